@@ -0,0 +1,10 @@
+"""
+Admin API initialization module.
+Exposes the router for administrator-only listing and reporting endpoints.
+"""
+
+from .router import router
+
+__all__ = [
+    "router"
+]
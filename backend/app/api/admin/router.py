@@ -0,0 +1,173 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import Optional
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+
+from app.core import rollups
+from app.core.database import get_db, SessionLocal
+from app.core.auth import get_current_user
+from app.core.export_stream import EXPORT_FORMATS, iter_export
+from app.core.fast_json import fast_response
+from app.core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.core.readonly_rows import BookingRow, PaymentRow
+from app.core.sampling_profiler import (
+    MAX_DURATION_SECONDS,
+    PROFILER_ENABLED,
+    ProfilerBusyError,
+    sampling_profiler,
+)
+from app.models.payment import Payment, PaymentStatus
+from app.services import admin_service
+from app.schemas.user import User
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"]
+)
+
+def require_admin(current_user: User = Depends(get_current_user)) -> User:
+    """管理者権限を持つユーザーのみ許可する"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=403,
+            detail="この操作を実行する権限がありません"
+        )
+    return current_user
+
+@router.get("/bookings")
+async def list_bookings(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    予約状況の一覧を取得するエンドポイント
+    - 決済IDの降順、after_id によるページネーション対応
+    - 管理者権限を持つユーザーのみアクセス可能
+    """
+    bookings = admin_service.list_bookings(
+        db=db,
+        start_date=start_date,
+        end_date=end_date,
+        after_id=after_id,
+        limit=limit
+    )
+    return fast_response({"bookings": bookings})
+
+@router.get("/payments")
+async def list_payments(
+    status: Optional[PaymentStatus] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    決済の一覧を取得するエンドポイント
+    - 決済IDの降順、after_id によるページネーション対応
+    - 管理者権限を持つユーザーのみアクセス可能
+    """
+    payments = admin_service.list_payments(
+        db=db,
+        status=status,
+        after_id=after_id,
+        limit=limit
+    )
+    return fast_response({"payments": payments})
+
+@router.get("/dashboard")
+async def get_dashboard(
+    days: int = Query(30, ge=1, le=366),
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    管理ダッシュボード用の日別集計を取得するエンドポイント
+    - 予約・決済時に更新される集計テーブルのみを参照するため、元テーブルの件数に依存しない
+    - 管理者権限を持つユーザーのみアクセス可能
+    """
+    end_day = datetime.utcnow().date() + timedelta(days=1)
+    dashboard = rollups.get_dashboard(db, end_day - timedelta(days=days), end_day)
+    return fast_response(dashboard)
+
+@router.get("/profile")
+async def profile_worker(
+    seconds: float = Query(10.0, gt=0, le=MAX_DURATION_SECONDS),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+    mode: str = Query("cpu", regex="^(cpu|wall)$"),
+    format: str = Query("collapsed", regex="^(collapsed|json)$"),
+    current_user: User = Depends(require_admin)
+):
+    """
+    このワーカープロセスをサンプリングプロファイラで計測するエンドポイント
+    - PROFILER_ENABLED が有効な場合のみ利用可能（無効時は404）
+    - 計測時間は PROFILER_MAX_SECONDS まで、同時に実行できるのは1件のみ
+    - collapsed: flamegraph.pl / speedscope で読み込める折り畳み形式（先頭フレームはルート）
+    - 管理者権限を持つユーザーのみアクセス可能
+    """
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    try:
+        summary = await sampling_profiler.profile(seconds, interval_ms / 1000, mode)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    if format == "json":
+        summary["stacks"] = dict(sampling_profiler.stacks.most_common(200))
+        return fast_response(summary)
+    return PlainTextResponse(
+        sampling_profiler.collapsed(),
+        headers={
+            "Content-Disposition": 'attachment; filename="profile.collapsed"',
+            "X-Profile-Samples": str(summary["samples"]),
+        }
+    )
+
+def _export_response(row_type, statement, name: str, export_format: str, gzip: bool) -> StreamingResponse:
+    """エクスポート用のストリーミングレスポンスを生成する"""
+    filename = f"{name}.{export_format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        iter_export(SessionLocal, row_type, statement, export_format=export_format, gzip=gzip),
+        media_type="application/gzip" if gzip else EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/exports/bookings")
+async def export_bookings(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    format: str = Query("csv", regex="^(csv|ndjson)$"),
+    gzip: bool = True,
+    current_user: User = Depends(require_admin)
+):
+    """
+    予約状況レポートをCSV/NDJSONでエクスポートするエンドポイント
+    - サーバーサイドカーソルで逐次取得・エンコードするため、件数に関わらずメモリ使用量は一定
+    - 管理者権限を持つユーザーのみアクセス可能
+    """
+    statement = admin_service.booking_query(start_date, end_date).order_by(Payment.id)
+    return _export_response(BookingRow, statement, "bookings", format, gzip)
+
+@router.get("/exports/payments")
+async def export_payments(
+    status: Optional[PaymentStatus] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    format: str = Query("csv", regex="^(csv|ndjson)$"),
+    gzip: bool = True,
+    current_user: User = Depends(require_admin)
+):
+    """
+    決済レポートをCSV/NDJSONでエクスポートするエンドポイント
+    - サーバーサイドカーソルで逐次取得・エンコードするため、件数に関わらずメモリ使用量は一定
+    - 管理者権限を持つユーザーのみアクセス可能
+    """
+    statement = admin_service.payment_query(status, start_date, end_date).order_by(Payment.id)
+    return _export_response(PaymentRow, statement, "payments", format, gzip)
@@ -2,7 +2,7 @@ from fastapi import APIRouter
 from typing import Optional
 from pydantic import BaseSettings
 from core.security import get_password_hash, verify_password, create_access_token
-from core.email_service import EmailService
+from app.core.email_service import get_email_service
 
 # 認証関連の設定クラス
 class AuthConfig(BaseSettings):
@@ -34,14 +34,21 @@ router = APIRouter(
 # グローバル設定インスタンス
 auth_config = AuthConfig()
 
-# メールサービスインスタンス
-email_service = EmailService()
+def __getattr__(name: str):
+    """
+    メールサービスインスタンス（email_service）は最初に参照された時点で生成する
+    ルートハンドラからは Depends(get_email_service) で受け取ることを推奨
+    """
+    if name == "email_service":
+        return get_email_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # 認証関連の依存関係をエクスポート
 __all__ = [
     "router",
     "auth_config",
     "email_service",
+    "get_email_service",
     "get_password_hash",
     "verify_password",
     "create_access_token"
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Security, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from typing import Dict
@@ -6,9 +6,21 @@ from typing import Dict
 from app.core.security import (
     create_access_token,
     get_password_hash,
-    verify_password,
-    get_current_user
+    verify_and_update_password,
+    configure_password_hashing,
+    get_current_user,
+    decode_access_token,
+    oauth2_scheme
 )
+from app.core.refresh_tokens import (
+    issue_tokens,
+    revoke_session,
+    revoke_user_sessions,
+    rotate_refresh_token
+)
+from app.core.token_revocation import revocation_list
+from app.core.breached_passwords import get_breached_password_filter, is_breached_password
+from app.core.database import SessionLocal
 from app.db.session import get_db
 from app.models.user import User
 from app.schemas.auth import (
@@ -17,11 +29,23 @@ from app.schemas.auth import (
     UserResponse,
     PasswordReset
 )
+from app.schemas.user import RefreshTokenRequest, Token
 from app.core.email import send_password_reset_email
+from app.core import rollups
+from app.core.rate_limit import (
+    login_rate_limit,
+    password_reset_rate_limit,
+    register_rate_limit
+)
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
-@router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/register",
+    response_model=UserResponse,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(register_rate_limit)]
+)
 async def register_user(user_data: UserCreate, db: Session = Depends(get_db)) -> Dict:
     """
     新規ユーザー登録エンドポイント
@@ -33,6 +57,13 @@ async def register_user(user_data: UserCreate, db: Session = Depends(get_db)) ->
             detail="Email already registered"
         )
     
+    # 漏えい済みのパスワードは使用できない
+    if is_breached_password(user_data.password):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="This password has appeared in a data breach. Please choose a different password"
+        )
+    
     # パスワードのハッシュ化
     hashed_password = get_password_hash(user_data.password)
     
@@ -47,16 +78,16 @@ async def register_user(user_data: UserCreate, db: Session = Depends(get_db)) ->
     db.commit()
     db.refresh(user)
     
-    # アクセストークンの生成
-    access_token = create_access_token(data={"sub": user.email})
+    # アクセストークン・リフレッシュトークンの生成
+    tokens = issue_tokens(db, user)
+    db.commit()
     
     return {
-        "access_token": access_token,
-        "token_type": "bearer",
+        **tokens,
         "user": user
     }
 
-@router.post("/login", response_model=UserResponse)
+@router.post("/login", response_model=UserResponse, dependencies=[Depends(login_rate_limit)])
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
@@ -66,23 +97,62 @@ async def login(
     """
     # ユーザーの検証
     user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    verified, new_hash = (
+        verify_and_update_password(form_data.password, user.hashed_password) if user else (False, None)
+    )
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # アクセストークンの生成
-    access_token = create_access_token(data={"sub": user.email})
+    # ハッシュのコストが現在の設定より低い場合は、設定したコストで作り直したものを保存する
+    if new_hash:
+        user.hashed_password = new_hash
+    
+    # ダッシュボード用のアクティブユーザー数を更新
+    rollups.record_user_activity(db, user.id)
+    
+    # アクセストークン・リフレッシュトークンの生成
+    tokens = issue_tokens(db, user)
+    db.commit()
     
     return {
-        "access_token": access_token,
-        "token_type": "bearer",
+        **tokens,
         "user": user
     }
 
-@router.post("/reset-password", status_code=status.HTTP_200_OK)
+@router.post("/refresh", response_model=Token, dependencies=[Depends(login_rate_limit)])
+async def refresh_tokens(
+    refresh_data: RefreshTokenRequest,
+    db: Session = Depends(get_db)
+) -> Dict:
+    """
+    リフレッシュトークンを新しいトークンの組と交換するエンドポイント
+    使用したリフレッシュトークンは無効になる
+    """
+    return rotate_refresh_token(db, refresh_data.refresh_token)
+
+@router.post("/logout", status_code=status.HTTP_200_OK)
+async def logout(
+    token: str = Security(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> Dict:
+    """
+    ログアウトエンドポイント
+    アクセストークンと、同じログインで発行されたリフレッシュトークンを失効させる
+    """
+    revoke_session(db, decode_access_token(token))
+    return {
+        "message": "Successfully logged out"
+    }
+
+@router.post(
+    "/reset-password",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(password_reset_rate_limit)]
+)
 async def reset_password(
     reset_data: PasswordReset,
     db: Session = Depends(get_db)
@@ -106,7 +176,11 @@ async def reset_password(
         "message": "Password reset instructions have been sent to your email"
     }
 
-@router.post("/verify-reset-token", status_code=status.HTTP_200_OK)
+@router.post(
+    "/verify-reset-token",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(password_reset_rate_limit)]
+)
 async def verify_reset_token(
     token: str,
     new_password: str,
@@ -116,12 +190,40 @@ async def verify_reset_token(
     """
     パスワードリセットトークンの検証とパスワード更新
     """
+    if is_breached_password(new_password):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="This password has appeared in a data breach. Please choose a different password"
+        )
+    
     # 新しいパスワードのハッシュ化と更新
     hashed_password = get_password_hash(new_password)
     current_user.hashed_password = hashed_password
     
+    # 既存のログインを全て失効させる
+    revoke_user_sessions(db, current_user.id)
     db.commit()
     
     return {
         "message": "Password has been successfully updated"
-    }
\ No newline at end of file
+    }
+
+@router.on_event("startup")
+async def calibrate_password_hashing():
+    """bcrypt のコストを決定する（結果はログに出力される）"""
+    configure_password_hashing()
+
+@router.on_event("startup")
+async def open_breached_password_filter():
+    """漏えい済みパスワードのフィルタを開く（BREACHED_PASSWORDS_FILTER が設定されている場合のみ）"""
+    get_breached_password_filter()
+
+@router.on_event("startup")
+async def start_revocation_sync():
+    """失効トークンの読み込みと定期同期を開始する"""
+    revocation_list.start(SessionLocal)
+
+@router.on_event("shutdown")
+async def stop_revocation_sync():
+    """失効トークンの定期同期を停止する"""
+    revocation_list.stop()
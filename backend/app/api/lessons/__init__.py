@@ -2,7 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException
 from typing import Optional
 from datetime import datetime
 from pydantic import BaseModel
+from sqlalchemy.orm import Session
 
+from app.core.database import get_db
 from app.core.schedule_manager import ScheduleManager
 from app.core.payment_processor import PaymentProcessor
 from app.core.security import get_current_user
@@ -13,9 +15,10 @@ router = APIRouter()
 class LessonConfig:
     """レッスン設定を管理するクラス"""
     
-    def __init__(self):
-        self.schedule_manager = ScheduleManager()
-        self.payment_processor = PaymentProcessor()
+    def __init__(self, db: Session = Depends(get_db)):
+        # リクエストのDBセッションを渡し、決済時の仮押さえの確定・集計の更新を有効にする
+        self.schedule_manager = ScheduleManager(db)
+        self.payment_processor = PaymentProcessor(db)
         self.min_booking_notice = 24  # 予約に必要な最小時間（時間単位）
         self.max_advance_booking = 30  # 予約可能な最大先日数
         
@@ -1,8 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from typing import List
-from datetime import datetime
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
 
-from app.services import lesson_service
+from app.core.collection_versions import (
+    collection_versions,
+    is_not_modified,
+    not_modified_response,
+    schedule_collections,
+    set_validators
+)
+from app.core.database import SessionLocal, get_db
+from app.core.fast_json import FAST_JSON_RESPONSES, fast_response
+from app.core.lesson_reminders import LESSON_REMINDERS_ENABLED, lesson_reminders
+from app.core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.core.rate_limit import booking_rate_limit
+from app.core.slot_holds import slot_holds
+from app.services import lesson_service, package_scheduler, search_service
 from app.schemas import lesson as lesson_schemas
 from app.core.auth import get_current_user
 from app.models.user import User
@@ -12,18 +26,29 @@ router = APIRouter()
 class LessonController:
     """レッスン予約に関する制御を行うコントローラークラス"""
     
-    @router.post("/lessons/book", response_model=lesson_schemas.LessonBooking)
-    async def book_lesson(
+    @router.post(
+        "/lessons/book",
+        response_model=lesson_schemas.LessonBooking,
+        dependencies=[Depends(booking_rate_limit)]
+    )
+    def book_lesson(
         lesson_request: lesson_schemas.LessonBookingCreate,
-        current_user: User = Depends(get_current_user)
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
     ):
-        """新規レッスンを予約するエンドポイント"""
+        """
+        グループレッスンを予約するエンドポイント
+        参加枠は条件付きUPDATE文で確保し、満席の場合は409（同期処理のためスレッドプールで実行する）
+        """
         try:
-            booking = await lesson_service.create_booking(
+            booking = lesson_service.create_booking(
+                db=db,
                 user_id=current_user.id,
                 lesson_data=lesson_request
             )
             return booking
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=400,
@@ -31,18 +56,37 @@ class LessonController:
             )
 
     @router.get("/lessons/schedule", response_model=List[lesson_schemas.LessonSchedule])
-    async def get_schedule(
+    def get_schedule(
+        request: Request,
+        response: Response,
         start_date: datetime = None,
         end_date: datetime = None,
-        current_user: User = Depends(get_current_user)
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
     ):
-        """ユーザーのレッスンスケジュールを取得するエンドポイント"""
+        """
+        ユーザーのレッスンスケジュールを取得するエンドポイント
+        ETag / Last-Modified による条件付きGETに対応（未変更ならバージョンの確認のみで304）
+        DBへの問い合わせを伴うため同期処理とし、スレッドプールで実行する
+        """
+        etag, last_modified = collection_versions.validators(
+            db, schedule_collections(current_user.id),
+            scope=f"schedule:{current_user.id}:{start_date}:{end_date}"
+        )
+        if is_not_modified(request, etag, last_modified):
+            return not_modified_response(etag, last_modified)
+        set_validators(response, etag, last_modified)
+
         try:
-            schedule = await lesson_service.get_user_schedule(
+            schedule = lesson_service.get_user_schedule(
+                db=db,
                 user_id=current_user.id,
                 start_date=start_date,
                 end_date=end_date
             )
+            if FAST_JSON_RESPONSES:
+                # DBから取得した値をそのままシリアライズし、response_model の再検証を省く
+                return fast_response(schedule, response)
             return schedule
         except Exception as e:
             raise HTTPException(
@@ -50,7 +94,84 @@ class LessonController:
                 detail=str(e)
             )
 
-    @router.put("/lessons/{booking_id}", response_model=lesson_schemas.LessonBooking)
+    @router.get("/lessons/search", response_model=List[lesson_schemas.LessonSearchResult])
+    def search_lessons(
+        search: lesson_schemas.LessonSearch = Depends(),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+    ):
+        """キーワードと条件（タイプ・レベル・料金・講師・期間）でレッスンを検索するエンドポイント"""
+        try:
+            return search_service.search_lessons(db=db, search=search, limit=limit)
+        except Exception as e:
+            raise HTTPException(
+                status_code=400,
+                detail=str(e)
+            )
+
+    @router.post(
+        "/lessons/holds",
+        response_model=lesson_schemas.SlotHold,
+        status_code=201,
+        dependencies=[Depends(booking_rate_limit)]
+    )
+    async def hold_slot(
+        hold_request: lesson_schemas.SlotHoldCreate,
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+    ):
+        """
+        チェックアウト中の時間枠を仮押さえするエンドポイント
+        仮押さえは SLOT_HOLD_TTL_SECONDS 後に失効し、決済の完了・失敗時に確定・解放される
+        """
+        if hold_request.end_time <= hold_request.start_time:
+            raise HTTPException(status_code=400, detail="end_time must be after start_time")
+        return slot_holds.place(
+            db,
+            teacher_id=hold_request.teacher_id,
+            start_time=hold_request.start_time,
+            end_time=hold_request.end_time,
+            user_id=current_user.id
+        )
+
+    @router.delete("/lessons/holds/{hold_id}", status_code=204)
+    async def release_slot_hold(
+        hold_id: str,
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+    ):
+        """チェックアウトの中止時に仮押さえを解放するエンドポイント"""
+        if not slot_holds.release(db, hold_id, user_id=current_user.id):
+            raise HTTPException(status_code=404, detail="Slot hold not found")
+        return Response(status_code=204)
+
+    @router.post("/lessons/package-schedule", response_model=lesson_schemas.PackageSchedule)
+    async def schedule_package(
+        package_request: lesson_schemas.PackageScheduleRequest,
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+    ):
+        """パッケージ予約の枠（互いに重ならず間隔を空けたN件）を自動で選ぶエンドポイント"""
+        slots = await package_scheduler.find_package_slots(
+            db=db,
+            user_id=current_user.id,
+            teacher_ids=package_request.teacher_ids,
+            count=package_request.count,
+            weekdays=package_request.weekdays,
+            preferred_times=package_request.preferred_times,
+            min_spacing=timedelta(hours=package_request.min_spacing_hours),
+            start_date=package_request.start_date,
+            end_date=package_request.end_date,
+            timezone=package_request.timezone
+        )
+        return {"slots": slots}
+
+    @router.put(
+        "/lessons/{booking_id}",
+        response_model=lesson_schemas.LessonBooking,
+        dependencies=[Depends(booking_rate_limit)]
+    )
     async def update_booking(
         booking_id: int,
         update_data: lesson_schemas.LessonBookingUpdate,
@@ -70,24 +191,53 @@ class LessonController:
                 detail=str(e)
             )
 
-    @router.delete("/lessons/{booking_id}", response_model=lesson_schemas.LessonBookingDelete)
-    async def cancel_booking(
+    @router.delete(
+        "/lessons/{booking_id}",
+        response_model=lesson_schemas.LessonBookingDelete,
+        dependencies=[Depends(booking_rate_limit)]
+    )
+    def cancel_booking(
         booking_id: int,
-        current_user: User = Depends(get_current_user)
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
     ):
-        """レッスン予約をキャンセルするエンドポイント"""
+        """レッスン予約をキャンセルし、参加枠を戻すエンドポイント"""
         try:
-            result = await lesson_service.cancel_booking(
+            result = lesson_service.cancel_booking(
+                db=db,
                 booking_id=booking_id,
                 user_id=current_user.id
             )
             return result
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=400,
                 detail=str(e)
             )
 
+@router.on_event("startup")
+async def start_slot_hold_sweeper():
+    """期限切れの仮押さえを削除し、期限の到来を待つスレッドを開始する"""
+    slot_holds.start(SessionLocal)
+
+@router.on_event("shutdown")
+async def stop_slot_hold_sweeper():
+    """仮押さえの期限管理スレッドを停止する"""
+    slot_holds.stop()
+
+@router.on_event("startup")
+async def start_lesson_reminders():
+    """リマインダー・予約変更期限の通知の検出と送信を開始する"""
+    if LESSON_REMINDERS_ENABLED:
+        lesson_reminders.start(SessionLocal)
+
+@router.on_event("shutdown")
+async def stop_lesson_reminders():
+    """通知の送信スレッドを停止する"""
+    lesson_reminders.stop()
+
 # レッスンコントローラーのインスタンスを作成
 lesson_controller = LessonController()
 
@@ -4,7 +4,7 @@ from pydantic import BaseModel
 from datetime import datetime
 
 # Core dependencies
-from app.core.gdrive_connector import GDriveConnector
+from app.core.gdrive_connector import get_gdrive_connector
 from app.core.access_control import require_auth, check_permissions
 
 # Initialize router
@@ -43,8 +43,14 @@ class MaterialConfig(BaseModel):
             }
         }
 
-# Initialize Google Drive connector for materials
-gdrive = GDriveConnector()
+def __getattr__(name: str):
+    """
+    Google Drive連携インスタンス（gdrive）は最初に参照された時点で生成する
+    ルートハンドラからは Depends(get_gdrive_connector) で受け取ることを推奨
+    """
+    if name == "gdrive":
+        return get_gdrive_connector()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Import routes
 from .routes import *
@@ -53,5 +59,6 @@ from .routes import *
 __all__ = [
     'router',
     'MaterialConfig',
-    'gdrive'
+    'gdrive',
+    'get_gdrive_connector'
 ]
\ No newline at end of file
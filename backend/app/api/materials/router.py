@@ -1,10 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Request, Response
+from typing import List, Optional
 from sqlalchemy.orm import Session
 
-from app.core.database import get_db
+from app.core.database import get_db, SessionLocal
+from app.core.download_counter import download_counter
+from app.core.fast_json import FAST_JSON_RESPONSES, fast_response
 from app.core.auth import get_current_user
-from app.services import material_service
+from app.core.collection_versions import (
+    collection_versions,
+    is_not_modified,
+    material_collections,
+    not_modified_response,
+    set_validators
+)
+from app.core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.services import material_service, search_service
 from app.schemas import material as material_schemas
 from app.schemas.user import User
 
@@ -13,32 +23,75 @@ router = APIRouter(
     tags=["materials"]
 )
 
-@router.get("/list", response_model=List[material_schemas.Material])
+@router.get("/list", response_model=material_schemas.MaterialList)
 async def list_materials(
-    skip: int = 0,
-    limit: int = 100,
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     教材一覧を取得するエンドポイント
-    - ページネーション対応
+    - カーソル (created_at, id) によるページネーション対応
+    - 一覧表示に必要な項目のみを返す
+    - ETag / Last-Modified による条件付きGETに対応（未変更ならバージョンの確認のみで304）
     - 認証済みユーザーのみアクセス可能
     """
+    etag, last_modified = collection_versions.validators(
+        db, material_collections(current_user.id),
+        scope=f"materials:{current_user.id}:{cursor}:{limit}"
+    )
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    set_validators(response, etag, last_modified)
+
     try:
         materials = material_service.get_materials(
             db=db,
             user_id=current_user.id,
-            skip=skip,
+            cursor=cursor,
             limit=limit
         )
+        if FAST_JSON_RESPONSES:
+            # DBから取得した値をそのままシリアライズし、response_model の再検証を省く
+            return fast_response(materials, response)
         return materials
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"教材一覧の取得に失敗しました: {str(e)}"
         )
 
+@router.get("/search", response_model=List[material_schemas.MaterialListItem])
+async def search_materials(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    教材を全文検索するエンドポイント
+    - タイトル・説明・カテゴリー名が検索対象
+    - 閲覧権限のある教材のみを返す
+    - 認証済みユーザーのみアクセス可能
+    """
+    try:
+        return search_service.search_materials(
+            db=db,
+            user_id=current_user.id,
+            query=q,
+            limit=limit
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"教材の検索に失敗しました: {str(e)}"
+        )
+
 @router.get("/download/{material_id}")
 async def download_material(
     material_id: int,
@@ -57,6 +110,8 @@ async def download_material(
             user_id=current_user.id
         )
         return material_file
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -134,4 +189,14 @@ async def delete_material(
         raise HTTPException(
             status_code=500,
             detail=f"教材の削除に失敗しました: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.on_event("startup")
+async def start_download_counter():
+    """ダウンロード数の定期反映を開始する"""
+    download_counter.start(SessionLocal)
+
+@router.on_event("shutdown")
+async def stop_download_counter():
+    """停止時に未反映のダウンロード数を反映する"""
+    download_counter.stop()
@@ -1,19 +1,41 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import Dict, Optional
+import json
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from functools import lru_cache
+from typing import List, Optional
 from pydantic import BaseModel
+from sqlalchemy.orm import Session
 from app.core.auth import get_current_user
+from app.core.database import get_db
+from app.core.payment_processor import PaymentProcessor
+from app.core.rate_limit import payment_rate_limit
 from app.services.payment import PaymentService
-from app.schemas.payment import PaymentCreate, PaymentStatus
-from app.core.config import Settings
+from app.schemas.payment import PaymentCreate, PaymentIntent, PaymentStatus
 
 router = APIRouter(
     prefix="/payment",
     tags=["payment"]
 )
 
-# 依存関係の注入
-settings = Settings()
-payment_service = PaymentService()
+@lru_cache(maxsize=None)
+def get_payment_service() -> PaymentService:
+    """
+    決済サービスを依存関係として提供する
+    インポート時ではなく最初のリクエスト時に生成し、以降は同じインスタンスを返す
+    """
+    return PaymentService()
+
+def get_payment_processor(db: Session = Depends(get_db)) -> PaymentProcessor:
+    """
+    リクエストのDBセッションを使う決済処理を提供する
+    仮押さえの関連付け・確定・解放と、ダッシュボード用の集計の更新に使用する
+    """
+    return PaymentProcessor(db)
+
+class PaymentIntentRequest(BaseModel):
+    # 最小通貨単位。仮押さえを指定した場合は使わず、サーバーで仮押さえの料金から算出する
+    amount: Optional[int] = None
+    currency: str = "usd"
+    slot_hold_ids: List[str] = []
 
 class PaymentProcessRequest(BaseModel):
     amount: float
@@ -27,10 +49,11 @@ class PaymentResponse(BaseModel):
     amount: float
     currency: str
 
-@router.post("/process", response_model=PaymentResponse)
+@router.post("/process", response_model=PaymentResponse, dependencies=[Depends(payment_rate_limit)])
 async def process_payment(
     payment_data: PaymentProcessRequest,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    payment_service: PaymentService = Depends(get_payment_service)
 ):
     """
     決済処理を実行するエンドポイント
@@ -63,10 +86,40 @@ async def process_payment(
             detail=str(e)
         )
 
-@router.get("/status/{payment_id}", response_model=PaymentStatus)
+@router.post("/intents", response_model=PaymentIntent, dependencies=[Depends(payment_rate_limit)])
+async def create_payment_intent(
+    intent_request: PaymentIntentRequest,
+    current_user = Depends(get_current_user),
+    processor: PaymentProcessor = Depends(get_payment_processor)
+):
+    """
+    チェックアウトの決済（PaymentIntent）を作成するエンドポイント
+    
+    仮押さえを指定した場合、金額・通貨は仮押さえの料金から算出する
+    （期限切れ・他のユーザーの仮押さえが含まれる場合は409）。
+
+    Args:
+        intent_request: 金額・通貨と、決済に関連付ける仮押さえのID
+        current_user: 認証されたユーザー情報
+    
+    Returns:
+        PaymentIntent: クライアントシークレットとPaymentIntentID
+    """
+    metadata = {"user_id": str(current_user.id)}
+    if intent_request.slot_hold_ids:
+        metadata["slot_hold_ids"] = ",".join(intent_request.slot_hold_ids)
+    return await processor.create_payment_intent(
+        amount=intent_request.amount,
+        currency=intent_request.currency,
+        metadata=metadata,
+        user_id=current_user.id
+    )
+
+@router.get("/status/{payment_id}", response_model=PaymentStatus, dependencies=[Depends(payment_rate_limit)])
 async def get_payment_status(
     payment_id: str,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    payment_service: PaymentService = Depends(get_payment_service)
 ):
     """
     決済状態を取得するエンドポイント
@@ -100,15 +153,24 @@ async def get_payment_status(
         )
 
 @router.post("/webhook", include_in_schema=False)
-async def payment_webhook(payload: Dict):
+async def payment_webhook(
+    request: Request,
+    processor: PaymentProcessor = Depends(get_payment_processor),
+    payment_service: PaymentService = Depends(get_payment_service)
+):
     """
     決済サービスからのWebhookを処理するエンドポイント
     
+    署名を検証したうえで、リクエストのDBセッションで仮押さえの確定・解放と集計の更新を行う
+    （署名が不正な場合は400）。
+    
     Args:
-        payload: Webhookペイロード
+        request: Webhookのリクエスト（署名の検証に加工前の本文を使う）
     """
+    payload = await request.body()
+    await processor.handle_webhook_event(payload, request.headers.get("stripe-signature", ""))
     try:
-        await payment_service.handle_webhook(payload)
+        await payment_service.handle_webhook(json.loads(payload))
         return {"status": "success"}
     except Exception as e:
         raise HTTPException(
@@ -0,0 +1,263 @@
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event, func, or_, select
+from sqlalchemy.orm import Session
+
+from app.models.material import Material
+from app.models.material_access import MaterialAccess
+
+
+def visible_materials_clause(user_id: str):
+    """
+    ユーザーが閲覧可能な教材を表すSQL条件
+
+    公開教材、教材単位の権限、カテゴリー単位の権限のいずれかに該当する教材。
+    権限側は material_access の (user_id, material_id) / (user_id, category_id)
+    索引で解決されるため、一覧取得は1回のクエリで済む。
+    """
+    return or_(
+        Material.is_public.is_(True),
+        Material.id.in_(
+            select(MaterialAccess.material_id).where(
+                MaterialAccess.user_id == user_id,
+                MaterialAccess.material_id.isnot(None)
+            )
+        ),
+        Material.category_id.in_(
+            select(MaterialAccess.category_id).where(
+                MaterialAccess.user_id == user_id,
+                MaterialAccess.category_id.isnot(None)
+            )
+        ),
+    )
+
+
+class MaterialAccessIndex:
+    """
+    教材アクセス権限のメモリ上の索引
+
+    教材側（公開教材の集合、カテゴリーごとの教材集合）は起動時に構築し、
+    ユーザー側（教材単位・カテゴリー単位の権限集合）は初回参照時に読み込んで
+    一定時間キャッシュする。このプロセスでの変更はコミット後に差分で反映する。
+    他ワーカーでの変更は、教材側は material_ttl ごとの件数・最終更新日時の確認で、
+    ユーザー側はキャッシュの有効期限内で反映される。
+    剥奪した権限が最大 user_ttl の間残るため、用途は一覧・検索結果の絞り込みに限る。
+    ダウンロードなどの認可は visible_materials_clause でDBに問い合わせて判定する。
+    """
+
+    def __init__(self, user_ttl: float = 60.0, material_ttl: float = 30.0):
+        self.user_ttl = user_ttl
+        self.material_ttl = material_ttl
+        self._lock = threading.RLock()
+        self._public: Set[int] = set()
+        self._material_category: Dict[int, Optional[int]] = {}
+        self._category_materials: Dict[int, Set[int]] = defaultdict(set)
+        # user_id -> (読み込み時刻, 教材IDの集合, カテゴリーIDの集合)
+        self._users: Dict[str, Tuple[float, Set[int], Set[int]]] = {}
+        # 権限の変更ごとに進め、変更と並行して読み込んだ権限をキャッシュしないために使う
+        self._generation = 0
+        # 最後に照合した教材の (件数, 最終更新日時) と、照合した時刻
+        self._signature: Optional[Tuple] = None
+        self._checked_at = 0.0
+        self.loaded = False
+
+    @staticmethod
+    def _material_signature(db: Session) -> Tuple:
+        return tuple(db.query(func.count(Material.id), func.max(Material.updated_at)).one())
+
+    def rebuild(self, db: Session, batch_size: int = 10000) -> None:
+        """教材側の索引をDBから再構築する"""
+        with self._lock:
+            self._signature = self._material_signature(db)
+            self._checked_at = time.monotonic()
+            self._public = set()
+            self._material_category = {}
+            self._category_materials = defaultdict(set)
+            self._users = {}
+            self._generation += 1
+            for row in db.query(
+                Material.id, Material.category_id, Material.is_public
+            ).yield_per(batch_size):
+                self._set_material(row.id, row.category_id, row.is_public)
+            self.loaded = True
+
+    def _set_material(self, material_id: int, category_id: Optional[int], is_public: bool) -> None:
+        previous = self._material_category.get(material_id)
+        if previous is not None:
+            self._category_materials[previous].discard(material_id)
+        self._material_category[material_id] = category_id
+        if category_id is not None:
+            self._category_materials[category_id].add(material_id)
+        if is_public:
+            self._public.add(material_id)
+        else:
+            self._public.discard(material_id)
+
+    def update_material(self, material_id: int, category_id: Optional[int], is_public: bool) -> None:
+        """教材の公開状態・カテゴリーの変更を反映する"""
+        with self._lock:
+            self._set_material(material_id, category_id, is_public)
+
+    def remove_material(self, material_id: int) -> None:
+        """教材の削除を反映する"""
+        with self._lock:
+            self._generation += 1
+            category_id = self._material_category.pop(material_id, None)
+            if category_id is not None:
+                self._category_materials[category_id].discard(material_id)
+            self._public.discard(material_id)
+            for _, materials, _ in self._users.values():
+                materials.discard(material_id)
+
+    def _user_grants(self, db: Session, user_id: str) -> Tuple[Set[int], Set[int]]:
+        with self._lock:
+            entry = self._users.get(user_id)
+            generation = self._generation
+        if entry is not None and time.monotonic() - entry[0] < self.user_ttl:
+            return entry[1], entry[2]
+
+        materials: Set[int] = set()
+        categories: Set[int] = set()
+        for row in db.query(MaterialAccess.material_id, MaterialAccess.category_id).filter(
+            MaterialAccess.user_id == user_id
+        ):
+            if row.material_id is not None:
+                materials.add(row.material_id)
+            else:
+                categories.add(row.category_id)
+
+        with self._lock:
+            # 読み込み中に権限が変更された場合は、反映漏れを避けるためキャッシュしない
+            if self._generation == generation:
+                self._users[user_id] = (time.monotonic(), materials, categories)
+        return materials, categories
+
+    def apply_grant(self, user_id: str, material_id: Optional[int], category_id: Optional[int]) -> None:
+        """権限の付与を読み込み済みのユーザーに反映する"""
+        with self._lock:
+            self._generation += 1
+            entry = self._users.get(user_id)
+            if entry is None:
+                return
+            if material_id is not None:
+                entry[1].add(material_id)
+            if category_id is not None:
+                entry[2].add(category_id)
+
+    def apply_revoke(self, user_id: str, material_id: Optional[int], category_id: Optional[int]) -> None:
+        """権限の剥奪を読み込み済みのユーザーに反映する"""
+        with self._lock:
+            self._generation += 1
+            entry = self._users.get(user_id)
+            if entry is None:
+                return
+            if material_id is not None:
+                entry[1].discard(material_id)
+            if category_id is not None:
+                entry[2].discard(category_id)
+
+    def can_access(self, db: Session, user_id: str, material_id: int) -> bool:
+        """ユーザーが教材を閲覧できるかを定数時間で判定する（一覧の絞り込み用。認可には使わない）"""
+        self.ensure_loaded(db)
+        if material_id in self._public:
+            return True
+        materials, categories = self._user_grants(db, user_id)
+        if material_id in materials:
+            return True
+        return self._material_category.get(material_id) in categories
+
+    def visible_material_ids(self, db: Session, user_id: str) -> Set[int]:
+        """ユーザーが閲覧可能な教材IDの集合を返す"""
+        self.ensure_loaded(db)
+        materials, categories = self._user_grants(db, user_id)
+        with self._lock:
+            visible = self._public | materials
+            for category_id in categories:
+                visible |= self._category_materials.get(category_id, set())
+        return visible
+
+    def filter_visible(self, db: Session, user_id: str, material_ids):
+        """教材IDの列から閲覧可能なものだけを順序を保って返す"""
+        return [material_id for material_id in material_ids
+                if self.can_access(db, user_id, material_id)]
+
+    def ensure_loaded(self, db: Session) -> None:
+        """
+        未構築であれば構築し、material_ttl を過ぎていればDBの教材と照合する
+
+        最終更新日時が前回の照合より新しい教材（他ワーカーでの作成・更新）を読み込んで反映し、
+        それでも件数が合わない場合（他ワーカーでの削除）は再構築する。
+        """
+        if not self.loaded:
+            self.rebuild(db)
+            return
+        if time.monotonic() - self._checked_at < self.material_ttl:
+            return
+        with self._lock:
+            if time.monotonic() - self._checked_at < self.material_ttl:
+                return
+            self._checked_at = time.monotonic()
+            signature = self._material_signature(db)
+            if signature == self._signature:
+                return
+            previous_latest = self._signature[1]
+            if previous_latest is None:
+                self.rebuild(db)
+                return
+            for row in db.query(Material.id, Material.category_id, Material.is_public).filter(
+                Material.updated_at >= previous_latest
+            ):
+                self._set_material(row.id, row.category_id, row.is_public)
+            if len(self._material_category) != signature[0]:
+                self.rebuild(db)
+            else:
+                self._signature = signature
+
+    def _apply(self, changes: List[Tuple]) -> None:
+        for change in changes:
+            if change[0] == "material":
+                self.update_material(*change[1:])
+            elif change[0] == "material_deleted":
+                self.remove_material(change[1])
+            elif change[0] == "grant":
+                self.apply_grant(*change[1:])
+            else:
+                self.apply_revoke(*change[1:])
+
+    def register_listeners(self) -> None:
+        """ORMセッションのコミット時に、変更された教材・権限を索引に反映する"""
+        # 索引ごとに別のキーで保持する（同じセッションを複数の索引が追従する場合がある）
+        key = ("material_access_changes", id(self))
+
+        def after_flush(session, flush_context):
+            changes: List[Tuple] = session.info.setdefault(key, [])
+            for obj in list(session.new) + list(session.dirty):
+                if isinstance(obj, Material):
+                    changes.append(("material", obj.id, obj.category_id, bool(obj.is_public)))
+                elif isinstance(obj, MaterialAccess) and obj in session.new:
+                    changes.append(("grant", obj.user_id, obj.material_id, obj.category_id))
+            for obj in session.deleted:
+                if isinstance(obj, Material):
+                    changes.append(("material_deleted", obj.id))
+                elif isinstance(obj, MaterialAccess):
+                    changes.append(("revoke", obj.user_id, obj.material_id, obj.category_id))
+
+        def after_commit(session):
+            changes = session.info.pop(key, None)
+            if changes:
+                self._apply(changes)
+
+        def after_rollback(session):
+            session.info.pop(key, None)
+
+        event.listen(Session, "after_flush", after_flush)
+        event.listen(Session, "after_commit", after_commit)
+        event.listen(Session, "after_soft_rollback", lambda session, previous: after_rollback(session))
+
+
+# アプリケーション全体で共有するアクセス権限索引
+material_access_index = MaterialAccessIndex()
+material_access_index.register_listeners()
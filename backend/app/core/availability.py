@@ -0,0 +1,181 @@
+"""
+講師の受講可能時間の展開
+
+繰り返しルール（AvailabilityRule）と例外（AvailabilityException）を、指定した期間の分だけ
+ジェネレーターで時間帯に展開し、予約済みのレッスンを除いた空き枠を順に返す。
+処理時間とメモリは検索期間の長さ（日数・枠数・期間内のレッスン数）に比例し、
+ルールの有効期間の長さには依存しない。
+
+日時は全てUTCのnaiveなdatetimeで扱う（DBの保存形式と同じ）。
+ルール・例外の時刻は講師のタイムゾーンの現地時刻として解釈する。
+"""
+import heapq
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, Iterator, Optional, Tuple
+
+import pytz
+
+Interval = Tuple[datetime, datetime]
+
+ONE_DAY = timedelta(days=1)
+
+
+def to_utc_naive(value: datetime) -> datetime:
+    """aware な datetime はUTCのnaiveに変換する（naive はUTCとみなしてそのまま返す）"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(pytz.UTC).replace(tzinfo=None)
+
+
+def local_interval(day: date, start: time, end: time, tz) -> Interval:
+    """現地の日付・時刻の時間帯をUTCのnaiveに変換する（end が start 以前なら翌日まで）"""
+    end_day = day + ONE_DAY if end <= start else day
+    return (
+        to_utc_naive(tz.localize(datetime.combine(day, start))),
+        to_utc_naive(tz.localize(datetime.combine(end_day, end))),
+    )
+
+
+def _days(first_day: date, last_day: date) -> Iterator[date]:
+    day = first_day
+    while day <= last_day:
+        yield day
+        day += ONE_DAY
+
+
+def iter_rule_intervals(rule, first_day: date, last_day: date, default_tz) -> Iterator[Interval]:
+    """ルールを first_day から last_day（現地の日付）までの時間帯に展開する"""
+    tz = pytz.timezone(rule.timezone) if rule.timezone else default_tz
+    first_day = max(first_day, rule.valid_from)
+    if rule.valid_until is not None:
+        last_day = min(last_day, rule.valid_until)
+    for day in _days(first_day, last_day):
+        if rule.occurs_on(day):
+            yield local_interval(day, rule.start_time, rule.end_time, tz)
+
+
+def teacher_timezone(rules: Iterable, default_tz):
+    """
+    講師のタイムゾーンを返す
+
+    例外はタイムゾーンを持たないため、ルールの timezone（複数ある場合は最も新しいルール）を用いる。
+    設定したルールがなければ default_tz とする。
+    """
+    zoned = [rule for rule in rules if rule.timezone]
+    if not zoned:
+        return default_tz
+    return pytz.timezone(max(zoned, key=lambda rule: rule.valid_from).timezone)
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> Iterator[Interval]:
+    """開始時刻順の時間帯のうち、重なる・接するものを1つにまとめる"""
+    current_start = current_end = None
+    for start, end in intervals:
+        if current_end is not None and start <= current_end:
+            current_end = max(current_end, end)
+            continue
+        if current_end is not None:
+            yield current_start, current_end
+        current_start, current_end = start, end
+    if current_end is not None:
+        yield current_start, current_end
+
+
+def subtract_intervals(intervals: Iterable[Interval], blocks: Iterable[Interval]) -> Iterator[Interval]:
+    """
+    時間帯から blocks と重なる部分を除く
+    いずれも開始時刻順で、blocks は互いに重ならないこと（merge_intervals の結果）
+    """
+    blocks = iter(blocks)
+    block = next(blocks, None)
+    for start, end in intervals:
+        while block is not None and block[1] <= start:
+            block = next(blocks, None)
+        while block is not None and block[0] < end:
+            if block[0] > start:
+                yield start, block[0]
+            if block[1] >= end:
+                start = end
+                break
+            start = block[1]
+            block = next(blocks, None)
+        if start < end:
+            yield start, end
+
+
+def iter_available_intervals(
+    rules: Iterable,
+    exceptions: Iterable,
+    window_start: datetime,
+    window_end: datetime,
+    default_tz,
+) -> Iterator[Interval]:
+    """
+    ルールと例外から、期間内の受講可能な時間帯を開始時刻順に返す
+    例外は講師のタイムゾーン（teacher_timezone）の現地の日付・時刻として展開する。
+    """
+    rules = list(rules)
+    tz = teacher_timezone(rules, default_tz)
+    # タイムゾーンの差で日付がずれる分、前後1日を含めて展開し、期間外は後で除く
+    first_day = (window_start - ONE_DAY).date()
+    last_day = (window_end + ONE_DAY).date()
+
+    additions, blocks = [], []
+    for exception in exceptions:
+        if exception.start_time is None or exception.end_time is None:
+            interval = local_interval(exception.date, time(0), time(0), tz)
+        else:
+            interval = local_interval(exception.date, exception.start_time, exception.end_time, tz)
+        (additions if exception.is_available else blocks).append(interval)
+
+    available = merge_intervals(heapq.merge(
+        *(iter_rule_intervals(rule, first_day, last_day, default_tz) for rule in rules),
+        sorted(additions),
+    ))
+    for start, end in subtract_intervals(available, merge_intervals(sorted(blocks))):
+        if end <= window_start:
+            continue
+        if start >= window_end:
+            break
+        yield start, end
+
+
+def iter_free_slots(
+    intervals: Iterable[Interval],
+    busy: Iterable[Interval],
+    window_start: datetime,
+    window_end: datetime,
+    duration: timedelta,
+    step: timedelta,
+) -> Iterator[Interval]:
+    """
+    受講可能な時間帯から、予約済みの時間帯と重ならない枠を順に返す
+
+    枠は受講可能な時間帯の開始時刻から step 刻みで並び、開始時刻が期間内のものを返す。
+    intervals・busy はいずれも開始時刻順であること。重なる枠は予約の終了後の枠まで飛ばすため、
+    処理量は枠数と予約数の和に比例する。
+    """
+    busy = merge_intervals(busy)
+    block = next(busy, None)
+    for start, end in intervals:
+        slot = start
+        if slot < window_start:
+            slot += -((start - window_start) // step) * step
+        while slot + duration <= end and slot < window_end:
+            while block is not None and block[1] <= slot:
+                block = next(busy, None)
+            if block is not None and block[0] < slot + duration:
+                # 予約の終了時刻以降で最初の枠まで進める
+                slot += -((slot - block[1]) // step) * step
+                continue
+            yield slot, slot + duration
+            slot += step
+        if slot >= window_end:
+            break
+
+
+def restore_timezone(value: datetime, reference: Optional[datetime]) -> datetime:
+    """to_utc_naive で変換した日時を、reference と同じタイムゾーンに戻す"""
+    if reference is None or reference.tzinfo is None:
+        return value
+    return pytz.UTC.localize(value).astimezone(reference.tzinfo)
@@ -0,0 +1,205 @@
+"""
+漏えい済みパスワードの照合（外部サービスを使わないオフライン判定）
+
+パスワード一覧（平文、または Have I Been Pwned 形式の SHA-1 "HASH:件数"）から
+ブルームフィルタのバイナリファイルを作成し、実行時は mmap で参照する。
+ファイル全体をメモリに読み込まないため、1億件（約171MiB）のフィルタでも
+常駐メモリは参照したページ分のみで、1回の判定は数マイクロ秒で済む。
+
+    python -m app.core.breached_passwords build pwned-passwords-sha1.txt breached.bloom --format sha1
+    python -m app.core.breached_passwords check breached.bloom
+    BREACHED_PASSWORDS_FILTER=/var/lib/speakpro/breached.bloom uvicorn ...
+
+フィルタが未設定の場合は判定を行わない（常に False）。
+"""
+import argparse
+import getpass
+import hashlib
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+from functools import lru_cache
+from typing import BinaryIO, Iterable, Iterator, List, Optional
+
+from app.utils.logger import logger
+
+BREACHED_PASSWORDS_FILTER = os.getenv("BREACHED_PASSWORDS_FILTER", "")
+
+# ファイル形式: マジック(8) / ビット数(8) / ハッシュ関数の数(4) / 予約(4) / 登録件数(8) / ビット列
+MAGIC = b"SPBLOOM1"
+HEADER = struct.Struct("<8sQIIQ")
+_MASK64 = (1 << 64) - 1
+
+
+def _positions(digest: bytes, size: int, hash_count: int) -> List[int]:
+    # SHA-1 は一様に分布するため、先頭16バイトを2つの64ビット値としてダブルハッシュ法で位置を求める
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:16], "little") | 1
+    return [((h1 + i * h2) & _MASK64) % size for i in range(hash_count)]
+
+
+def filter_parameters(entries: int, error_rate: float):
+    """登録件数と偽陽性率から (ビット数, ハッシュ関数の数) を求める"""
+    entries = max(1, entries)
+    size = max(64, math.ceil(-entries * math.log(error_rate) / math.log(2) ** 2))
+    hash_count = max(1, round(size / entries * math.log(2)))
+    return size, hash_count
+
+
+class BreachedPasswordFilter:
+    """mmap で参照するブルームフィルタ（読み取り専用）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size, self.hash_count, _, self.count = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a breached-password filter")
+        if len(self._mmap) < HEADER.size + (self.size + 7) // 8:
+            self._mmap.close()
+            raise ValueError(f"{path} is truncated")
+
+    def contains_sha1(self, digest: bytes) -> bool:
+        data = self._mmap
+        offset = HEADER.size
+        for position in _positions(digest, self.size, self.hash_count):
+            if not data[offset + (position >> 3)] & (1 << (position & 7)):
+                return False
+        return True
+
+    def __contains__(self, password: str) -> bool:
+        return self.contains_sha1(hashlib.sha1(password.encode("utf-8")).digest())
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._mmap)
+
+    def close(self) -> None:
+        self._mmap.close()
+
+
+# ---------------------------------------------------------------------------
+# 作成
+# ---------------------------------------------------------------------------
+
+def iter_digests(lines: Iterable[bytes], input_format: str = "plain") -> Iterator[bytes]:
+    """
+    入力の各行を SHA-1 ダイジェストに変換する
+
+    Args:
+        input_format: "plain"（1行に1パスワード）または "sha1"（16進のSHA-1、":件数" 付き可）
+    """
+    for line in lines:
+        line = line.rstrip(b"\r\n")
+        if not line:
+            continue
+        if input_format == "sha1":
+            try:
+                yield bytes.fromhex(line.split(b":", 1)[0].decode("ascii"))
+            except ValueError:
+                continue
+        else:
+            yield hashlib.sha1(line).digest()
+
+
+def write_filter(out: BinaryIO, digests: Iterable[bytes], entries: int, error_rate: float = 0.001) -> int:
+    """
+    ダイジェストからフィルタを作成して書き出す
+
+    Args:
+        entries: 想定する登録件数（フィルタの大きさの決定に使う）
+
+    Returns:
+        int: 登録した件数
+    """
+    size, hash_count = filter_parameters(entries, error_rate)
+    bits = bytearray((size + 7) // 8)
+    count = 0
+    for digest in digests:
+        for position in _positions(digest, size, hash_count):
+            bits[position >> 3] |= 1 << (position & 7)
+        count += 1
+    out.write(HEADER.pack(MAGIC, size, hash_count, 0, count))
+    out.write(bits)
+    return count
+
+
+def build_filter(source: str, destination: str, input_format: str = "plain",
+                 error_rate: float = 0.001, entries: Optional[int] = None) -> int:
+    """
+    パスワード一覧のファイルからフィルタを作成する
+    entries を省略した場合は、入力の行数を数えてから作成する
+    """
+    if entries is None:
+        with open(source, "rb") as f:
+            entries = sum(1 for line in f if line.strip())
+    temporary = f"{destination}.tmp"
+    with open(source, "rb") as f, open(temporary, "wb") as out:
+        count = write_filter(out, iter_digests(f, input_format), entries, error_rate)
+    # 作成中のファイルを参照しないよう、完成してから置き換える
+    os.replace(temporary, destination)
+    return count
+
+
+# ---------------------------------------------------------------------------
+# 判定
+# ---------------------------------------------------------------------------
+
+@lru_cache(maxsize=None)
+def get_breached_password_filter() -> Optional[BreachedPasswordFilter]:
+    """BREACHED_PASSWORDS_FILTER のフィルタ（未設定・読み込めない場合は None）"""
+    if not BREACHED_PASSWORDS_FILTER:
+        return None
+    try:
+        breached = BreachedPasswordFilter(BREACHED_PASSWORDS_FILTER)
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to open breached-password filter: {str(e)}")
+        return None
+    logger.info(f"Loaded breached-password filter {BREACHED_PASSWORDS_FILTER} "
+                f"({breached.count} entries, {breached.nbytes} bytes mapped)")
+    return breached
+
+
+def is_breached_password(password: str) -> bool:
+    """
+    漏えい済みのパスワード一覧に含まれていれば True を返す
+    ブルームフィルタのため、ごく低い確率（作成時の偽陽性率）で含まれないパスワードも True になる
+    """
+    breached = get_breached_password_filter()
+    return breached is not None and password in breached
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or query the breached-password filter")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="パスワード一覧からフィルタを作成する")
+    build.add_argument("source", help="入力ファイル（1行に1件）")
+    build.add_argument("destination", help="出力するフィルタのパス")
+    build.add_argument("--format", choices=("plain", "sha1"), default="plain",
+                       help="入力の形式（平文、またはHIBP形式のSHA-1）")
+    build.add_argument("--error-rate", type=float, default=0.001, help="偽陽性率（既定0.1%%）")
+    build.add_argument("--entries", type=int, help="登録件数（省略時は入力の行数を数える）")
+
+    check = commands.add_parser("check", help="入力したパスワードがフィルタに含まれるか調べる")
+    check.add_argument("filter", help="フィルタのパス")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        started = time.perf_counter()
+        count = build_filter(args.source, args.destination, args.format, args.error_rate, args.entries)
+        print(f"wrote {count} entries to {args.destination} "
+              f"({os.path.getsize(args.destination)} bytes) in {time.perf_counter() - started:.1f}s")
+    else:
+        breached = BreachedPasswordFilter(args.filter)
+        password = getpass.getpass("password: ") if sys.stdin.isatty() else sys.stdin.readline().rstrip("\n")
+        print("breached" if password in breached else "not found")
+
+
+if __name__ == "__main__":
+    main()
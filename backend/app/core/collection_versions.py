@@ -0,0 +1,272 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, List, Sequence, Set, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import case, event, inspect, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models.collection_version import CollectionVersion
+from app.models.lesson import Lesson
+from app.models.material import Material, MaterialCategory
+from app.models.material_access import MaterialAccess
+from app.models.payment import Payment
+
+# 変更時に更新するコレクション
+# - schedule:<ユーザーID>: ユーザーのスケジュール（担当するレッスンと、決済により予約したレッスン）
+# - materials:<ユーザーID>: ユーザーに付与した教材の閲覧権限
+# - lessons / materials: 対象のユーザーを特定できない変更（Core の更新文）と、教材・カテゴリーの変更
+# 予約・決済ではそのレッスンの講師・受講者の行のみを更新し、全体で1行を奪い合わないようにする
+
+# 回数・人数のみの更新では一覧の内容が変わらないため、バージョンを進めない列
+# （ダウンロード数の反映・参加枠の確保）。updated_at は ORM の更新で必ず変わるため含める
+COUNTER_COLUMNS = {
+    Material: frozenset({"download_count", "updated_at"}),
+    Lesson: frozenset({"current_participants", "updated_at"}),
+}
+
+# Core の INSERT / UPDATE / DELETE 文（ORMのフラッシュを経由しない更新）で更新するコレクション
+TABLE_COLLECTIONS = {
+    Lesson.__tablename__: "lessons",
+    Payment.__tablename__: "lessons",
+    Material.__tablename__: "materials",
+    MaterialCategory.__tablename__: "materials",
+    MaterialAccess.__tablename__: "materials",
+}
+TABLE_COUNTER_COLUMNS = {model.__tablename__: columns for model, columns in COUNTER_COLUMNS.items()}
+
+_UPSERT_DIALECTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+# まだ一度も更新されていないコレクションの最終更新日時
+_NEVER_MODIFIED = 0
+
+
+def schedule_collections(user_id) -> List[str]:
+    """ユーザーのスケジュールが依存するコレクション"""
+    return ["lessons", f"schedule:{user_id}"]
+
+
+def material_collections(user_id) -> List[str]:
+    """ユーザーの教材一覧が依存するコレクション"""
+    return ["materials", f"materials:{user_id}"]
+
+
+def _values(obj, attribute: str) -> Set:
+    """属性の現在の値と、フラッシュで変更される前の値"""
+    history = inspect(obj).attrs[attribute].history
+    return {value for value in history.sum() if value is not None}
+
+
+def _counter_only(session, obj) -> bool:
+    """回数・人数の列のみが変更された更新かどうか"""
+    counters = COUNTER_COLUMNS.get(type(obj))
+    if counters is None or obj in session.new or obj in session.deleted:
+        return False
+    state = inspect(obj)
+    changed = {attr.key for attr in state.attrs if attr.history.has_changes()}
+    return changed <= counters
+
+
+def _changed_collections(obj) -> Tuple[Set[str], Set[int]]:
+    """ORMの変更で更新するコレクションと、受講者を求めるレッスンのID"""
+    if isinstance(obj, Lesson):
+        lesson_ids = {obj.id} if obj.id is not None else set()
+        return {f"schedule:{teacher_id}" for teacher_id in _values(obj, "teacher_id")}, lesson_ids
+    if isinstance(obj, Payment):
+        return {f"schedule:{user_id}" for user_id in _values(obj, "user_id")}, set()
+    if isinstance(obj, MaterialAccess):
+        return {f"materials:{user_id}" for user_id in _values(obj, "user_id")}, set()
+    if isinstance(obj, (Material, MaterialCategory)):
+        return {"materials"}, set()
+    return set(), set()
+
+
+class CollectionVersions:
+    """
+    コレクション（ユーザーごとのスケジュール・教材の閲覧権限など）ごとのバージョンカウンター
+
+    バージョンは collection_versions テーブルに保持し、変更と同じトランザクションで進める。
+    全ワーカーで共有されるため、どのワーカーで更新しても以降の条件付きGETは304にならず、
+    ロールバックされた変更ではバージョンは進まない。
+    ORMのフラッシュに加え、Session.execute による Core の更新文（一括UPDATEなど）でも進める。
+    ダウンロード数・参加人数のみの更新（COUNTER_COLUMNS）では進めない。
+    バージョンの確認は主キーの検索で済み、未変更の場合は一覧の取得とシリアライズを省ける。
+    """
+
+    def get(self, db: Session, names: Sequence[str]) -> Dict[str, Tuple[int, datetime]]:
+        """コレクションごとの (バージョン, 最終更新日時) を返す"""
+        rows = {
+            row.name: (row.version, row.modified_at)
+            for row in db.execute(
+                select(CollectionVersion.name, CollectionVersion.version, CollectionVersion.modified_at)
+                .where(CollectionVersion.name.in_(list(names)))
+            )
+        }
+        states = {}
+        for name in names:
+            version, modified = rows.get(name, (0, _NEVER_MODIFIED))
+            states[name] = (version, datetime.fromtimestamp(modified, timezone.utc))
+        return states
+
+    def bump(self, connection, *names: str) -> None:
+        """
+        コレクションのバージョンを進める（呼び出し元のトランザクションで実行する）
+
+        Last-Modified は秒単位のため、同じ秒内の更新でも最終更新日時を必ず1秒進める。
+        """
+        table = CollectionVersion.__table__
+        now = int(time.time())
+        upsert = _UPSERT_DIALECTS.get(connection.dialect.name)
+        for name in sorted(names):
+            if upsert is not None:
+                statement = upsert(table).values(name=name, version=1, modified_at=now)
+                statement = statement.on_conflict_do_update(
+                    index_elements=[table.c.name],
+                    set_={
+                        "version": table.c.version + 1,
+                        "modified_at": case(
+                            (table.c.modified_at + 1 > statement.excluded.modified_at, table.c.modified_at + 1),
+                            else_=statement.excluded.modified_at
+                        ),
+                    }
+                )
+                connection.execute(statement)
+                continue
+
+            updated = connection.execute(
+                update(table).where(table.c.name == name).values(
+                    version=table.c.version + 1,
+                    modified_at=case(
+                        (table.c.modified_at + 1 > now, table.c.modified_at + 1), else_=now
+                    )
+                )
+            ).rowcount
+            if not updated:
+                connection.execute(insert(table).values(name=name, version=1, modified_at=now))
+
+    def validators(self, db: Session, names: Sequence[str], scope: str = "") -> Tuple[str, datetime]:
+        """
+        ETag と Last-Modified を算出する
+
+        Args:
+            db: DBセッション
+            names: レスポンスが依存するコレクション
+            scope: ユーザーIDやクエリパラメータなど、レスポンスを区別する値
+
+        Returns:
+            Tuple[str, datetime]: 弱いETagと最終更新日時
+        """
+        states = self.get(db, names)
+        key = "|".join([scope] + [f"{name}:{states[name][0]}" for name in names])
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+        last_modified = max(modified for _, modified in states.values())
+        return f'W/"{digest}"', last_modified
+
+    def track_session_changes(self) -> None:
+        """ORMセッションでの変更を記録し、フラッシュ後・コミット前に同じトランザクションでバージョンを進める"""
+        def changed(session) -> Set[str]:
+            return session.info.setdefault("changed_collections", set())
+
+        def after_flush(session, flush_context):
+            lesson_ids = session.info.setdefault("changed_lessons", set())
+            for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+                if _counter_only(session, obj):
+                    continue
+                names, lessons = _changed_collections(obj)
+                changed(session).update(names)
+                lesson_ids.update(lessons)
+
+        def do_orm_execute(orm_execute_state):
+            if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+                return
+            statement = orm_execute_state.statement
+            table = getattr(getattr(statement, "table", None), "name", None)
+            name = TABLE_COLLECTIONS.get(table)
+            if not name:
+                return
+            if orm_execute_state.is_update:
+                columns = {getattr(column, "key", column) for column in getattr(statement, "_values", None) or ()}
+                if columns and columns <= TABLE_COUNTER_COLUMNS.get(table, frozenset()):
+                    return
+            changed(orm_execute_state.session).add(name)
+
+        def flush_changes(session, *args):
+            names = session.info.pop("changed_collections", None) or set()
+            lesson_ids = session.info.pop("changed_lessons", None)
+            if lesson_ids:
+                # レッスンの変更は、予約した受講者のスケジュールにも反映する
+                names.update(
+                    f"schedule:{user_id}" for (user_id,) in session.connection().execute(
+                        select(Payment.user_id).where(Payment.lesson_id.in_(sorted(lesson_ids))).distinct()
+                    )
+                )
+            if names:
+                self.bump(session.connection(), *names)
+
+        def after_rollback(session):
+            session.info.pop("changed_collections", None)
+            session.info.pop("changed_lessons", None)
+
+        event.listen(Session, "after_flush", after_flush)
+        event.listen(Session, "do_orm_execute", do_orm_execute)
+        event.listen(Session, "after_flush_postexec", flush_changes)
+        event.listen(Session, "before_commit", flush_changes)
+        event.listen(Session, "after_soft_rollback", lambda session, previous: after_rollback(session))
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # 弱い比較（W/ の有無を無視）
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    """
+    条件付きGETが未変更（304）に該当するかを判定する
+    If-None-Match がある場合は If-Modified-Since より優先する
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def set_validators(response: Response, etag: str, last_modified: datetime) -> None:
+    """レスポンスに ETag / Last-Modified を設定する"""
+    response.headers["ETag"] = etag
+    response.headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    # キャッシュは保持させるが、毎回再検証させる
+    response.headers["Cache-Control"] = "private, no-cache"
+
+
+def not_modified_response(etag: str, last_modified: datetime) -> Response:
+    """304 Not Modified レスポンスを生成する"""
+    response = Response(status_code=304)
+    set_validators(response, etag, last_modified)
+    return response
+
+
+# アプリケーション全体で共有するバージョンカウンター
+collection_versions = CollectionVersions()
+collection_versions.track_session_changes()
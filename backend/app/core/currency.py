@@ -0,0 +1,49 @@
+from typing import List, Sequence
+
+# Stripe の金額が通貨の単位そのもの（小数なし）の通貨と、1/1000 単位の通貨
+ZERO_DECIMAL_CURRENCIES = frozenset({
+    "BIF", "CLP", "DJF", "GNF", "JPY", "KMF", "KRW", "MGA",
+    "PYG", "RWF", "UGX", "VND", "VUV", "XAF", "XOF", "XPF",
+})
+THREE_DECIMAL_CURRENCIES = frozenset({"BHD", "JOD", "KWD", "OMR", "TND"})
+
+
+def minor_unit_factor(currency: str) -> int:
+    """通貨の単位あたりの最小通貨単位の数（USD は 100、JPY は 1）"""
+    currency = currency.upper()
+    if currency in ZERO_DECIMAL_CURRENCIES:
+        return 1
+    if currency in THREE_DECIMAL_CURRENCIES:
+        return 1000
+    return 100
+
+
+def to_major_units(amount: int, currency: str) -> float:
+    """
+    Convert a Stripe amount (smallest currency unit) to the currency's major unit
+
+    Args:
+        amount: Amount as sent by Stripe (e.g. cents for USD, yen for JPY)
+        currency: Currency code
+
+    Returns:
+        Amount in the currency's major unit
+    """
+    factor = minor_unit_factor(currency)
+    return float(amount) if factor == 1 else amount / factor
+
+
+def split_minor_units(amount: int, weights: Sequence[int]) -> List[int]:
+    """
+    最小通貨単位の金額を重みに比例して分ける
+
+    端数は切り捨て、余りは最後の要素に加えるため、合計は必ず amount に一致する。
+    （100.00 を3件に分けると 33.33 / 33.33 / 33.34）
+    """
+    total = sum(weights)
+    if total <= 0:
+        shares = [amount // len(weights)] * len(weights)
+    else:
+        shares = [amount * weight // total for weight in weights]
+    shares[-1] += amount - sum(shares)
+    return shares
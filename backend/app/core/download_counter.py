@@ -0,0 +1,110 @@
+import threading
+from collections import Counter
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import case, update
+from sqlalchemy.orm import Session
+
+from app.models.material import Material
+from app.utils.logger import logger
+
+
+class DownloadCounter:
+    """
+    教材ダウンロード数の書き込み遅延（write-behind）カウンター
+
+    ダウンロードごとにDBへ書き込まず、教材ごとの増分をメモリ上に集約し、
+    一定間隔で1回の UPDATE 文（download_count = download_count + n）として反映する。
+    増分はDB側で加算されるため、複数ワーカーから同時に反映しても更新は失われない。
+    """
+
+    def __init__(self, flush_interval: float = 5.0):
+        self.flush_interval = flush_interval
+        self._pending: Counter = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._session_factory: Optional[Callable[[], Session]] = None
+
+    def increment(self, material_id: int, amount: int = 1) -> None:
+        """ダウンロード数の増分を記録する"""
+        with self._lock:
+            self._pending[material_id] += amount
+
+    def pending(self) -> Dict[int, int]:
+        """未反映の増分を返す"""
+        with self._lock:
+            return dict(self._pending)
+
+    def flush(self) -> int:
+        """
+        未反映の増分をDBへ反映する
+
+        Returns:
+            int: 反映した教材の件数
+        """
+        with self._flush_lock:
+            with self._lock:
+                increments, self._pending = self._pending, Counter()
+            if not increments:
+                return 0
+
+            db = self._session_factory()
+            try:
+                # updated_at の onupdate を無効にし、回数の反映を内容の変更として扱わせない
+                # （access_index の再同期・一覧のETagは updated_at・内容の変更のみで更新する）
+                db.execute(
+                    update(Material)
+                    .where(Material.id.in_(list(increments)))
+                    .values(
+                        download_count=Material.download_count + case(
+                            increments, value=Material.id, else_=0
+                        ),
+                        updated_at=Material.updated_at
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                # 反映に失敗した増分は次回の反映に持ち越す
+                with self._lock:
+                    self._pending.update(increments)
+                logger.error(f"Failed to flush download counts: {str(e)}")
+                raise
+            finally:
+                db.close()
+            return len(increments)
+
+    def start(self, session_factory: Callable[[], Session]) -> None:
+        """定期反映用のバックグラウンドスレッドを開始する"""
+        self._session_factory = session_factory
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="download-counter", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """バックグラウンドスレッドを停止し、残りの増分を反映する"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._session_factory is not None:
+            self.flush()
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                # 失敗した増分は保持されているため次回に再試行する
+                pass
+
+
+# アプリケーション全体で共有するカウンター
+download_counter = DownloadCounter()
@@ -2,11 +2,15 @@ import smtplib
 import os
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import List, Optional
-from jinja2 import Template
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 from pydantic import EmailStr
 from functools import lru_cache
 
+from app.core.instrumentation import timed
+
+if TYPE_CHECKING:
+    from jinja2 import Template
+
 class EmailService:
     def __init__(self):
         """
@@ -17,26 +21,34 @@ class EmailService:
         self.smtp_port = int(os.getenv("SMTP_PORT", "587"))
         self.smtp_username = os.getenv("SMTP_USERNAME")
         self.smtp_password = os.getenv("SMTP_PASSWORD")
+        self.smtp_use_tls = os.getenv("SMTP_USE_TLS", "true").lower() in ("1", "true", "yes")
         self.default_sender = os.getenv("DEFAULT_SENDER_EMAIL")
+        self.template_dir = os.getenv("EMAIL_TEMPLATE_DIR", "app/templates/emails")
 
     def _create_smtp_connection(self) -> smtplib.SMTP:
         """
         SMTPサーバーへの接続を確立
         """
         smtp = smtplib.SMTP(self.smtp_server, self.smtp_port)
-        smtp.starttls()
-        smtp.login(self.smtp_username, self.smtp_password)
+        if self.smtp_use_tls:
+            smtp.starttls()
+        if self.smtp_username:
+            smtp.login(self.smtp_username, self.smtp_password)
         return smtp
 
     @lru_cache(maxsize=10)
-    def _load_template(self, template_name: str) -> Template:
+    def _load_template(self, template_name: str) -> "Template":
         """
         メールテンプレートを読み込む
+        jinja2は最初のテンプレート読み込み時にインポートする
         """
-        template_path = f"app/templates/emails/{template_name}.html"
+        from jinja2 import Template
+
+        template_path = os.path.join(self.template_dir, f"{template_name}.html")
         with open(template_path, "r") as f:
             return Template(f.read())
 
+    @timed("smtp")
     async def send_email(
         self,
         to_email: EmailStr,
@@ -61,25 +73,8 @@ class EmailService:
             bool: 送信成功の場合True
         """
         try:
-            msg = MIMEMultipart()
-            msg["From"] = self.default_sender
-            msg["To"] = to_email
-            msg["Subject"] = subject
-
-            if cc:
-                msg["Cc"] = ", ".join(cc)
-            if bcc:
-                msg["Bcc"] = ", ".join(bcc)
-
-            content_type = "html" if is_html else "plain"
-            msg.attach(MIMEText(body, content_type))
-
+            msg, recipients = self._build_message(to_email, subject, body, cc, bcc, is_html)
             with self._create_smtp_connection() as smtp:
-                recipients = [to_email]
-                if cc:
-                    recipients.extend(cc)
-                if bcc:
-                    recipients.extend(bcc)
                 smtp.send_message(msg, to_addrs=recipients)
 
             return True
@@ -88,6 +83,65 @@ class EmailService:
             print(f"Error sending email: {str(e)}")
             return False
 
+    def _build_message(
+        self,
+        to_email: EmailStr,
+        subject: str,
+        body: str,
+        cc: Optional[List[EmailStr]] = None,
+        bcc: Optional[List[EmailStr]] = None,
+        is_html: bool = False
+    ) -> Tuple[MIMEMultipart, List[str]]:
+        """
+        メッセージと送信先アドレスの一覧を作成する
+        """
+        msg = MIMEMultipart()
+        msg["From"] = self.default_sender
+        msg["To"] = to_email
+        msg["Subject"] = subject
+
+        if cc:
+            msg["Cc"] = ", ".join(cc)
+        if bcc:
+            msg["Bcc"] = ", ".join(bcc)
+
+        content_type = "html" if is_html else "plain"
+        msg.attach(MIMEText(body, content_type))
+
+        recipients = [to_email]
+        if cc:
+            recipients.extend(cc)
+        if bcc:
+            recipients.extend(bcc)
+        return msg, recipients
+
+    @timed("smtp")
+    async def send_bulk(self, messages: List[Dict[str, Any]]) -> List[bool]:
+        """
+        複数のメールを1つのSMTP接続で送信する
+
+        Args:
+            messages: send_email の引数（to_email, subject, body, cc, bcc, is_html）の辞書のリスト
+
+        Returns:
+            List[bool]: メッセージごとの送信結果（messages と同じ順序）
+        """
+        results = [False] * len(messages)
+        try:
+            with self._create_smtp_connection() as smtp:
+                for index, message in enumerate(messages):
+                    try:
+                        msg, recipients = self._build_message(**message)
+                        smtp.send_message(msg, to_addrs=recipients)
+                        results[index] = True
+                    except smtplib.SMTPRecipientsRefused as e:
+                        # 宛先の拒否は該当のメッセージのみ失敗とし、接続は使い続ける
+                        print(f"Error sending email: {str(e)}")
+        except Exception as e:
+            # 接続が切れた場合、残りのメッセージは失敗として返す
+            print(f"Error sending email: {str(e)}")
+        return results
+
     async def send_welcome_email(self, to_email: EmailStr, username: str) -> bool:
         """
         ユーザー登録時のウェルカムメールを送信
@@ -118,6 +172,30 @@ class EmailService:
             is_html=True
         )
 
+    def lesson_reminder_message(self, to_email: EmailStr, lesson_details: dict) -> Dict[str, Any]:
+        """
+        レッスン前日のリマインダーメール（send_bulk に渡すメッセージ）を作成
+        """
+        template = self._load_template("lesson_reminder")
+        return {
+            "to_email": to_email,
+            "subject": "Lesson Reminder",
+            "body": template.render(**lesson_details),
+            "is_html": True,
+        }
+
+    def change_deadline_message(self, to_email: EmailStr, lesson_details: dict) -> Dict[str, Any]:
+        """
+        予約変更期限の事前通知メール（send_bulk に渡すメッセージ）を作成
+        """
+        template = self._load_template("lesson_change_deadline")
+        return {
+            "to_email": to_email,
+            "subject": "Lesson Change Deadline Approaching",
+            "body": template.render(**lesson_details),
+            "is_html": True,
+        }
+
     async def send_password_reset(
         self,
         to_email: EmailStr,
@@ -137,17 +215,11 @@ class EmailService:
             is_html=True
         )
 
-# シングルトンインスタンスの作成
-email_service = EmailService()
-# 基本的な使用例
-await email_service.send_email(
-    to_email="user@example.com",
-    subject="Test Email",
-    body="This is a test email"
-)
-
-# ウェルカムメールの送信
-await email_service.send_welcome_email(
-    to_email="newuser@example.com",
-    username="John Doe"
-)
\ No newline at end of file
+@lru_cache(maxsize=None)
+def get_email_service() -> EmailService:
+    """
+    メールサービスのインスタンスを取得する
+    インポート時ではなく最初に必要になった時点で生成し、以降は同じインスタンスを返す
+    （FastAPIの依存関係としても利用できる）
+    """
+    return EmailService()
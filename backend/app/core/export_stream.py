@@ -0,0 +1,107 @@
+import csv
+import io
+import zlib
+from datetime import date, datetime
+from typing import Callable, Iterable, Iterator, Sequence
+
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from app.core.fast_json import dumps
+from app.core.readonly_rows import ReadOnlyRow, stream_rows
+
+# 出力をまとめて書き出す行数
+ROWS_PER_CHUNK = 1000
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(rows: Iterable[ReadOnlyRow], fields: Sequence[str]) -> Iterator[bytes]:
+    """
+    行をCSVとして少しずつエンコードする
+    ROWS_PER_CHUNK 行ごとにバイト列を返すため、全件をメモリに保持しない
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+
+    pending = 0
+    for row in rows:
+        values = row.as_dict()
+        writer.writerow([_csv_value(values[field]) for field in fields])
+        pending += 1
+        if pending >= ROWS_PER_CHUNK:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_ndjson(rows: Iterable[ReadOnlyRow]) -> Iterator[bytes]:
+    """行を1行1JSON（NDJSON）として少しずつエンコードする"""
+    chunk = []
+    for row in rows:
+        chunk.append(dumps(row.as_dict()))
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield b"\n".join(chunk) + b"\n"
+            chunk = []
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
+
+
+def iter_gzip(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """バイト列のストリームを逐次gzip圧縮する"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def iter_export(
+    session_factory: Callable[[], Session],
+    row_type,
+    statement: Select,
+    export_format: str = "csv",
+    gzip: bool = False,
+    batch_size: int = 1000
+) -> Iterator[bytes]:
+    """
+    クエリ結果をエクスポート形式で逐次出力する
+
+    レスポンスの送信中もDBカーソルを使い続けるため、リクエストの依存関係とは
+    別に専用のセッションを開き、出力完了（または中断）時に閉じる。
+
+    Args:
+        session_factory: セッションを生成する関数
+        row_type: 参照専用行の型
+        statement: row_type.select() を絞り込んだクエリ
+        export_format: "csv" または "ndjson"
+        gzip: gzip圧縮する場合True
+        batch_size: サーバーサイドカーソルで一度に取得する行数
+    """
+    db = session_factory()
+    try:
+        rows = stream_rows(db, row_type, statement, batch_size=batch_size)
+        if export_format == "csv":
+            chunks = iter_csv(rows, row_type.__slots__)
+        else:
+            chunks = iter_ndjson(rows)
+        if gzip:
+            chunks = iter_gzip(chunks)
+        yield from chunks
+    finally:
+        db.close()
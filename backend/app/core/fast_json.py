@@ -0,0 +1,69 @@
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Optional
+
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:  # orjson は任意の依存関係
+    orjson = None
+
+# 一覧系エンドポイントで高速レスポンスを使用するか（環境変数で切り替え）
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "false").lower() in ("1", "true", "yes")
+
+
+def _default(value: Any) -> Any:
+    """標準のjsonモジュールで扱えない型を変換する"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    JSONバイト列へ直接シリアライズする
+    orjson がインストールされていればそれを使い、なければ標準のjsonを使う
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, default=_default, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """
+    DBから取得した信頼済みのデータを、pydantic の再検証を行わずに
+    そのままJSONへシリアライズするレスポンス
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def fast_response(content: Any, response: Optional[Response] = None) -> FastJSONResponse:
+    """
+    高速レスポンスを生成する
+
+    Args:
+        content: レスポンス本文（dict / list）
+        response: エンドポイントに注入された Response（設定済みのヘッダーを引き継ぐ）
+    """
+    fast = FastJSONResponse(content)
+    if response is not None:
+        # 複数の Set-Cookie などを失わないよう、辞書にせず raw_headers をそのまま引き継ぐ
+        # （本文に合わせた Content-Length / Content-Type はこのレスポンスのものを使う）
+        fast.raw_headers.extend(
+            (name, value) for name, value in response.raw_headers
+            if name not in (b"content-length", b"content-type")
+        )
+    return fast
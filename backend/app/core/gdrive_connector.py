@@ -1,13 +1,15 @@
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
+from functools import lru_cache
 from typing import Optional, List, Dict
 import os
 import io
 import logging
 from datetime import datetime
 
+from app.core.instrumentation import timed
+
+# google-api-python-client / google-auth-oauthlib はインポートに時間がかかるため、
+# 各メソッド内で実際に必要になった時点でインポートする
+
 class GoogleDriveConnector:
     """Google Driveとの連携を管理するクラス"""
     
@@ -19,6 +21,7 @@ class GoogleDriveConnector:
         self.service = None
         self.logger = logging.getLogger(__name__)
         
+    @timed("gdrive")
     def authenticate(self) -> bool:
         """
         Google Drive APIの認証を行う
@@ -27,6 +30,9 @@ class GoogleDriveConnector:
             bool: 認証成功の場合True、失敗の場合False
         """
         try:
+            from google_auth_oauthlib.flow import InstalledAppFlow
+            from googleapiclient.discovery import build
+
             client_config = {
                 "installed": {
                     "client_id": os.getenv("GOOGLE_DRIVE_CLIENT_ID"),
@@ -49,6 +55,7 @@ class GoogleDriveConnector:
             self.logger.error(f"Authentication failed: {str(e)}")
             return False
 
+    @timed("gdrive")
     def upload_file(self, file_path: str, folder_id: Optional[str] = None) -> Optional[str]:
         """
         ファイルをGoogle Driveにアップロードする
@@ -61,6 +68,8 @@ class GoogleDriveConnector:
             Optional[str]: アップロードしたファイルのID、失敗時はNone
         """
         try:
+            from googleapiclient.http import MediaFileUpload
+
             file_metadata = {
                 'name': os.path.basename(file_path)
             }
@@ -84,6 +93,7 @@ class GoogleDriveConnector:
             self.logger.error(f"Upload failed: {str(e)}")
             return None
 
+    @timed("gdrive")
     def download_file(self, file_id: str, output_path: str) -> bool:
         """
         Google Driveからファイルをダウンロードする
@@ -96,6 +106,8 @@ class GoogleDriveConnector:
             bool: ダウンロード成功の場合True、失敗の場合False
         """
         try:
+            from googleapiclient.http import MediaIoBaseDownload
+
             request = self.service.files().get_media(fileId=file_id)
             fh = io.BytesIO()
             downloader = MediaIoBaseDownload(fh, request)
@@ -115,6 +127,7 @@ class GoogleDriveConnector:
             self.logger.error(f"Download failed: {str(e)}")
             return False
 
+    @timed("gdrive")
     def create_folder(self, folder_name: str, parent_id: Optional[str] = None) -> Optional[str]:
         """
         Google Drive上にフォルダを作成する
@@ -146,6 +159,7 @@ class GoogleDriveConnector:
             self.logger.error(f"Folder creation failed: {str(e)}")
             return None
 
+    @timed("gdrive")
     def list_files(self, folder_id: Optional[str] = None) -> List[Dict]:
         """
         指定フォルダ内のファイル一覧を取得する
@@ -171,19 +185,15 @@ class GoogleDriveConnector:
             self.logger.error(f"List files failed: {str(e)}")
             return []
 
-# インスタンス化
-gdrive = GoogleDriveConnector()
+# 旧名称での参照用
+GDriveConnector = GoogleDriveConnector
 
-# 認証
-if gdrive.authenticate():
-    # ファイルのアップロード
-    file_id = gdrive.upload_file("/path/to/file.pdf")
-    
-    # フォルダの作成
-    folder_id = gdrive.create_folder("新しいフォルダ")
-    
-    # ファイル一覧の取得
-    files = gdrive.list_files(folder_id)
-    
-    # ファイルのダウンロード
-    gdrive.download_file(file_id, "/path/to/save/file.pdf")
\ No newline at end of file
+
+@lru_cache(maxsize=None)
+def get_gdrive_connector() -> GoogleDriveConnector:
+    """
+    Google Drive連携のインスタンスを取得する
+    インポート時ではなく最初に必要になった時点で生成し、以降は同じインスタンスを返す
+    （認証は authenticate() を明示的に呼び出した時点で行う）
+    """
+    return GoogleDriveConnector()
@@ -0,0 +1,291 @@
+import functools
+import inspect
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    from opentelemetry import trace
+except ImportError:  # opentelemetry は任意の依存関係
+    trace = None
+
+# 計測モード（環境変数で切り替え）
+#   off     : 何も計測しない（タイマーは共有のnullcontextを返すだけ）
+#   metrics : Prometheus形式のヒストグラムを集計する
+#   otel    : metrics に加えて OpenTelemetry のスパンを作成する
+INSTRUMENTATION_MODE = os.getenv("INSTRUMENTATION", "metrics").lower()
+
+# ヒストグラムのバケット（秒）
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+_NOOP = nullcontext()
+
+
+class Histogram:
+    """
+    Prometheusのヒストグラム相当の集計
+
+    ラベルの組ごとにバケット別の件数・合計・件数を保持する。
+    observe はロック内で数回の加算を行うだけなので、リクエスト処理への影響は小さい。
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, labels: Tuple[str, ...]) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> List[str]:
+        """Prometheusのテキスト形式に変換する"""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series = {labels: (list(counts), total, count)
+                      for labels, (counts, total, count) in self._series.items()}
+
+        for labels, (counts, total, count) in sorted(series.items()):
+            label_text = ",".join(
+                f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels)
+            )
+            prefix = f"{label_text}," if label_text else ""
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {count}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Instrumentation:
+    """
+    リクエスト全体とサブシステム（DB・bcrypt・SMTP・Google Drive・Stripe）の処理時間を計測する
+
+    - timer(): with文で囲んだ処理の時間をヒストグラムに記録する
+    - timed(): 関数（同期・非同期）全体を計測するデコレーター
+    - 現在のリクエスト内でのサブシステム別の合計時間を保持し、
+      ミドルウェアが Server-Timing ヘッダーとして返す
+    """
+
+    def __init__(self, mode: str = INSTRUMENTATION_MODE):
+        self.request_duration = Histogram(
+            "http_request_duration_seconds",
+            "HTTP request latency in seconds",
+            ("method", "route", "status"),
+        )
+        self.subsystem_duration = Histogram(
+            "subsystem_duration_seconds",
+            "Time spent in a subsystem call in seconds",
+            ("subsystem", "operation"),
+        )
+        self._breakdown: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+            "instrumentation_breakdown", default=None
+        )
+        self._listener_installed = False
+        self.configure(mode)
+
+    def configure(self, mode: str) -> None:
+        """計測モードを切り替える（off / metrics / otel）"""
+        self.mode = mode
+        self.enabled = mode != "off"
+        self.tracer = trace.get_tracer(__name__) if mode == "otel" and trace is not None else None
+        if self.enabled:
+            self.install_db_listener()
+
+    def timer(self, subsystem: str, operation: str):
+        """
+        処理時間を計測するコンテキストマネージャーを返す
+
+        Example:
+            with instrumentation.timer("stripe", "payment_intent.create"):
+                intent = stripe.PaymentIntent.create(...)
+        """
+        if not self.enabled:
+            return _NOOP
+        return self._timer(subsystem, operation)
+
+    @contextmanager
+    def _timer(self, subsystem: str, operation: str) -> Iterator[None]:
+        span = (
+            self.tracer.start_as_current_span(f"{subsystem}.{operation}")
+            if self.tracer is not None else _NOOP
+        )
+        started = time.perf_counter()
+        try:
+            with span:
+                yield
+        finally:
+            self.record(subsystem, operation, time.perf_counter() - started)
+
+    def record(self, subsystem: str, operation: str, elapsed: float) -> None:
+        """計測済みの処理時間を記録する"""
+        self.subsystem_duration.observe((subsystem, operation), elapsed)
+        breakdown = self._breakdown.get()
+        if breakdown is not None:
+            breakdown[subsystem] = breakdown.get(subsystem, 0.0) + elapsed
+
+    def timed(self, subsystem: str, operation: Optional[str] = None) -> Callable:
+        """
+        関数全体の処理時間を計測するデコレーター（同期・非同期関数の両方に対応）
+        無効時は元の関数をそのまま呼び出す
+        """
+        def decorator(func: Callable) -> Callable:
+            name = operation or func.__name__
+
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return await func(*args, **kwargs)
+                    with self._timer(subsystem, name):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self._timer(subsystem, name):
+                    return func(*args, **kwargs)
+            return wrapper
+
+        return decorator
+
+    @contextmanager
+    def request_breakdown(self) -> Iterator[Dict[str, float]]:
+        """ブロック内のサブシステム別の合計時間（秒）を集計する"""
+        breakdown: Dict[str, float] = {}
+        token = self._breakdown.set(breakdown)
+        try:
+            yield breakdown
+        finally:
+            self._breakdown.reset(token)
+
+    def install_db_listener(self) -> None:
+        """全エンジンのSQL実行時間を subsystem="db" として記録するイベントリスナーを登録する"""
+        if self._listener_installed:
+            return
+        event.listen(Engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(Engine, "handle_error", self._handle_error)
+        self._listener_installed = True
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.enabled:
+            conn.info.setdefault("instrumentation_started", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("instrumentation_started")
+        if started:
+            self.record("db", "query", time.perf_counter() - started.pop())
+
+    def _handle_error(self, exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("instrumentation_started"):
+            connection.info["instrumentation_started"].pop()
+
+    def render(self) -> str:
+        """全ヒストグラムをPrometheusのテキスト形式で返す"""
+        lines = self.request_duration.render() + self.subsystem_duration.render()
+        return "\n".join(lines) + "\n"
+
+
+class InstrumentationMiddleware:
+    """
+    リクエストごとの処理時間を計測するASGIミドルウェア
+
+    ルートのパステンプレート（例: /materials/{material_id}）ごとにヒストグラムへ記録し、
+    サブシステム別の内訳を Server-Timing ヘッダーで返す。
+    BaseHTTPMiddleware を使わずASGIを直接扱うため、ストリーミングレスポンスも
+    そのまま通過する。
+    """
+
+    def __init__(self, app, registry: Optional[Instrumentation] = None):
+        self.app = app
+        self.instrumentation = registry if registry is not None else instrumentation
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.instrumentation.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        with self.instrumentation.request_breakdown() as breakdown:
+            async def send_with_timing(message):
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    if breakdown:
+                        timing = ", ".join(
+                            f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in breakdown.items()
+                        )
+                        message.setdefault("headers", [])
+                        message["headers"] = list(message["headers"]) + [
+                            (b"server-timing", timing.encode("latin-1"))
+                        ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                route = scope.get("route")
+                self.instrumentation.request_duration.observe(
+                    (scope["method"], getattr(route, "path", "<unmatched>"), str(status_code)),
+                    time.perf_counter() - started,
+                )
+
+
+async def metrics_endpoint(request):
+    """Prometheus形式のメトリクスを返すエンドポイント"""
+    from starlette.responses import PlainTextResponse
+
+    return PlainTextResponse(
+        instrumentation.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+# アプリケーション全体で共有するインスタンス
+instrumentation = Instrumentation()
+timer = instrumentation.timer
+timed = instrumentation.timed
@@ -0,0 +1,392 @@
+import asyncio
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.email_service import get_email_service
+from app.models.lesson import Lesson, LessonStatus
+from app.models.lesson_notification import (
+    LessonNotification,
+    NotificationKind,
+    NotificationStatus,
+)
+from app.models.payment import Payment, PaymentStatus
+from app.models.user import User
+from app.utils.logger import logger
+
+# 通知の検出・送信をこのワーカーで行うか
+LESSON_REMINDERS_ENABLED = os.getenv("LESSON_REMINDERS_ENABLED", "true").lower() in ("1", "true", "yes")
+# レッスン開始の何時間前にリマインダーを送るか
+LESSON_REMINDER_HOURS = int(os.getenv("LESSON_REMINDER_HOURS", "24"))
+# 予約変更が可能な期限（レッスンの何日前まで）
+LESSON_CHANGE_DEADLINE_DAYS = int(os.getenv("LESSON_CHANGE_DEADLINE_DAYS", "3"))
+# 予約変更期限の何時間前に事前通知を送るか
+CHANGE_DEADLINE_NOTICE_HOURS = int(os.getenv("CHANGE_DEADLINE_NOTICE_HOURS", "24"))
+# 送信対象の検出と送信を行う間隔（秒）
+REMINDER_POLL_SECONDS = float(os.getenv("REMINDER_POLL_SECONDS", "30"))
+# 検出済みの範囲を無視して送信対象の期間全体を検出し直す間隔（秒）
+REMINDER_RECONCILE_SECONDS = float(os.getenv("REMINDER_RECONCILE_SECONDS", "3600"))
+# 1回に確保して1つのSMTP接続で送信する件数
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "200"))
+# 確保した行の期限（秒）。ワーカーが停止した場合、この時間の経過後に他のワーカーが送信する
+REMINDER_LEASE_SECONDS = int(os.getenv("REMINDER_LEASE_SECONDS", "300"))
+# 送信の最大試行回数
+REMINDER_MAX_ATTEMPTS = int(os.getenv("REMINDER_MAX_ATTEMPTS", "5"))
+
+# 通知行を1回の INSERT 文で作成する最大件数
+INSERT_CHUNK_SIZE = 500
+
+_INSERT_IGNORE_DIALECTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+class NotificationSchedule:
+    """通知の種類ごとの送信時期"""
+
+    def __init__(self, kind: NotificationKind, lead: timedelta, latest: timedelta):
+        self.kind = kind
+        # レッスン開始の lead 前に送信する
+        self.lead = lead
+        # レッスン開始まで latest を切った後は送信しない（変更期限を過ぎた事前通知など）
+        self.latest = latest
+
+    def due_at(self, lesson_start: datetime) -> datetime:
+        return lesson_start - self.lead
+
+
+SCHEDULES = (
+    NotificationSchedule(
+        NotificationKind.LESSON_REMINDER,
+        lead=timedelta(hours=LESSON_REMINDER_HOURS),
+        latest=timedelta(0),
+    ),
+    NotificationSchedule(
+        NotificationKind.CHANGE_DEADLINE,
+        lead=timedelta(days=LESSON_CHANGE_DEADLINE_DAYS, hours=CHANGE_DEADLINE_NOTICE_HOURS),
+        latest=timedelta(days=LESSON_CHANGE_DEADLINE_DAYS),
+    ),
+)
+
+
+class LessonReminderDispatcher:
+    """
+    レッスンのリマインダー・予約変更期限の事前通知を送信する
+
+    1. 検出: 送信時期が近づいたレッスンを開始日時の範囲検索（ix_lessons_start_time）で求め、
+       受講者ごとの通知行を作成する。一意制約により、複数のワーカーや再起動後に
+       同じレッスンを再度検出しても行は1つしか作成されない。
+       前回の検出以降は、新たに範囲に入ったレッスンと、その後に更新・決済されたレッスンのみを検索する。
+    2. 送信: 送信期限の到来した行を SKIP LOCKED（SQLiteでは書き込みの直列化）で確保し、
+       確保の期限（lease）を設定してから EmailService.send_bulk でまとめて送信する。
+       送信後にワーカーが停止した場合は期限の経過後に再送信されるため、送信は少なくとも1回となる。
+    """
+
+    def __init__(
+        self,
+        schedules=SCHEDULES,
+        poll_interval: float = REMINDER_POLL_SECONDS,
+        batch_size: int = REMINDER_BATCH_SIZE,
+        lease_seconds: int = REMINDER_LEASE_SECONDS,
+        max_attempts: int = REMINDER_MAX_ATTEMPTS,
+        reconcile_interval: float = REMINDER_RECONCILE_SECONDS
+    ):
+        self.schedules = schedules
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.lease = timedelta(seconds=lease_seconds)
+        self.max_attempts = max_attempts
+        self.reconcile_interval = timedelta(seconds=reconcile_interval)
+        # 送信を開始する何秒前に通知行を作成しておくか
+        self.horizon = timedelta(seconds=poll_interval * 2)
+        # 種類ごとの検出済みの開始日時の上限と、前回の検出の開始時刻
+        self._scanned_until: Dict[NotificationKind, datetime] = {}
+        self._last_scan: Optional[datetime] = None
+        self._last_reconcile: Optional[datetime] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._session_factory: Optional[Callable[[], Session]] = None
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+
+    # --- 検出 --------------------------------------------------------------
+
+    def enqueue_due(self, db: Session, now: Optional[datetime] = None) -> int:
+        """
+        送信時期が近づいたレッスンの通知行を作成する
+
+        Returns:
+            int: 新たに検出した（受講者単位の）通知の件数。既存の行と重複したものも含む
+        """
+        now = now or datetime.utcnow()
+        if self._last_reconcile is None or now - self._last_reconcile >= self.reconcile_interval:
+            # 検出漏れ（停止中に範囲へ入ったレッスンなど）を拾うため、期間全体を検出し直す
+            self._scanned_until.clear()
+            self._last_scan = None
+            self._last_reconcile = now
+        # 前回の検出中にコミットされた更新を取りこぼさないよう、少し遡って検索する
+        changed_since = self._last_scan - self.horizon if self._last_scan else None
+
+        found = 0
+        for schedule in self.schedules:
+            upper = now + schedule.lead + self.horizon
+            query = select(Lesson.id, Lesson.start_time, Payment.user_id).join(
+                Payment, Payment.lesson_id == Lesson.id
+            ).where(
+                Payment.status == PaymentStatus.COMPLETED,
+                Lesson.status == LessonStatus.SCHEDULED,
+                Lesson.is_active.is_(True),
+                Lesson.start_time > now + schedule.latest,
+                Lesson.start_time <= upper
+            )
+            scanned_until = self._scanned_until.get(schedule.kind)
+            if scanned_until is not None:
+                query = query.where(or_(
+                    Lesson.start_time > scanned_until,
+                    Lesson.updated_at >= changed_since,
+                    Payment.completed_at >= changed_since
+                ))
+
+            rows = [
+                {
+                    "lesson_id": lesson_id,
+                    "user_id": user_id,
+                    "kind": schedule.kind,
+                    "lesson_start": start_time,
+                    "due_at": schedule.due_at(start_time),
+                    "status": NotificationStatus.PENDING,
+                    "attempts": 0,
+                }
+                for lesson_id, start_time, user_id in db.execute(query)
+            ]
+            self._insert_new(db, rows)
+            self._scanned_until[schedule.kind] = upper
+            found += len(rows)
+
+        self._last_scan = now
+        return found
+
+    def _insert_new(self, db: Session, rows: List[Dict]) -> None:
+        """
+        通知行を作成する（同じレッスン・受講者・種類・開始日時の行が既にあれば作成しない）
+        """
+        if not rows:
+            return
+        upsert = _INSERT_IGNORE_DIALECTS.get(db.get_bind().dialect.name)
+        if upsert is not None:
+            # 1文あたりのパラメーター数の上限を超えないよう分割する
+            for offset in range(0, len(rows), INSERT_CHUNK_SIZE):
+                db.execute(
+                    upsert(LessonNotification)
+                    .values(rows[offset:offset + INSERT_CHUNK_SIZE])
+                    .on_conflict_do_nothing()
+                )
+            db.commit()
+            return
+
+        existing = set(db.query(
+            LessonNotification.lesson_id, LessonNotification.user_id,
+            LessonNotification.kind, LessonNotification.lesson_start
+        ).filter(LessonNotification.lesson_id.in_({row["lesson_id"] for row in rows})))
+        rows = [
+            row for row in rows
+            if (row["lesson_id"], str(row["user_id"]), row["kind"], row["lesson_start"]) not in existing
+        ]
+        if not rows:
+            return
+        try:
+            db.execute(insert(LessonNotification), rows)
+            db.commit()
+        except IntegrityError:
+            # 他のワーカーが同時に作成した場合。残りの行は次回の検出で作成される
+            db.rollback()
+
+    # --- 送信 --------------------------------------------------------------
+
+    def claim(self, db: Session, now: Optional[datetime] = None) -> Tuple[str, List[LessonNotification]]:
+        """
+        送信期限の到来した行を最大 batch_size 件確保する
+
+        確保済み（期限内）の行や、他のワーカーがロック中の行は対象にしない。
+
+        Returns:
+            Tuple[str, List[LessonNotification]]: 確保に使ったトークンと確保した行
+        """
+        now = now or datetime.utcnow()
+        token = str(uuid4())
+        claimable = (
+            LessonNotification.status == NotificationStatus.PENDING,
+            LessonNotification.due_at <= now,
+            or_(LessonNotification.lease_expires_at.is_(None),
+                LessonNotification.lease_expires_at <= now),
+        )
+        candidates = (
+            select(LessonNotification.id)
+            .where(*claimable)
+            .order_by(LessonNotification.due_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        db.execute(
+            update(LessonNotification)
+            .where(LessonNotification.id.in_(candidates), *claimable)
+            .values(
+                claim_token=token,
+                lease_expires_at=now + self.lease,
+                attempts=LessonNotification.attempts + 1
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        claimed = db.query(LessonNotification).filter(LessonNotification.claim_token == token).all()
+        return token, claimed
+
+    def dispatch_batch(self, db: Session, now: Optional[datetime] = None) -> int:
+        """
+        1バッチ分の通知を確保して送信する
+
+        Returns:
+            int: 確保した件数（0の場合は送信待ちの行がない）
+        """
+        now = now or datetime.utcnow()
+        token, claimed = self.claim(db, now)
+        if not claimed:
+            return 0
+
+        lessons = {
+            lesson.id: lesson for lesson in
+            db.query(Lesson).filter(Lesson.id.in_({n.lesson_id for n in claimed}))
+        }
+        users = {
+            str(user.id): user for user in
+            db.query(User).filter(User.id.in_({n.user_id for n in claimed}))
+        }
+        email_service = get_email_service()
+        messages, to_send, skipped = [], [], []
+        schedules = {schedule.kind: schedule for schedule in self.schedules}
+        for notification in claimed:
+            lesson = lessons.get(notification.lesson_id)
+            user = users.get(str(notification.user_id))
+            if (
+                lesson is None or user is None or not lesson.is_active
+                or lesson.status != LessonStatus.SCHEDULED
+                # 日時が変更されたレッスンは、新しい日時の行を作成して送信する
+                or lesson.start_time != notification.lesson_start
+                or lesson.start_time <= now + schedules[notification.kind].latest
+            ):
+                skipped.append(notification.id)
+                continue
+            messages.append(self._message(email_service, notification, lesson, user))
+            to_send.append(notification)
+
+        results = asyncio.run(email_service.send_bulk(messages)) if messages else []
+        sent = [n.id for n, ok in zip(to_send, results) if ok]
+        failed = [n for n, ok in zip(to_send, results) if not ok]
+
+        self._finish(db, token, sent, NotificationStatus.SENT, sent_at=now)
+        self._finish(db, token, skipped, NotificationStatus.SKIPPED)
+        self._finish(db, token, [n.id for n in failed if n.attempts >= self.max_attempts],
+                     NotificationStatus.FAILED, last_error="SMTP send failed")
+        retry = [n for n in failed if n.attempts < self.max_attempts]
+        for attempts in {n.attempts for n in retry}:
+            # 再送信は試行回数に応じて間隔を空ける（1分, 2分, 4分, ...）
+            self._finish(
+                db, token, [n.id for n in retry if n.attempts == attempts],
+                NotificationStatus.PENDING, last_error="SMTP send failed",
+                lease_expires_at=now + timedelta(minutes=2 ** (attempts - 1))
+            )
+        db.commit()
+
+        self.sent += len(sent)
+        self.skipped += len(skipped)
+        self.failed += len(failed)
+        return len(claimed)
+
+    def _finish(self, db: Session, token: str, ids: List[int], status: NotificationStatus, **values) -> None:
+        """確保した行の状態を更新する（期限切れで他のワーカーが確保し直した行は更新しない）"""
+        if not ids:
+            return
+        values.setdefault("lease_expires_at", None)
+        db.execute(
+            update(LessonNotification)
+            .where(LessonNotification.id.in_(ids), LessonNotification.claim_token == token)
+            .values(status=status, claim_token=None, **values)
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def _message(email_service, notification: LessonNotification, lesson: Lesson, user: User) -> Dict:
+        details = {
+            "first_name": user.first_name,
+            "title": lesson.title,
+            "start_time": lesson.start_time.strftime("%Y-%m-%d %H:%M"),
+            "meeting_url": lesson.meeting_url,
+            "change_deadline": (
+                lesson.start_time - timedelta(days=LESSON_CHANGE_DEADLINE_DAYS)
+            ).strftime("%Y-%m-%d %H:%M"),
+        }
+        if notification.kind == NotificationKind.CHANGE_DEADLINE:
+            return email_service.change_deadline_message(user.email, details)
+        return email_service.lesson_reminder_message(user.email, details)
+
+    def run_once(self, now: Optional[datetime] = None) -> int:
+        """
+        検出と、送信待ちがなくなるまでの送信を1回行う
+
+        Returns:
+            int: 確保した通知の件数
+        """
+        db = self._session_factory()
+        try:
+            self.enqueue_due(db, now)
+            dispatched = 0
+            while True:
+                claimed = self.dispatch_batch(db, now)
+                dispatched += claimed
+                if claimed < self.batch_size:
+                    return dispatched
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    # --- バックグラウンドスレッド ------------------------------------------
+
+    def start(self, session_factory: Callable[[], Session]) -> None:
+        """定期的に検出・送信を行うバックグラウンドスレッドを開始する"""
+        self._session_factory = session_factory
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="lesson-reminders", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """バックグラウンドスレッドを停止する（確保中の行は期限の経過後に他のワーカーが送信する）"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Lesson reminder dispatch failed: {str(e)}")
+            if self._stop_event.wait(self.poll_interval):
+                return
+
+
+# アプリケーション全体で共有するインスタンス
+lesson_reminders = LessonReminderDispatcher()
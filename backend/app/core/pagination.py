@@ -0,0 +1,49 @@
+import base64
+import binascii
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.core import DEFAULT_CONFIG
+
+# ページサイズの既定値と上限
+DEFAULT_PAGE_SIZE: int = DEFAULT_CONFIG["PAGINATION_DEFAULT_LIMIT"]
+MAX_PAGE_SIZE: int = DEFAULT_CONFIG["PAGINATION_MAX_LIMIT"]
+
+_CURSOR_SEPARATOR = "|"
+
+
+def encode_cursor(created_at: Optional[datetime], row_id: int) -> str:
+    """
+    キーセットページネーション用のカーソルを生成する
+
+    Args:
+        created_at: ページ末尾の行の作成日時（未設定の行は None）
+        row_id: ページ末尾の行のID
+
+    Returns:
+        str: URLセーフなカーソル文字列
+    """
+    created = created_at.isoformat() if created_at is not None else ""
+    raw = f"{created}{_CURSOR_SEPARATOR}{row_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    """
+    カーソル文字列を (created_at, id) に復元する（作成日時が未設定の行のカーソルは created_at が None）
+
+    Raises:
+        HTTPException: カーソルの形式が不正な場合
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        created_at, row_id = raw.split(_CURSOR_SEPARATOR, 1)
+        return (datetime.fromisoformat(created_at) if created_at else None), int(row_id)
+    except (ValueError, UnicodeError, binascii.Error):
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid cursor"
+        )
@@ -1,37 +1,95 @@
+from datetime import datetime
 from typing import Optional, Dict, Any
-import stripe
 from fastapi import HTTPException
+from sqlalchemy.orm import Session
 from app.core.config import settings
+from app.core.currency import to_major_units
+from app.core import rollups
+from app.core.instrumentation import timer
+from app.core.slot_holds import slot_holds
 from app.models.payment import PaymentIntent, PaymentConfirmation
 from app.utils.logger import logger
 
+def _metadata(payment_intent) -> Dict[str, Any]:
+    """PaymentIntent の metadata を辞書で返す（StripeObject・辞書・属性のみのオブジェクトに対応する）"""
+    metadata = getattr(payment_intent, "metadata", None)
+    if metadata is None:
+        return {}
+    if hasattr(metadata, "to_dict"):
+        # 新しい stripe SDK の StripeObject は Mapping ではないため dict() で変換できない
+        return metadata.to_dict()
+    return dict(metadata) if hasattr(metadata, "keys") else dict(vars(metadata))
+
 class PaymentProcessor:
-    def __init__(self):
-        """Initialize the payment processor with Stripe configuration"""
-        self.stripe = stripe
-        self.stripe.api_key = settings.STRIPE_SECRET_KEY
+    def __init__(self, db: Optional[Session] = None):
+        """
+        Initialize the payment processor with Stripe configuration
+
+        Args:
+            db: Optional database session used to update the admin dashboard rollups
+        """
+        self.db = db
+        self._stripe = None
+
+    @property
+    def stripe(self):
+        """
+        Stripe SDK module, imported and configured on first use
+
+        The stripe package is slow to import, so it is not loaded until a
+        payment operation actually needs it.
+        """
+        if self._stripe is None:
+            import stripe
+
+            stripe.api_key = settings.STRIPE_SECRET_KEY
+            self._stripe = stripe
+        return self._stripe
 
     async def create_payment_intent(
-        self, amount: int, currency: str = "usd", metadata: Optional[Dict[str, Any]] = None
+        self,
+        amount: Optional[int],
+        currency: str = "usd",
+        metadata: Optional[Dict[str, Any]] = None,
+        user_id: Optional[str] = None
     ) -> PaymentIntent:
         """
         Create a payment intent for processing payment
         
         Args:
-            amount: Amount in cents
+            amount: Amount in cents. Ignored when slot holds are linked: the amount and
+                currency are then priced on the server from the holds
             currency: Currency code (default: usd)
-            metadata: Additional metadata for the payment
+            metadata: Additional metadata for the payment. "slot_hold_ids" (comma-separated)
+                links the checkout's slot holds to the intent
+            user_id: The paying user. Only this user's slot holds are linked to the intent
             
         Returns:
             PaymentIntent object containing client secret and payment details
         """
+        hold_ids = [hold_id for hold_id in ((metadata or {}).get("slot_hold_ids") or "").split(",") if hold_id]
+        link_holds = bool(hold_ids) and user_id is not None and self.db is not None
+        if link_holds:
+            # 仮押さえの料金から金額を算出する（クライアントの指定した金額は使わない）
+            amount, currency = slot_holds.quote(self.db, hold_ids, user_id)
+        if amount is None:
+            raise HTTPException(status_code=400, detail="amount is required")
         try:
-            intent = self.stripe.PaymentIntent.create(
-                amount=amount,
-                currency=currency,
-                metadata=metadata or {},
-                automatic_payment_methods={"enabled": True}
-            )
+            with timer("stripe", "payment_intent.create"):
+                intent = self.stripe.PaymentIntent.create(
+                    amount=amount,
+                    currency=currency,
+                    metadata=metadata or {},
+                    automatic_payment_methods={"enabled": True}
+                )
+
+            if link_holds:
+                # 決済の完了・失敗時に仮押さえを確定・解放できるよう関連付ける
+                # 料金の算出後に失効した仮押さえがあれば、金額が一致しないため決済させない
+                if slot_holds.attach_payment(self.db, hold_ids, intent.id, user_id) != len(set(hold_ids)):
+                    self.db.rollback()
+                    raise HTTPException(status_code=409, detail="Slot hold not found or expired")
+                self.db.commit()
             
             return PaymentIntent(
                 client_secret=intent.client_secret,
@@ -40,7 +98,7 @@ class PaymentProcessor:
                 currency=currency
             )
             
-        except stripe.error.StripeError as e:
+        except self.stripe.error.StripeError as e:
             logger.error(f"Stripe error while creating payment intent: {str(e)}")
             raise HTTPException(
                 status_code=400,
@@ -58,7 +116,8 @@ class PaymentProcessor:
             PaymentConfirmation object with status and details
         """
         try:
-            intent = self.stripe.PaymentIntent.retrieve(payment_intent_id)
+            with timer("stripe", "payment_intent.retrieve"):
+                intent = self.stripe.PaymentIntent.retrieve(payment_intent_id)
             
             return PaymentConfirmation(
                 payment_intent_id=intent.id,
@@ -67,7 +126,7 @@ class PaymentProcessor:
                 currency=intent.currency
             )
             
-        except stripe.error.StripeError as e:
+        except self.stripe.error.StripeError as e:
             logger.error(f"Stripe error while confirming payment: {str(e)}")
             raise HTTPException(
                 status_code=400,
@@ -92,7 +151,15 @@ class PaymentProcessor:
             if amount:
                 refund_params["amount"] = amount
                 
-            refund = self.stripe.Refund.create(**refund_params)
+            with timer("stripe", "refund.create"):
+                refund = self.stripe.Refund.create(**refund_params)
+
+            if self.db is not None:
+                rollups.record_refund(
+                    self.db, datetime.utcnow(), refund.currency,
+                    to_major_units(refund.amount, refund.currency), refund_id=refund.id
+                )
+                self.db.commit()
             
             return {
                 "refund_id": refund.id,
@@ -101,7 +168,7 @@ class PaymentProcessor:
                 "currency": refund.currency
             }
             
-        except stripe.error.StripeError as e:
+        except self.stripe.error.StripeError as e:
             logger.error(f"Stripe error while processing refund: {str(e)}")
             raise HTTPException(
                 status_code=400,
@@ -120,10 +187,11 @@ class PaymentProcessor:
             Dictionary containing payment history details
         """
         try:
-            payments = self.stripe.PaymentIntent.list(
-                customer=customer_id,
-                limit=limit
-            )
+            with timer("stripe", "payment_intent.list"):
+                payments = self.stripe.PaymentIntent.list(
+                    customer=customer_id,
+                    limit=limit
+                )
             
             return {
                 "payments": [
@@ -138,7 +206,7 @@ class PaymentProcessor:
                 ]
             }
             
-        except stripe.error.StripeError as e:
+        except self.stripe.error.StripeError as e:
             logger.error(f"Stripe error while retrieving payment history: {str(e)}")
             raise HTTPException(
                 status_code=400,
@@ -157,11 +225,12 @@ class PaymentProcessor:
             Dictionary containing the processed event details
         """
         try:
-            event = stripe.Webhook.construct_event(
-                payload,
-                sig_header,
-                settings.STRIPE_WEBHOOK_SECRET
-            )
+            with timer("stripe", "webhook.construct_event"):
+                event = self.stripe.Webhook.construct_event(
+                    payload,
+                    sig_header,
+                    settings.STRIPE_WEBHOOK_SECRET
+                )
             
             # Handle different event types
             if event.type == "payment_intent.succeeded":
@@ -171,7 +240,7 @@ class PaymentProcessor:
                 
             return {"status": "success", "event_type": event.type}
             
-        except stripe.error.SignatureVerificationError as e:
+        except self.stripe.error.SignatureVerificationError as e:
             logger.error(f"Invalid signature in webhook: {str(e)}")
             raise HTTPException(
                 status_code=400,
@@ -187,9 +256,30 @@ class PaymentProcessor:
     async def _handle_payment_success(self, payment_intent: Dict[str, Any]) -> None:
         """Handle successful payment webhook event"""
         logger.info(f"Payment succeeded: {payment_intent.id}")
-        # Implement success handling logic here
+        if self.db is not None:
+            amount = to_major_units(payment_intent.amount, payment_intent.currency)
+            if not rollups.record_payment(
+                self.db, datetime.utcnow(), payment_intent.currency, amount,
+                payment_intent_id=payment_intent.id
+            ):
+                # Stripe は同じイベントを再送することがあるため、処理済みの決済は無視する
+                self.db.rollback()
+                logger.info(f"Payment {payment_intent.id} was already processed")
+                return
+            # 仮押さえの削除とレッスンの予約を同じトランザクションでコミットする
+            # 金額が仮押さえの料金と一致しない場合は予約せず、返金対象として記録する
+            metadata = _metadata(payment_intent)
+            lessons = slot_holds.confirm(
+                self.db, payment_intent.id, payment_intent.amount, payment_intent.currency,
+                hold_ids=[hold_id for hold_id in (metadata.get("slot_hold_ids") or "").split(",") if hold_id],
+                user_id=metadata.get("user_id")
+            )
+            self.db.commit()
+            if lessons:
+                logger.info(f"Booked {len(lessons)} lessons from slot holds for {payment_intent.id}")
 
     async def _handle_payment_failure(self, payment_intent: Dict[str, Any]) -> None:
         """Handle failed payment webhook event"""
         logger.error(f"Payment failed: {payment_intent.id}")
-        # Implement failure handling logic here
\ No newline at end of file
+        if self.db is not None:
+            slot_holds.release_for_payment(self.db, payment_intent.id)
\ No newline at end of file
@@ -0,0 +1,109 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from app.utils.logger import logger
+
+# 開発環境でリクエストごとのSQL発行数を監視する（create_app で QueryCountMiddleware を登録する）
+QUERY_COUNT_ENABLED = os.getenv("QUERY_COUNT_ENABLED", "false").lower() in ("1", "true", "yes")
+# 警告（strict の場合は500エラー）とする1リクエストあたりのSQL発行数
+QUERY_COUNT_MAX = int(os.getenv("QUERY_COUNT_MAX", "10"))
+QUERY_COUNT_STRICT = os.getenv("QUERY_COUNT_STRICT", "false").lower() in ("1", "true", "yes")
+
+
+class QueryCounter:
+    """1リクエスト（またはブロック）内で発行されたSQLを数える"""
+
+    def __init__(self, keep_statements: bool = False):
+        self.count = 0
+        self.keep_statements = keep_statements
+        self.statements: List[str] = []
+
+    def record(self, statement: str) -> None:
+        self.count += 1
+        if self.keep_statements:
+            self.statements.append(statement)
+
+
+# 現在のリクエストのカウンター
+# スレッドプールで実行される同期処理にもコンテキストごとコピーされるため、
+# カウンターオブジェクトを共有して加算する
+_current_counter: ContextVar[Optional[QueryCounter]] = ContextVar("query_counter", default=None)
+_listener_installed = False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    counter = _current_counter.get()
+    if counter is not None:
+        counter.record(statement)
+
+
+def install_listener() -> None:
+    """全エンジンのSQL実行を数えるイベントリスナーを登録する"""
+    global _listener_installed
+    if not _listener_installed:
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        _listener_installed = True
+
+
+@contextmanager
+def count_queries(keep_statements: bool = False) -> Iterator[QueryCounter]:
+    """
+    ブロック内で発行されたSQLの件数を数える
+
+    Example:
+        with count_queries() as counter:
+            material_service.get_materials(db, user_id)
+        assert counter.count == 1
+    """
+    install_listener()
+    counter = QueryCounter(keep_statements=keep_statements)
+    token = _current_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _current_counter.reset(token)
+
+
+class QueryCountMiddleware(BaseHTTPMiddleware):
+    """
+    開発環境向けのクエリ数監視ミドルウェア
+
+    リクエストごとのSQL発行数を X-Query-Count ヘッダーで返し、
+    上限を超えた場合は警告ログを出力する（strict の場合は500エラーにする）。
+    N+1クエリの検出に使用する。
+    """
+
+    def __init__(self, app, max_queries: int = 10, strict: bool = False):
+        super().__init__(app)
+        self.max_queries = max_queries
+        self.strict = strict
+        install_listener()
+
+    async def dispatch(self, request: Request, call_next):
+        with count_queries(keep_statements=True) as counter:
+            response = await call_next(request)
+
+        if counter.count > self.max_queries:
+            logger.warning(
+                f"{request.method} {request.url.path} executed {counter.count} queries "
+                f"(limit {self.max_queries}): {counter.statements[:5]}"
+            )
+            if self.strict:
+                return JSONResponse(
+                    status_code=500,
+                    content={
+                        "detail": f"Query limit exceeded: {counter.count} > {self.max_queries}"
+                    },
+                    headers={"X-Query-Count": str(counter.count)},
+                )
+
+        response.headers["X-Query-Count"] = str(counter.count)
+        return response
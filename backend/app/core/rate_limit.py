@@ -0,0 +1,428 @@
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple
+
+import jwt
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+from app.core.security import ALGORITHM, SECRET_KEY
+from app.utils.logger import logger
+
+try:
+    import redis
+except ImportError:  # redis は任意の依存関係（共有バックエンドを使う場合のみ必要）
+    redis = None
+
+# レート制限を有効にするか・バックエンドの種類（環境変数で切り替え）
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://127.0.0.1:6379/0")
+# X-Forwarded-For を信頼するか（リバースプロキシの背後で動かす場合のみ有効にする）
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() in ("1", "true", "yes")
+# 信頼するプロキシの段数（X-Forwarded-For の右から何番目を接続元とするか）
+RATE_LIMIT_PROXY_HOPS = max(1, int(os.getenv("RATE_LIMIT_PROXY_HOPS", "1")))
+# 共有バックエンドに接続できなかった後、再接続を試みずにリクエストを許可する秒数
+RATE_LIMIT_BACKEND_RETRY_SECONDS = float(os.getenv("RATE_LIMIT_BACKEND_RETRY_SECONDS", "5"))
+
+TOKEN_BUCKET = "token_bucket"
+SLIDING_WINDOW = "sliding_window"
+
+
+# ---------------------------------------------------------------------------
+# アルゴリズム（状態を受け取り新しい状態を返す純粋関数。各バックエンドで共有する）
+# ---------------------------------------------------------------------------
+
+def token_bucket_step(
+    state: Optional[Tuple[float, float]],
+    capacity: float,
+    rate: float,
+    now: float,
+    cost: float = 1.0
+) -> Tuple[Tuple[float, float], bool, float]:
+    """
+    トークンバケットを1回進める
+
+    Args:
+        state: (残りトークン数, 最終更新時刻) 。初回は None
+        capacity: バケットの容量（瞬間的に許可する最大リクエスト数）
+        rate: 1秒あたりの補充量
+        now: 現在時刻（秒）
+        cost: 消費するトークン数
+
+    Returns:
+        (新しい状態, 許可するか, 再試行までの秒数)
+    """
+    tokens, updated = state if state is not None else (capacity, now)
+    tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+    if tokens >= cost:
+        return (tokens - cost, now), True, 0.0
+    return (tokens, now), False, (cost - tokens) / rate
+
+
+def sliding_window_step(
+    state: Optional[Tuple[int, int, int]],
+    limit: int,
+    window: float,
+    now: float,
+    cost: int = 1
+) -> Tuple[Tuple[int, int, int], bool, float]:
+    """
+    スライディングウィンドウ（直前の固定ウィンドウの件数を経過割合で按分する近似）を1回進める
+
+    Args:
+        state: (現在のウィンドウ番号, 現在のウィンドウの件数, 直前のウィンドウの件数) 。初回は None
+        limit: ウィンドウあたりの上限
+        window: ウィンドウの長さ（秒）
+
+    Returns:
+        (新しい状態, 許可するか, 再試行までの秒数)
+    """
+    current = int(now // window)
+    index, count, previous = state if state is not None else (current, 0, 0)
+    if current != index:
+        previous = count if current == index + 1 else 0
+        index, count = current, 0
+
+    elapsed_ratio = (now - current * window) / window
+    estimated = previous * (1 - elapsed_ratio) + count
+    if estimated + cost <= limit:
+        return (index, count + cost, previous), True, 0.0
+    # 直前のウィンドウの寄与が十分に減るまで、または次のウィンドウまで待つ
+    if previous:
+        retry_after = min(
+            (current + 1) * window - now,
+            max(0.0, (estimated + cost - limit) / previous * window)
+        )
+    else:
+        retry_after = (current + 1) * window - now
+    return (index, count, previous), False, retry_after
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """
+    レート制限の定義
+
+    Attributes:
+        name: キーの接頭辞（制限ごとに一意）
+        limit: 期間あたりのリクエスト数（トークンバケットでは容量）
+        period: 期間（秒）
+        key_func: リクエストから制限対象のキー（IP・アカウントなど）を取り出す関数。
+                  None を返した場合はこの制限を適用しない
+        algorithm: TOKEN_BUCKET または SLIDING_WINDOW
+    """
+    name: str
+    limit: int
+    period: float
+    key_func: Callable[[Request], Awaitable[Optional[str]]]
+    algorithm: str = TOKEN_BUCKET
+
+
+# ---------------------------------------------------------------------------
+# バックエンド
+# ---------------------------------------------------------------------------
+
+class InProcessBackend:
+    """
+    ワーカープロセス内で状態を持つバックエンド
+
+    キーの数は max_keys までに制限し、最も長く使われていないキーから捨てる
+    （捨てられたキーは満タンのバケットとして扱われる）。
+    ワーカーごとに独立して数えるため、全体の上限はワーカー数倍になる。
+    """
+
+    # 判定がイベントループを止めないため、スレッドプールを使わずに呼び出す
+    blocking = False
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._states: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: RateLimit, now: float, cost: int = 1) -> Tuple[bool, float]:
+        with self._lock:
+            state = self._states.get(key)
+            if limit.algorithm == SLIDING_WINDOW:
+                state, allowed, retry_after = sliding_window_step(state, limit.limit, limit.period, now, cost)
+            else:
+                state, allowed, retry_after = token_bucket_step(
+                    state, limit.limit, limit.limit / limit.period, now, cost
+                )
+            self._states[key] = state
+            self._states.move_to_end(key)
+            if len(self._states) > self.max_keys:
+                self._states.popitem(last=False)
+        return allowed, retry_after
+
+    def reset(self) -> None:
+        with self._lock:
+            self._states.clear()
+
+
+# Redis 上で1回の往復で判定するためのLuaスクリプト
+# （状態の形式・計算は token_bucket_step / sliding_window_step と同じ）
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(retry_after)}
+"""
+
+SLIDING_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local current = math.floor(now / window)
+local state = redis.call('HMGET', KEYS[1], 'index', 'count', 'previous')
+local index = tonumber(state[1]) or current
+local count = tonumber(state[2]) or 0
+local previous = tonumber(state[3]) or 0
+if current ~= index then
+  if current == index + 1 then previous = count else previous = 0 end
+  index = current
+  count = 0
+end
+local estimated = previous * (1 - (now - current * window) / window) + count
+local allowed = 0
+local retry_after = 0
+if estimated + cost <= limit then
+  count = count + cost
+  allowed = 1
+else
+  retry_after = (current + 1) * window - now
+  if previous > 0 then
+    retry_after = math.min(retry_after, math.max(0, (estimated + cost - limit) / previous * window))
+  end
+end
+redis.call('HSET', KEYS[1], 'index', index, 'count', count, 'previous', previous)
+redis.call('PEXPIRE', KEYS[1], math.ceil(window * 2000))
+return {allowed, tostring(retry_after)}
+"""
+
+SCRIPTS = {
+    TOKEN_BUCKET: TOKEN_BUCKET_SCRIPT,
+    SLIDING_WINDOW: SLIDING_WINDOW_SCRIPT,
+}
+
+
+def script_sha(script: str) -> str:
+    return hashlib.sha1(script.encode()).hexdigest()
+
+
+class RedisBackend:
+    """
+    Redis（またはRESP互換サーバー）で状態を共有するバックエンド
+
+    判定はLuaスクリプト（EVALSHA）で行うため、1回の判定につき1往復で済み、
+    複数ワーカーから同時に更新しても数え漏れがない。
+    Redis に接続できない場合は、可用性を優先してリクエストを許可し、
+    retry_seconds の間は接続を試みない（障害中に毎回タイムアウトを待たない）。
+    redis-py の呼び出しはブロックするため、RateLimiter はスレッドプールで呼び出す。
+    """
+
+    blocking = True
+
+    def __init__(self, client, key_prefix: str = "ratelimit:",
+                 retry_seconds: float = RATE_LIMIT_BACKEND_RETRY_SECONDS):
+        self.client = client
+        self.key_prefix = key_prefix
+        self.retry_seconds = retry_seconds
+        self._unavailable_until = 0.0
+        self._shas = {algorithm: script_sha(script) for algorithm, script in SCRIPTS.items()}
+
+    @classmethod
+    def from_url(cls, url: str = RATE_LIMIT_REDIS_URL) -> "RedisBackend":
+        if redis is None:
+            raise RuntimeError("The redis package is required for RATE_LIMIT_BACKEND=redis")
+        return cls(redis.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.05))
+
+    def hit(self, key: str, limit: RateLimit, now: float, cost: int = 1) -> Tuple[bool, float]:
+        if time.monotonic() < self._unavailable_until:
+            return True, 0.0
+        if limit.algorithm == SLIDING_WINDOW:
+            args = (limit.limit, limit.period, now, cost)
+        else:
+            args = (limit.limit, limit.limit / limit.period, now, cost)
+        redis_key = self.key_prefix + key
+        try:
+            try:
+                allowed, retry_after = self.client.evalsha(self._shas[limit.algorithm], 1, redis_key, *args)
+            except Exception as e:
+                if "NOSCRIPT" not in str(e):
+                    raise
+                allowed, retry_after = self.client.eval(SCRIPTS[limit.algorithm], 1, redis_key, *args)
+        except Exception as e:
+            self._unavailable_until = time.monotonic() + self.retry_seconds
+            logger.warning(f"Rate limit backend unavailable, allowing requests for {self.retry_seconds}s: {str(e)}")
+            return True, 0.0
+        return bool(int(allowed)), float(retry_after)
+
+    def reset(self) -> None:
+        for key in self.client.scan_iter(f"{self.key_prefix}*"):
+            self.client.delete(key)
+
+
+# ---------------------------------------------------------------------------
+# 制限対象のキー
+# ---------------------------------------------------------------------------
+
+async def client_ip(request: Request) -> Optional[str]:
+    """
+    接続元IPアドレス
+
+    X-Forwarded-For の左側はクライアントが自由に設定できるため、信頼するプロキシが
+    追加した右から RATE_LIMIT_PROXY_HOPS 番目のアドレスを使う（段数に満たない場合は使わない）。
+    """
+    if RATE_LIMIT_TRUST_PROXY:
+        forwarded = [address.strip() for address in request.headers.get("x-forwarded-for", "").split(",")]
+        if len(forwarded) >= RATE_LIMIT_PROXY_HOPS and forwarded[-RATE_LIMIT_PROXY_HOPS]:
+            return forwarded[-RATE_LIMIT_PROXY_HOPS]
+    return request.client.host if request.client else None
+
+
+async def login_username(request: Request) -> Optional[str]:
+    """ログインフォームのユーザー名（メールアドレス）"""
+    form = await request.form()
+    username = form.get("username")
+    return username.strip().lower() if isinstance(username, str) and username else None
+
+
+async def body_email(request: Request) -> Optional[str]:
+    """JSONリクエストボディの email"""
+    try:
+        body = await request.json()
+    except ValueError:
+        return None
+    email = body.get("email") if isinstance(body, dict) else None
+    return email.strip().lower() if isinstance(email, str) and email else None
+
+
+async def token_subject(request: Request) -> Optional[str]:
+    """Bearerトークンの主体（ユーザー）。トークンが無効な場合は None（認証処理で拒否される）"""
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except Exception:
+        return None
+
+
+# ---------------------------------------------------------------------------
+# FastAPI の依存関係
+# ---------------------------------------------------------------------------
+
+class RateLimiter:
+    """
+    レート制限の判定を行う
+
+    バックエンドは最初の判定時に生成する（RATE_LIMIT_BACKEND=memory / redis）。
+    """
+
+    def __init__(self, backend=None, enabled: bool = RATE_LIMIT_ENABLED):
+        self._backend = backend
+        self.enabled = enabled
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = (
+                RedisBackend.from_url() if RATE_LIMIT_BACKEND == "redis" else InProcessBackend()
+            )
+        return self._backend
+
+    @staticmethod
+    def _hit_all(backend, hits: Sequence[Tuple[str, RateLimit]], now: float) -> List[Tuple[bool, float]]:
+        return [backend.hit(key, limit, now) for key, limit in hits]
+
+    async def check(self, request: Request, limits: Sequence[RateLimit]) -> None:
+        """
+        全ての制限を判定し、いずれかを超えていれば429を返す
+        判定はエンドポイント本体（bcrypt・メール送信など）の実行前に行われる
+        """
+        if not self.enabled:
+            return
+        now = time.time()
+        hits: List[Tuple[str, RateLimit]] = []
+        for limit in limits:
+            key = await limit.key_func(request)
+            if key is not None:
+                hits.append((f"{limit.name}:{key}", limit))
+        if not hits:
+            return
+
+        backend = self.backend
+        if backend.blocking:
+            # 共有バックエンドへの通信でイベントループを止めないよう、まとめてスレッドプールで判定する
+            results = await run_in_threadpool(self._hit_all, backend, hits, now)
+        else:
+            results = self._hit_all(backend, hits, now)
+        rejected = [retry_after for allowed, retry_after in results if not allowed]
+
+        if rejected:
+            retry_after = max(1, math.ceil(max(rejected)))
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+
+def rate_limit(*limits: RateLimit) -> Callable[[Request], Awaitable[None]]:
+    """
+    指定した制限を判定する依存関係を返す
+
+    Example:
+        @router.post("/login", dependencies=[Depends(login_rate_limit)])
+    """
+    async def dependency(request: Request) -> None:
+        await rate_limiter.check(request, limits)
+    return dependency
+
+
+# アプリケーション全体で共有するインスタンス
+rate_limiter = RateLimiter()
+
+# エンドポイントごとの制限
+login_rate_limit = rate_limit(
+    RateLimit("login:ip", limit=20, period=60, key_func=client_ip),
+    RateLimit("login:account", limit=5, period=60, key_func=login_username, algorithm=SLIDING_WINDOW),
+)
+register_rate_limit = rate_limit(
+    RateLimit("register:ip", limit=10, period=3600, key_func=client_ip, algorithm=SLIDING_WINDOW),
+)
+password_reset_rate_limit = rate_limit(
+    RateLimit("reset:ip", limit=5, period=600, key_func=client_ip),
+    RateLimit("reset:account", limit=3, period=3600, key_func=body_email, algorithm=SLIDING_WINDOW),
+)
+booking_rate_limit = rate_limit(
+    RateLimit("booking:ip", limit=60, period=60, key_func=client_ip),
+    RateLimit("booking:account", limit=30, period=60, key_func=token_subject),
+)
+payment_rate_limit = rate_limit(
+    RateLimit("payment:ip", limit=30, period=60, key_func=client_ip),
+    RateLimit("payment:account", limit=10, period=60, key_func=token_subject, algorithm=SLIDING_WINDOW),
+)
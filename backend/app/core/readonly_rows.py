@@ -0,0 +1,144 @@
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, Iterator, List, Optional, Type, TypeVar
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from app.models.lesson import Lesson
+from app.models.payment import Payment
+
+RowT = TypeVar("RowT", bound="ReadOnlyRow")
+
+
+class ReadOnlyRow:
+    """
+    参照専用の軽量な行オブジェクトの基底クラス
+
+    __slots__ を使うためインスタンスごとの __dict__ を持たず、
+    ORMのアイデンティティマップや変更追跡の対象にもならない。
+    """
+    __slots__ = ()
+
+    def as_dict(self) -> Dict[str, Any]:
+        """辞書形式に変換する（Enumは値に変換）"""
+        return {
+            name: value.value if isinstance(value, Enum) else value
+            for name, value in ((name, getattr(self, name)) for name in self.__slots__)
+        }
+
+
+@dataclass(frozen=True)
+class LessonRow(ReadOnlyRow):
+    """レッスンの参照専用行"""
+    __slots__ = (
+        "id", "title", "start_time", "end_time", "status", "lesson_type",
+        "teacher_id", "current_participants", "max_participants", "price", "currency",
+    )
+    id: int
+    title: str
+    start_time: datetime
+    end_time: datetime
+    status: Enum
+    lesson_type: Enum
+    teacher_id: int
+    current_participants: int
+    max_participants: int
+    price: float
+    currency: str
+
+    @staticmethod
+    def select() -> Select:
+        return select(
+            Lesson.id, Lesson.title, Lesson.start_time, Lesson.end_time, Lesson.status,
+            Lesson.lesson_type, Lesson.teacher_id, Lesson.current_participants,
+            Lesson.max_participants, Lesson.price, Lesson.currency,
+        )
+
+
+@dataclass(frozen=True)
+class PaymentRow(ReadOnlyRow):
+    """決済の参照専用行"""
+    __slots__ = (
+        "id", "user_id", "lesson_id", "amount", "currency", "payment_method",
+        "status", "stripe_payment_intent_id", "created_at", "completed_at",
+    )
+    id: int
+    user_id: int
+    lesson_id: Optional[int]
+    amount: float
+    currency: str
+    payment_method: Enum
+    status: Enum
+    stripe_payment_intent_id: Optional[str]
+    created_at: datetime
+    completed_at: Optional[datetime]
+
+    @staticmethod
+    def select() -> Select:
+        return select(
+            Payment.id, Payment.user_id, Payment.lesson_id, Payment.amount, Payment.currency,
+            Payment.payment_method, Payment.status, Payment.stripe_payment_intent_id,
+            Payment.created_at, Payment.completed_at,
+        )
+
+
+@dataclass(frozen=True)
+class BookingRow(ReadOnlyRow):
+    """予約（決済とレッスンの組）の参照専用行"""
+    __slots__ = (
+        "payment_id", "user_id", "lesson_id", "lesson_title", "start_time", "end_time",
+        "lesson_status", "teacher_id", "payment_status", "amount", "currency", "created_at",
+    )
+    payment_id: int
+    user_id: int
+    lesson_id: int
+    lesson_title: str
+    start_time: datetime
+    end_time: datetime
+    lesson_status: Enum
+    teacher_id: int
+    payment_status: Enum
+    amount: float
+    currency: str
+    created_at: datetime
+
+    @staticmethod
+    def select() -> Select:
+        return select(
+            Payment.id, Payment.user_id, Lesson.id, Lesson.title, Lesson.start_time,
+            Lesson.end_time, Lesson.status, Lesson.teacher_id, Payment.status,
+            Payment.amount, Payment.currency, Payment.created_at,
+        ).join(Lesson, Lesson.id == Payment.lesson_id)
+
+
+def fetch_rows(db: Session, row_type: Type[RowT], statement: Select) -> List[RowT]:
+    """
+    カラムのみを選択したクエリを実行し、参照専用行のリストとして返す
+
+    Args:
+        db: DBセッション
+        row_type: 行の型（LessonRow / PaymentRow / BookingRow）
+        statement: row_type.select() を絞り込んだクエリ
+    """
+    return [row_type(*row) for row in db.execute(statement)]
+
+
+def stream_rows(
+    db: Session,
+    row_type: Type[RowT],
+    statement: Select,
+    batch_size: int = 1000
+) -> Iterator[RowT]:
+    """
+    サーバーサイドカーソルで少しずつ取得しながら参照専用行を返す
+    件数の多いエクスポートでもメモリ使用量は batch_size 分に抑えられる
+    """
+    result = db.execute(statement.execution_options(yield_per=batch_size, stream_results=True))
+    try:
+        for row in result:
+            yield row_type(*row)
+    finally:
+        result.close()
@@ -0,0 +1,247 @@
+"""
+開発・負荷試験用のRedisプロトコル（RESP）互換の簡易サーバー
+
+レート制限の共有バックエンド（RedisBackend）が使うコマンドのみ実装する。
+EVAL / EVALSHA は Lua を実行せず、rate_limit.SCRIPTS に登録されたスクリプトを
+SHA1 で識別し、同じ計算を行う Python の関数（token_bucket_step / sliding_window_step）で処理する。
+本番では実際の Redis を使用すること。
+
+    python -m app.core.redis_standin --port 6380
+    RATE_LIMIT_BACKEND=redis RATE_LIMIT_REDIS_URL=redis://127.0.0.1:6380/0 uvicorn ...
+"""
+import argparse
+import fnmatch
+import socketserver
+import threading
+import time
+from typing import Dict, List, Optional
+
+from app.core.rate_limit import (
+    SCRIPTS,
+    TOKEN_BUCKET,
+    script_sha,
+    sliding_window_step,
+    token_bucket_step,
+)
+
+_SCRIPT_ALGORITHMS = {script_sha(script): algorithm for algorithm, script in SCRIPTS.items()}
+
+
+class _Error(Exception):
+    pass
+
+
+def _encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, _Error):
+        return f"-{value}\r\n".encode()
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return f":{value}\r\n".encode()
+    if isinstance(value, (list, tuple)):
+        return f"*{len(value)}\r\n".encode() + b"".join(_encode(item) for item in value)
+    if isinstance(value, str):
+        value = value.encode()
+    if isinstance(value, bytes) and value in (b"OK", b"PONG"):
+        return b"+" + value + b"\r\n"
+    return b"$" + str(len(value)).encode() + b"\r\n" + value + b"\r\n"
+
+
+class RedisStandin:
+    """ハッシュ・文字列・有効期限・スクリプト実行のみを持つインメモリのキーバリューストア"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.data: Dict[bytes, object] = {}
+        self.expires: Dict[bytes, float] = {}
+        self.lock = threading.Lock()
+        self.commands = 0
+        standin = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                while True:
+                    try:
+                        command = standin._read_command(self.rfile)
+                    except (ConnectionError, ValueError):
+                        return
+                    if command is None:
+                        return
+                    self.wfile.write(_encode(standin.execute(command)))
+
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self) -> "RedisStandin":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    @staticmethod
+    def _read_command(rfile) -> Optional[List[bytes]]:
+        line = rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # redis-cli などのインラインコマンド
+            return line.strip().split()
+        arguments = []
+        for _ in range(int(line[1:])):
+            header = rfile.readline()
+            if not header.startswith(b"$"):
+                raise ValueError("Protocol error")
+            length = int(header[1:])
+            arguments.append(rfile.read(length + 2)[:-2])
+        return arguments
+
+    def _get(self, key: bytes):
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def execute(self, command: List[bytes]):
+        if not command:
+            return _Error("ERR empty command")
+        name = command[0].upper().decode()
+        args = command[1:]
+        with self.lock:
+            self.commands += 1
+            handler = getattr(self, f"_cmd_{name.lower()}", None)
+            if handler is None:
+                return _Error(f"ERR unknown command '{name}'")
+            try:
+                return handler(*args)
+            except TypeError:
+                return _Error(f"ERR wrong number of arguments for '{name.lower()}' command")
+
+    # --- コマンド ---------------------------------------------------------
+
+    def _cmd_ping(self, *args):
+        return args[0] if args else b"PONG"
+
+    def _cmd_get(self, key):
+        value = self._get(key)
+        return value if isinstance(value, bytes) or value is None else _Error("WRONGTYPE")
+
+    def _cmd_set(self, key, value, *options):
+        self.data[key] = value
+        self.expires.pop(key, None)
+        upper = [option.upper() for option in options]
+        if b"PX" in upper:
+            self.expires[key] = time.monotonic() + int(options[upper.index(b"PX") + 1]) / 1000
+        return b"OK"
+
+    def _cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._get(key) is not None:
+                removed += 1
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return removed
+
+    def _cmd_hmget(self, key, *fields):
+        value = self._get(key) or {}
+        return [value.get(field) for field in fields]
+
+    def _cmd_hset(self, key, *pairs):
+        value = self._get(key)
+        if value is None:
+            value = self.data[key] = {}
+        added = 0
+        for field, item in zip(pairs[::2], pairs[1::2]):
+            added += field not in value
+            value[field] = item
+        return added
+
+    def _cmd_pexpire(self, key, milliseconds):
+        if self._get(key) is None:
+            return 0
+        self.expires[key] = time.monotonic() + int(milliseconds) / 1000
+        return 1
+
+    def _cmd_scan(self, cursor, *options):
+        upper = [option.upper() for option in options]
+        pattern = options[upper.index(b"MATCH") + 1].decode() if b"MATCH" in upper else "*"
+        keys = [key for key in list(self.data) if self._get(key) is not None
+                and fnmatch.fnmatchcase(key.decode(), pattern)]
+        return [b"0", keys]
+
+    def _cmd_flushall(self, *args):
+        self.data.clear()
+        self.expires.clear()
+        return b"OK"
+
+    def _cmd_client(self, *args):
+        return b"OK"
+
+    def _cmd_script(self, subcommand, *args):
+        if subcommand.upper() == b"LOAD":
+            sha = script_sha(args[0].decode())
+            return sha if sha in _SCRIPT_ALGORITHMS else _Error("ERR unsupported script")
+        if subcommand.upper() == b"EXISTS":
+            return [int(sha.decode() in _SCRIPT_ALGORITHMS) for sha in args]
+        return b"OK"
+
+    def _cmd_eval(self, script, numkeys, *args):
+        return self._cmd_evalsha(script_sha(script.decode()).encode(), numkeys, *args)
+
+    def _cmd_evalsha(self, sha, numkeys, *args):
+        algorithm = _SCRIPT_ALGORITHMS.get(sha.decode())
+        if algorithm is None:
+            return _Error("NOSCRIPT No matching script. Please use EVAL.")
+        keys, argv = args[:int(numkeys)], [float(arg) for arg in args[int(numkeys):]]
+        key = keys[0]
+        fields = self._get(key) or {}
+
+        if algorithm == TOKEN_BUCKET:
+            capacity, rate, now, cost = argv
+            state = (
+                (float(fields[b"tokens"]), float(fields[b"ts"])) if b"tokens" in fields else None
+            )
+            (tokens, updated), allowed, retry_after = token_bucket_step(state, capacity, rate, now, cost)
+            self._cmd_hset(key, b"tokens", repr(tokens).encode(), b"ts", repr(updated).encode())
+            ttl = capacity / rate
+        else:
+            limit, window, now, cost = argv
+            state = (
+                tuple(int(fields[name]) for name in (b"index", b"count", b"previous"))
+                if b"index" in fields else None
+            )
+            (index, count, previous), allowed, retry_after = sliding_window_step(
+                state, limit, window, now, int(cost)
+            )
+            self._cmd_hset(key, b"index", str(index).encode(), b"count", str(count).encode(),
+                           b"previous", str(previous).encode())
+            ttl = window * 2
+        self.expires[key] = time.monotonic() + ttl
+        return [int(allowed), repr(retry_after).encode()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a local Redis-protocol stand-in for rate limiting")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    args = parser.parse_args()
+
+    standin = RedisStandin(args.host, args.port)
+    print(f"Redis stand-in listening on {standin.url}")
+    try:
+        standin.server.serve_forever()
+    except KeyboardInterrupt:
+        standin.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from uuid import uuid4
+
+import jwt
+from fastapi import HTTPException
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.core.security import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    ALGORITHM,
+    REFRESH_TOKEN_EXPIRE_DAYS,
+    SECRET_KEY,
+    create_access_token,
+    create_refresh_token,
+)
+from app.core.token_revocation import revocation_list
+from app.models.auth_token import RefreshToken
+from app.models.user import User
+from app.utils.logger import logger
+
+
+def _invalid_refresh_token() -> HTTPException:
+    return HTTPException(
+        status_code=401,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def _family_expires_at(now: datetime) -> datetime:
+    # ファミリー内のトークンはいずれも現在までに発行されているため、この時刻までに失効する
+    return now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+
+
+def issue_tokens(db: Session, user: User, family_id: Optional[str] = None,
+                 jti: Optional[str] = None) -> Dict:
+    """
+    アクセストークンとリフレッシュトークンの組を発行する
+    family_id を省略した場合は新しいログインとして扱う。コミットは呼び出し側で行う
+
+    Returns:
+        Dict: access_token, refresh_token, token_type
+    """
+    now = datetime.utcnow()
+    family_id = family_id or str(uuid4())
+    refresh = RefreshToken(
+        jti=jti or str(uuid4()),
+        family_id=family_id,
+        user_id=user.id,
+        issued_at=now,
+        expires_at=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    )
+    db.add(refresh)
+    return {
+        "access_token": create_access_token(data={"sub": user.email, "fam": family_id}),
+        "refresh_token": create_refresh_token(user.email, refresh.jti, family_id, refresh.expires_at),
+        "token_type": "bearer",
+    }
+
+
+def rotate_refresh_token(db: Session, token: str) -> Dict:
+    """
+    リフレッシュトークンを使用済みにし、新しいトークンの組を発行する
+
+    使用済みのトークンが再度提示された場合は漏えいとみなし、
+    同じファミリーのトークン（発行済みのアクセストークンを含む）を全て失効させる。
+    """
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        raise _invalid_refresh_token()
+    if payload.get("type") != "refresh":
+        raise _invalid_refresh_token()
+
+    current = db.get(RefreshToken, payload.get("jti"))
+    if current is None or revocation_list.is_revoked(current.family_id):
+        raise _invalid_refresh_token()
+
+    now = datetime.utcnow()
+    next_jti = str(uuid4())
+    # 同時に同じトークンが使われても、使用済みにできるのは1回だけ
+    claimed = db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.jti == current.jti, RefreshToken.used_at.is_(None))
+        .values(used_at=now, replaced_by=next_jti)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not claimed:
+        logger.warning(f"Refresh token reuse detected, revoking family {current.family_id}")
+        revocation_list.revoke(db, current.family_id, _family_expires_at(now), reason="reuse")
+        db.commit()
+        raise _invalid_refresh_token()
+
+    user = db.get(User, current.user_id)
+    if user is None or not user.is_active:
+        db.rollback()
+        raise _invalid_refresh_token()
+
+    tokens = issue_tokens(db, user, family_id=current.family_id, jti=next_jti)
+    db.commit()
+    return tokens
+
+
+def revoke_session(db: Session, payload: Dict) -> None:
+    """
+    ログアウト: アクセストークンと、同じログインのリフレッシュトークンを失効させる
+    """
+    now = datetime.utcnow()
+    if payload.get("jti"):
+        expires_at = (
+            datetime.utcfromtimestamp(payload["exp"]) if payload.get("exp")
+            else now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        )
+        revocation_list.revoke(db, payload["jti"], expires_at, reason="logout")
+    if payload.get("fam"):
+        revocation_list.revoke(db, payload["fam"], _family_expires_at(now), reason="logout")
+    db.commit()
+
+
+def revoke_user_sessions(db: Session, user_id: str, reason: str = "password_change") -> int:
+    """
+    ユーザーの全てのログインを失効させる（パスワード変更時など）。コミットは呼び出し側で行う
+
+    Returns:
+        int: 失効させたファミリーの数
+    """
+    now = datetime.utcnow()
+    families = [
+        family_id for (family_id,) in
+        db.query(RefreshToken.family_id)
+        .filter(RefreshToken.user_id == user_id, RefreshToken.expires_at > now)
+        .distinct()
+    ]
+    revocation_list.revoke_many(db, families, _family_expires_at(now), reason=reason)
+    return len(families)
@@ -0,0 +1,297 @@
+import argparse
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import String, case, cast, delete, distinct, func, insert, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models.lesson import Lesson, LessonStatus
+from app.models.payment import Payment, PaymentStatus
+from app.models.rollup import (
+    DailyActiveUsers,
+    DailyRevenue,
+    DailyTeacherBookings,
+    RecordedPaymentEvent,
+    UserDailyActivity,
+)
+
+_UPSERT_DIALECTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def _day(value: Optional[datetime]) -> date:
+    if value is None:
+        return datetime.utcnow().date()
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _increment(db: Session, model, keys: Dict, increments: Dict) -> None:
+    """
+    集計行を加算する（存在しない場合は作成する）
+
+    PostgreSQL / SQLite では INSERT ... ON CONFLICT DO UPDATE の1文で加算し、
+    同時更新でも値が失われないようにする。
+    """
+    dialect = db.get_bind().dialect.name
+    upsert = _UPSERT_DIALECTS.get(dialect)
+    if upsert is not None:
+        statement = upsert(model).values(**keys, **increments)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={
+                name: getattr(model, name) + getattr(statement.excluded, name)
+                for name in increments
+            }
+        )
+        db.execute(statement)
+        return
+
+    updated = db.query(model).filter_by(**keys).update(
+        {getattr(model, name): getattr(model, name) + value for name, value in increments.items()},
+        synchronize_session=False
+    )
+    if not updated:
+        db.execute(insert(model).values(**keys, **increments))
+
+
+def record_lesson_booked(db: Session, teacher_id: int, start_time: datetime, count: int = 1) -> None:
+    """レッスンの予約を講師・日ごとの予約数に加算する（countに負数を渡すと減算）"""
+    _increment(
+        db, DailyTeacherBookings,
+        {"day": _day(start_time), "teacher_id": teacher_id},
+        {"bookings": count, "cancellations": 0}
+    )
+
+
+def record_lesson_cancelled(db: Session, teacher_id: int, start_time: datetime) -> None:
+    """レッスンのキャンセルを講師・日ごとのキャンセル数に加算する"""
+    _increment(
+        db, DailyTeacherBookings,
+        {"day": _day(start_time), "teacher_id": teacher_id},
+        {"bookings": 0, "cancellations": 1}
+    )
+
+
+def _first_record(db: Session, kind: str, external_id: str) -> bool:
+    """
+    決済・返金を計上済みとして記録し、初めての記録であればTrueを返す
+
+    同じIDのWebhookが同時に届いた場合も、INSERT ... ON CONFLICT DO NOTHING により
+    一方だけがTrueになる（他方は先のトランザクションの完了を待ってFalseになる）。
+    """
+    dialect = db.get_bind().dialect.name
+    upsert = _UPSERT_DIALECTS.get(dialect)
+    if upsert is not None:
+        result = db.execute(
+            upsert(RecordedPaymentEvent).values(kind=kind, external_id=external_id).on_conflict_do_nothing()
+        )
+        return result.rowcount == 1
+    if db.query(RecordedPaymentEvent).filter_by(kind=kind, external_id=external_id).first() is not None:
+        return False
+    db.add(RecordedPaymentEvent(kind=kind, external_id=external_id))
+    db.flush()
+    return True
+
+
+def record_payment(
+    db: Session,
+    paid_at: Optional[datetime],
+    currency: str,
+    amount: float,
+    payment_intent_id: Optional[str] = None
+) -> bool:
+    """
+    決済完了を日ごと・通貨ごとの売上に加算する
+    payment_intent_id を指定した場合、計上済みの決済（Webhookの再送）は加算しない
+
+    Returns:
+        bool: 加算した場合True
+    """
+    if payment_intent_id is not None and not _first_record(db, "payment", payment_intent_id):
+        return False
+    _increment(
+        db, DailyRevenue,
+        {"day": _day(paid_at), "currency": currency.upper()},
+        {"amount": amount, "payments": 1, "refunded_amount": 0, "refunds": 0}
+    )
+    return True
+
+
+def record_refund(
+    db: Session,
+    refunded_at: Optional[datetime],
+    currency: str,
+    amount: float,
+    refund_id: Optional[str] = None
+) -> bool:
+    """
+    返金を日ごと・通貨ごとの売上に加算する
+    refund_id を指定した場合、計上済みの返金は加算しない
+
+    Returns:
+        bool: 加算した場合True
+    """
+    if refund_id is not None and not _first_record(db, "refund", refund_id):
+        return False
+    _increment(
+        db, DailyRevenue,
+        {"day": _day(refunded_at), "currency": currency.upper()},
+        {"amount": 0, "payments": 0, "refunded_amount": amount, "refunds": 1}
+    )
+    return True
+
+
+def record_user_activity(db: Session, user_id: str, at: Optional[datetime] = None) -> None:
+    """
+    ユーザーの活動を記録し、その日に初めての活動であればアクティブユーザー数に加算する
+    """
+    day = _day(at)
+    dialect = db.get_bind().dialect.name
+    upsert = _UPSERT_DIALECTS.get(dialect)
+    if upsert is not None:
+        result = db.execute(
+            upsert(UserDailyActivity).values(day=day, user_id=user_id).on_conflict_do_nothing()
+        )
+        first_activity = result.rowcount == 1
+    else:
+        first_activity = db.query(UserDailyActivity).filter_by(day=day, user_id=user_id).first() is None
+        if first_activity:
+            db.add(UserDailyActivity(day=day, user_id=user_id))
+
+    if first_activity:
+        _increment(db, DailyActiveUsers, {"day": day}, {"active_users": 1})
+
+
+def backfill(db: Session, start_day: date, end_day: date) -> None:
+    """
+    指定期間 [start_day, end_day) の集計テーブルを元データから再構築する
+
+    講師別予約数・売上は lessons / payments から集計し直す。決済数・返金数は
+    record_payment / record_refund と同じく PaymentIntent ごとに1件と数え、返金は
+    返金日時（payments.refunded_at）の日に計上する（返金日時のない行は計上しない）。
+    アクティブユーザー数は user_daily_activity から数え直す。活動記録の導入前の期間は
+    元データがないため再構築できない（users.last_login は最終ログインのみで、
+    過去の日ごとの活動を表さないため使わない）。
+    """
+    start = datetime.combine(start_day, datetime.min.time())
+    end = datetime.combine(end_day, datetime.min.time())
+
+    for model in (DailyTeacherBookings, DailyRevenue, DailyActiveUsers):
+        db.execute(delete(model).where(model.day >= start_day, model.day < end_day))
+
+    lesson_day = func.date(Lesson.start_time)
+    db.execute(insert(DailyTeacherBookings).from_select(
+        ["day", "teacher_id", "bookings", "cancellations"],
+        select(
+            lesson_day,
+            Lesson.teacher_id,
+            func.count(Lesson.id),
+            func.sum(case((Lesson.status == LessonStatus.CANCELLED, 1), else_=0)),
+        ).where(
+            Lesson.start_time >= start, Lesson.start_time < end
+        ).group_by(lesson_day, Lesson.teacher_id)
+    ))
+
+    # パッケージ予約では1つの決済に複数の行があるため、PaymentIntent ごとに1件と数える
+    payment_key = func.coalesce(Payment.stripe_payment_intent_id, cast(Payment.id, String))
+    paid_day = func.date(Payment.completed_at)
+    db.execute(insert(DailyRevenue).from_select(
+        ["day", "currency", "amount", "payments", "refunded_amount", "refunds"],
+        select(
+            paid_day,
+            func.upper(Payment.currency),
+            func.sum(Payment.amount),
+            func.count(distinct(payment_key)),
+            literal(0),
+            literal(0),
+        ).where(
+            # 予約できずに返金対象となった決済も、Webhook では売上に計上している
+            Payment.status.in_([
+                PaymentStatus.COMPLETED, PaymentStatus.REFUNDED, PaymentStatus.REFUND_REQUIRED
+            ]),
+            Payment.completed_at >= start,
+            Payment.completed_at < end
+        ).group_by(paid_day, func.upper(Payment.currency))
+    ))
+    refunded_day = func.date(Payment.refunded_at)
+    for row in db.execute(
+        select(
+            refunded_day.label("day"),
+            Payment.currency,
+            func.sum(Payment.amount).label("amount"),
+            func.count(distinct(payment_key)).label("refunds"),
+        ).where(
+            Payment.status == PaymentStatus.REFUNDED,
+            Payment.refunded_at >= start,
+            Payment.refunded_at < end
+        ).group_by(refunded_day, Payment.currency)
+    ):
+        _increment(
+            db, DailyRevenue,
+            {"day": date.fromisoformat(str(row.day)), "currency": row.currency.upper()},
+            {"amount": 0, "payments": 0, "refunded_amount": row.amount, "refunds": row.refunds}
+        )
+
+    db.execute(insert(DailyActiveUsers).from_select(
+        ["day", "active_users"],
+        select(UserDailyActivity.day, func.count(UserDailyActivity.user_id)).where(
+            UserDailyActivity.day >= start_day, UserDailyActivity.day < end_day
+        ).group_by(UserDailyActivity.day)
+    ))
+    db.commit()
+
+
+def get_dashboard(db: Session, start_day: date, end_day: date) -> Dict[str, List[Dict]]:
+    """
+    ダッシュボード用の日別集計を取得する
+    集計テーブルのみを参照するため、読み取り量は期間の日数に比例する
+    """
+    bookings = db.query(
+        DailyTeacherBookings.day,
+        func.sum(DailyTeacherBookings.bookings).label("bookings"),
+        func.sum(DailyTeacherBookings.cancellations).label("cancellations"),
+    ).filter(
+        DailyTeacherBookings.day >= start_day, DailyTeacherBookings.day < end_day
+    ).group_by(DailyTeacherBookings.day).order_by(DailyTeacherBookings.day)
+
+    revenue = db.query(
+        DailyRevenue.day, DailyRevenue.currency, DailyRevenue.amount,
+        DailyRevenue.payments, DailyRevenue.refunded_amount, DailyRevenue.refunds,
+    ).filter(
+        DailyRevenue.day >= start_day, DailyRevenue.day < end_day
+    ).order_by(DailyRevenue.day, DailyRevenue.currency)
+
+    active_users = db.query(DailyActiveUsers.day, DailyActiveUsers.active_users).filter(
+        DailyActiveUsers.day >= start_day, DailyActiveUsers.day < end_day
+    ).order_by(DailyActiveUsers.day)
+
+    return {
+        "bookings": [row._asdict() for row in bookings],
+        "revenue": [row._asdict() for row in revenue],
+        "active_users": [row._asdict() for row in active_users],
+    }
+
+
+def main() -> None:
+    """集計テーブルのバックフィルを実行するコマンド"""
+    from app.core.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Backfill admin dashboard rollup tables")
+    parser.add_argument("--start", type=date.fromisoformat, required=True, help="開始日 (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="終了日 (YYYY-MM-DD, 含まない。既定は明日)")
+    args = parser.parse_args()
+
+    end_day = args.end or datetime.utcnow().date() + timedelta(days=1)
+    db = SessionLocal()
+    try:
+        backfill(db, args.start, end_day)
+        print(f"Backfilled rollups for {args.start} - {end_day}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
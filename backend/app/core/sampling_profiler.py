@@ -0,0 +1,197 @@
+import asyncio
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+# 本番ワーカーでのプロファイリングを許可するか（環境変数で明示的に有効化する）
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# 安全のための上限
+MAX_DURATION_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "30"))
+MIN_INTERVAL_SECONDS = 0.001
+MAX_STACK_DEPTH = 64
+MAX_UNIQUE_STACKS = 10000
+# サンプリング処理に使った時間の割合がこれを超えた場合はサンプリング間隔を広げる
+MAX_OVERHEAD_RATIO = 0.05
+
+# 計測モードごとのタイマーとシグナル（cpu: CPU時間、wall: 経過時間）
+_TIMERS = {
+    "cpu": (signal.ITIMER_PROF, signal.SIGPROF),
+    "wall": (signal.ITIMER_REAL, signal.SIGALRM),
+}
+
+# 現在処理中のリクエストのASGIスコープ（サンプルをルートに紐付けるために使用）
+_current_scope: ContextVar[Optional[dict]] = ContextVar("profiler_scope", default=None)
+
+
+class ProfilerBusyError(RuntimeError):
+    """別のプロファイリングが実行中の場合の例外"""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    parts = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(parts[-2:])}:{code.co_firstlineno})"
+
+
+def _route_of(scope: Optional[dict]) -> str:
+    if scope is None:
+        return "<no request>"
+    route = scope.get("route")
+    return f"{scope.get('method', '')} {getattr(route, 'path', None) or scope.get('path', '')}".strip()
+
+
+class SamplingProfiler:
+    """
+    シグナルを使ったサンプリングプロファイラ（純Python）
+
+    setitimer で一定間隔ごとにシグナルを発生させ、ハンドラー内で全スレッドの
+    スタックを取得して折り畳み形式（collapsed stacks）で数える。
+    メインスレッドのサンプルは実行中のリクエストのルートに紐付け、
+    それ以外のスレッドはスレッド名で区別する。
+
+    同時に実行できるプロファイリングは1つのみで、時間・スタックの深さ・
+    スタックの種類数・サンプリングに使う時間の割合に上限を設ける。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.stacks: Counter = Counter()
+        self.routes: Counter = Counter()
+        self.samples = 0
+        self.dropped = 0
+        self.handler_seconds = 0.0
+        self.interval = 0.0
+        self.started_at = 0.0
+        self._mode = "cpu"
+        self._thread_names: Dict[int, str] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def _handle_signal(self, signum, frame) -> None:
+        started = time.perf_counter()
+        main_thread_id = threading.main_thread().ident
+        route = _route_of(_current_scope.get())
+
+        for thread_id, thread_frame in sys._current_frames().items():
+            if thread_id == main_thread_id:
+                # ハンドラー自身のフレームではなく、割り込まれたフレームから辿る
+                thread_frame = frame
+                root = route
+            else:
+                root = f"<thread {self._thread_names.get(thread_id, thread_id)}>"
+            if thread_frame is None:
+                continue
+
+            labels: List[str] = []
+            while thread_frame is not None and len(labels) < MAX_STACK_DEPTH:
+                labels.append(_frame_label(thread_frame))
+                thread_frame = thread_frame.f_back
+            key = ";".join([root] + labels[::-1])
+
+            if key in self.stacks or len(self.stacks) < MAX_UNIQUE_STACKS:
+                self.stacks[key] += 1
+            else:
+                self.dropped += 1
+            self.routes[root] += 1
+        self.samples += 1
+
+        self.handler_seconds += time.perf_counter() - started
+        elapsed = time.perf_counter() - self.started_at
+        if elapsed > 0 and self.handler_seconds / elapsed > MAX_OVERHEAD_RATIO:
+            # サンプリングの負荷が大きすぎる場合は間隔を2倍に広げる
+            self.interval *= 2
+            timer, _ = _TIMERS[self._mode]
+            signal.setitimer(timer, self.interval, self.interval)
+
+    def start(self, interval: float, mode: str = "cpu") -> None:
+        """サンプリングを開始する（メインスレッドから呼び出すこと）"""
+        if mode not in _TIMERS:
+            raise ValueError(f"Unknown profiler mode: {mode}")
+        if threading.current_thread() is not threading.main_thread():
+            raise RuntimeError("The sampling profiler must be started from the main thread")
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running")
+
+        self._reset()
+        self._mode = mode
+        self.interval = max(interval, MIN_INTERVAL_SECONDS)
+        self._thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        timer, signum = _TIMERS[mode]
+        self._previous_handler = signal.signal(signum, self._handle_signal)
+        self.started_at = time.perf_counter()
+        signal.setitimer(timer, self.interval, self.interval)
+
+    def stop(self) -> Dict:
+        """サンプリングを停止し、結果を返す"""
+        timer, signum = _TIMERS[self._mode]
+        signal.setitimer(timer, 0, 0)
+        signal.signal(signum, self._previous_handler or signal.SIG_DFL)
+        elapsed = time.perf_counter() - self.started_at
+        self._lock.release()
+        return {
+            "mode": self._mode,
+            "duration_seconds": elapsed,
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "overhead_ratio": self.handler_seconds / elapsed if elapsed else 0.0,
+            "dropped_stacks": self.dropped,
+            "routes": dict(self.routes.most_common()),
+        }
+
+    async def profile(self, seconds: float, interval: float, mode: str = "cpu") -> Dict:
+        """
+        指定秒数だけサンプリングし、結果を返す
+
+        Args:
+            seconds: 計測時間（MAX_DURATION_SECONDS で頭打ち）
+            interval: サンプリング間隔（秒）
+            mode: "cpu"（CPU時間）または "wall"（経過時間）
+        """
+        self.start(interval, mode)
+        try:
+            await asyncio.sleep(min(seconds, MAX_DURATION_SECONDS))
+        finally:
+            summary = self.stop()
+        return summary
+
+    def collapsed(self) -> str:
+        """
+        直近の結果を折り畳み形式で返す
+        各行は「ルート;呼び出し元;...;呼び出し先 サンプル数」（flamegraph.pl / speedscope で読み込める）
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfilerContextMiddleware:
+    """
+    プロファイラがサンプルをルートに紐付けられるよう、処理中のリクエストを記録するASGIミドルウェア
+    ContextVar を1つ設定するだけなので、プロファイリングしていない間の負荷は無視できる
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_scope.reset(token)
+
+
+# アプリケーション全体で共有するインスタンス
+sampling_profiler = SamplingProfiler()
@@ -1,13 +1,19 @@
+import heapq
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict
+from typing import Iterator, List, Optional, Dict
 from fastapi import HTTPException
 import pytz
 from sqlalchemy.orm import Session
 
-from app.models.lesson import Lesson
+from app.models.availability import AvailabilityException, AvailabilityRule
+from app.models.lesson import Lesson, LessonStatus
 from app.models.user import User
 from app.schemas.schedule import ScheduleCreate, ScheduleUpdate
 from app.core.config import settings
+from app.core import availability, rollups
+from app.core.instrumentation import timer
+from app.core.slot_holds import slot_holds
+from app.core.teacher_calendar import SLOT as CALENDAR_SLOT, TEACHER_CALENDAR_ENABLED, teacher_calendar
 
 class ScheduleManager:
     """スケジュール管理を行うクラス"""
@@ -22,13 +28,33 @@ class ScheduleManager:
         start_date: datetime, 
         end_date: datetime
     ) -> List[Dict]:
-        """利用可能な時間枠を取得する"""
+        """
+        利用可能な時間枠を取得する
+        講師に受講可能時間のルールがある場合はルールから、ない場合は営業時間から枠を求める
+        """
+        rules = self._get_availability_rules(teacher_id, start_date, end_date)
+        if rules:
+            return [
+                {
+                    "start_time": availability.restore_timezone(slot_start, start_date),
+                    "end_time": availability.restore_timezone(slot_end, start_date),
+                }
+                for slot_start, slot_end in self.iter_available_slots(teacher_id, start_date, end_date, rules)
+            ]
+
+        if TEACHER_CALENDAR_ENABLED:
+            return self._get_business_hour_slots(teacher_id, start_date, end_date)
+
         # 既存の予約を取得
-        existing_lessons = self.db.query(Lesson).filter(
-            Lesson.teacher_id == teacher_id,
-            Lesson.start_time >= start_date,
-            Lesson.end_time <= end_date
-        ).all()
+        with timer("schedule", "existing_lessons"):
+            existing_lessons = self.db.query(Lesson).filter(
+                Lesson.teacher_id == teacher_id,
+                Lesson.start_time >= start_date,
+                Lesson.end_time <= end_date
+            ).all()
+        # 決済中の仮押さえも予約済みとして扱う
+        with timer("schedule", "slot_holds"):
+            existing_lessons += slot_holds.active_holds(self.db, teacher_id, start_date, end_date)
 
         # 利用可能な時間枠を生成
         available_slots = []
@@ -47,10 +73,144 @@ class ScheduleManager:
 
         return available_slots
 
+    def _get_business_hour_slots(
+        self,
+        teacher_id: int,
+        start_date: datetime,
+        end_date: datetime
+    ) -> List[Dict]:
+        """営業時間内の空き枠を、講師の予定のビットマスクとの AND で求める"""
+        duration = timedelta(minutes=settings.LESSON_DURATION)
+        window_start = availability.to_utc_naive(start_date)
+        with timer("schedule", "teacher_calendar"):
+            origin, busy = teacher_calendar.busy_mask(
+                self.db, teacher_id, window_start, availability.to_utc_naive(end_date) + duration
+            )
+
+        available_slots = []
+        step = timedelta(minutes=settings.SLOT_INTERVAL)
+        current_time = start_date
+        day_end = current_time
+        local_delta = day_origin = None
+        day_busy = 0
+        masks: Dict[timedelta, int] = {}
+        while current_time < end_date:
+            if current_time >= day_end:
+                # 現地時刻との差は1日の中では変わらないため、日ごとに1回だけ求める
+                # （夏時間の切り替わりを含む日は枠ごとに _is_business_hours で判定する）
+                day_end = current_time + timedelta(days=1)
+                local_delta = self._local_delta(current_time)
+                if local_delta != self._local_delta(day_end):
+                    local_delta = None
+                # 期間全体のビットマスクとのANDは桁数に比例するため、日の先頭までずらしておく
+                shift = (window_start + (current_time - start_date) - origin) // CALENDAR_SLOT
+                day_origin, day_busy = origin + shift * CALENDAR_SLOT, busy >> shift
+            if local_delta is not None:
+                hour = (current_time + local_delta).hour
+                in_business_hours = settings.BUSINESS_HOURS_START <= hour < settings.BUSINESS_HOURS_END
+            else:
+                in_business_hours = self._is_business_hours(current_time)
+            if in_business_hours:
+                # 枠のビットは日の先頭からの位置だけで決まるため、同じ位置の枠では使い回す
+                position = window_start + (current_time - start_date) - day_origin
+                mask = masks.get(position)
+                if mask is None:
+                    mask = masks[position] = teacher_calendar.window_mask(
+                        day_origin, day_origin + position, day_origin + position + duration
+                    )
+                if not day_busy & mask:
+                    available_slots.append({
+                        "start_time": current_time,
+                        "end_time": current_time + duration
+                    })
+            current_time += step
+        return available_slots
+
+    def iter_available_slots(
+        self,
+        teacher_id: int,
+        start_date: datetime,
+        end_date: datetime,
+        rules: Optional[List[AvailabilityRule]] = None
+    ) -> Iterator[availability.Interval]:
+        """
+        受講可能時間のルールから、予約済みのレッスン・有効な仮押さえと重ならない枠を開始時刻順に返す
+
+        ルール・例外・レッスンは期間内の分だけ取得し、枠は必要になった時点で生成する。
+        日時はUTCのnaiveなdatetimeで返す。
+        """
+        window_start = availability.to_utc_naive(start_date)
+        window_end = availability.to_utc_naive(end_date)
+        if rules is None:
+            rules = self._get_availability_rules(teacher_id, start_date, end_date)
+
+        with timer("schedule", "availability_exceptions"):
+            exceptions = self.db.query(AvailabilityException).filter(
+                AvailabilityException.teacher_id == teacher_id,
+                AvailabilityException.date >= (window_start - timedelta(days=1)).date(),
+                AvailabilityException.date <= (window_end + timedelta(days=1)).date()
+            ).all()
+        if TEACHER_CALENDAR_ENABLED:
+            # 予約済み・仮押さえの枠を、ビットマスクの連続する区間として取得する
+            with timer("schedule", "teacher_calendar"):
+                busy = list(teacher_calendar.iter_busy_intervals(self.db, teacher_id, window_start, window_end))
+        else:
+            busy = self._iter_busy_intervals(teacher_id, window_start, window_end)
+
+        intervals = availability.iter_available_intervals(
+            rules, exceptions, window_start, window_end, self.timezone
+        )
+        return availability.iter_free_slots(
+            intervals,
+            busy,
+            window_start,
+            window_end,
+            duration=timedelta(minutes=settings.LESSON_DURATION),
+            step=timedelta(minutes=settings.SLOT_INTERVAL)
+        )
+
+    def _iter_busy_intervals(
+        self,
+        teacher_id: int,
+        window_start: datetime,
+        window_end: datetime
+    ) -> Iterator[availability.Interval]:
+        """期間と重なる予約済みのレッスン・有効な仮押さえの時間帯を開始時刻順に返す"""
+        with timer("schedule", "existing_lessons"):
+            lessons = self.db.query(Lesson.start_time, Lesson.end_time).filter(
+                Lesson.teacher_id == teacher_id,
+                Lesson.start_time < window_end,
+                Lesson.end_time > window_start,
+                Lesson.status != LessonStatus.CANCELLED
+            ).order_by(Lesson.start_time).all()
+        with timer("schedule", "slot_holds"):
+            holds = [
+                (hold.start_time, hold.end_time)
+                for hold in slot_holds.active_holds(self.db, teacher_id, window_start, window_end)
+            ]
+        # いずれも開始時刻順のため、併合しても順序は保たれる
+        return heapq.merge(lessons, holds)
+
+    def _get_availability_rules(
+        self,
+        teacher_id: int,
+        start_date: datetime,
+        end_date: datetime
+    ) -> List[AvailabilityRule]:
+        """検索期間と有効期間が重なる受講可能時間のルールを取得する"""
+        first_day = (availability.to_utc_naive(start_date) - timedelta(days=1)).date()
+        last_day = (availability.to_utc_naive(end_date) + timedelta(days=1)).date()
+        with timer("schedule", "availability_rules"):
+            return self.db.query(AvailabilityRule).filter(
+                AvailabilityRule.teacher_id == teacher_id,
+                AvailabilityRule.valid_from <= last_day,
+                (AvailabilityRule.valid_until.is_(None)) | (AvailabilityRule.valid_until >= first_day)
+            ).all()
+
     def create_schedule(self, schedule: ScheduleCreate) -> Lesson:
         """新しいスケジュールを作成する"""
         # 時間枠の重複チェック
-        if self._check_schedule_conflict(schedule.start_time, schedule.end_time):
+        if self._has_conflict(schedule.teacher_id, schedule.start_time, schedule.end_time):
             raise HTTPException(
                 status_code=400,
                 detail="Schedule conflict detected"
@@ -66,6 +226,8 @@ class ScheduleManager:
         )
         
         self.db.add(db_schedule)
+        # ダッシュボード用の集計を同じトランザクションで更新する
+        rollups.record_lesson_booked(self.db, db_schedule.teacher_id, db_schedule.start_time)
         self.db.commit()
         self.db.refresh(db_schedule)
         
@@ -73,7 +235,8 @@ class ScheduleManager:
 
     def update_schedule(self, schedule_id: int, schedule: ScheduleUpdate) -> Lesson:
         """スケジュールを更新する"""
-        db_schedule = self.db.query(Lesson).filter(Lesson.id == schedule_id).first()
+        with timer("schedule", "get_schedule"):
+            db_schedule = self.db.query(Lesson).filter(Lesson.id == schedule_id).first()
         if not db_schedule:
             raise HTTPException(status_code=404, detail="Schedule not found")
 
@@ -95,15 +258,44 @@ class ScheduleManager:
                 detail="Schedule conflict detected"
             )
 
+        # 更新前の講師・日時・状態（集計の更新用）
+        previous_teacher_id = db_schedule.teacher_id
+        previous_start_time = db_schedule.start_time
+        previous_status = db_schedule.status
+
         # スケジュールの更新
         for key, value in schedule.dict(exclude_unset=True).items():
             setattr(db_schedule, key, value)
 
+        self._update_rollups(db_schedule, previous_teacher_id, previous_start_time, previous_status)
         self.db.commit()
         self.db.refresh(db_schedule)
         
         return db_schedule
 
+    def _update_rollups(
+        self,
+        lesson: Lesson,
+        previous_teacher_id: int,
+        previous_start_time: datetime,
+        previous_status
+    ) -> None:
+        """スケジュールの変更をダッシュボード用の集計に反映する"""
+        if (lesson.teacher_id, lesson.start_time.date()) != (previous_teacher_id, previous_start_time.date()):
+            rollups.record_lesson_booked(self.db, previous_teacher_id, previous_start_time, count=-1)
+            rollups.record_lesson_booked(self.db, lesson.teacher_id, lesson.start_time)
+
+        if self._is_cancelled(lesson.status) and not self._is_cancelled(previous_status):
+            rollups.record_lesson_cancelled(self.db, lesson.teacher_id, lesson.start_time)
+
+    @staticmethod
+    def _is_cancelled(status) -> bool:
+        return getattr(status, "value", status) == "cancelled"
+
+    def _local_delta(self, time: datetime) -> timedelta:
+        """_is_business_hours が判定に使う現地時刻と、time の時刻との差"""
+        return time.astimezone(self.timezone).replace(tzinfo=None) - time.replace(tzinfo=None)
+
     def _is_business_hours(self, time: datetime) -> bool:
         """営業時間内かどうかをチェックする"""
         local_time = time.astimezone(self.timezone)
@@ -121,6 +313,22 @@ class ScheduleManager:
                 return True
         return False
 
+    def _has_conflict(self, teacher_id: int, start_time: datetime, end_time: datetime) -> bool:
+        """
+        新規スケジュールの重複チェック
+        ビットマスクを使う場合は講師・日の行をロックして確認するため、同じ講師への同時の予約は
+        コミットまで直列化される（予約済みの枠の更新はフラッシュ時に teacher_calendar が行う）
+        """
+        if TEACHER_CALENDAR_ENABLED:
+            with timer("schedule", "conflict_check"):
+                return not teacher_calendar.lock_and_check(
+                    self.db,
+                    teacher_id,
+                    availability.to_utc_naive(start_time),
+                    availability.to_utc_naive(end_time)
+                )
+        return self._check_schedule_conflict(start_time, end_time)
+
     def _check_schedule_conflict(
         self, 
         start_time: datetime, 
@@ -136,7 +344,8 @@ class ScheduleManager:
         if exclude_id:
             query = query.filter(Lesson.id != exclude_id)
             
-        return query.first() is not None
+        with timer("schedule", "conflict_check"):
+            return query.first() is not None
 
     def _can_update_schedule(self, schedule: Lesson) -> bool:
         """スケジュールが更新可能かチェックする"""
@@ -0,0 +1,473 @@
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event, func, literal_column, table, column, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from app.core.database import engine as app_engine
+from app.models.lesson import Lesson
+from app.models.material import Material, MaterialCategory
+from app.utils.logger import logger
+
+# 英数字は単語単位、日本語（かな・漢字）は文字バイグラムで分割する
+_WORD_PATTERN = re.compile(r"[0-9a-z]+|[\u3040-\u30ff\u3400-\u9fff]+")
+_CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u9fff]")
+
+# SQLite FTS5 の仮想テーブル
+materials_fts = table("materials_fts", column("rowid"), column("rank"))
+lessons_fts = table("lessons_fts", column("rowid"), column("rank"))
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    """
+    検索用に文字列をトークンへ分割する
+
+    Args:
+        value: 対象の文字列
+
+    Returns:
+        List[str]: 小文字化したトークンのリスト
+    """
+    if not value:
+        return []
+
+    tokens = []
+    for word in _WORD_PATTERN.findall(value.lower()):
+        if _CJK_PATTERN.match(word) and len(word) > 1:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def search_text(value: Optional[str]) -> str:
+    """
+    FTS5 に登録する文字列（tokenize の結果を空白で連結したもの）
+
+    unicode61 トークナイザーは日本語の連続した文字列を1語として扱うため、
+    登録前に転置インデックスと同じ文字バイグラムに分割しておき、
+    どちらのバックエンドでも同じ語で一致するようにする。
+    """
+    return " ".join(tokenize(value))
+
+
+def build_match_expression(query: str) -> Optional[str]:
+    """
+    検索クエリを FTS5 の MATCH 式（全トークンのAND）に変換する
+    登録した文字列と同じく tokenize で分割する
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return None
+    return " ".join('"' + token.replace('"', '""') + '"' for token in tokens)
+
+
+def register_sqlite_functions(dbapi_connection) -> None:
+    """FTS5 の同期用トリガーが使う search_text をSQLiteの接続に登録する"""
+    dbapi_connection.create_function("search_text", 1, search_text, deterministic=True)
+
+
+def _register_on_connect(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        register_sqlite_functions(dbapi_connection)
+
+
+def register_engine(engine: Engine) -> None:
+    """
+    エンジンの新しい接続に search_text を登録する
+
+    プロセス内の全エンジンではなく、FTS5 の索引を持つDBに接続するエンジンにのみ登録する。
+    """
+    if not event.contains(engine, "connect", _register_on_connect):
+        event.listen(engine, "connect", _register_on_connect)
+
+
+# アプリケーションのエンジンは、FTS5 のトリガーがあるDBへの最初の書き込みより前に登録しておく
+register_engine(app_engine)
+
+
+class InvertedIndex:
+    """
+    プロセス内の転置インデックス
+
+    FTS5 が利用できないDB向けのフォールバック。
+    教材・レッスン・カテゴリーをそれぞれ別のポスティングリストで管理し、
+    教材はカテゴリー名のトークンでもヒットする。
+    このプロセスでの変更はコミット後に反映し、ロールバックした変更は反映しない。
+    他ワーカーでの変更・Core の更新文による変更は、sync_ttl ごとのDBとの照合
+    （件数・最終更新日時の確認と、更新された行の再読み込み）で反映する。
+    """
+
+    def __init__(self, sync_ttl: float = 30.0):
+        self.sync_ttl = sync_ttl
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._postings: Dict[str, Dict[str, Set[int]]] = {
+            "material": defaultdict(set),
+            "lesson": defaultdict(set),
+            "category": defaultdict(set),
+        }
+        self._documents: Dict[str, Dict[int, Set[str]]] = {
+            "material": {},
+            "lesson": {},
+            "category": {},
+        }
+        self._material_category: Dict[int, int] = {}
+        self._category_members: Dict[int, Set[int]] = defaultdict(set)
+        # 最後に照合した教材・レッスンの (件数, 最終更新日時) と、照合した時刻
+        self._signatures: Dict[str, Tuple] = {}
+        self._checked_at = time.monotonic()
+
+    def add(self, kind: str, doc_id: int, *texts: Optional[str]) -> None:
+        """ドキュメントを登録する（既存の場合は置き換える）"""
+        tokens = {token for value in texts for token in tokenize(value)}
+        with self._lock:
+            self.remove(kind, doc_id)
+            self._documents[kind][doc_id] = tokens
+            postings = self._postings[kind]
+            for token in tokens:
+                postings[token].add(doc_id)
+
+    def remove(self, kind: str, doc_id: int) -> None:
+        """ドキュメントを削除する"""
+        with self._lock:
+            tokens = self._documents[kind].pop(doc_id, None)
+            if not tokens:
+                return
+            postings = self._postings[kind]
+            for token in tokens:
+                ids = postings.get(token)
+                if ids is not None:
+                    ids.discard(doc_id)
+                    if not ids:
+                        del postings[token]
+
+    def add_material(self, material_id: int, title: str, description: Optional[str],
+                     category_id: Optional[int]) -> None:
+        """教材を登録し、カテゴリーとの対応を記録する"""
+        with self._lock:
+            self.remove_material(material_id)
+            self.add("material", material_id, title, description)
+            if category_id is not None:
+                self._material_category[material_id] = category_id
+                self._category_members[category_id].add(material_id)
+
+    def remove_material(self, material_id: int) -> None:
+        """教材を削除する"""
+        with self._lock:
+            self.remove("material", material_id)
+            category_id = self._material_category.pop(material_id, None)
+            if category_id is not None:
+                self._category_members[category_id].discard(material_id)
+
+    def search(self, kind: str, query: str) -> List[int]:
+        """
+        全トークンを含むドキュメントのIDを新しい順（ID降順）に返す
+        """
+        tokens = set(tokenize(query))
+        if not tokens:
+            return []
+
+        with self._lock:
+            candidates = [self._matching_ids(kind, token) for token in tokens]
+            # 小さい集合から積集合を取る
+            candidates.sort(key=len)
+            result = set(candidates[0])
+            for ids in candidates[1:]:
+                result &= ids
+                if not result:
+                    break
+        return sorted(result, reverse=True)
+
+    def _matching_ids(self, kind: str, token: str) -> Set[int]:
+        ids = self._postings[kind].get(token, set())
+        if kind != "material":
+            return ids
+        category_ids = self._postings["category"].get(token)
+        if not category_ids:
+            return ids
+        ids = set(ids)
+        for category_id in category_ids:
+            ids |= self._category_members.get(category_id, set())
+        return ids
+
+    @staticmethod
+    def _signature(db: Session, model) -> Tuple:
+        return tuple(db.query(func.count(model.id), func.max(model.updated_at)).one())
+
+    def rebuild(self, db: Session, batch_size: int = 10000) -> None:
+        """DBの内容からインデックスを再構築する"""
+        with self._lock:
+            self._reset()
+            self._signatures = {
+                "material": self._signature(db, Material),
+                "lesson": self._signature(db, Lesson),
+            }
+            for row in db.query(MaterialCategory.id, MaterialCategory.name).yield_per(batch_size):
+                self.add("category", row.id, row.name)
+            for row in db.query(
+                Material.id, Material.title, Material.description, Material.category_id
+            ).yield_per(batch_size):
+                self.add_material(row.id, row.title, row.description, row.category_id)
+            for row in db.query(Lesson.id, Lesson.title, Lesson.description).yield_per(batch_size):
+                self.add("lesson", row.id, row.title, row.description)
+
+    def ensure_synced(self, db: Session) -> None:
+        """
+        sync_ttl を過ぎていればDBと照合し、他ワーカー・Core の更新文による変更を反映する
+
+        カテゴリーは件数が少ないため全件を読み直す。教材・レッスンは最終更新日時が
+        前回の照合より新しい行を読み込み、それでも件数が合わない場合（他ワーカーでの削除、
+        更新日時を指定した一括登録）は再構築する。
+        """
+        if time.monotonic() - self._checked_at < self.sync_ttl:
+            return
+        with self._lock:
+            if time.monotonic() - self._checked_at < self.sync_ttl:
+                return
+            self._checked_at = time.monotonic()
+
+            categories = dict(db.query(MaterialCategory.id, MaterialCategory.name).all())
+            for category_id in set(self._documents["category"]) - set(categories):
+                self.remove("category", category_id)
+            for category_id, name in categories.items():
+                self.add("category", category_id, name)
+
+            sources = {
+                "material": (Material, (Material.id, Material.title, Material.description, Material.category_id)),
+                "lesson": (Lesson, (Lesson.id, Lesson.title, Lesson.description)),
+            }
+            for kind, (model, columns) in sources.items():
+                signature = self._signature(db, model)
+                previous = self._signatures.get(kind)
+                if signature == previous:
+                    continue
+                if previous is None or previous[1] is None:
+                    self.rebuild(db)
+                    return
+                for row in db.query(*columns).filter(model.updated_at >= previous[1]):
+                    if kind == "material":
+                        self.add_material(row.id, row.title, row.description, row.category_id)
+                    else:
+                        self.add(kind, row.id, row.title, row.description)
+                if len(self._documents[kind]) != signature[0]:
+                    self.rebuild(db)
+                    return
+                self._signatures[kind] = signature
+
+    def _apply(self, changes: List[Tuple]) -> None:
+        for change in changes:
+            if change[0] == "deleted":
+                if change[1] == "material":
+                    self.remove_material(change[2])
+                else:
+                    self.remove(change[1], change[2])
+            elif change[0] == "material":
+                self.add_material(*change[1:])
+            else:
+                self.add(*change)
+
+    def register_listeners(self) -> None:
+        """ORMセッションのコミット時に、変更された教材・レッスン・カテゴリーをインデックスに反映する"""
+        # インデックスごとに別のキーで保持する（同じセッションを複数のインデックスが追従する場合がある）
+        key = ("search_index_changes", id(self))
+
+        def after_flush(session, flush_context):
+            changes: List[Tuple] = session.info.setdefault(key, [])
+            for obj in list(session.new) + list(session.dirty):
+                if isinstance(obj, Material):
+                    changes.append(("material", obj.id, obj.title, obj.description, obj.category_id))
+                elif isinstance(obj, Lesson):
+                    changes.append(("lesson", obj.id, obj.title, obj.description))
+                elif isinstance(obj, MaterialCategory):
+                    changes.append(("category", obj.id, obj.name))
+            for obj in session.deleted:
+                if isinstance(obj, Material):
+                    changes.append(("deleted", "material", obj.id))
+                elif isinstance(obj, Lesson):
+                    changes.append(("deleted", "lesson", obj.id))
+                elif isinstance(obj, MaterialCategory):
+                    changes.append(("deleted", "category", obj.id))
+
+        def after_commit(session):
+            changes = session.info.pop(key, None)
+            if changes:
+                self._apply(changes)
+
+        def after_rollback(session):
+            session.info.pop(key, None)
+
+        event.listen(Session, "after_flush", after_flush)
+        event.listen(Session, "after_commit", after_commit)
+        event.listen(Session, "after_soft_rollback", lambda session, previous: after_rollback(session))
+
+
+# SQLite FTS5 の仮想テーブルと同期用トリガー
+# 列には search_text で分割済みの文字列を登録する（トリガーは作成し直して形式の変更を反映する）
+_FTS5_TRIGGERS = [
+    "materials_fts_ai", "materials_fts_au", "materials_fts_ad",
+    "material_categories_fts_au", "lessons_fts_ai", "lessons_fts_au", "lessons_fts_ad",
+]
+
+_FTS5_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS materials_fts
+    USING fts5(title, description, category, tokenize='unicode61')
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS lessons_fts
+    USING fts5(title, description, tokenize='unicode61')
+    """,
+] + [f"DROP TRIGGER IF EXISTS {name}" for name in _FTS5_TRIGGERS] + [
+    """
+    CREATE TRIGGER materials_fts_ai AFTER INSERT ON materials BEGIN
+        INSERT INTO materials_fts(rowid, title, description, category)
+        VALUES (new.id, search_text(new.title), search_text(new.description),
+                search_text((SELECT name FROM material_categories WHERE id = new.category_id)));
+    END
+    """,
+    """
+    CREATE TRIGGER materials_fts_au
+    AFTER UPDATE OF title, description, category_id ON materials BEGIN
+        DELETE FROM materials_fts WHERE rowid = old.id;
+        INSERT INTO materials_fts(rowid, title, description, category)
+        VALUES (new.id, search_text(new.title), search_text(new.description),
+                search_text((SELECT name FROM material_categories WHERE id = new.category_id)));
+    END
+    """,
+    """
+    CREATE TRIGGER materials_fts_ad AFTER DELETE ON materials BEGIN
+        DELETE FROM materials_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER material_categories_fts_au
+    AFTER UPDATE OF name ON material_categories BEGIN
+        UPDATE materials_fts SET category = search_text(new.name)
+        WHERE rowid IN (SELECT id FROM materials WHERE category_id = new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER lessons_fts_ai AFTER INSERT ON lessons BEGIN
+        INSERT INTO lessons_fts(rowid, title, description)
+        VALUES (new.id, search_text(new.title), search_text(new.description));
+    END
+    """,
+    """
+    CREATE TRIGGER lessons_fts_au AFTER UPDATE OF title, description ON lessons BEGIN
+        DELETE FROM lessons_fts WHERE rowid = old.id;
+        INSERT INTO lessons_fts(rowid, title, description)
+        VALUES (new.id, search_text(new.title), search_text(new.description));
+    END
+    """,
+    """
+    CREATE TRIGGER lessons_fts_ad AFTER DELETE ON lessons BEGIN
+        DELETE FROM lessons_fts WHERE rowid = old.id;
+    END
+    """,
+]
+
+_FTS5_REBUILD = [
+    "DELETE FROM materials_fts",
+    """
+    INSERT INTO materials_fts(rowid, title, description, category)
+    SELECT m.id, search_text(m.title), search_text(m.description), search_text(c.name)
+    FROM materials m LEFT JOIN material_categories c ON c.id = m.category_id
+    """,
+    "DELETE FROM lessons_fts",
+    """
+    INSERT INTO lessons_fts(rowid, title, description)
+    SELECT id, search_text(title), search_text(description) FROM lessons
+    """,
+]
+
+
+def fts5_available(connection: Connection) -> bool:
+    """接続先が FTS5 を利用できる SQLite かどうかを判定する"""
+    if connection.dialect.name != "sqlite":
+        return False
+    try:
+        connection.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS temp._fts5_probe USING fts5(x)"))
+        connection.execute(text("DROP TABLE temp._fts5_probe"))
+        return True
+    except Exception:
+        return False
+
+
+def install_fts5(connection: Connection, rebuild: bool = False) -> None:
+    """
+    FTS5 の仮想テーブルとトリガーを作成する
+
+    分割前の文字列を登録していた以前のトリガーが残っている場合は、索引も作り直す。
+
+    Args:
+        connection: SQLite への接続
+        rebuild: 既存データから索引を作り直す場合True
+    """
+    register_sqlite_functions(connection.connection.dbapi_connection)
+    trigger_sql = connection.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'materials_fts_ai'"
+    )).scalar()
+    if trigger_sql is not None and "search_text" not in trigger_sql:
+        rebuild = True
+    for statement in _FTS5_DDL:
+        connection.execute(text(statement))
+    if rebuild:
+        for statement in _FTS5_REBUILD:
+            connection.execute(text(statement))
+
+
+def fts_match(fts_table, expression: str):
+    """FTS5 の MATCH 条件を生成する"""
+    return literal_column(fts_table.name).op("MATCH")(expression)
+
+
+class SearchIndex:
+    """
+    検索バックエンドの選択を管理するクラス
+
+    SQLite で FTS5 が使える場合はDB内の索引を、それ以外は
+    プロセス内の転置インデックスを使用する。
+    """
+
+    def __init__(self):
+        self.use_fts5: Optional[bool] = None
+        self.inverted_index: Optional[InvertedIndex] = None
+
+    def initialize(self, db: Session, rebuild: bool = False) -> None:
+        """利用するバックエンドを決定し、索引を準備する"""
+        register_engine(db.get_bind())
+        connection = db.connection()
+        self.use_fts5 = fts5_available(connection)
+        if self.use_fts5:
+            install_fts5(connection, rebuild=rebuild)
+            db.commit()
+            logger.info("Search index: using SQLite FTS5")
+        else:
+            self.inverted_index = InvertedIndex()
+            self.inverted_index.rebuild(db)
+            self.inverted_index.register_listeners()
+            logger.info("Search index: using in-process inverted index")
+
+    def ensure_initialized(self, db: Session) -> None:
+        if self.use_fts5 is None:
+            self.initialize(db)
+
+    def material_ids(self, db: Session, query: str) -> List[int]:
+        self.inverted_index.ensure_synced(db)
+        return self.inverted_index.search("material", query)
+
+    def lesson_ids(self, db: Session, query: str) -> List[int]:
+        self.inverted_index.ensure_synced(db)
+        return self.inverted_index.search("lesson", query)
+
+
+# アプリケーション全体で共有する検索インデックス
+search_index = SearchIndex()
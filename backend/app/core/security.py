@@ -1,38 +1,139 @@
+import os
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
+from uuid import uuid4
 import jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, Security
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError
 
+from app.core.instrumentation import timer
+from app.core.token_revocation import revocation_list
+from app.utils.logger import logger
+
 # パスワードハッシュ化の設定
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt のコスト（rounds）は、1回のハッシュ化がこの時間（ミリ秒）に収まる最大値を起動時に計測して決める
+BCRYPT_TARGET_MS = float(os.getenv("BCRYPT_TARGET_MS", "250"))
+BCRYPT_MIN_ROUNDS = int(os.getenv("BCRYPT_MIN_ROUNDS", "10"))
+BCRYPT_MAX_ROUNDS = int(os.getenv("BCRYPT_MAX_ROUNDS", "16"))
+# 指定した場合は計測せずにこの値を使う（複数台で揃えたい場合など）
+BCRYPT_ROUNDS = os.getenv("BCRYPT_ROUNDS")
+
+_bcrypt_rounds: Optional[int] = None
+_bcrypt_lock = threading.Lock()
+
 # JWT設定
 SECRET_KEY = "your-secret-key-here"  # 本番環境では環境変数から取得すべき
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = 7
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+def calibrate_bcrypt_rounds(
+    target_ms: float = BCRYPT_TARGET_MS,
+    min_rounds: int = BCRYPT_MIN_ROUNDS,
+    max_rounds: int = BCRYPT_MAX_ROUNDS,
+    samples: int = 3
+) -> Tuple[int, float]:
+    """
+    1回のハッシュ化が target_ms 以内に収まる最大の rounds を求める
+
+    計測時間を抑えるため低いコストで計測し、rounds が1増えるごとに
+    処理時間が2倍になるものとして見積もる。
+
+    Returns:
+        Tuple[int, float]: (rounds, 見積もった1回あたりの処理時間（ミリ秒）)
+    """
+    probe_rounds = max(4, min(min_rounds, 8))
+    hasher = pwd_context.handler("bcrypt").using(rounds=probe_rounds)
+    elapsed = float("inf")
+    for _ in range(samples):
+        started = time.perf_counter()
+        hasher.hash("calibration-password")
+        elapsed = min(elapsed, (time.perf_counter() - started) * 1000)
+
+    rounds, estimate = probe_rounds, elapsed
+    while rounds < max_rounds and (rounds < min_rounds or estimate * 2 <= target_ms):
+        rounds += 1
+        estimate *= 2
+    return rounds, estimate
+
+def configure_password_hashing(rounds: Optional[int] = None) -> int:
+    """
+    bcrypt のコストを設定する（省略時は BCRYPT_ROUNDS、未指定なら計測して決める）
+
+    設定したコストより低いハッシュは needs_update で検出され、次回のログイン時に作り直される。
+    ワーカーやホストごとに計測結果が異なっても、高いコストのハッシュは作り直さないため、
+    ログインのたびにコストが入れ替わることはない。
+    """
+    global _bcrypt_rounds
+    with _bcrypt_lock:
+        if rounds is None and BCRYPT_ROUNDS:
+            rounds = int(BCRYPT_ROUNDS)
+            logger.info(f"bcrypt rounds={rounds} (BCRYPT_ROUNDS)")
+        elif rounds is None:
+            rounds, estimate = calibrate_bcrypt_rounds()
+            logger.info(
+                f"bcrypt rounds={rounds} calibrated for {BCRYPT_TARGET_MS:.0f} ms target "
+                f"(estimated {estimate:.0f} ms per hash, allowed {BCRYPT_MIN_ROUNDS}-{BCRYPT_MAX_ROUNDS})"
+            )
+        pwd_context.update(
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=pwd_context.handler("bcrypt").max_rounds,
+        )
+        _bcrypt_rounds = rounds
+    return rounds
+
+def get_bcrypt_rounds() -> int:
+    """現在の bcrypt のコスト（未設定の場合はここで設定する）"""
+    if _bcrypt_rounds is None:
+        configure_password_hashing()
+    return _bcrypt_rounds
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     プレーンパスワードとハッシュ化されたパスワードを比較検証する
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    with timer("bcrypt", "verify_password"):
+        return pwd_context.verify(plain_password, hashed_password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    パスワードを検証し、ハッシュのコストが現在の設定より低い場合は作り直す
+
+    Returns:
+        Tuple[bool, Optional[str]]: (検証結果, 作り直したハッシュ（不要な場合は None）)
+    """
+    get_bcrypt_rounds()
+    if not verify_password(plain_password, hashed_password):
+        return False, None
+    if pwd_context.needs_update(hashed_password):
+        with timer("bcrypt", "rehash_password"):
+            return True, pwd_context.hash(plain_password)
+    return True, None
 
 def get_password_hash(password: str) -> str:
     """
     パスワードをハッシュ化する
     """
-    return pwd_context.hash(password)
+    get_bcrypt_rounds()
+    with timer("bcrypt", "hash_password"):
+        return pwd_context.hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     JWTアクセストークンを生成する
+    失効させられるよう、トークンごとに一意な jti を付与する
     """
     to_encode = data.copy()
+    to_encode.setdefault("jti", str(uuid4()))
     
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -43,9 +144,22 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Security(oauth2_scheme)):
+def create_refresh_token(subject: str, jti: str, family_id: str, expires_at: datetime) -> str:
     """
-    現在のユーザーを取得する
+    JWTリフレッシュトークンを生成する
+    """
+    return jwt.encode(
+        {"sub": subject, "jti": jti, "fam": family_id, "type": "refresh", "exp": expires_at},
+        SECRET_KEY,
+        algorithm=ALGORITHM,
+    )
+
+def decode_access_token(token: str) -> dict:
+    """
+    アクセストークンを検証し、ペイロードを返す
+
+    トークン自身の jti と、発行元のログイン（fam）のいずれかが失効していれば拒否する。
+    失効の判定はワーカー内のフィルタで行い、フィルタに含まれる場合のみDBで確認する。
     """
     credentials_exception = HTTPException(
         status_code=401,
@@ -55,11 +169,19 @@ async def get_current_user(token: str = Security(oauth2_scheme)):
     
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
+    except (JWTError, jwt.PyJWTError):
+        raise credentials_exception
+    if payload.get("sub") is None or payload.get("type") == "refresh":
         raise credentials_exception
+    if revocation_list.is_revoked(payload.get("jti"), payload.get("fam")):
+        raise credentials_exception
+    return payload
+
+async def get_current_user(token: str = Security(oauth2_scheme)):
+    """
+    現在のユーザーを取得する
+    """
+    user_id: str = decode_access_token(token)["sub"]
     
     # ここでユーザーをデータベースから取得する処理を追加
     # この例では省略していますが、実際の実装では必要です
@@ -0,0 +1,502 @@
+import heapq
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, delete, or_, update
+from sqlalchemy.orm import Session
+
+from app.core.currency import split_minor_units, to_major_units
+from app.core.teacher_calendar import teacher_calendar
+from app.core import rollups
+from app.models.lesson import Lesson, LessonStatus, LessonType
+from app.models.payment import Payment, PaymentMethod, PaymentStatus
+from app.models.slot_hold import SlotHold
+from app.models.user import User
+from app.utils.logger import logger
+
+# 仮押さえの有効期間（秒）。決済の完了までに要する時間より長くすること
+SLOT_HOLD_TTL_SECONDS = int(os.getenv("SLOT_HOLD_TTL_SECONDS", "600"))
+# 期限切れの行を1回の DELETE 文で削除する最大件数
+SWEEP_BATCH_SIZE = 500
+# 決済に関連付けた仮押さえを、失効後も残しておく期間（秒）
+# 決済の完了が失効後になった場合も、Webhook で仮押さえを取り出して予約・返金の判定を行えるようにする
+SLOT_HOLD_PAYMENT_GRACE_SECONDS = int(os.getenv("SLOT_HOLD_PAYMENT_GRACE_SECONDS", "86400"))
+# 個人レッスンの料金（1時間あたり、最小通貨単位）と通貨
+# 仮押さえの決済金額はクライアントの指定ではなく、この料金から算出する
+PRIVATE_LESSON_HOURLY_RATE = int(os.getenv("PRIVATE_LESSON_HOURLY_RATE", "3000"))
+PRIVATE_LESSON_CURRENCY = os.getenv("PRIVATE_LESSON_CURRENCY", "usd").lower()
+
+
+def hold_price(start_time: datetime, end_time: datetime) -> int:
+    """仮押さえした枠の料金（最小通貨単位）"""
+    minutes = (end_time - start_time).total_seconds() / 60
+    return int(round(PRIVATE_LESSON_HOURLY_RATE * minutes / 60))
+
+
+class SlotHoldManager:
+    """
+    決済完了までの時間枠の仮押さえ（TTL付き）を管理する
+
+    仮押さえの有効性は slot_holds.expires_at で判定するため、期限切れの行が残っていても
+    空き枠の検索・重複チェックには影響しない。期限切れの行の削除は、このワーカーが作成した
+    仮押さえの期限をヒープで管理し、最も早い期限まで待機するスレッドが行う（DBを定期的に
+    検索しない）。他のワーカーが停止して残った行は、起動時の一括削除で取り除く。
+    決済に関連付けた仮押さえは、Webhook の遅延に備えて失効後も payment_grace の間は削除しない。
+    仮押さえの作成・削除は、講師の予定のビットマスク（teacher_calendar）にも反映する。
+    """
+
+    def __init__(self, ttl_seconds: int = SLOT_HOLD_TTL_SECONDS,
+                 payment_grace_seconds: int = SLOT_HOLD_PAYMENT_GRACE_SECONDS):
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.payment_grace = timedelta(seconds=payment_grace_seconds)
+        # (期限, 仮押さえID) のヒープと、仮押さえIDごとの現在の期限
+        # 解放・延長された仮押さえのヒープ上の要素は、取り出した時点で読み捨てる
+        self._heap: List[Tuple[datetime, str]] = []
+        self._expires: Dict[str, datetime] = {}
+        # 期限が到来し、行を削除中の仮押さえの件数
+        self._sweeping = 0
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._session_factory: Optional[Callable[[], Session]] = None
+        self.expired = 0
+
+    # --- 仮押さえの操作 ----------------------------------------------------
+
+    def place(
+        self,
+        db: Session,
+        teacher_id: int,
+        start_time: datetime,
+        end_time: datetime,
+        user_id: str,
+        ttl: Optional[timedelta] = None
+    ) -> SlotHold:
+        """
+        時間枠を仮押さえする
+
+        予約済みのレッスン・他のユーザーの有効な仮押さえと重なる場合は409を返す。
+        同じユーザーが同じ時間枠を仮押さえし直した場合は期限を延長する。
+        講師の行をロックして重複チェックと登録を直列化し、ロックはコミットで解放する。
+        """
+        now = datetime.utcnow()
+        expires_at = now + (ttl or self.ttl)
+
+        # 同じ講師への仮押さえ・予約の確認をワーカー間で直列化する
+        db.query(User.id).filter(User.id == teacher_id).with_for_update().first()
+
+        booked = db.query(Lesson.id).filter(
+            Lesson.teacher_id == teacher_id,
+            Lesson.start_time < end_time,
+            Lesson.end_time > start_time,
+            Lesson.status != LessonStatus.CANCELLED
+        ).first()
+        holds = db.query(SlotHold).filter(
+            SlotHold.teacher_id == teacher_id,
+            SlotHold.start_time < end_time,
+            SlotHold.end_time > start_time,
+            SlotHold.expires_at > now
+        ).all()
+        own = next((hold for hold in holds if hold.user_id == user_id
+                    and (hold.start_time, hold.end_time) == (start_time, end_time)), None)
+        if booked or any(hold is not own for hold in holds):
+            db.rollback()
+            raise HTTPException(status_code=409, detail="Selected time slot is not available")
+
+        if own is not None:
+            own.expires_at = expires_at
+            hold = own
+        else:
+            hold = SlotHold(
+                teacher_id=teacher_id,
+                user_id=user_id,
+                start_time=start_time,
+                end_time=end_time,
+                expires_at=expires_at
+            )
+            db.add(hold)
+        teacher_calendar.hold(db, teacher_id, start_time, end_time, expires_at)
+        # コミット後に読むと再読み込みが発生し、失効・削除済みの場合は失敗するため先に取得する
+        db.flush()
+        hold_id = hold.id
+        db.commit()
+        self._schedule(hold_id, expires_at)
+        return hold
+
+    def release(self, db: Session, hold_id: str, user_id: Optional[str] = None) -> bool:
+        """
+        仮押さえを解放する（チェックアウトの中止時）
+
+        Returns:
+            bool: 解放した場合True
+        """
+        query = db.query(SlotHold).filter(SlotHold.id == hold_id)
+        if user_id is not None:
+            query = query.filter(SlotHold.user_id == user_id)
+        hold = query.first()
+        if hold is None:
+            return False
+        db.delete(hold)
+        db.flush()
+        teacher_calendar.release_hold(db, hold.teacher_id, hold.start_time, hold.end_time)
+        db.commit()
+        self._forget([hold_id])
+        return True
+
+    def quote(self, db: Session, hold_ids: Sequence[str], user_id: str) -> Tuple[int, str]:
+        """
+        ユーザーの有効な仮押さえの決済金額（最小通貨単位）と通貨を返す
+        他のユーザーの仮押さえや期限切れの仮押さえが含まれる場合は409を返す
+        """
+        holds = db.query(SlotHold.start_time, SlotHold.end_time).filter(
+            SlotHold.id.in_(list(hold_ids)),
+            SlotHold.user_id == user_id,
+            SlotHold.expires_at > datetime.utcnow()
+        ).all()
+        if len(holds) != len(set(hold_ids)):
+            raise HTTPException(status_code=409, detail="Slot hold not found or expired")
+        return sum(hold_price(start_time, end_time) for start_time, end_time in holds), PRIVATE_LESSON_CURRENCY
+
+    def attach_payment(
+        self,
+        db: Session,
+        hold_ids: Sequence[str],
+        payment_intent_id: str,
+        user_id: str
+    ) -> int:
+        """
+        仮押さえに決済（PaymentIntent）を関連付ける。コミットは呼び出し側で行う
+        他のユーザーの仮押さえは関連付けない（決済の失敗による解放に使われないようにする）
+
+        Returns:
+            int: 関連付けた有効な仮押さえの件数
+        """
+        return db.execute(
+            update(SlotHold)
+            .where(
+                SlotHold.id.in_(list(hold_ids)),
+                SlotHold.user_id == user_id,
+                SlotHold.expires_at > datetime.utcnow()
+            )
+            .values(payment_intent_id=payment_intent_id)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
+    def consume(self, db: Session, payment_intent_id: str) -> List[SlotHold]:
+        """
+        決済の完了時に、関連付けられた仮押さえを取り出して削除する
+        予約の作成は呼び出し側で同じトランザクション内に行い、コミットする（confirm を参照）
+        行をロックするため、同じ決済のWebhookが同時に届いても仮押さえを取り出すのは一方だけになる
+
+        Returns:
+            List[SlotHold]: 取り出した仮押さえ（決済の完了が遅れて期限切れになったものも含む）
+        """
+        holds = db.query(SlotHold).filter(
+            SlotHold.payment_intent_id == payment_intent_id
+        ).order_by(SlotHold.start_time).with_for_update().all()
+        for hold in holds:
+            db.delete(hold)
+        db.flush()
+        for hold in holds:
+            teacher_calendar.release_hold(db, hold.teacher_id, hold.start_time, hold.end_time)
+        self._forget([hold.id for hold in holds])
+        return holds
+
+    def confirm(
+        self,
+        db: Session,
+        payment_intent_id: str,
+        amount: int,
+        currency: str,
+        hold_ids: Sequence[str] = (),
+        user_id: Optional[str] = None
+    ) -> List[Lesson]:
+        """
+        決済の完了時に、関連付けられた仮押さえをレッスンの予約に置き換える。コミットは呼び出し側で行う
+
+        仮押さえの削除と、レッスン・受講者の決済記録の作成を同じトランザクションで行うため、
+        時間枠が空いた状態がコミットされることはない。
+        決済金額・通貨が仮押さえの料金と一致しない場合、または決済時に指定した仮押さえが
+        既に削除されている場合は予約せず、決済を返金対象（REFUND_REQUIRED）として記録する。
+        期限切れの仮押さえは枠が空いていれば予約し、他の予約・仮押さえに使われていれば
+        その枠の分を返金対象とする。金額は最小通貨単位で枠の料金に比例して分け、端数は最後の枠に含める。
+
+        Args:
+            db: DBセッション
+            payment_intent_id: 完了した決済（PaymentIntent）のID
+            amount: 決済金額（最小通貨単位）
+            currency: 通貨コード
+            hold_ids: 決済の作成時に関連付けた仮押さえのID（PaymentIntent の metadata）
+            user_id: 決済したユーザーのID（仮押さえが残っていない場合の返金記録に使う）
+
+        Returns:
+            List[Lesson]: 作成したレッスン（関連付けられた仮押さえがない場合は空）
+        """
+        holds = self.consume(db, payment_intent_id)
+        missing = set(hold_ids) - {hold.id for hold in holds}
+        if not holds and not missing:
+            return []
+        now = datetime.utcnow()
+        prices = [hold_price(hold.start_time, hold.end_time) for hold in holds]
+        if missing or currency.lower() != PRIVATE_LESSON_CURRENCY or amount != sum(prices):
+            logger.warning(
+                f"Payment {payment_intent_id} does not match its slot holds "
+                f"(paid {amount} {currency}, expected {sum(prices)} {PRIVATE_LESSON_CURRENCY} "
+                f"for {len(holds)} holds, {len(missing)} missing); marked for refund"
+            )
+            payer = holds[0].user_id if holds else user_id
+            if payer is not None:
+                db.add(self._payment(payer, payment_intent_id, amount, currency, now,
+                                     status=PaymentStatus.REFUND_REQUIRED))
+            db.flush()
+            return []
+
+        lessons = []
+        for hold, price in zip(holds, split_minor_units(amount, prices)):
+            if not self._is_free(db, hold, now):
+                logger.warning(
+                    f"Slot {hold.start_time} of teacher {hold.teacher_id} was taken before payment "
+                    f"{payment_intent_id} completed; marked for refund"
+                )
+                db.add(self._payment(hold.user_id, payment_intent_id, price, currency, now,
+                                     status=PaymentStatus.REFUND_REQUIRED))
+                continue
+            lesson = Lesson(
+                title="Private lesson",
+                start_time=hold.start_time,
+                end_time=hold.end_time,
+                lesson_type=LessonType.INDIVIDUAL,
+                status=LessonStatus.SCHEDULED,
+                max_participants=1,
+                current_participants=1,
+                price=to_major_units(price, currency),
+                currency=currency.upper(),
+                teacher_id=hold.teacher_id,
+                is_active=True
+            )
+            db.add(lesson)
+            db.add(self._payment(hold.user_id, payment_intent_id, price, currency, now, lesson=lesson))
+            rollups.record_lesson_booked(db, hold.teacher_id, hold.start_time)
+            lessons.append(lesson)
+        db.flush()
+        return lessons
+
+    @staticmethod
+    def _payment(
+        user_id: str,
+        payment_intent_id: str,
+        amount: int,
+        currency: str,
+        now: datetime,
+        status: PaymentStatus = PaymentStatus.COMPLETED,
+        lesson: Optional[Lesson] = None
+    ) -> Payment:
+        return Payment(
+            user_id=user_id,
+            lesson=lesson,
+            amount=to_major_units(amount, currency),
+            currency=currency.upper(),
+            payment_method=PaymentMethod.CREDIT_CARD,
+            status=status,
+            stripe_payment_intent_id=payment_intent_id,
+            completed_at=now
+        )
+
+    @staticmethod
+    def _is_free(db: Session, hold: SlotHold, now: datetime) -> bool:
+        """
+        取り出した仮押さえの枠が、予約済みのレッスン・他の有効な仮押さえと重ならないか
+        期限切れの仮押さえの枠は他のユーザーが仮押さえ・予約している場合があるため、
+        place と同じく講師の行をロックして確認する
+        """
+        db.query(User.id).filter(User.id == hold.teacher_id).with_for_update().first()
+        booked = db.query(Lesson.id).filter(
+            Lesson.teacher_id == hold.teacher_id,
+            Lesson.start_time < hold.end_time,
+            Lesson.end_time > hold.start_time,
+            Lesson.status != LessonStatus.CANCELLED
+        ).first()
+        held = db.query(SlotHold.id).filter(
+            SlotHold.teacher_id == hold.teacher_id,
+            SlotHold.start_time < hold.end_time,
+            SlotHold.end_time > hold.start_time,
+            SlotHold.expires_at > now
+        ).first()
+        return booked is None and held is None
+
+    def release_for_payment(self, db: Session, payment_intent_id: str) -> int:
+        """決済の失敗時に、関連付けられた仮押さえを解放する"""
+        holds = db.query(SlotHold).filter(SlotHold.payment_intent_id == payment_intent_id).all()
+        if holds:
+            for hold in holds:
+                db.delete(hold)
+            db.flush()
+            for hold in holds:
+                teacher_calendar.release_hold(db, hold.teacher_id, hold.start_time, hold.end_time)
+            db.commit()
+            self._forget([hold.id for hold in holds])
+        return len(holds)
+
+    def active_holds(
+        self,
+        db: Session,
+        teacher_id: int,
+        start_time: datetime,
+        end_time: datetime
+    ) -> List[SlotHold]:
+        """期間と重なる有効な仮押さえを開始時刻順に返す"""
+        return db.query(SlotHold).filter(
+            SlotHold.teacher_id == teacher_id,
+            SlotHold.start_time < end_time,
+            SlotHold.end_time > start_time,
+            SlotHold.expires_at > datetime.utcnow()
+        ).order_by(SlotHold.start_time).all()
+
+    # --- 期限切れの仮押さえの削除 ------------------------------------------
+
+    def _schedule(self, hold_id: str, expires_at: datetime) -> None:
+        with self._condition:
+            self._expires[hold_id] = expires_at
+            heapq.heappush(self._heap, (expires_at, hold_id))
+            # 最も早い期限が変わった場合のみ待機中のスレッドを起こす
+            if self._heap[0][1] == hold_id:
+                self._condition.notify()
+
+    def _forget(self, hold_ids: Sequence[str]) -> None:
+        with self._condition:
+            for hold_id in hold_ids:
+                self._expires.pop(hold_id, None)
+
+    def pending(self) -> int:
+        """このワーカーが期限を管理している仮押さえの件数（削除中のものを含む）"""
+        with self._condition:
+            return len(self._expires) + self._sweeping
+
+    def _pop_due(self, now: datetime) -> List[str]:
+        due = []
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now:
+                expires_at, hold_id = heapq.heappop(self._heap)
+                if self._expires.get(hold_id) == expires_at:
+                    del self._expires[hold_id]
+                    due.append(hold_id)
+            self._sweeping += len(due)
+        return due
+
+    def _expired(self, now: datetime):
+        """削除してよい失効済みの仮押さえの条件（決済に関連付けたものは payment_grace を過ぎてから）"""
+        return and_(
+            SlotHold.expires_at <= now,
+            or_(SlotHold.payment_intent_id.is_(None), SlotHold.expires_at <= now - self.payment_grace)
+        )
+
+    def sweep(self, now: Optional[datetime] = None) -> int:
+        """
+        期限の到来した仮押さえの行を削除する
+        決済に関連付けた仮押さえは削除せず、payment_grace の経過後に改めて削除する
+
+        Returns:
+            int: 削除した件数
+        """
+        now = now or datetime.utcnow()
+        due = self._pop_due(now)
+        try:
+            return self._delete_due(due, now)
+        finally:
+            with self._condition:
+                self._sweeping -= len(due)
+
+    def _delete_due(self, due: List[str], now: datetime) -> int:
+        if not due or self._session_factory is None:
+            return 0
+        removed = 0
+        db = self._session_factory()
+        try:
+            for offset in range(0, len(due), SWEEP_BATCH_SIZE):
+                # 他のワーカーで延長された仮押さえは削除しない
+                batch = SlotHold.id.in_(due[offset:offset + SWEEP_BATCH_SIZE])
+                expired = (batch, self._expired(now))
+                for hold_id, expires_at in db.query(SlotHold.id, SlotHold.expires_at).filter(
+                    batch, SlotHold.expires_at <= now, SlotHold.payment_intent_id.isnot(None),
+                    SlotHold.expires_at > now - self.payment_grace
+                ):
+                    self._schedule(hold_id, expires_at + self.payment_grace)
+                intervals = db.query(SlotHold.teacher_id, SlotHold.start_time, SlotHold.end_time).filter(
+                    *expired
+                ).all()
+                removed += db.execute(
+                    delete(SlotHold).where(*expired).execution_options(synchronize_session=False)
+                ).rowcount
+                for teacher_id, start_time, end_time in intervals:
+                    teacher_calendar.release_hold(db, teacher_id, start_time, end_time)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            # 行が残っても期限切れとして扱われるため、次回の起動時の一括削除に任せる
+            logger.error(f"Failed to delete expired slot holds: {str(e)}")
+        finally:
+            db.close()
+        self.expired += removed
+        return removed
+
+    def purge_expired(self, db: Session) -> int:
+        """
+        期限切れの行を一括で削除する（起動時に、停止したワーカーが残した行を取り除く）
+        決済に関連付けた仮押さえは payment_grace を過ぎたものだけ削除する
+        """
+        removed = db.execute(
+            delete(SlotHold).where(self._expired(datetime.utcnow()))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        return removed
+
+    def start(self, session_factory: Callable[[], Session]) -> None:
+        """期限切れの行を削除し、期限の到来を待つバックグラウンドスレッドを開始する"""
+        self._session_factory = session_factory
+        db = session_factory()
+        try:
+            removed = self.purge_expired(db)
+        finally:
+            db.close()
+        if removed:
+            logger.info(f"Removed {removed} expired slot holds")
+
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="slot-hold-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """バックグラウンドスレッドを停止する"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if self._stopping:
+                    return
+                timeout = None
+                if self._heap:
+                    timeout = max(0.0, (self._heap[0][0] - datetime.utcnow()).total_seconds())
+                if timeout is None or timeout > 0:
+                    self._condition.wait(timeout)
+                if self._stopping:
+                    return
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Slot hold sweeper failed: {str(e)}")
+
+
+# アプリケーション全体で共有するインスタンス
+slot_holds = SlotHoldManager()
@@ -0,0 +1,504 @@
+"""
+講師の予定のビットマスク表現
+
+講師ごと・日（UTC）ごとに、SLOT_INTERVAL 分の枠を1ビットとする固定長のビットマスクを
+teacher_calendar_days に保存し、メモリ上にもキャッシュする。
+予約はビットの OR、仮押さえはその日の有効な仮押さえからの再計算、キャンセル・解放は AND-NOT で反映し、
+「この枠は空いているか」「期間内の空き枠」はビット演算で求める。
+
+枠の単位は SLOT_INTERVAL 分のため、レッスンは前後の枠境界まで広げて扱う
+（枠と少しでも重なれば使用中）。日時は全てUTCのnaiveなdatetimeで扱う。
+
+キャッシュはプロセス内に保持し、このプロセスでの変更はコミット時に破棄する。
+他のワーカーでの変更は最大 CALENDAR_CACHE_SECONDS 秒遅れて反映されるため、
+予約時の重複チェック（lock_and_check）はキャッシュを使わず、行をロックして行う。
+"""
+import os
+import threading
+import time as monotonic_time
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.availability import Interval
+from app.core.config import settings
+from app.models.lesson import Lesson, LessonStatus
+from app.models.slot_hold import SlotHold
+from app.models.teacher_calendar import TeacherCalendarDay
+
+# 空き枠の検索・重複チェックにビットマスクを使うか（無効でもビットマスクの更新は行う）
+TEACHER_CALENDAR_ENABLED = os.getenv("TEACHER_CALENDAR_ENABLED", "true").lower() in ("1", "true", "yes")
+# キャッシュの有効期間（秒）と最大件数（講師・日の組の数）
+CALENDAR_CACHE_SECONDS = float(os.getenv("CALENDAR_CACHE_SECONDS", "5"))
+CALENDAR_CACHE_SIZE = int(os.getenv("CALENDAR_CACHE_SIZE", "20000"))
+
+SLOT = timedelta(minutes=settings.SLOT_INTERVAL)
+SLOTS_PER_DAY = 24 * 60 // settings.SLOT_INTERVAL
+MASK_BYTES = (SLOTS_PER_DAY + 7) // 8
+ONE_DAY = timedelta(days=1)
+
+_INSERT_IGNORE_DIALECTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, time())
+
+
+def _ceil_slots(value: timedelta) -> int:
+    return -(-value // SLOT)
+
+
+def _range_mask(first: int, last: int) -> int:
+    """ビット first から last の手前までを立てたマスク"""
+    return ((1 << (last - first)) - 1) << first if last > first else 0
+
+
+def slot_masks(start: datetime, end: datetime) -> Dict[date, int]:
+    """[start, end) と重なる枠のビットを日ごとに返す"""
+    masks = {}
+    day = start.date()
+    while _midnight(day) < end:
+        origin = _midnight(day)
+        first = max(0, (start - origin) // SLOT)
+        last = min(SLOTS_PER_DAY, _ceil_slots(end - origin))
+        if last > first:
+            masks[day] = _range_mask(first, last)
+        day += ONE_DAY
+    return masks
+
+
+def encode(mask: int) -> bytes:
+    return mask.to_bytes(MASK_BYTES, "little")
+
+
+def decode(value: Optional[bytes]) -> int:
+    return int.from_bytes(value, "little") if value else 0
+
+
+def _is_cancelled(status) -> bool:
+    return getattr(status, "value", status) == "cancelled"
+
+
+class CalendarDay:
+    """1日分のビットマスク（キャッシュの要素）"""
+
+    __slots__ = ("booked", "held", "held_until", "loaded_at")
+
+    def __init__(self, booked: int, held: int, held_until: Optional[datetime]):
+        self.booked = booked
+        self.held = held
+        self.held_until = held_until
+        self.loaded_at = monotonic_time.monotonic()
+
+    def busy(self, now: datetime) -> int:
+        """予約済みの枠と有効な仮押さえの枠"""
+        if self.held_until is not None and self.held_until > now:
+            return self.booked | self.held
+        return self.booked
+
+
+class TeacherCalendar:
+    """講師の予定のビットマスクの読み込み・更新・キャッシュ"""
+
+    def __init__(self, cache_seconds: float = CALENDAR_CACHE_SECONDS, cache_size: int = CALENDAR_CACHE_SIZE):
+        self.cache_seconds = cache_seconds
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[int, date], CalendarDay]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # --- 読み込み ----------------------------------------------------------
+
+    def days(self, db: Session, teacher_id: int, first_day: date, last_day: date) -> List[CalendarDay]:
+        """first_day から last_day までの日ごとのビットマスク（キャッシュになければ読み込む）"""
+        days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+        found: Dict[date, CalendarDay] = {}
+        expired_before = monotonic_time.monotonic() - self.cache_seconds
+        with self._lock:
+            for day in days:
+                entry = self._cache.get((teacher_id, day))
+                if entry is not None and entry.loaded_at > expired_before:
+                    self._cache.move_to_end((teacher_id, day))
+                    found[day] = entry
+        self.hits += len(found)
+
+        missing = [day for day in days if day not in found]
+        if missing:
+            self.misses += len(missing)
+            loaded = self._load(db, teacher_id, missing[0], missing[-1])
+            with self._lock:
+                for day, entry in loaded.items():
+                    self._cache[(teacher_id, day)] = entry
+                    self._cache.move_to_end((teacher_id, day))
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            found.update(loaded)
+        return [found[day] for day in days]
+
+    def _load(self, db: Session, teacher_id: int, first_day: date, last_day: date) -> Dict[date, CalendarDay]:
+        """
+        保存済みの行を読み込み、行のない日はレッスン・仮押さえから求める
+        （行は予約などで最初に更新する時点で作成するため、読み込みでは書き込まない）
+        """
+        loaded = {
+            day: CalendarDay(decode(booked), decode(held), held_until)
+            for day, booked, held, held_until in db.query(
+                TeacherCalendarDay.day, TeacherCalendarDay.booked,
+                TeacherCalendarDay.held, TeacherCalendarDay.held_until
+            ).filter(
+                TeacherCalendarDay.teacher_id == teacher_id,
+                TeacherCalendarDay.day >= first_day,
+                TeacherCalendarDay.day <= last_day
+            )
+        }
+        missing = [
+            first_day + timedelta(days=offset)
+            for offset in range((last_day - first_day).days + 1)
+            if first_day + timedelta(days=offset) not in loaded
+        ]
+        if missing:
+            loaded.update(self._build(db, teacher_id, missing[0], missing[-1], set(missing)))
+        return loaded
+
+    def _build(
+        self,
+        db: Session,
+        teacher_id: int,
+        first_day: date,
+        last_day: date,
+        days: Set[date]
+    ) -> Dict[date, CalendarDay]:
+        """レッスン・有効な仮押さえからビットマスクを求める"""
+        window_start, window_end = _midnight(first_day), _midnight(last_day) + ONE_DAY
+        booked = dict.fromkeys(days, 0)
+        held = dict.fromkeys(days, 0)
+        held_until: Dict[date, datetime] = {}
+
+        lessons = db.query(Lesson.start_time, Lesson.end_time).filter(
+            Lesson.teacher_id == teacher_id,
+            Lesson.start_time < window_end,
+            Lesson.end_time > window_start,
+            Lesson.status != LessonStatus.CANCELLED
+        )
+        for start, end in lessons:
+            for day, mask in slot_masks(start, end).items():
+                if day in booked:
+                    booked[day] |= mask
+
+        holds = db.query(SlotHold.start_time, SlotHold.end_time, SlotHold.expires_at).filter(
+            SlotHold.teacher_id == teacher_id,
+            SlotHold.start_time < window_end,
+            SlotHold.end_time > window_start,
+            SlotHold.expires_at > datetime.utcnow()
+        )
+        for start, end, expires_at in holds:
+            for day, mask in slot_masks(start, end).items():
+                if day in held:
+                    held[day] |= mask
+                    held_until[day] = max(expires_at, held_until.get(day, expires_at))
+
+        return {day: CalendarDay(booked[day], held[day], held_until.get(day)) for day in days}
+
+    def busy_mask(
+        self,
+        db: Session,
+        teacher_id: int,
+        start: datetime,
+        end: datetime,
+        now: Optional[datetime] = None
+    ) -> Tuple[datetime, int]:
+        """
+        期間を含む日の使用中の枠を1つの整数に連結して返す
+
+        Returns:
+            Tuple[datetime, int]: ビット0の枠の開始日時（最初の日の0:00）とビットマスク
+        """
+        now = now or datetime.utcnow()
+        first_day, last_day = start.date(), (end - timedelta(microseconds=1)).date()
+        mask = 0
+        for offset, day in enumerate(self.days(db, teacher_id, first_day, last_day)):
+            mask |= day.busy(now) << (offset * SLOTS_PER_DAY)
+        return _midnight(first_day), mask
+
+    @staticmethod
+    def window_mask(origin: datetime, start: datetime, end: datetime) -> int:
+        """busy_mask の origin を基準とした、[start, end) と重なる枠のビット"""
+        return _range_mask(max(0, (start - origin) // SLOT), _ceil_slots(end - origin))
+
+    def is_free(
+        self,
+        db: Session,
+        teacher_id: int,
+        start: datetime,
+        end: datetime,
+        now: Optional[datetime] = None
+    ) -> bool:
+        """[start, end) と重なる枠が全て空いているか"""
+        origin, busy = self.busy_mask(db, teacher_id, start, end, now)
+        return busy & self.window_mask(origin, start, end) == 0
+
+    def iter_busy_intervals(
+        self,
+        db: Session,
+        teacher_id: int,
+        start: datetime,
+        end: datetime,
+        now: Optional[datetime] = None
+    ) -> Iterator[Interval]:
+        """使用中の枠が連続する区間を開始時刻順に返す（availability.iter_free_slots の busy に渡せる）"""
+        origin, busy = self.busy_mask(db, teacher_id, start, end, now)
+        offset = 0
+        while busy:
+            low = (busy & -busy).bit_length() - 1
+            run = busy >> low
+            # 最下位から連続する1の個数
+            length = ((run + 1) & ~run).bit_length() - 1
+            yield origin + SLOT * (offset + low), origin + SLOT * (offset + low + length)
+            busy = run >> length
+            offset += low + length
+
+    def iter_free_starts(
+        self,
+        db: Session,
+        teacher_id: int,
+        start: datetime,
+        end: datetime,
+        duration: timedelta,
+        now: Optional[datetime] = None
+    ) -> Iterator[datetime]:
+        """
+        期間内に収まり、duration の間に使用中の枠がない開始日時（枠の境界）を順に返す
+        k 枠分ずらしたマスクの OR で「開始できない枠」を求めるため、処理量は枠数によらない
+        """
+        origin, busy = self.busy_mask(db, teacher_id, start, end, now)
+        width = _ceil_slots(duration)
+        blocked = busy
+        for shift in range(1, width):
+            blocked |= busy >> shift
+        first = _ceil_slots(start - origin)
+        last = (end - origin) // SLOT - width + 1
+        free = ~blocked & _range_mask(first, last)
+        while free:
+            low = free & -free
+            yield origin + SLOT * (low.bit_length() - 1)
+            free ^= low
+
+    # --- 更新 --------------------------------------------------------------
+
+    def _ensure_rows(self, db: Session, teacher_id: int, days: List[date]) -> None:
+        """行のない日の行を、レッスン・仮押さえから求めて作成する（コミットは呼び出し側で行う）"""
+        existing = {
+            day for (day,) in db.query(TeacherCalendarDay.day).filter(
+                TeacherCalendarDay.teacher_id == teacher_id,
+                TeacherCalendarDay.day.in_(days)
+            )
+        }
+        missing = sorted(set(days) - existing)
+        if not missing:
+            return
+        built = self._build(db, teacher_id, missing[0], missing[-1], set(missing))
+        rows = [
+            {"teacher_id": teacher_id, "day": day, "booked": encode(entry.booked),
+             "held": encode(entry.held), "held_until": entry.held_until}
+            for day, entry in built.items()
+        ]
+        upsert = _INSERT_IGNORE_DIALECTS.get(db.get_bind().dialect.name)
+        if upsert is not None:
+            db.execute(upsert(TeacherCalendarDay).values(rows).on_conflict_do_nothing())
+            return
+        try:
+            with db.begin_nested():
+                db.execute(insert(TeacherCalendarDay), rows)
+        except IntegrityError:
+            # 他のトランザクションが同時に作成した場合は、その行を使う
+            pass
+
+    def _lock_days(self, db: Session, teacher_id: int, days: List[date]) -> Dict[date, Tuple]:
+        """日ごとの行を作成・ロックし、(booked, held, held_until) を返す"""
+        self._ensure_rows(db, teacher_id, days)
+        rows = db.execute(
+            select(TeacherCalendarDay.day, TeacherCalendarDay.booked,
+                   TeacherCalendarDay.held, TeacherCalendarDay.held_until)
+            .where(TeacherCalendarDay.teacher_id == teacher_id, TeacherCalendarDay.day.in_(days))
+            .order_by(TeacherCalendarDay.day)
+            .with_for_update()
+        )
+        return {day: (decode(booked), decode(held), held_until) for day, booked, held, held_until in rows}
+
+    def lock_and_check(self, db: Session, teacher_id: int, start: datetime, end: datetime) -> bool:
+        """
+        予約前の重複チェック。対象の日の行をロックし、予約済みの枠と重ならないかを返す
+        ロックはトランザクションの終了まで保持されるため、同じ講師・日への予約は直列化される
+        """
+        masks = slot_masks(start, end)
+        rows = self._lock_days(db, teacher_id, sorted(masks))
+        return all(rows[day][0] & mask == 0 for day, mask in masks.items())
+
+    def _write(self, db: Session, teacher_id: int, day: date, **values) -> None:
+        db.execute(
+            update(TeacherCalendarDay)
+            .where(TeacherCalendarDay.teacher_id == teacher_id, TeacherCalendarDay.day == day)
+            .values(updated_at=datetime.utcnow(), **values)
+            .execution_options(synchronize_session=False)
+        )
+        db.info.setdefault("calendar_changes", set()).add((teacher_id, day))
+
+    def book(self, db: Session, teacher_id: int, start: datetime, end: datetime) -> None:
+        """予約済みの枠を追加する（OR）"""
+        masks = slot_masks(start, end)
+        rows = self._lock_days(db, teacher_id, sorted(masks))
+        for day, mask in masks.items():
+            self._write(db, teacher_id, day, booked=encode(rows[day][0] | mask))
+
+    def unbook(self, db: Session, teacher_id: int, start: datetime, end: datetime) -> None:
+        """
+        予約済みの枠を取り除く（AND-NOT）
+
+        枠の境界をまたいで同じ枠を使う他のレッスンのビットは、DB上のレッスンから戻す。
+        レッスンのキャンセル・削除をDBに反映した後（フラッシュ後）に呼び出すこと。
+        """
+        masks = slot_masks(start, end)
+        days = sorted(masks)
+        rows = self._lock_days(db, teacher_id, days)
+        span_start, span_end = _midnight(days[0]), _midnight(days[-1]) + ONE_DAY
+        remaining = dict.fromkeys(days, 0)
+        others = db.query(Lesson.start_time, Lesson.end_time).filter(
+            Lesson.teacher_id == teacher_id,
+            Lesson.start_time < min(end + SLOT, span_end),
+            Lesson.end_time > max(start - SLOT, span_start),
+            Lesson.status != LessonStatus.CANCELLED
+        )
+        for other_start, other_end in others:
+            for day, mask in slot_masks(other_start, other_end).items():
+                if day in remaining:
+                    remaining[day] |= mask
+        for day, mask in masks.items():
+            booked = (rows[day][0] & ~mask) | (remaining[day] & mask)
+            self._write(db, teacher_id, day, booked=encode(booked))
+
+    def hold(self, db: Session, teacher_id: int, start: datetime, end: datetime, expires_at: datetime) -> None:
+        """
+        仮押さえの枠を追加する
+
+        保存済みの held には、release_hold を経ずに削除された失効済みの仮押さえ
+        （purge_expired・sweep の失敗時）のビットが残っている場合があるため、
+        ORせずにその日の有効な仮押さえから求め直す。
+        """
+        masks = slot_masks(start, end)
+        days = sorted(masks)
+        self._lock_days(db, teacher_id, days)
+        span_start, span_end = _midnight(days[0]), _midnight(days[-1]) + ONE_DAY
+        held = dict(masks)
+        held_until = dict.fromkeys(days, expires_at)
+        live = db.query(SlotHold.start_time, SlotHold.end_time, SlotHold.expires_at).filter(
+            SlotHold.teacher_id == teacher_id,
+            SlotHold.start_time < span_end,
+            SlotHold.end_time > span_start,
+            SlotHold.expires_at > datetime.utcnow()
+        )
+        for other_start, other_end, other_expires_at in live:
+            for day, mask in slot_masks(other_start, other_end).items():
+                if day in held:
+                    held[day] |= mask
+                    held_until[day] = max(held_until[day], other_expires_at)
+        for day in days:
+            self._write(db, teacher_id, day, held=encode(held[day]), held_until=held_until[day])
+
+    def release_hold(self, db: Session, teacher_id: int, start: datetime, end: datetime) -> None:
+        """
+        仮押さえの枠を取り除く（AND-NOT）。仮押さえの行を削除した後に呼び出すこと
+        同じ枠を使う他の有効な仮押さえのビットはDBから戻す
+        """
+        masks = slot_masks(start, end)
+        rows = self._lock_days(db, teacher_id, sorted(masks))
+        remaining = dict.fromkeys(masks, 0)
+        others = db.query(SlotHold.start_time, SlotHold.end_time).filter(
+            SlotHold.teacher_id == teacher_id,
+            SlotHold.start_time < end + SLOT,
+            SlotHold.end_time > start - SLOT,
+            SlotHold.expires_at > datetime.utcnow()
+        )
+        for other_start, other_end in others:
+            for day, mask in slot_masks(other_start, other_end).items():
+                if day in remaining:
+                    remaining[day] |= mask
+        for day, mask in masks.items():
+            held = (rows[day][1] & ~mask) | (remaining[day] & mask)
+            self._write(db, teacher_id, day, held=encode(held))
+
+    def invalidate(self, keys) -> None:
+        """キャッシュから (講師ID, 日) の要素を取り除く"""
+        with self._lock:
+            for key in keys:
+                self._cache.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    # --- レッスンの変更の反映 ----------------------------------------------
+
+    def track_session_changes(self) -> None:
+        """
+        ORMセッションのフラッシュ時に、レッスンの作成・日時変更・キャンセル・削除をビットマスクに反映する
+        ScheduleManager.create_schedule / update_schedule、Lesson.cancel 後のコミットなどが対象
+        """
+        def after_flush(session, flush_context):
+            added, removed = [], []
+            for lesson in session.new:
+                if isinstance(lesson, Lesson) and not _is_cancelled(lesson.status):
+                    added.append((lesson.teacher_id, lesson.start_time, lesson.end_time))
+            for lesson in session.deleted:
+                if isinstance(lesson, Lesson) and not _is_cancelled(lesson.status):
+                    removed.append((lesson.teacher_id, lesson.start_time, lesson.end_time))
+            for lesson in session.dirty:
+                if not isinstance(lesson, Lesson):
+                    continue
+                state = inspect(lesson)
+                history = {
+                    name: state.attrs[name].history
+                    for name in ("teacher_id", "start_time", "end_time", "status")
+                }
+                if not any(h.has_changes() for h in history.values()):
+                    continue
+                previous = {
+                    name: (h.deleted[0] if h.deleted else getattr(lesson, name))
+                    for name, h in history.items()
+                }
+                if not _is_cancelled(previous["status"]):
+                    removed.append((previous["teacher_id"], previous["start_time"], previous["end_time"]))
+                if not _is_cancelled(lesson.status):
+                    added.append((lesson.teacher_id, lesson.start_time, lesson.end_time))
+
+            for teacher_id, start, end in removed:
+                if None not in (teacher_id, start, end):
+                    self.unbook(session, teacher_id, start, end)
+            for teacher_id, start, end in added:
+                if None not in (teacher_id, start, end):
+                    self.book(session, teacher_id, start, end)
+
+        def after_commit(session):
+            changed = session.info.pop("calendar_changes", None)
+            if changed:
+                self.invalidate(changed)
+
+        def after_rollback(session):
+            session.info.pop("calendar_changes", None)
+
+        event.listen(Session, "after_flush", after_flush)
+        event.listen(Session, "after_commit", after_commit)
+        event.listen(Session, "after_soft_rollback", lambda session, previous: after_rollback(session))
+
+
+# アプリケーション全体で共有するインスタンス
+teacher_calendar = TeacherCalendar()
+teacher_calendar.track_session_changes()
@@ -0,0 +1,245 @@
+import hashlib
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import insert, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.auth_token import RevokedToken
+from app.utils.logger import logger
+
+# 他のワーカーで失効したトークンを取り込む間隔（秒）
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "5"))
+# 期限切れの行を除いてフィルタを作り直す間隔（秒）
+REVOCATION_REBUILD_SECONDS = float(os.getenv("REVOCATION_REBUILD_SECONDS", "3600"))
+REVOCATION_FILTER_CAPACITY = int(os.getenv("REVOCATION_FILTER_CAPACITY", "100000"))
+REVOCATION_FILTER_ERROR_RATE = float(os.getenv("REVOCATION_FILTER_ERROR_RATE", "0.001"))
+# 採番順とコミット順が前後した行を取りこぼさないよう、直近この秒数の行は毎回読み直す
+REVOCATION_SYNC_LOOKBACK_SECONDS = 60
+
+_INSERT_IGNORE_DIALECTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+class BloomFilter:
+    """
+    文字列キーのブルームフィルタ
+
+    含まれないキーは必ず False を返し、含まれるキーは必ず True を返す。
+    含まれないキーが True になる確率（偽陽性率）は、capacity 件まで error_rate 以下に保たれる。
+    削除はできないため、期限切れのキーは作り直しで取り除く。
+    """
+
+    def __init__(self, capacity: int, error_rate: float = REVOCATION_FILTER_ERROR_RATE):
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        # 128ビットのハッシュを2つに分け、ダブルハッシュ法で hash_count 個の位置を求める
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hash_count)]
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.bits)
+
+
+class RevocationList:
+    """
+    失効したトークンの一覧をワーカー内のブルームフィルタで保持する
+
+    revoked_tokens テーブルから id の昇順に差分だけを定期的に読み込むため、
+    トークンの検証（get_current_user）では通常DBへ問い合わせない。
+    フィルタに含まれると判定された場合のみ、偽陽性を除くためにDBで確認する。
+    他のワーカーで失効したトークンが反映されるまでには最大 sync_interval 秒かかる。
+    """
+
+    def __init__(self, sync_interval: float = REVOCATION_SYNC_SECONDS,
+                 rebuild_interval: float = REVOCATION_REBUILD_SECONDS,
+                 capacity: int = REVOCATION_FILTER_CAPACITY):
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self.capacity = capacity
+        self._filter = BloomFilter(capacity)
+        self._cursor = 0
+        self._rebuilt_at = 0.0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._session_factory: Optional[Callable[[], Session]] = None
+        # 判定の内訳（フィルタに含まれた回数・DBで失効を確認した回数）
+        self.filter_hits = 0
+        self.confirmed = 0
+
+    @property
+    def bloom_filter(self) -> BloomFilter:
+        return self._filter
+
+    @property
+    def false_positives(self) -> int:
+        return self.filter_hits - self.confirmed
+
+    def load(self, db: Session) -> int:
+        """
+        有効期限内の失効トークンからフィルタを作り直す
+
+        Returns:
+            int: 読み込んだ件数
+        """
+        with self._lock:
+            rows = (
+                db.query(RevokedToken.id, RevokedToken.jti)
+                .filter(RevokedToken.expires_at > datetime.utcnow())
+                .all()
+            )
+            cursor = db.query(RevokedToken.id).order_by(RevokedToken.id.desc()).limit(1).scalar() or 0
+            bloom = BloomFilter(max(self.capacity, len(rows) * 2))
+            for _, jti in rows:
+                bloom.add(jti)
+            self._filter, self._cursor = bloom, cursor
+            self._rebuilt_at = time.monotonic()
+        return len(rows)
+
+    def sync(self, db: Session) -> int:
+        """
+        前回以降に追加された失効トークンをフィルタへ追加する
+
+        Returns:
+            int: 追加した件数
+        """
+        if time.monotonic() - self._rebuilt_at >= self.rebuild_interval:
+            return self.load(db)
+        lookback = datetime.utcnow() - timedelta(seconds=REVOCATION_SYNC_LOOKBACK_SECONDS)
+        added = 0
+        with self._lock:
+            rows = (
+                db.query(RevokedToken.id, RevokedToken.jti)
+                .filter(or_(RevokedToken.id > self._cursor, RevokedToken.revoked_at >= lookback))
+                .order_by(RevokedToken.id)
+                .all()
+            )
+            for row_id, jti in rows:
+                if jti not in self._filter:
+                    self._filter.add(jti)
+                    added += 1
+                self._cursor = max(self._cursor, row_id)
+            overfull = self._filter.count > self._filter.capacity
+        if overfull:
+            # 容量を超えると偽陽性率が上がるため、大きいフィルタで作り直す
+            self.load(db)
+        return added
+
+    def is_revoked(self, *keys: Optional[str]) -> bool:
+        """
+        いずれかのキー（jti・family_id）が失効していれば True を返す
+        """
+        keys = [key for key in keys if key]
+        bloom = self._filter
+        candidates = [key for key in keys if key in bloom]
+        if not candidates:
+            return False
+
+        self.filter_hits += 1
+        if self._session_factory is None:
+            # DBで確認できない場合は失効として扱う
+            self.confirmed += 1
+            return True
+        db = self._session_factory()
+        try:
+            revoked = (
+                db.query(RevokedToken.id).filter(RevokedToken.jti.in_(candidates)).first() is not None
+            )
+        finally:
+            db.close()
+        if revoked:
+            self.confirmed += 1
+        return revoked
+
+    def revoke(self, db: Session, jti: str, expires_at: datetime, reason: Optional[str] = None) -> None:
+        """
+        トークン（またはファミリー）を失効させる
+        このワーカーのフィルタには即座に追加する。コミットは呼び出し側で行う
+
+        同じトークンの失効（リフレッシュトークンの再利用検知やログアウト）が同時に行われても、
+        INSERT ... ON CONFLICT DO NOTHING により一方の行だけが残り、エラーにはならない。
+        """
+        values = {"jti": jti, "expires_at": expires_at, "reason": reason}
+        upsert = _INSERT_IGNORE_DIALECTS.get(db.get_bind().dialect.name)
+        if upsert is not None:
+            db.execute(upsert(RevokedToken).values(values).on_conflict_do_nothing())
+        else:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(RevokedToken).values(values))
+            except IntegrityError:
+                # 他のトランザクションが同時に失効させた場合は、その行を使う
+                pass
+        with self._lock:
+            self._filter.add(jti)
+
+    def revoke_many(self, db: Session, jtis: Iterable[str], expires_at: datetime,
+                    reason: Optional[str] = None) -> None:
+        for jti in jtis:
+            self.revoke(db, jti, expires_at, reason)
+
+    def start(self, session_factory: Callable[[], Session]) -> None:
+        """フィルタを読み込み、差分同期用のバックグラウンドスレッドを開始する"""
+        self._session_factory = session_factory
+        db = session_factory()
+        try:
+            count = self.load(db)
+        finally:
+            db.close()
+        logger.info(f"Loaded {count} revoked tokens ({self._filter.nbytes} bytes filter)")
+
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="token-revocation", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """バックグラウンドスレッドを停止する"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.sync_interval):
+            db = self._session_factory()
+            try:
+                self.sync(db)
+            except Exception as e:
+                # 同期に失敗しても、次回は同じカーソルから再試行する
+                logger.error(f"Failed to sync revoked tokens: {str(e)}")
+            finally:
+                db.close()
+
+
+# アプリケーション全体で共有する失効リスト
+revocation_list = RevocationList()
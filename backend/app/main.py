@@ -0,0 +1,52 @@
+"""
+アプリケーションのエントリーポイント
+
+モジュールのインポート時にはアプリケーションを生成せず、create_app() を呼び出した
+時点でルーターを読み込む。外部サービスのクライアント（メール・Google Drive・Stripe）は
+各ルーターの依存関係として最初のリクエスト時に生成される。
+
+起動方法:
+    uvicorn --factory app.main:create_app
+"""
+from fastapi import FastAPI
+
+from app.core import DEFAULT_CONFIG, get_version
+from app.core.instrumentation import InstrumentationMiddleware, metrics_endpoint
+from app.core.sampling_profiler import PROFILER_ENABLED, ProfilerContextMiddleware
+
+
+def create_app() -> FastAPI:
+    """
+    FastAPIアプリケーションを生成する
+
+    Returns:
+        FastAPI: ルーターを登録したアプリケーション
+    """
+    from app.api.admin import router as admin_router
+    from app.api.auth.router import router as auth_router
+    from app.api.lessons.router import router as lessons_router
+    from app.api.materials.router import router as materials_router
+    from app.api.payment.router import router as payment_router
+
+    app = FastAPI(title=DEFAULT_CONFIG["APP_NAME"], version=get_version())
+    for router in (auth_router, lessons_router, materials_router, payment_router, admin_router):
+        app.include_router(router)
+
+    # リクエスト・サブシステム別の処理時間の計測（INSTRUMENTATION=off で無効化）
+    app.add_middleware(InstrumentationMiddleware)
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+
+    # サンプリングプロファイラのルート別集計用（PROFILER_ENABLED の場合のみ）
+    if PROFILER_ENABLED:
+        app.add_middleware(ProfilerContextMiddleware)
+
+    # リクエストごとのSQL発行数の監視（開発環境で QUERY_COUNT_ENABLED を指定した場合のみ）
+    from app.core.query_counter import (
+        QUERY_COUNT_ENABLED,
+        QUERY_COUNT_MAX,
+        QUERY_COUNT_STRICT,
+        QueryCountMiddleware,
+    )
+    if QUERY_COUNT_ENABLED:
+        app.add_middleware(QueryCountMiddleware, max_queries=QUERY_COUNT_MAX, strict=QUERY_COUNT_STRICT)
+    return app
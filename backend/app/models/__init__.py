@@ -7,6 +7,19 @@ from .invitation import Invitation
 from .lesson_booking import LessonBooking
 from .material_access import MaterialAccess
 from .payment_history import PaymentHistory
+from .rollup import (
+    DailyTeacherBookings,
+    DailyRevenue,
+    DailyActiveUsers,
+    UserDailyActivity,
+    RecordedPaymentEvent,
+)
+from .auth_token import RefreshToken, RevokedToken
+from .availability import AvailabilityRule, AvailabilityException
+from .slot_hold import SlotHold
+from .lesson_notification import LessonNotification
+from .teacher_calendar import TeacherCalendarDay
+from .collection_version import CollectionVersion
 
 # Define all models that should be available when importing from models
 __all__ = [
@@ -18,4 +31,17 @@ __all__ = [
     'LessonBooking',
     'MaterialAccess',
     'PaymentHistory',
+    'DailyTeacherBookings',
+    'DailyRevenue',
+    'DailyActiveUsers',
+    'UserDailyActivity',
+    'RecordedPaymentEvent',
+    'RefreshToken',
+    'RevokedToken',
+    'AvailabilityRule',
+    'AvailabilityException',
+    'SlotHold',
+    'LessonNotification',
+    'TeacherCalendarDay',
+    'CollectionVersion',
 ]
\ No newline at end of file
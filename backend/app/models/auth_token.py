@@ -0,0 +1,46 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from datetime import datetime
+
+from .base import Base
+
+class RefreshToken(Base):
+    """リフレッシュトークンモデル
+
+    リフレッシュトークンは使用するたびに新しいトークンへ置き換える（ローテーション）。
+    同じログインから発行されたトークンは family_id を共有し、使用済みのトークンが
+    再度提示された場合（漏えいの疑い）はファミリー全体を失効させる。
+    """
+    __tablename__ = "refresh_tokens"
+    __table_args__ = (
+        # ユーザーの有効なセッションを列挙する際の索引
+        Index("ix_refresh_tokens_user_expires", "user_id", "expires_at"),
+    )
+
+    jti = Column(String(36), primary_key=True)
+    family_id = Column(String(36), nullable=False, index=True)
+    user_id = Column(String(36), ForeignKey("users.id"), nullable=False)
+    issued_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+    used_at = Column(DateTime, nullable=True)
+    replaced_by = Column(String(36), nullable=True)
+
+    def __repr__(self):
+        return f"<RefreshToken(jti={self.jti}, family_id={self.family_id}, user_id={self.user_id})>"
+
+
+class RevokedToken(Base):
+    """失効したトークン（jti）またはトークンファミリー（family_id）の一覧
+
+    各ワーカーは id の昇順に差分を読み込み、メモリ上のフィルタへ追加する。
+    expires_at を過ぎた行はトークン自体が期限切れのため判定に不要となる。
+    """
+    __tablename__ = "revoked_tokens"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    jti = Column(String(36), nullable=False, unique=True, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    reason = Column(String(32), nullable=True)
+
+    def __repr__(self):
+        return f"<RevokedToken(jti={self.jti}, reason={self.reason})>"
@@ -0,0 +1,76 @@
+from sqlalchemy import Column, Integer, String, Date, Time, DateTime, Boolean, ForeignKey, Index
+from datetime import date, datetime, timedelta
+
+from .base import Base
+
+# weekdays のビット（月曜日 = 1 << 0 … 日曜日 = 1 << 6）
+MONDAY, TUESDAY, WEDNESDAY, THURSDAY, FRIDAY, SATURDAY, SUNDAY = (1 << i for i in range(7))
+WEEKDAYS = MONDAY | TUESDAY | WEDNESDAY | THURSDAY | FRIDAY
+EVERY_DAY = WEEKDAYS | SATURDAY | SUNDAY
+
+
+class AvailabilityRule(Base):
+    """講師の受講可能時間の繰り返しルール
+
+    RRULE の FREQ=WEEKLY;INTERVAL=interval_weeks;BYDAY=weekdays;UNTIL=valid_until に相当する。
+    時刻は講師のタイムゾーン（timezone、未設定の場合はアプリケーションの既定）の現地時刻で、
+    end_time が start_time 以前の場合は翌日の end_time までとみなす。
+    ルールは行として展開せず、空き枠の検索時に必要な期間だけ展開する。
+    """
+    __tablename__ = "availability_rules"
+    __table_args__ = (
+        # 講師ごとに、検索期間と重なるルールを求める際の索引
+        Index("ix_availability_rules_teacher_valid_from", "teacher_id", "valid_from"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    teacher_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    weekdays = Column(Integer, nullable=False, default=WEEKDAYS)
+    start_time = Column(Time, nullable=False)
+    end_time = Column(Time, nullable=False)
+    interval_weeks = Column(Integer, nullable=False, default=1)
+    valid_from = Column(Date, nullable=False, default=date.today)
+    valid_until = Column(Date, nullable=True)
+    timezone = Column(String(64), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def occurs_on(self, day: date) -> bool:
+        """指定した日にルールが適用されるかどうか"""
+        if day < self.valid_from or (self.valid_until is not None and day > self.valid_until):
+            return False
+        if not self.weekdays & (1 << day.weekday()):
+            return False
+        # valid_from を含む週を起点に interval_weeks 週ごと
+        anchor = self.valid_from - timedelta(days=self.valid_from.weekday())
+        return ((day - anchor).days // 7) % max(1, self.interval_weeks or 1) == 0
+
+    def __repr__(self):
+        return (f"<AvailabilityRule(teacher_id={self.teacher_id}, weekdays={self.weekdays:07b}, "
+                f"{self.start_time}-{self.end_time})>")
+
+
+class AvailabilityException(Base):
+    """繰り返しルールに対する日単位の例外
+
+    is_available が False の場合は指定した時間帯（時刻が未設定なら終日）を受講不可とし、
+    True の場合はルールにない時間帯を受講可能として追加する。
+    日付・時刻は講師のルールと同じタイムゾーンの現地時刻とする。
+    """
+    __tablename__ = "availability_exceptions"
+    __table_args__ = (
+        Index("ix_availability_exceptions_teacher_date", "teacher_id", "date"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    teacher_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    date = Column(Date, nullable=False)
+    start_time = Column(Time, nullable=True)
+    end_time = Column(Time, nullable=True)
+    is_available = Column(Boolean, nullable=False, default=False)
+    reason = Column(String(255), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        kind = "available" if self.is_available else "unavailable"
+        return f"<AvailabilityException(teacher_id={self.teacher_id}, date={self.date}, {kind})>"
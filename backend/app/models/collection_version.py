@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String
+
+from .base import Base
+
+class CollectionVersion(Base):
+    """コレクション（lessons / materials）ごとのバージョン
+
+    一覧レスポンスの ETag / Last-Modified の算出に使用する。変更と同じトランザクションで
+    進めるため、全ワーカーでコミット済みの変更だけが反映される。
+    """
+    __tablename__ = "collection_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    # 最終更新日時（UNIX時刻の秒。Last-Modified が同じ秒内の更新でも進むよう整数で保持する）
+    modified_at = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<CollectionVersion(name={self.name}, version={self.version})>"
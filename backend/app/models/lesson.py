@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Boolean, Float
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Boolean, Float, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from enum import Enum as PyEnum
@@ -22,6 +22,12 @@ class Lesson(Base):
     レッスンの基本情報、スケジュール、状態などを管理する
     """
     __tablename__ = "lessons"
+    __table_args__ = (
+        # 講師ごとの期間検索用
+        Index("ix_lessons_teacher_id_start_time", "teacher_id", "start_time"),
+        # 開始日時の範囲検索用（通知の送信対象の検出など）
+        Index("ix_lessons_start_time", "start_time"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=False)
@@ -35,6 +41,7 @@ class Lesson(Base):
     # レッスン情報
     lesson_type = Column(Enum(LessonType), nullable=False, default=LessonType.INDIVIDUAL)
     status = Column(Enum(LessonStatus), nullable=False, default=LessonStatus.PENDING)
+    level = Column(String(20), nullable=True, index=True)  # beginner, intermediate, advanced
     max_participants = Column(Integer, default=1)
     current_participants = Column(Integer, default=0)
     
@@ -58,8 +65,10 @@ class Lesson(Base):
 
     # リレーションシップ
     teacher = relationship("User", back_populates="lessons")
-    material = relationship("Material", back_populates="lessons")
-    bookings = relationship("Booking", back_populates="lesson")
+    # Material 側は lesson_materials（中間テーブル）経由で関連付けるため、逆方向の属性は持たない
+    material = relationship("Material")
+    lesson_materials = relationship("LessonMaterial", back_populates="lesson")
+    payments = relationship("Payment", back_populates="lesson")
 
     def __init__(self, **kwargs):
         super(Lesson, self).__init__(**kwargs)
@@ -75,7 +84,10 @@ class Lesson(Base):
         )
 
     def add_participant(self) -> bool:
-        """参加者を追加する"""
+        """
+        参加者を追加する
+        読み込んだ値を加算するため、同時に予約される場合は lesson_service.reserve_seats を使う
+        """
         if not self.is_available():
             return False
         self.current_participants += 1
@@ -0,0 +1,51 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Index, UniqueConstraint
+from datetime import datetime
+from enum import Enum as PyEnum
+
+from .base import Base
+
+class NotificationKind(PyEnum):
+    LESSON_REMINDER = "lesson_reminder"    # レッスン前日のリマインダー
+    CHANGE_DEADLINE = "change_deadline"    # 予約変更期限（3日前）の事前通知
+
+class NotificationStatus(PyEnum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    SKIPPED = "skipped"    # 送信前にレッスンがキャンセル・日時変更された
+
+class LessonNotification(Base):
+    """
+    レッスンに関する時刻指定のメール通知（送信待ちの行が送信キューを兼ねる）
+
+    レッスン・受講者・種類・開始日時ごとに1行のみ作成するため、複数のワーカーや再起動後に
+    同じレッスンを再度検出しても通知は重複しない。送信するワーカーは claim_token と
+    lease_expires_at を設定して行を確保し、期限までに完了しなかった行は他のワーカーが再確保する。
+    """
+    __tablename__ = "lesson_notifications"
+    __table_args__ = (
+        UniqueConstraint("lesson_id", "user_id", "kind", "lesson_start",
+                         name="uq_lesson_notifications_lesson_user_kind_start"),
+        # 送信期限の到来した行の検索用
+        Index("ix_lesson_notifications_status_due_at", "status", "due_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    lesson_id = Column(Integer, ForeignKey("lessons.id"), nullable=False)
+    user_id = Column(String(36), ForeignKey("users.id"), nullable=False)
+    kind = Column(Enum(NotificationKind), nullable=False)
+    # 通知を作成した時点のレッスン開始日時（送信時に変わっていれば送信しない）
+    lesson_start = Column(DateTime, nullable=False)
+    due_at = Column(DateTime, nullable=False)
+    status = Column(Enum(NotificationStatus), nullable=False, default=NotificationStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    claim_token = Column(String(36), nullable=True, index=True)
+    # 確保の期限。送信に失敗した行では再送信を開始できる日時を表す
+    lease_expires_at = Column(DateTime, nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+    last_error = Column(String(500), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return (f"<LessonNotification(id={self.id}, lesson_id={self.lesson_id}, "
+                f"kind={self.kind}, due_at={self.due_at}, status={self.status})>")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index, func
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .base import Base
@@ -9,6 +9,13 @@ class Material(Base):
     教材情報を管理するためのSQLAlchemyモデル
     """
     __tablename__ = "materials"
+    __table_args__ = (
+        # 一覧表示のキーセットページネーション (created_at, id) 用の複合インデックス
+        Index("ix_materials_created_at_id", "created_at", "id"),
+    )
+
+    # 一覧表示で説明文を切り詰める文字数
+    LIST_DESCRIPTION_LENGTH = 200
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=False)
@@ -63,9 +70,25 @@ class Material(Base):
             'category_id': self.category_id
         }
 
+    @classmethod
+    def list_columns(cls):
+        """一覧表示用に取得するカラム（MaterialList.tsxで表示する項目のみ）"""
+        return (
+            cls.id,
+            cls.title,
+            func.substr(cls.description, 1, cls.LIST_DESCRIPTION_LENGTH).label("description"),
+            cls.file_type,
+            cls.content_url,
+            cls.created_at,
+        )
+
     def increment_download_count(self):
-        """ダウンロード数をインクリメント"""
-        self.download_count += 1
+        """
+        ダウンロード数をインクリメント
+        読み取った値ではなくDB上の値に加算するため、同時更新でも失われない
+        （通常のダウンロードでは core.download_counter による集約反映を使用する）
+        """
+        self.download_count = Material.download_count + 1
 
     def __repr__(self):
         return f"<Material(id={self.id}, title='{self.title}')>"
@@ -0,0 +1,38 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, CheckConstraint
+from sqlalchemy.orm import relationship
+from datetime import datetime
+
+from .base import Base
+
+class MaterialAccess(Base):
+    """教材アクセス権限モデル
+
+    ユーザーに対して教材単位、またはカテゴリー単位で閲覧権限を付与する。
+    is_public の教材は権限がなくても閲覧できる。
+    """
+    __tablename__ = "material_access"
+    __table_args__ = (
+        CheckConstraint(
+            "(material_id IS NULL) <> (category_id IS NULL)",
+            name="ck_material_access_target"
+        ),
+        # ユーザーの閲覧可能教材を求める際の索引
+        Index("ix_material_access_user_material", "user_id", "material_id", unique=True),
+        Index("ix_material_access_user_category", "user_id", "category_id", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(String(36), ForeignKey("users.id"), nullable=False)
+    material_id = Column(Integer, ForeignKey("materials.id"), nullable=True)
+    category_id = Column(Integer, ForeignKey("material_categories.id"), nullable=True)
+
+    granted_by = Column(String(36), ForeignKey("users.id"), nullable=True)
+    granted_at = Column(DateTime, default=datetime.utcnow)
+
+    # 関連付け
+    material = relationship("Material")
+    category = relationship("MaterialCategory")
+
+    def __repr__(self):
+        target = f"material_id={self.material_id}" if self.material_id else f"category_id={self.category_id}"
+        return f"<MaterialAccess(user_id={self.user_id}, {target})>"
@@ -10,6 +10,8 @@ class PaymentStatus(enum.Enum):
     COMPLETED = "completed"
     FAILED = "failed"
     REFUNDED = "refunded"
+    # 決済は完了したが予約できなかった（金額の不一致・枠の重複など）。返金が必要
+    REFUND_REQUIRED = "refund_required"
     CANCELLED = "cancelled"
 
 class PaymentMethod(enum.Enum):
@@ -33,7 +35,8 @@ class Payment(Base):
     payment_method = Column(Enum(PaymentMethod), nullable=False)
     status = Column(Enum(PaymentStatus), default=PaymentStatus.PENDING)
     
-    stripe_payment_intent_id = Column(String(255), unique=True, nullable=True)
+    # パッケージ予約では1つの決済で複数のレッスンを予約するため、一意ではない
+    stripe_payment_intent_id = Column(String(255), nullable=True, index=True)
     stripe_customer_id = Column(String(255), nullable=True)
     
     description = Column(String(500), nullable=True)
@@ -41,11 +44,13 @@ class Payment(Base):
     
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    completed_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True, index=True)
+    # 返金日時（updated_at は以降の更新でも変わるため、返金の集計にはこちらを使う）
+    refunded_at = Column(DateTime, nullable=True, index=True)
 
     # リレーションシップ
     user = relationship("User", back_populates="payments")
-    lesson = relationship("Lesson", back_populates="payment")
+    lesson = relationship("Lesson", back_populates="payments")
 
     @property
     def is_completed(self):
@@ -71,7 +76,8 @@ class Payment(Base):
         """返金処理"""
         if self.can_refund:
             self.status = PaymentStatus.REFUNDED
-            self.updated_at = datetime.utcnow()
+            self.refunded_at = datetime.utcnow()
+            self.updated_at = self.refunded_at
 
     def cancel_payment(self):
         """支払いキャンセル処理"""
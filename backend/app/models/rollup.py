@@ -0,0 +1,83 @@
+from sqlalchemy import Column, Integer, String, Date, Float, DateTime, PrimaryKeyConstraint
+from datetime import datetime
+
+from .base import Base
+
+class DailyTeacherBookings(Base):
+    """講師ごと・日ごとの予約数とキャンセル数の集計テーブル"""
+    __tablename__ = "rollup_daily_teacher_bookings"
+    __table_args__ = (
+        PrimaryKeyConstraint("day", "teacher_id"),
+    )
+
+    day = Column(Date, nullable=False)
+    teacher_id = Column(Integer, nullable=False)
+    bookings = Column(Integer, nullable=False, default=0)
+    cancellations = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<DailyTeacherBookings(day={self.day}, teacher_id={self.teacher_id}, bookings={self.bookings})>"
+
+
+class DailyRevenue(Base):
+    """日ごと・通貨ごとの売上の集計テーブル"""
+    __tablename__ = "rollup_daily_revenue"
+    __table_args__ = (
+        PrimaryKeyConstraint("day", "currency"),
+    )
+
+    day = Column(Date, nullable=False)
+    currency = Column(String(3), nullable=False)
+    amount = Column(Float, nullable=False, default=0)
+    payments = Column(Integer, nullable=False, default=0)
+    refunded_amount = Column(Float, nullable=False, default=0)
+    refunds = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<DailyRevenue(day={self.day}, currency={self.currency}, amount={self.amount})>"
+
+
+class DailyActiveUsers(Base):
+    """日ごとのアクティブユーザー数の集計テーブル"""
+    __tablename__ = "rollup_daily_active_users"
+
+    day = Column(Date, primary_key=True)
+    active_users = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DailyActiveUsers(day={self.day}, active_users={self.active_users})>"
+
+
+class UserDailyActivity(Base):
+    """ユーザーの日ごとの活動記録（アクティブユーザー数の重複排除用）"""
+    __tablename__ = "user_daily_activity"
+    __table_args__ = (
+        PrimaryKeyConstraint("day", "user_id"),
+    )
+
+    day = Column(Date, nullable=False)
+    user_id = Column(String(36), nullable=False)
+
+    def __repr__(self):
+        return f"<UserDailyActivity(day={self.day}, user_id={self.user_id})>"
+
+
+class RecordedPaymentEvent(Base):
+    """
+    売上に計上済みの決済・返金（Webhookの再送による二重計上の防止用）
+
+    kind は "payment"（PaymentIntentID）または "refund"（RefundID）。
+    """
+    __tablename__ = "rollup_recorded_payment_events"
+    __table_args__ = (
+        PrimaryKeyConstraint("kind", "external_id"),
+    )
+
+    kind = Column(String(20), nullable=False)
+    external_id = Column(String(255), nullable=False)
+    recorded_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<RecordedPaymentEvent(kind={self.kind}, external_id={self.external_id})>"
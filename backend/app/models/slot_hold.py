@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from datetime import datetime
+from uuid import uuid4
+
+from .base import Base
+
+class SlotHold(Base):
+    """決済完了までの時間枠の仮押さえ
+
+    expires_at を過ぎた仮押さえは無効として扱い、空き枠の検索・重複チェックの対象にしない。
+    行の削除は各ワーカーの SlotHoldManager が期限の到来時にまとめて行う。
+    """
+    __tablename__ = "slot_holds"
+    __table_args__ = (
+        # 講師ごとの期間検索用
+        Index("ix_slot_holds_teacher_id_start_time", "teacher_id", "start_time"),
+    )
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid4()))
+    teacher_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(String(36), ForeignKey("users.id"), nullable=False)
+    start_time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    payment_intent_id = Column(String(255), nullable=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def is_active(self, now: datetime = None) -> bool:
+        """仮押さえが有効期限内かどうか"""
+        return self.expires_at > (now or datetime.utcnow())
+
+    def __repr__(self):
+        return (f"<SlotHold(id={self.id}, teacher_id={self.teacher_id}, "
+                f"{self.start_time}-{self.end_time}, expires_at={self.expires_at})>")
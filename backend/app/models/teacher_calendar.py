@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, Date, DateTime, LargeBinary, PrimaryKeyConstraint
+from datetime import datetime
+
+from .base import Base
+
+class TeacherCalendarDay(Base):
+    """
+    講師ごと・日（UTC）ごとの使用中の時間枠のビットマスク
+
+    ビット i は 0:00 + i × SLOT_INTERVAL 分からの1枠を表し、予約済みのレッスンまたは
+    仮押さえと少しでも重なる枠のビットを立てる。SLOT_INTERVAL を変更した場合は
+    このテーブルの行を全て削除すること（必要になった時点でレッスンから作り直される）。
+    """
+    __tablename__ = "teacher_calendar_days"
+    __table_args__ = (
+        PrimaryKeyConstraint("teacher_id", "day"),
+    )
+
+    teacher_id = Column(Integer, nullable=False)
+    day = Column(Date, nullable=False)
+    # 予約済みのレッスンの枠（リトルエンディアンの固定長バイト列）
+    booked = Column(LargeBinary, nullable=False)
+    # 仮押さえの枠。held_until を過ぎた場合は全て失効したものとして扱う
+    held = Column(LargeBinary, nullable=False)
+    held_until = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<TeacherCalendarDay(teacher_id={self.teacher_id}, day={self.day})>"
@@ -26,8 +26,8 @@ class User(Base):
     last_login = Column(DateTime)
 
     # Relationships
-    lessons = relationship("Lesson", back_populates="user")
-    materials = relationship("Material", back_populates="user")
+    lessons = relationship("Lesson", back_populates="teacher")
+    materials = relationship("Material", back_populates="creator")
     payments = relationship("Payment", back_populates="user")
 
     def __init__(self, email: str, password: str, first_name: str = None, last_name: str = None):
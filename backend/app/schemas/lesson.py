@@ -1,6 +1,6 @@
-from datetime import datetime
+from datetime import datetime, time
 from typing import Optional, List
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 from enum import Enum
 
 class LessonStatus(str, Enum):
@@ -68,12 +68,24 @@ class LessonResponse(LessonInDB):
     is_bookable: bool
     remaining_slots: int
 
+class LessonBookingCreate(BaseModel):
+    """グループレッスンの予約リクエストモデル（個人レッスンは仮押さえ・決済で予約する）"""
+    lesson_id: int
+    notes: Optional[str] = Field(None, max_length=500)
+
 class LessonBooking(BaseModel):
     """レッスン予約時に使用するモデル"""
+    id: Optional[int] = None
     lesson_id: int
-    student_id: int
+    student_id: str
     notes: Optional[str] = Field(None, max_length=500)
 
+class LessonBookingDelete(BaseModel):
+    """予約キャンセルのレスポンスモデル"""
+    id: int
+    lesson_id: int
+    status: str
+
 class LessonCancellation(BaseModel):
     """レッスンキャンセル時に使用するモデル"""
     lesson_id: int
@@ -81,10 +93,98 @@ class LessonCancellation(BaseModel):
 
 class LessonSearch(BaseModel):
     """レッスン検索時に使用するモデル"""
+    query: Optional[str] = Field(None, max_length=200)
     start_date: Optional[datetime] = None
     end_date: Optional[datetime] = None
     lesson_type: Optional[LessonType] = None
     level: Optional[LessonLevel] = None
     instructor_id: Optional[int] = None
     price_min: Optional[float] = Field(None, ge=0)
-    price_max: Optional[float] = Field(None, ge=0)
\ No newline at end of file
+    price_max: Optional[float] = Field(None, ge=0)
+
+class LessonSearchResult(BaseModel):
+    """レッスン検索結果として返すモデル"""
+    id: int
+    title: str
+    description: Optional[str] = None
+    lesson_type: str
+    level: Optional[LessonLevel] = None
+    start_time: datetime
+    end_time: datetime
+    price: float
+    currency: str
+    teacher_id: int
+
+    class Config:
+        orm_mode = True
+
+
+class LessonSchedule(BaseModel):
+    """スケジュール一覧として返すレッスン情報モデル"""
+    id: int
+    title: str
+    start_time: datetime
+    end_time: datetime
+    status: LessonStatus
+    lesson_type: str
+    teacher_id: int
+    teacher_name: Optional[str] = None
+    material_id: Optional[int] = None
+    material_title: Optional[str] = None
+    meeting_url: Optional[str] = None
+
+
+class SlotHoldCreate(BaseModel):
+    """時間枠の仮押さえのリクエストモデル"""
+    teacher_id: int
+    start_time: datetime
+    end_time: datetime
+
+
+class SlotHold(BaseModel):
+    """時間枠の仮押さえのレスポンスモデル"""
+    id: str
+    teacher_id: int
+    start_time: datetime
+    end_time: datetime
+    expires_at: datetime
+
+    class Config:
+        orm_mode = True
+
+
+class PreferredTimeWindow(BaseModel):
+    """パッケージ予約の希望時間帯（現地時刻）"""
+    start: time
+    end: time
+
+
+class PackageScheduleRequest(BaseModel):
+    """パッケージ予約の自動スケジュールのリクエストモデル"""
+    teacher_ids: List[int] = Field(..., min_items=1, max_items=10)
+    count: int = Field(5, ge=1, le=20)
+    weekdays: Optional[List[int]] = None  # 希望する曜日（0=月曜 ... 6=日曜）
+    preferred_times: List[PreferredTimeWindow] = []
+    min_spacing_hours: int = Field(24, ge=0, le=24 * 14)  # レッスンの開始時刻の最小間隔
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    timezone: Optional[str] = None  # 曜日・時間帯の解釈に使うタイムゾーン（省略時はサービスの既定値）
+
+    @validator('weekdays', each_item=True)
+    def validate_weekdays(cls, v):
+        if not 0 <= v <= 6:
+            raise ValueError('weekdays must be between 0 (Monday) and 6 (Sunday)')
+        return v
+
+
+class PackageSlot(BaseModel):
+    """自動スケジュールで選んだ枠"""
+    teacher_id: int
+    start_time: datetime
+    end_time: datetime
+    score: float  # 希望の曜日・時間帯との不一致（0は希望どおり）
+
+
+class PackageSchedule(BaseModel):
+    """パッケージ予約の自動スケジュールのレスポンスモデル"""
+    slots: List[PackageSlot]
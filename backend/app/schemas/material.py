@@ -41,6 +41,23 @@ class Material(MaterialBase):
     class Config:
         orm_mode = True
 
+class MaterialListItem(BaseModel):
+    """教材一覧表示用の軽量スキーマ"""
+    id: int = Field(..., description="教材のID")
+    title: str = Field(..., description="教材のタイトル")
+    description: Optional[str] = Field(None, description="教材の説明（先頭部分のみ）")
+    file_type: Optional[str] = Field(None, description="ファイルタイプ")
+    content_url: Optional[str] = Field(None, description="教材ファイルのURL")
+    created_at: datetime = Field(..., description="作成日時")
+
+    class Config:
+        orm_mode = True
+
+class MaterialList(BaseModel):
+    """教材一覧レスポンス（キーセットページネーション）"""
+    materials: List[MaterialListItem] = Field(default=[], description="教材の一覧")
+    next_cursor: Optional[str] = Field(None, description="次ページ取得用のカーソル（最終ページの場合はNone）")
+
 class MaterialDownload(BaseModel):
     """教材ダウンロード記録用スキーマ"""
     material_id: int = Field(..., description="教材のID")
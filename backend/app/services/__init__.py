@@ -0,0 +1,4 @@
+"""
+Service layer for the SpeakPro backend application.
+Routers delegate database access and business rules to the modules in this package.
+"""
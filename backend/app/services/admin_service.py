@@ -0,0 +1,80 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.pagination import DEFAULT_PAGE_SIZE
+from app.core.readonly_rows import BookingRow, PaymentRow, fetch_rows
+from app.models.lesson import Lesson
+from app.models.payment import Payment, PaymentStatus
+
+
+def booking_query(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+):
+    """予約一覧・エクスポート共通のクエリを生成する"""
+    statement = BookingRow.select()
+    if start_date:
+        statement = statement.where(Lesson.start_time >= start_date)
+    if end_date:
+        statement = statement.where(Lesson.start_time < end_date)
+    return statement
+
+
+def payment_query(
+    status: Optional[PaymentStatus] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+):
+    """決済一覧・エクスポート共通のクエリを生成する"""
+    statement = PaymentRow.select()
+    if status:
+        statement = statement.where(Payment.status == status)
+    if start_date:
+        statement = statement.where(Payment.created_at >= start_date)
+    if end_date:
+        statement = statement.where(Payment.created_at < end_date)
+    return statement
+
+
+def list_bookings(
+    db: Session,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+    limit: int = DEFAULT_PAGE_SIZE
+) -> List[Dict]:
+    """
+    管理者向けの予約一覧を取得する
+    ORMオブジェクトを生成せず、参照専用行として取得する
+
+    Args:
+        db: DBセッション
+        start_date: レッスン開始日時の下限
+        end_date: レッスン開始日時の上限（含まない）
+        after_id: 前ページ末尾の決済ID
+        limit: 取得件数
+    """
+    statement = booking_query(start_date, end_date)
+    if after_id:
+        statement = statement.where(Payment.id < after_id)
+    statement = statement.order_by(Payment.id.desc()).limit(limit)
+    return [row.as_dict() for row in fetch_rows(db, BookingRow, statement)]
+
+
+def list_payments(
+    db: Session,
+    status: Optional[PaymentStatus] = None,
+    after_id: Optional[int] = None,
+    limit: int = DEFAULT_PAGE_SIZE
+) -> List[Dict]:
+    """
+    管理者向けの決済一覧を取得する
+    ORMオブジェクトを生成せず、参照専用行として取得する
+    """
+    statement = payment_query(status=status)
+    if after_id:
+        statement = statement.where(Payment.id < after_id)
+    statement = statement.order_by(Payment.id.desc()).limit(limit)
+    return [row.as_dict() for row in fetch_rows(db, PaymentRow, statement)]
@@ -0,0 +1,200 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session, joinedload
+
+from app.models.lesson import Lesson, LessonStatus, LessonType
+from app.models.payment import Payment, PaymentMethod, PaymentStatus
+from app.schemas.lesson import LessonBookingCreate
+
+# スケジュール一覧で参照するリレーションの読み込み方法
+# 多対一のリレーションはJOINで同じクエリ内に読み込み、行ごとの遅延読み込みを防ぐ
+SCHEDULE_LOAD_OPTIONS = (
+    joinedload(Lesson.teacher),
+    joinedload(Lesson.material),
+)
+
+
+def get_user_schedule(
+    db: Session,
+    user_id: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> List[Dict]:
+    """
+    ユーザーのレッスンスケジュールを取得する
+
+    講師として担当するレッスンと、決済完了により予約が確定したレッスンを返す。
+    講師・教材は SCHEDULE_LOAD_OPTIONS により1回のクエリで読み込む。
+
+    Args:
+        db: DBセッション
+        user_id: ユーザーID
+        start_date: 取得期間の開始日時
+        end_date: 取得期間の終了日時
+
+    Returns:
+        List[Dict]: スケジュール情報のリスト
+    """
+    booked_lesson_ids = select(Payment.lesson_id).where(
+        Payment.user_id == user_id,
+        Payment.status == PaymentStatus.COMPLETED,
+        Payment.lesson_id.isnot(None)
+    )
+
+    query = db.query(Lesson).options(*SCHEDULE_LOAD_OPTIONS).filter(
+        or_(Lesson.teacher_id == user_id, Lesson.id.in_(booked_lesson_ids))
+    )
+    if start_date:
+        query = query.filter(Lesson.start_time >= start_date)
+    if end_date:
+        query = query.filter(Lesson.end_time <= end_date)
+
+    return [_to_schedule(lesson) for lesson in query.order_by(Lesson.start_time).all()]
+
+
+def _to_schedule(lesson: Lesson) -> Dict:
+    """レッスンをスケジュール表示用の辞書に変換する"""
+    return {
+        "id": lesson.id,
+        "title": lesson.title,
+        "start_time": lesson.start_time,
+        "end_time": lesson.end_time,
+        "status": lesson.status.value,
+        "lesson_type": lesson.lesson_type.value,
+        "teacher_id": lesson.teacher_id,
+        "teacher_name": lesson.teacher.full_name if lesson.teacher else None,
+        "material_id": lesson.material_id,
+        "material_title": lesson.material.title if lesson.material else None,
+        "meeting_url": lesson.meeting_url,
+    }
+
+
+def reserve_seats(db: Session, lesson_id: int, seats: int = 1) -> bool:
+    """
+    レッスンの参加枠を確保する
+
+    定員の確認と加算を1つの条件付きUPDATE文で行うため、同時に予約されても定員を超えない。
+    行ロックはUPDATE文の実行中からコミットまでしか保持しないため、
+    予約処理の残りはコミット後に行うか、できるだけ短くすること。
+    Lesson.add_participant は読み込んだ値をPythonで加算するため、同時予約では使わない。
+
+    Args:
+        db: DBセッション（コミットは呼び出し側で行う）
+        lesson_id: レッスンID
+        seats: 確保する人数
+
+    Returns:
+        bool: 確保できた場合True（満席・予約不可・存在しない場合はFalse）
+    """
+    result = db.execute(
+        update(Lesson)
+        .where(
+            Lesson.id == lesson_id,
+            Lesson.is_active.is_(True),
+            Lesson.status == LessonStatus.SCHEDULED,
+            Lesson.current_participants + seats <= Lesson.max_participants
+        )
+        .values(current_participants=Lesson.current_participants + seats)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def release_seats(db: Session, lesson_id: int, seats: int = 1) -> bool:
+    """
+    確保した参加枠を戻す（予約のキャンセル・決済失敗時）
+
+    Returns:
+        bool: 戻せた場合True（参加者数が seats 未満の場合はFalse）
+    """
+    result = db.execute(
+        update(Lesson)
+        .where(Lesson.id == lesson_id, Lesson.current_participants >= seats)
+        .values(current_participants=Lesson.current_participants - seats)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def create_booking(db: Session, user_id: str, lesson_data: LessonBookingCreate) -> Dict:
+    """
+    グループレッスンを予約する
+
+    reserve_seats で参加枠を確保し、同じトランザクションで支払い待ちの決済記録を作成する。
+    枠の確保は条件付きUPDATE文のため、同時に予約されても定員を超えない。
+    個人レッスンは仮押さえ（/lessons/holds）と決済で予約するため対象外。
+
+    Args:
+        db: DBセッション
+        user_id: 予約するユーザーのID
+        lesson_data: 予約するレッスンと備考
+
+    Returns:
+        Dict: 予約（決済記録）のID・レッスンID・ユーザーID・備考
+    """
+    lesson = db.query(Lesson.id, Lesson.lesson_type, Lesson.price, Lesson.currency).filter(
+        Lesson.id == lesson_data.lesson_id
+    ).first()
+    if lesson is None:
+        raise HTTPException(status_code=404, detail="Lesson not found")
+    if lesson.lesson_type == LessonType.INDIVIDUAL:
+        raise HTTPException(status_code=400, detail="Private lessons are booked through slot holds")
+
+    booked = db.query(Payment.id).filter(
+        Payment.user_id == user_id,
+        Payment.lesson_id == lesson.id,
+        Payment.status.in_([PaymentStatus.PENDING, PaymentStatus.COMPLETED])
+    ).first()
+    if booked is not None:
+        raise HTTPException(status_code=409, detail="Lesson already booked")
+
+    if not reserve_seats(db, lesson.id):
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Lesson is full or not available for booking")
+    # 行ロックはコミットまで保持されるため、枠の確保からコミットまでは決済記録の作成のみ行う
+    payment = Payment(
+        user_id=user_id,
+        lesson_id=lesson.id,
+        amount=lesson.price,
+        currency=lesson.currency,
+        payment_method=PaymentMethod.CREDIT_CARD,
+        status=PaymentStatus.PENDING,
+        description=lesson_data.notes
+    )
+    db.add(payment)
+    db.commit()
+    return {"id": payment.id, "lesson_id": lesson.id, "student_id": user_id, "notes": lesson_data.notes}
+
+
+def cancel_booking(db: Session, booking_id: int, user_id: str) -> Dict:
+    """
+    支払い待ちのグループレッスンの予約をキャンセルし、release_seats で参加枠を戻す
+
+    支払い済みの予約は返金を伴うため、ここではキャンセルしない（409）。
+
+    Args:
+        db: DBセッション
+        booking_id: 予約（決済記録）のID
+        user_id: 予約したユーザーのID
+
+    Returns:
+        Dict: 予約のID・レッスンID・ステータス
+    """
+    payment = db.query(Payment).filter(
+        Payment.id == booking_id,
+        Payment.user_id == user_id,
+        Payment.lesson_id.isnot(None)
+    ).with_for_update().first()
+    if payment is None:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    if payment.status != PaymentStatus.PENDING:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=f"Booking is {payment.status.value} and cannot be cancelled")
+
+    payment.cancel_payment()
+    release_seats(db, payment.lesson_id)
+    db.commit()
+    return {"id": payment.id, "lesson_id": payment.lesson_id, "status": payment.status.value}
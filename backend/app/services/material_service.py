@@ -0,0 +1,182 @@
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.core.access_index import visible_materials_clause
+from app.core.download_counter import download_counter
+from app.core.pagination import DEFAULT_PAGE_SIZE, decode_cursor, encode_cursor
+from app.models.material import Material
+from app.models.material_access import MaterialAccess
+
+
+def get_materials(
+    db: Session,
+    user_id: str,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE
+) -> Dict:
+    """
+    教材一覧を新しい順に取得する
+
+    (created_at, id) のキーセットページネーションを用いるため、
+    ページの深さに関わらず ix_materials_created_at_id の範囲走査で済む。
+    作成日時が未設定の行は最も古いものとして末尾に id の降順で並べる。
+    NULL の並び順はDBによって異なり、IS NULL を同じ条件に含めると範囲走査にならないため、
+    作成日時のある行を読み切った後に別のクエリで取得する。
+    一覧表示に必要なカラムのみを取得し、ORMオブジェクトは生成しない。
+    閲覧権限は公開フラグと material_access の索引付きサブクエリで絞り込む。
+
+    Args:
+        db: DBセッション
+        user_id: 取得するユーザーのID
+        cursor: 前ページの next_cursor（先頭ページの場合はNone）
+        limit: 1ページあたりの件数
+
+    Returns:
+        Dict: materials と next_cursor を含む辞書
+    """
+    query = db.query(*Material.list_columns()).filter(visible_materials_clause(user_id))
+
+    created_at = last_id = None
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+
+    # 次ページの有無を判定するため1件多く取得する
+    rows = []
+    if last_id is None or created_at is not None:
+        dated = query.filter(Material.created_at.isnot(None))
+        if last_id is not None:
+            dated = dated.filter(
+                or_(
+                    Material.created_at < created_at,
+                    and_(Material.created_at == created_at, Material.id < last_id)
+                )
+            )
+        rows = dated.order_by(
+            Material.created_at.desc(),
+            Material.id.desc()
+        ).limit(limit + 1).all()
+    if len(rows) <= limit:
+        undated = query.filter(Material.created_at.is_(None))
+        if last_id is not None and created_at is None:
+            undated = undated.filter(Material.id < last_id)
+        rows += undated.order_by(Material.id.desc()).limit(limit + 1 - len(rows)).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
+
+    return {
+        "materials": [row._asdict() for row in rows],
+        "next_cursor": next_cursor
+    }
+
+
+def download_material(db: Session, material_id: int, user_id: str) -> Dict:
+    """
+    教材のダウンロード情報を取得し、ダウンロード数を記録する
+
+    ダウンロード数はその場でコミットせず、download_counter に集約して
+    定期的にまとめて反映する。
+
+    Args:
+        db: DBセッション
+        material_id: 教材ID
+        user_id: ダウンロードするユーザーのID
+
+    Returns:
+        Dict: 教材のID・タイトル・ファイルタイプ・URL
+    """
+    # 閲覧可否はキャッシュした権限ではなくDBで判定する
+    # （他ワーカーで剥奪された権限をキャッシュの有効期限まで使わせない）
+    material = db.query(
+        Material.id,
+        Material.title,
+        Material.file_type,
+        Material.content_url,
+        visible_materials_clause(user_id).label("accessible")
+    ).filter(Material.id == material_id).first()
+
+    if not material:
+        raise HTTPException(
+            status_code=404,
+            detail="Material not found"
+        )
+
+    if not material.accessible:
+        raise HTTPException(
+            status_code=403,
+            detail="Access to this material is not permitted"
+        )
+
+    download_counter.increment(material.id)
+    return {
+        "id": material.id,
+        "title": material.title,
+        "file_type": material.file_type,
+        "content_url": material.content_url
+    }
+
+
+def grant_access(
+    db: Session,
+    user_id: str,
+    material_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    granted_by: Optional[str] = None
+) -> MaterialAccess:
+    """
+    ユーザーに教材単位またはカテゴリー単位の閲覧権限を付与する
+    付与内容はORMイベント経由でアクセス権限索引に反映される
+    """
+    if (material_id is None) == (category_id is None):
+        raise HTTPException(
+            status_code=400,
+            detail="Specify exactly one of material_id or category_id"
+        )
+
+    access = db.query(MaterialAccess).filter(
+        MaterialAccess.user_id == user_id,
+        MaterialAccess.material_id == material_id,
+        MaterialAccess.category_id == category_id
+    ).first()
+    if access:
+        return access
+
+    access = MaterialAccess(
+        user_id=user_id,
+        material_id=material_id,
+        category_id=category_id,
+        granted_by=granted_by
+    )
+    db.add(access)
+    db.commit()
+    db.refresh(access)
+    return access
+
+
+def revoke_access(
+    db: Session,
+    user_id: str,
+    material_id: Optional[int] = None,
+    category_id: Optional[int] = None
+) -> bool:
+    """
+    ユーザーの閲覧権限を剥奪する
+
+    Returns:
+        bool: 権限が存在し削除した場合True
+    """
+    access = db.query(MaterialAccess).filter(
+        MaterialAccess.user_id == user_id,
+        MaterialAccess.material_id == material_id,
+        MaterialAccess.category_id == category_id
+    ).first()
+    if not access:
+        return False
+
+    db.delete(access)
+    db.commit()
+    return True
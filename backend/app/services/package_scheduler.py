@@ -0,0 +1,239 @@
+import bisect
+import heapq
+from datetime import datetime, time, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pytz
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.core import availability
+from app.core.config import settings
+from app.core.instrumentation import timer
+from app.core.schedule_manager import ScheduleManager
+from app.models.lesson import Lesson, LessonStatus
+from app.models.payment import Payment, PaymentStatus
+from app.schemas.lesson import PreferredTimeWindow
+
+# 既定の検索期間（日）と、指定できる最大の検索期間（日）
+DEFAULT_HORIZON_DAYS = 91
+MAX_HORIZON_DAYS = 183
+
+# 希望との不一致の評価（値が小さいほど良い）
+# 希望時間帯からの距離（1時間あたり）は最大12時間のため、希望しない曜日はそれより重くする
+WEEKDAY_PENALTY = 24.0
+TIME_PENALTY_PER_HOUR = 1.0
+
+# (希望との不一致, 開始日時, 講師の指定順, 終了日時)
+# タプルの比較順に、希望に近い枠・早い枠・先に指定された講師の枠を優先する
+# （開始が遅いことは、希望との不一致がわずかでもそれより優先度が低い）
+Candidate = Tuple[float, datetime, int, datetime]
+
+
+def _minutes(value) -> int:
+    return value.hour * 60 + value.minute
+
+
+def _time_penalty(local_start: datetime, duration: timedelta, windows: Sequence[PreferredTimeWindow]) -> float:
+    """希望時間帯に収まらない場合、最も近い希望時間帯までの時間（時間単位）"""
+    if not windows:
+        return 0.0
+    length = duration.total_seconds() / 60
+    start = _minutes(local_start)
+    best = None
+    for window in windows:
+        window_start, window_end = _minutes(window.start), _minutes(window.end)
+        if window_end <= window_start:
+            # 日付をまたぐ時間帯
+            window_end += 24 * 60
+        latest = window_end - length
+        for minute in (start, start + 24 * 60):
+            if window_start <= minute <= latest:
+                return 0.0
+            distance = min(abs(minute - window_start), abs(minute - latest))
+            best = distance if best is None else min(best, distance)
+    return best / 60 * TIME_PENALTY_PER_HOUR
+
+
+def score_slot(
+    start: datetime,
+    duration: timedelta,
+    tz,
+    weekdays: Optional[Sequence[int]],
+    windows: Sequence[PreferredTimeWindow]
+) -> float:
+    """
+    枠の希望との不一致（UTCのnaiveな開始日時を、希望の曜日・時間帯は tz の現地時刻で評価する）
+    希望どおりの枠は0になる
+    """
+    local_start = pytz.UTC.localize(start).astimezone(tz)
+    score = _time_penalty(local_start, duration, windows)
+    if weekdays and local_start.weekday() not in weekdays:
+        score += WEEKDAY_PENALTY
+    return score
+
+
+def _preference_scorer(tz, weekdays: Optional[Sequence[int]], windows: Sequence[PreferredTimeWindow]):
+    """
+    枠のリストに対して score_slot と同じ値を順に返す関数を作る（枠ごとのタイムゾーン変換を省く）
+
+    UTCとの時差は日ごとに1回だけ求め、値は現地の曜日・時刻・長さごとに使い回す。
+    時差が変わる日（夏時間の切り替わり）の枠は score_slot で求める。
+    """
+    scores: Dict[Tuple[int, time, timedelta], float] = {}
+
+    def utc_offset(value: datetime) -> timedelta:
+        return pytz.UTC.localize(value).astimezone(tz).utcoffset()
+
+    def score_all(slots: Sequence[Dict]) -> Iterator[float]:
+        day_start = day_end = offset = None
+        for slot in slots:
+            start = slot["start_time"]
+            duration = slot["end_time"] - start
+            # 枠は開始時刻順のため、時差は日が変わったときだけ求め直す
+            if day_start is None or not day_start <= start < day_end:
+                day_start = datetime.combine(start.date(), time.min)
+                day_end = day_start + timedelta(days=1)
+                offset = utc_offset(day_start)
+                if offset != utc_offset(day_end):
+                    offset = None
+            if offset is None:
+                yield score_slot(start, duration, tz, weekdays, windows)
+                continue
+            local_start = start + offset
+            key = (local_start.weekday(), local_start.time(), duration)
+            value = scores.get(key)
+            if value is None:
+                value = scores[key] = score_slot(start, duration, tz, weekdays, windows)
+            yield value
+
+    return score_all
+
+
+def select_slots(candidates: List[Candidate], count: int, min_spacing: timedelta,
+                 busy: Sequence[availability.Interval] = ()) -> List[Candidate]:
+    """
+    候補の順（Candidate を参照）に、互いの開始時刻が min_spacing 以上離れ、重ならない枠を count 件選ぶ
+
+    候補はヒープで評価順に取り出し、選んだ枠は開始時刻順のリストに保持して
+    前後の枠とだけ比較するため、処理量は候補数 × log(候補数) に比例する。
+    busy（受講者の既存の予約）と重なる候補は選ばない。
+    """
+    heapq.heapify(candidates)
+    # 重なりのない区間にまとめ、開始時刻が枠の終了より前の最後の区間とだけ比較する
+    busy = list(availability.merge_intervals(busy))
+    busy_starts = [start for start, _ in busy]
+    starts: List[datetime] = []
+    chosen: Dict[datetime, Candidate] = {}
+    while candidates and len(starts) < count:
+        candidate = heapq.heappop(candidates)
+        _, start, _, end = candidate
+
+        index = bisect.bisect_left(busy_starts, end)
+        if index and busy[index - 1][1] > start:
+            continue
+        index = bisect.bisect_left(starts, start)
+        if index < len(starts):
+            later = chosen[starts[index]]
+            if later[1] - start < min_spacing or later[1] < end:
+                continue
+        if index:
+            earlier = chosen[starts[index - 1]]
+            if start - earlier[1] < min_spacing or earlier[3] > start:
+                continue
+        starts.insert(index, start)
+        chosen[start] = candidate
+    return [chosen[start] for start in starts]
+
+
+def _student_busy(db: Session, user_id: str, start: datetime, end: datetime) -> List[availability.Interval]:
+    """受講者が予約済み（決済完了）のレッスンの時間帯を開始時刻順に返す"""
+    return db.query(Lesson.start_time, Lesson.end_time).join(
+        Payment, Payment.lesson_id == Lesson.id
+    ).filter(
+        Payment.user_id == user_id,
+        Payment.status == PaymentStatus.COMPLETED,
+        Lesson.status != LessonStatus.CANCELLED,
+        Lesson.start_time < end,
+        Lesson.end_time > start
+    ).order_by(Lesson.start_time).all()
+
+
+async def find_package_slots(
+    db: Session,
+    user_id: str,
+    teacher_ids: Sequence[int],
+    count: int,
+    weekdays: Optional[Sequence[int]] = None,
+    preferred_times: Sequence[PreferredTimeWindow] = (),
+    min_spacing: timedelta = timedelta(hours=24),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    timezone: Optional[str] = None
+) -> List[Dict]:
+    """
+    パッケージ予約の枠を自動で選ぶ
+
+    講師ごとに期間内の空き枠を1回だけ求め（get_available_slots）、全講師の枠を
+    希望との不一致・開始日時・講師の指定順の順で比べ、select_slots で互いに間隔を空けた count 件を選ぶ。
+    受講者の既存の予約と重なる枠は選ばない。
+
+    Args:
+        db: DBセッション
+        user_id: 受講者のユーザーID
+        teacher_ids: 候補の講師ID（先に指定した講師を優先する）
+        count: 選ぶ枠の数
+        weekdays: 希望する曜日（0=月曜 ... 6=日曜）
+        preferred_times: 希望する時間帯（現地時刻）
+        min_spacing: レッスンの開始時刻の最小間隔
+        start_date: 検索期間の開始日時（省略時は現在）
+        end_date: 検索期間の終了日時（省略時は DEFAULT_HORIZON_DAYS 日後）
+        timezone: 曜日・時間帯の解釈に使うタイムゾーン
+
+    Returns:
+        List[Dict]: 開始時刻順の枠（teacher_id, start_time, end_time, score＝希望との不一致）
+    """
+    try:
+        tz = pytz.timezone(timezone or settings.TIMEZONE)
+    except pytz.UnknownTimeZoneError:
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {timezone}")
+
+    horizon_start = availability.to_utc_naive(start_date or datetime.utcnow())
+    horizon_end = (
+        availability.to_utc_naive(end_date) if end_date
+        else horizon_start + timedelta(days=DEFAULT_HORIZON_DAYS)
+    )
+    if horizon_end <= horizon_start:
+        raise HTTPException(status_code=400, detail="end_date must be after start_date")
+    if horizon_end - horizon_start > timedelta(days=MAX_HORIZON_DAYS):
+        raise HTTPException(
+            status_code=400,
+            detail=f"The search period cannot exceed {MAX_HORIZON_DAYS} days"
+        )
+
+    manager = ScheduleManager(db)
+    teachers = list(dict.fromkeys(teacher_ids))
+    score_all = _preference_scorer(tz, weekdays, preferred_times)
+    candidates: List[Candidate] = []
+    with timer("schedule", "package_candidates"):
+        for rank, teacher_id in enumerate(teachers):
+            # 期間をUTCのnaiveで渡すため、返される枠もUTCのnaiveになる
+            slots = await manager.get_available_slots(teacher_id, horizon_start, horizon_end)
+            candidates.extend(
+                (value, slot["start_time"], rank, slot["end_time"])
+                for value, slot in zip(score_all(slots), slots)
+            )
+
+    busy = _student_busy(db, user_id, horizon_start, horizon_end)
+    with timer("schedule", "package_select"):
+        selected = select_slots(candidates, count, min_spacing, busy)
+
+    if len(selected) < count:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Only {len(selected)} of {count} lessons could be scheduled in the requested period"
+        )
+    return [
+        {"teacher_id": teachers[rank], "start_time": start, "end_time": end, "score": round(score, 4)}
+        for score, start, rank, end in selected
+    ]
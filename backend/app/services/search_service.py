@@ -0,0 +1,163 @@
+import heapq
+from typing import Dict, List
+
+from sqlalchemy.orm import Session
+
+from app.core.access_index import material_access_index, visible_materials_clause
+from app.core.pagination import DEFAULT_PAGE_SIZE
+from app.core.search_index import (
+    build_match_expression,
+    fts_match,
+    lessons_fts,
+    materials_fts,
+    search_index,
+)
+from app.models.lesson import Lesson, LessonType
+from app.models.material import Material
+from app.schemas.lesson import LessonSearch, LessonType as LessonTypeSchema
+
+# スキーマのレッスンタイプとモデルのレッスンタイプの対応
+_LESSON_TYPES = {
+    LessonTypeSchema.ONE_ON_ONE: LessonType.INDIVIDUAL,
+    LessonTypeSchema.GROUP: LessonType.GROUP,
+    LessonTypeSchema.WORKSHOP: LessonType.WORKSHOP,
+}
+
+# フォールバック索引の候補をSQLの IN 条件に渡す際の1回あたりの件数
+FALLBACK_BATCH_SIZE = 5000
+
+
+def search_materials(
+    db: Session,
+    user_id: str,
+    query: str,
+    limit: int = DEFAULT_PAGE_SIZE
+) -> List[Dict]:
+    """
+    教材をタイトル・説明・カテゴリー名で全文検索する
+    検索結果はユーザーが閲覧可能な教材のみに絞り込む
+
+    Args:
+        db: DBセッション
+        user_id: 検索するユーザーのID
+        query: 検索キーワード（空白区切りでAND検索）
+        limit: 取得件数
+
+    Returns:
+        List[Dict]: 一覧表示用の教材情報
+    """
+    search_index.ensure_initialized(db)
+    rows_query = db.query(*Material.list_columns())
+
+    if search_index.use_fts5:
+        expression = build_match_expression(query)
+        if expression is None:
+            return []
+        rows_query = rows_query.join(
+            materials_fts, materials_fts.c.rowid == Material.id
+        ).filter(
+            fts_match(materials_fts, expression),
+            visible_materials_clause(user_id)
+        ).order_by(materials_fts.c.rank)
+    else:
+        # 検索結果と閲覧可能な教材の集合をメモリ上で積集合にする
+        visible = material_access_index.visible_material_ids(db, user_id)
+        ids = [material_id for material_id in search_index.material_ids(db, query)
+               if material_id in visible]
+        # 候補は新しい順のため、先頭から分割して取得し limit 件に達した時点で止める
+        # （索引に残っている削除済みの教材があっても、後続の候補で補う）
+        rows = []
+        for offset in range(0, len(ids), FALLBACK_BATCH_SIZE):
+            rows += rows_query.filter(
+                Material.id.in_(ids[offset:offset + FALLBACK_BATCH_SIZE])
+            ).order_by(Material.id.desc()).limit(limit - len(rows)).all()
+            if len(rows) >= limit:
+                break
+        return [row._asdict() for row in rows]
+
+    return [row._asdict() for row in rows_query.limit(limit).all()]
+
+
+def search_lessons(db: Session, search: LessonSearch, limit: int = DEFAULT_PAGE_SIZE) -> List[Dict]:
+    """
+    レッスンをキーワードと検索条件で検索する
+
+    キーワードは全文検索索引で絞り込み、タイプ・レベル・料金・講師・期間の
+    条件はインデックス付きのカラムに対するSQL条件として組み合わせる。
+
+    Args:
+        db: DBセッション
+        search: 検索条件
+        limit: 取得件数
+
+    Returns:
+        List[Dict]: 検索結果のレッスン情報
+    """
+    rows_query = db.query(
+        Lesson.id,
+        Lesson.title,
+        Lesson.description,
+        Lesson.lesson_type,
+        Lesson.level,
+        Lesson.start_time,
+        Lesson.end_time,
+        Lesson.price,
+        Lesson.currency,
+        Lesson.teacher_id,
+    ).filter(Lesson.is_active.is_(True))
+
+    rows_query = _apply_lesson_filters(rows_query, search)
+    order_by = Lesson.start_time
+    if search.query:
+        search_index.ensure_initialized(db)
+        if search_index.use_fts5:
+            expression = build_match_expression(search.query)
+            if expression is None:
+                return []
+            rows_query = rows_query.join(
+                lessons_fts, lessons_fts.c.rowid == Lesson.id
+            ).filter(fts_match(lessons_fts, expression))
+            order_by = lessons_fts.c.rank
+        else:
+            ids = search_index.lesson_ids(db, search.query)
+            if not ids:
+                return []
+            # 候補を切り詰めると検索条件に合う行を取りこぼすため、全候補に条件を適用し、
+            # 候補を分割して取得した各回の先頭 limit 件から開始日時順に limit 件を選ぶ
+            rows = []
+            for offset in range(0, len(ids), FALLBACK_BATCH_SIZE):
+                rows += rows_query.filter(
+                    Lesson.id.in_(ids[offset:offset + FALLBACK_BATCH_SIZE])
+                ).order_by(Lesson.start_time).limit(limit).all()
+            return _lesson_results(heapq.nsmallest(limit, rows, key=lambda row: row.start_time))
+
+    return _lesson_results(rows_query.order_by(order_by).limit(limit).all())
+
+
+def _lesson_results(rows) -> List[Dict]:
+    """検索結果の行を辞書に変換する"""
+    results = []
+    for row in rows:
+        result = row._asdict()
+        result["lesson_type"] = row.lesson_type.value
+        results.append(result)
+    return results
+
+
+def _apply_lesson_filters(rows_query, search: LessonSearch):
+    """LessonSearch の条件をクエリに適用する"""
+    if search.lesson_type is not None:
+        rows_query = rows_query.filter(Lesson.lesson_type == _LESSON_TYPES[search.lesson_type])
+    if search.level is not None:
+        rows_query = rows_query.filter(Lesson.level == search.level.value)
+    if search.instructor_id is not None:
+        rows_query = rows_query.filter(Lesson.teacher_id == search.instructor_id)
+    if search.price_min is not None:
+        rows_query = rows_query.filter(Lesson.price >= search.price_min)
+    if search.price_max is not None:
+        rows_query = rows_query.filter(Lesson.price <= search.price_max)
+    if search.start_date is not None:
+        rows_query = rows_query.filter(Lesson.start_time >= search.start_date)
+    if search.end_date is not None:
+        rows_query = rows_query.filter(Lesson.end_time <= search.end_date)
+    return rows_query
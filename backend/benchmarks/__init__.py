@@ -0,0 +1,8 @@
+"""
+Standalone performance benchmarks for the SpeakPro backend.
+Run each module from the backend directory, e.g. ``python -m benchmarks.bench_material_pagination``.
+
+Most modules print a table. ``bench_hot_paths`` can also write JSON results (``--json``)
+and compare them with a previous run (``--compare``). External services are replaced by the
+local stand-ins in ``benchmarks.stubs``.
+"""
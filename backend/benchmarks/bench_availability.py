@@ -0,0 +1,119 @@
+"""
+受講可能時間ルールの展開のベンチマーク
+
+有効期間だけが異なる同じルール（平日・隔週の土曜日）と例外、1年分のレッスンを講師2人に登録し、
+get_available_slots の所要時間を検索期間（1週間・3か月・1年）ごとに計測する。
+あわせて以下を検証する。
+- ルールの有効期間の長さ（1年・20年）によって所要時間が変わらないこと
+- 返された枠が開始時刻順で、予約済みのレッスンと重ならないこと
+ジェネレーターのまま数える場合は枠のリストを保持しないため、メモリ使用量は
+期間内のレッスン数にのみ比例する（peak_kib）。
+"""
+import asyncio
+import tracemalloc
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.core.schedule_manager import ScheduleManager
+from app.models.availability import (
+    SATURDAY,
+    WEEKDAYS,
+    AvailabilityException,
+    AvailabilityRule,
+)
+from app.models.lesson import Lesson, LessonStatus, LessonType
+
+from .common import create_sqlite_session, measure, report, seeded_random
+
+START = datetime(2024, 6, 3, 0, 0)
+LESSONS_PER_TEACHER = 1_500
+WINDOWS = {"1 week": 7, "3 months": 91, "1 year": 365}
+
+
+def seed(db) -> None:
+    rng = seeded_random()
+    rules = []
+    for teacher_id, valid_from in ((1, date(2024, 1, 1)), (2, date(2004, 1, 1))):
+        rules += [
+            {"teacher_id": teacher_id, "weekdays": WEEKDAYS, "start_time": time(9),
+             "end_time": time(12), "interval_weeks": 1, "valid_from": valid_from},
+            {"teacher_id": teacher_id, "weekdays": WEEKDAYS, "start_time": time(17),
+             "end_time": time(22), "interval_weeks": 1, "valid_from": valid_from},
+            {"teacher_id": teacher_id, "weekdays": SATURDAY, "start_time": time(10),
+             "end_time": time(16), "interval_weeks": 2, "valid_from": valid_from},
+        ]
+    db.execute(insert(AvailabilityRule.__table__), rules)
+    db.execute(insert(AvailabilityException.__table__), [
+        {"teacher_id": teacher_id, "date": START.date() + timedelta(days=rng.randrange(365)),
+         "is_available": False, "reason": "holiday"}
+        for teacher_id in (1, 2) for _ in range(20)
+    ])
+
+    lessons = []
+    for teacher_id in (1, 2):
+        for _ in range(LESSONS_PER_TEACHER):
+            start = START + timedelta(days=rng.randrange(365), hours=rng.randrange(24),
+                                      minutes=rng.choice((0, 30)))
+            lessons.append({
+                "id": len(lessons) + 1, "title": "Lesson", "start_time": start,
+                "end_time": start + timedelta(minutes=50), "duration": 50,
+                "lesson_type": LessonType.INDIVIDUAL.name, "status": LessonStatus.SCHEDULED.name,
+                "price": 50.0, "teacher_id": teacher_id, "is_active": True,
+            })
+    db.execute(insert(Lesson.__table__), lessons)
+    db.commit()
+
+
+def verify(db, manager: ScheduleManager) -> None:
+    end = START + timedelta(days=365)
+    slots = asyncio.run(manager.get_available_slots(1, START, end))
+    lessons = sorted(
+        db.query(Lesson.start_time, Lesson.end_time).filter(Lesson.teacher_id == 1).all()
+    )
+    for slot in slots:
+        assert not any(
+            slot["start_time"] < lesson_end and slot["end_time"] > lesson_start
+            for lesson_start, lesson_end in lessons
+        ), f"slot {slot} overlaps a booked lesson"
+    assert [s["start_time"] for s in slots] == sorted(s["start_time"] for s in slots)
+    print(f"1 year: {len(slots):,} free slots of {settings.LESSON_DURATION} min "
+          f"every {settings.SLOT_INTERVAL} min")
+
+
+def peak_kib(func) -> float:
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main() -> None:
+    db = create_sqlite_session()
+    seed(db)
+    manager = ScheduleManager(db)
+    verify(db, manager)
+    loop = asyncio.new_event_loop()
+
+    results = {}
+    for name, days in WINDOWS.items():
+        end = START + timedelta(days=days)
+        for teacher_id, lifetime in ((1, "rules since 2024"), (2, "rules since 2004")):
+            results[f"get_available_slots ({name}, {lifetime})"] = measure(
+                lambda: loop.run_until_complete(manager.get_available_slots(teacher_id, START, end)),
+                repeat=10,
+            )
+
+    # ジェネレーターのまま数える場合（結果のリストを作らない）のメモリ使用量
+    for name, days in WINDOWS.items():
+        end = START + timedelta(days=days)
+        count = lambda: sum(1 for _ in manager.iter_available_slots(1, START, end))
+        results[f"iter_available_slots ({name})"] = measure(count, repeat=10)
+        results[f"iter_available_slots ({name})"]["peak_kib"] = peak_kib(count)
+    report("availability rules", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+bcrypt のコスト自動調整のベンチマーク
+
+rounds ごとのハッシュ化・検証の所要時間を計測し、calibrate_bcrypt_rounds の見積もりが
+実測と一致すること、選ばれたコストが目標時間（BCRYPT_TARGET_MS）の半分から2倍の範囲に
+収まることを検証する。あわせてログイン時の再ハッシュの追加コストを計測する。
+
+    BCRYPT_TARGET_MS=100 python -m benchmarks.bench_bcrypt
+"""
+import argparse
+
+from app.core.security import (
+    BCRYPT_MAX_ROUNDS,
+    BCRYPT_MIN_ROUNDS,
+    BCRYPT_TARGET_MS,
+    calibrate_bcrypt_rounds,
+    configure_password_hashing,
+    pwd_context,
+    verify_and_update_password,
+)
+
+from .common import measure, report
+
+PASSWORD = "correct horse battery staple"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark bcrypt cost calibration")
+    parser.add_argument("--target-ms", type=float, default=BCRYPT_TARGET_MS)
+    parser.add_argument("--max-rounds", type=int, default=13, help="rounds ごとの計測を行う上限")
+    args = parser.parse_args()
+
+    bcrypt = pwd_context.handler("bcrypt")
+    results = {}
+    for rounds in range(8, args.max_rounds + 1):
+        hasher = bcrypt.using(rounds=rounds)
+        hashed = hasher.hash(PASSWORD)
+        repeat = max(3, 2 ** (14 - rounds))
+        results[f"hash (rounds={rounds})"] = measure(lambda: hasher.hash(PASSWORD), repeat=repeat, warmup=1)
+        results[f"verify (rounds={rounds})"] = measure(lambda: bcrypt.verify(PASSWORD, hashed),
+                                                       repeat=repeat, warmup=1)
+
+    rounds, estimate = calibrate_bcrypt_rounds(args.target_ms, BCRYPT_MIN_ROUNDS, BCRYPT_MAX_ROUNDS)
+    results["calibrate_bcrypt_rounds"] = measure(
+        lambda: calibrate_bcrypt_rounds(args.target_ms, BCRYPT_MIN_ROUNDS, BCRYPT_MAX_ROUNDS),
+        repeat=3, warmup=0,
+    )
+    configure_password_hashing(rounds)
+    actual = measure(lambda: pwd_context.hash(PASSWORD), repeat=3, warmup=1)["median_ms"]
+    print(f"calibrated rounds={rounds} for target {args.target_ms:.0f} ms: "
+          f"estimated {estimate:.0f} ms, measured {actual:.0f} ms")
+    if BCRYPT_MIN_ROUNDS < rounds < BCRYPT_MAX_ROUNDS:
+        assert args.target_ms / 2 <= actual <= args.target_ms * 2, (
+            f"calibrated hash takes {actual:.0f} ms for a {args.target_ms:.0f} ms target"
+        )
+
+    # 現在以上のコストのハッシュは作り直さず、低いコストのハッシュはログイン時に作り直す
+    # （計測結果が異なる他のワーカーで作られたハッシュも、高いコストなら作り直さない）
+    current_hash = pwd_context.hash(PASSWORD)
+    stale_hash = bcrypt.using(rounds=rounds - 1).hash(PASSWORD)
+    assert verify_and_update_password(PASSWORD, current_hash) == (True, None)
+    assert not pwd_context.needs_update(bcrypt.using(rounds=rounds + 1).hash(PASSWORD))
+    verified, new_hash = verify_and_update_password(PASSWORD, stale_hash)
+    assert verified and new_hash and not pwd_context.needs_update(new_hash)
+    assert verify_and_update_password("wrong password", stale_hash) == (False, None)
+
+    results["login (current cost)"] = measure(
+        lambda: verify_and_update_password(PASSWORD, current_hash), repeat=3, warmup=1
+    )
+    results["login (stale cost, rehash)"] = measure(
+        lambda: verify_and_update_password(PASSWORD, stale_hash), repeat=3, warmup=1
+    )
+    report("bcrypt", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+漏えい済みパスワード判定のベンチマーク
+
+--entries 件のパスワード一覧から実際にフィルタを作成し、作成時間・登録済みパスワードが
+必ず含まれること・偽陽性率を検証する。さらに --synthetic-entries 件（既定1億件）相当の
+大きさのフィルタで、判定時間と判定による常駐メモリの増加を計測する。
+大きいフィルタはビットの半分が立った状態（最適な充填率）のランダムなビット列で代用する。
+
+    python -m benchmarks.bench_breached_passwords --entries 1000000 --synthetic-entries 100000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from app.core.breached_passwords import (
+    HEADER,
+    MAGIC,
+    BreachedPasswordFilter,
+    build_filter,
+    filter_parameters,
+)
+
+from .common import measure, report, seeded_random
+
+LOOKUPS = 10_000
+
+
+def resident_kib() -> int:
+    """現在の常駐メモリ（KiB）"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def write_synthetic_filter(path: str, entries: int, error_rate: float) -> None:
+    size, hash_count = filter_parameters(entries, error_rate)
+    remaining = (size + 7) // 8
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, size, hash_count, 0, entries))
+        while remaining:
+            chunk = min(remaining, 16 * 1024 * 1024)
+            f.write(os.urandom(chunk))
+            remaining -= chunk
+
+
+def lookups(breached: BreachedPasswordFilter, passwords):
+    def run():
+        for password in passwords:
+            password in breached
+    return run
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the breached-password filter")
+    parser.add_argument("--entries", type=int, default=1_000_000, help="実際に作成するフィルタの件数")
+    parser.add_argument("--synthetic-entries", type=int, default=100_000_000,
+                        help="判定時間を計測する大きいフィルタの件数")
+    parser.add_argument("--error-rate", type=float, default=0.001)
+    args = parser.parse_args()
+
+    rng = seeded_random()
+    unknown = [f"unknown-{rng.random()}" for _ in range(LOOKUPS)]
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "passwords.txt")
+        with open(source, "w") as f:
+            for i in range(args.entries):
+                f.write(f"breached-{i}\n")
+
+        path = os.path.join(directory, "breached.bloom")
+        started = time.perf_counter()
+        build_filter(source, path, error_rate=args.error_rate, entries=args.entries)
+        build_seconds = time.perf_counter() - started
+        breached = BreachedPasswordFilter(path)
+
+        known = [f"breached-{rng.randrange(args.entries)}" for _ in range(LOOKUPS)]
+        assert all(password in breached for password in known), "a listed password was not found"
+        false_positives = sum(password in breached for password in unknown)
+        assert false_positives <= max(10, LOOKUPS * args.error_rate * 3), (
+            f"{false_positives} false positives in {LOOKUPS} lookups"
+        )
+        print(f"built {args.entries:,} entries in {build_seconds:.1f}s "
+              f"({os.path.getsize(path) / 2 ** 20:.1f} MiB, "
+              f"{build_seconds / args.entries * 1e6:.1f} us/entry); "
+              f"false positives {false_positives}/{LOOKUPS}")
+
+        results[f"{args.entries:,} entries, listed"] = measure(lookups(breached, known), repeat=10)
+        results[f"{args.entries:,} entries, not listed"] = measure(lookups(breached, unknown), repeat=10)
+        breached.close()
+
+        large = os.path.join(directory, "synthetic.bloom")
+        write_synthetic_filter(large, args.synthetic_entries, args.error_rate)
+        before = resident_kib()
+        breached = BreachedPasswordFilter(large)
+        cold = measure(lookups(breached, unknown), repeat=1, warmup=0)
+        results[f"{args.synthetic_entries:,} entries, first lookups"] = cold
+        results[f"{args.synthetic_entries:,} entries, not listed"] = measure(
+            lookups(breached, unknown), repeat=10
+        )
+        resident = resident_kib() - before
+        print(f"{args.synthetic_entries:,}-entry filter: {breached.nbytes / 2 ** 20:.0f} MiB mapped, "
+              f"resident +{resident / 1024:.1f} MiB after {LOOKUPS * 12:,} lookups")
+        breached.close()
+
+    for stats in results.values():
+        stats["us_per_lookup"] = stats["median_ms"] * 1000 / LOOKUPS
+    report(f"breached-password filter ({LOOKUPS:,} lookups per sample)", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+条件付きGET（ETag）のポーリングベンチマーク
+
+SWR の再検証を想定し、教材一覧を一定間隔でポーリングする間に
+まれに更新が入るパターンで、毎回全件を返す場合と ETag で304を返す場合の
+転送量とレイテンシを比較する。更新とポーリングは別のセッション（別ワーカーに相当）で行う。
+あわせて以下を検証する。
+- 別のセッションでコミットした更新（ORM・Core の UPDATE 文）でETagが変わること
+- ロールバックした更新、ダウンロード数・参加人数のみの更新ではETagが変わらないこと
+- 予約・レッスンの変更では、関係する講師・受講者のスケジュールのみETagが変わること
+"""
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+from app.core.collection_versions import (
+    collection_versions,
+    is_not_modified,
+    material_collections,
+    schedule_collections
+)
+from app.models.lesson import Lesson, LessonStatus, LessonType
+from app.models.material import Material
+from app.models.payment import Payment, PaymentMethod, PaymentStatus
+from app.services import material_service
+
+from .common import create_sqlite_session, measure, report
+
+MATERIALS = 10_000
+PAGE_SIZE = 100
+POLLS = 1_000
+WRITE_EVERY = 50  # 50回のポーリングにつき1回更新が入る
+USER_ID = "bench-user"
+
+
+def _request(etag=None) -> Request:
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({"type": "http", "method": "GET", "path": "/materials/list", "headers": headers})
+
+
+def verify(db, writer) -> None:
+    def etag(names):
+        return collection_versions.validators(db, names, scope=USER_ID)[0]
+
+    materials = material_collections(USER_ID)
+    before = etag(materials)
+    writer.query(Material).filter(Material.id == 1).one().title = "Renamed"
+    writer.flush()
+    writer.rollback()
+    assert etag(materials) == before, "a rolled back change bumped the version"
+
+    writer.query(Material).filter(Material.id == 1).one().title = "Renamed"
+    writer.commit()
+    after_orm = etag(materials)
+    assert after_orm != before
+
+    # ダウンロード数の反映（download_counter.flush）と同じ UPDATE 文では一覧の内容は変わらない
+    writer.execute(update(Material).where(Material.id == 1).values(
+        download_count=Material.download_count + 1, updated_at=Material.updated_at
+    ))
+    writer.commit()
+    writer.query(Material).filter(Material.id == 2).one().download_count += 1
+    writer.commit()
+    assert etag(materials) == after_orm, "a download count update bumped the version"
+
+    writer.execute(update(Material).where(Material.id == 1).values(is_public=False))
+    writer.commit()
+    assert etag(materials) != after_orm
+
+    writer.execute(insert(Lesson.__table__).values(
+        id=1, title="Lesson", start_time=datetime(2024, 6, 3, 10), end_time=datetime(2024, 6, 3, 10, 50),
+        duration=50, lesson_type=LessonType.GROUP.name, status=LessonStatus.SCHEDULED.name,
+        price=50.0, teacher_id=1, max_participants=5, current_participants=0, is_active=True,
+    ))
+    writer.commit()
+    student, other = schedule_collections("2"), schedule_collections("3")
+    teacher = schedule_collections("1")
+    versions = {name: etag(names) for name, names in
+                (("student", student), ("other", other), ("teacher", teacher))}
+
+    # 予約枠の確保（lesson_service.reserve_seats）と同じ UPDATE 文では進めない
+    writer.execute(update(Lesson).where(Lesson.id == 1).values(
+        current_participants=Lesson.current_participants + 1
+    ))
+    writer.commit()
+    assert etag(student) == versions["student"], "a seat reservation bumped the version"
+
+    # 予約の決済は、その受講者のスケジュールのみを進める
+    writer.add(Payment(
+        user_id=2, lesson_id=1, amount=50.0, currency="usd",
+        payment_method=PaymentMethod.CREDIT_CARD, status=PaymentStatus.COMPLETED,
+    ))
+    writer.commit()
+    assert etag(student) != versions["student"]
+    assert etag(other) == versions["other"], "a booking bumped another user's schedule"
+    assert etag(teacher) == versions["teacher"]
+
+    # レッスンの変更は、講師と予約した受講者のスケジュールを進める
+    versions["student"] = etag(student)
+    writer.query(Lesson).filter(Lesson.id == 1).one().title = "Renamed lesson"
+    writer.commit()
+    assert etag(teacher) != versions["teacher"]
+    assert etag(student) != versions["student"]
+    assert etag(other) == versions["other"], "a lesson change bumped an unrelated schedule"
+
+
+def main() -> None:
+    db = create_sqlite_session()
+    db.execute(insert(Material.__table__), [
+        {"title": f"Material {i}", "description": "説明 " * 50, "is_public": True,
+         "download_count": 0, "created_at": datetime(2024, 1, 1) + timedelta(minutes=i)}
+        for i in range(MATERIALS)
+    ])
+    db.commit()
+    writer = sessionmaker(bind=db.get_bind())()
+    verify(db, writer)
+
+    def write() -> None:
+        writer.execute(update(Material).where(Material.id == 1).values(is_public=True))
+        writer.commit()
+
+    def full_response() -> bytes:
+        page = material_service.get_materials(db, USER_ID, limit=PAGE_SIZE)
+        return json.dumps(page, default=str).encode("utf-8")
+
+    def poll_without_etag() -> int:
+        sent = 0
+        for i in range(POLLS):
+            if i % WRITE_EVERY == 0:
+                write()
+            sent += len(full_response())
+        return sent
+
+    def poll_with_etag() -> int:
+        sent = 0
+        client_etag = None
+        for i in range(POLLS):
+            if i % WRITE_EVERY == 0:
+                write()
+            etag, last_modified = collection_versions.validators(
+                db, material_collections(USER_ID), scope=f"materials:{USER_ID}"
+            )
+            if is_not_modified(_request(client_etag), etag, last_modified):
+                continue
+            sent += len(full_response())
+            client_etag = etag
+        return sent
+
+    bytes_plain = poll_without_etag()
+    bytes_etag = poll_with_etag()
+
+    results = {
+        "always 200": {"bytes": float(bytes_plain), **measure(poll_without_etag, repeat=3)},
+        "etag / 304": {"bytes": float(bytes_etag), **measure(poll_with_etag, repeat=3)},
+    }
+    report(f"polling {POLLS} times, 1 write per {WRITE_EVERY} polls "
+           f"(saved {100 * (1 - bytes_etag / bytes_plain):.1f}% bytes)", results)
+
+
+if __name__ == "__main__":
+    main()
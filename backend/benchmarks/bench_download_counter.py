@@ -0,0 +1,82 @@
+"""
+ダウンロード数カウンターのストレステスト兼ベンチマーク
+
+多数のスレッドから同時にダウンロード数を加算しながら定期反映を行い、
+停止後のDB上の合計が加算回数と一致すること（更新が失われないこと）と、
+反映で updated_at が変わらないこと（内容の変更として扱われないこと）を検証する。
+"""
+import random
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, insert, func
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.download_counter import DownloadCounter
+from app.models.base import Base
+from app.models.material import Material
+
+from .common import report
+
+MATERIALS = 1_000
+UPDATED_AT = datetime(2024, 1, 1)
+THREADS = 32
+INCREMENTS_PER_THREAD = 50_000
+FLUSH_INTERVAL = 0.05
+SEED = 20241117
+
+
+def main() -> None:
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+
+    with session_factory() as db:
+        db.execute(insert(Material.__table__), [
+            {"id": i, "title": f"Material {i}", "download_count": 0, "updated_at": UPDATED_AT}
+            for i in range(1, MATERIALS + 1)
+        ])
+        db.commit()
+
+    counter = DownloadCounter(flush_interval=FLUSH_INTERVAL)
+    counter.start(session_factory)
+
+    def worker(seed: int) -> None:
+        rng = random.Random(seed)
+        for _ in range(INCREMENTS_PER_THREAD):
+            counter.increment(rng.randint(1, MATERIALS))
+
+    threads = [threading.Thread(target=worker, args=(SEED + i,)) for i in range(THREADS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    counter.stop()
+
+    expected = THREADS * INCREMENTS_PER_THREAD
+    with session_factory() as db:
+        total = db.query(func.sum(Material.download_count)).scalar()
+        updated_at = db.query(func.max(Material.updated_at)).scalar()
+    assert total == expected, f"lost updates: expected {expected}, got {total}"
+    assert updated_at == UPDATED_AT, "flushing download counts changed updated_at"
+    assert not counter.pending(), "counts left unflushed after stop()"
+
+    report(f"download counter ({THREADS} threads, {MATERIALS} materials)", {
+        "increments": {
+            "total": float(expected),
+            "elapsed_s": elapsed,
+            "ops_per_s": expected / elapsed,
+        },
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+ストリーミングエクスポートのメモリベンチマーク
+
+数百万件の決済をファイルベースのSQLiteに投入し、CSV/NDJSON（gzipあり・なし）で
+エクスポートしながら一定間隔でRSSを計測する。出力件数が増えてもRSSが
+増え続けない（ほぼ一定である）ことを検証する。
+"""
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.core.export_stream import iter_export
+from app.core.readonly_rows import PaymentRow
+from app.models.base import Base
+from app.models.payment import Payment, PaymentMethod, PaymentStatus
+
+from .common import report
+
+ROWS = 3_000_000
+BATCH_SIZE = 100_000
+# 出力開始直後からのRSS増加の許容量
+RSS_GROWTH_LIMIT_MB = 32
+
+
+def rss_mb() -> float:
+    """現在のRSS（MB）を返す（Linux）"""
+    with open("/proc/self/statm") as f:
+        resident_pages = int(f.read().split()[1])
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+def seed(session_factory) -> None:
+    base = datetime(2024, 1, 1)
+    with session_factory() as db:
+        for offset in range(0, ROWS, BATCH_SIZE):
+            db.execute(insert(Payment.__table__), [
+                {
+                    "user_id": i % 10000,
+                    "lesson_id": i,
+                    "amount": 50.0 + i % 7,
+                    "currency": "USD",
+                    "payment_method": PaymentMethod.CREDIT_CARD.name,
+                    "status": PaymentStatus.COMPLETED.name,
+                    "stripe_payment_intent_id": f"pi_{i}",
+                    "created_at": base + timedelta(seconds=i),
+                }
+                for i in range(offset, min(offset + BATCH_SIZE, ROWS))
+            ])
+            db.commit()
+
+
+def run_export(session_factory, export_format: str, gzip: bool) -> dict:
+    statement = PaymentRow.select().order_by(Payment.id)
+    written = 0
+    samples = []
+    started = time.perf_counter()
+    for index, chunk in enumerate(
+        iter_export(session_factory, PaymentRow, statement, export_format=export_format, gzip=gzip)
+    ):
+        written += len(chunk)
+        if index % 200 == 0:
+            samples.append(rss_mb())
+    elapsed = time.perf_counter() - started
+
+    # 立ち上がり（最初の数サンプル）以降のRSSの増加量
+    baseline = samples[min(3, len(samples) - 1)]
+    growth = max(samples) - baseline
+    assert growth < RSS_GROWTH_LIMIT_MB, f"RSS grew by {growth:.1f} MB during export"
+    return {
+        "output_mb": written / 1024 / 1024,
+        "elapsed_s": elapsed,
+        "rows_per_s": ROWS / elapsed,
+        "rss_start_mb": baseline,
+        "rss_growth_mb": growth,
+    }
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{directory}/export.db")
+        Base.metadata.create_all(engine)
+        session_factory = sessionmaker(bind=engine)
+        seed(session_factory)
+
+        results = {}
+        for export_format in ("csv", "ndjson"):
+            for gzip in (False, True):
+                name = f"{export_format}{' + gzip' if gzip else ''}"
+                results[name] = run_export(session_factory, export_format, gzip)
+        report(f"streaming export ({ROWS:,} payments)", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+主要な処理経路のベンチマーク
+
+固定シードの合成データに対して、以下の処理時間を計測する。
+外部サービス（Stripe・SMTP・Google Drive）は benchmarks.stubs の代替実装に置き換える。
+
+- ScheduleManager.get_available_slots / 重複チェック
+- create_access_token / get_current_user
+- パスワードのハッシュ化・検証（bcrypt）
+- メールテンプレートの描画と送信
+- 教材一覧の取得とシリアライズ
+- Stripe Webhook の処理
+- Google Drive 連携
+
+結果はJSONで出力でき、以前の結果と比較して劣化を検出できる:
+    python -m benchmarks.bench_hot_paths --json before.json
+    python -m benchmarks.bench_hot_paths --json after.json --compare before.json
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.core.email_service import EmailService
+from app.core.fast_json import dumps
+from app.core.gdrive_connector import GoogleDriveConnector
+from app.core.payment_processor import PaymentProcessor
+from app.core.schedule_manager import ScheduleManager
+from app.core.security import create_access_token, get_current_user, get_password_hash, verify_password
+from app.models.lesson import Lesson, LessonStatus, LessonType
+from app.models.material import Material
+from app.schemas.material import MaterialList
+from app.services import material_service
+
+from . import stubs
+from .common import compare, create_sqlite_session, measure, report, seeded_random, write_json
+
+TEACHERS = 50
+LESSONS = 20_000
+MATERIALS = 5_000
+START = datetime(2024, 6, 3, 0, 0)
+
+TEMPLATES = {
+    "welcome": "<h1>Welcome, {{ username }}!</h1><p>Thanks for joining SpeakPro.</p>",
+    "lesson_confirmation": (
+        "<h1>{{ title }}</h1><p>{{ teacher_name }} / {{ start_time }} - {{ end_time }}</p>"
+        "<ul>{% for item in agenda %}<li>{{ item }}</li>{% endfor %}</ul>"
+        "<a href=\"{{ meeting_url }}\">Join</a>"
+    ),
+}
+
+
+def seed(db) -> None:
+    rng = seeded_random()
+    lessons = []
+    for i in range(1, LESSONS + 1):
+        start = START + timedelta(days=rng.randrange(90), hours=rng.randrange(9, 21),
+                                  minutes=rng.choice((0, 30)))
+        lessons.append({
+            "id": i, "title": f"Lesson {i}", "start_time": start,
+            "end_time": start + timedelta(minutes=50), "duration": 50,
+            "lesson_type": LessonType.INDIVIDUAL.name, "status": LessonStatus.SCHEDULED.name,
+            "price": 50.0, "teacher_id": rng.randrange(1, TEACHERS + 1), "is_active": True,
+        })
+    db.execute(insert(Lesson.__table__), lessons)
+    db.execute(insert(Material.__table__), [
+        {"id": i, "title": f"Material {i}", "description": "Lorem ipsum " * rng.randrange(5, 50),
+         "file_type": "PDF", "is_public": True, "download_count": rng.randrange(1000),
+         "created_at": START - timedelta(minutes=i)}
+        for i in range(1, MATERIALS + 1)
+    ])
+    db.commit()
+
+
+def build_cases(db, loop, template_dir: str) -> dict:
+    manager = ScheduleManager(db)
+
+    token = create_access_token({"sub": "user@example.com"})
+    password_hash = get_password_hash("correct horse battery staple")
+
+    email_service = EmailService()
+    email_service.template_dir = template_dir
+    email_service.default_sender = "noreply@example.com"
+    email_service._create_smtp_connection = lambda: stubs.FakeSMTP()
+    lesson_details = {
+        "title": "Business English", "teacher_name": "Teacher 1",
+        "start_time": "2024-06-03 10:00", "end_time": "2024-06-03 10:50",
+        "agenda": ["Warm-up", "Vocabulary", "Role play", "Feedback"],
+        "meeting_url": "https://meet.example.com/abc",
+    }
+
+    processor = PaymentProcessor(db=db)
+    processor._stripe = stubs.FakeStripe()
+    intent = loop.run_until_complete(processor.create_payment_intent(5000))
+    payload = stubs.payment_succeeded_event(intent.payment_intent_id)
+    signature = stubs.sign_payload(payload, settings.STRIPE_WEBHOOK_SECRET)
+
+    drive = GoogleDriveConnector()
+    drive.service = stubs.FakeDriveService()
+    folder_id = drive.create_folder("materials")
+
+    def material_page():
+        page = material_service.get_materials(db, "bench-user", limit=50)
+        return MaterialList(**page).json()
+
+    return {
+        "get_available_slots (1 week)": lambda: loop.run_until_complete(
+            manager.get_available_slots(1, START, START + timedelta(days=7))
+        ),
+        "get_available_slots (30 days)": lambda: loop.run_until_complete(
+            manager.get_available_slots(1, START, START + timedelta(days=30))
+        ),
+        "schedule conflict check": lambda: manager._check_schedule_conflict(
+            START + timedelta(days=10, hours=10), START + timedelta(days=10, hours=10, minutes=50)
+        ),
+        "create_access_token": lambda: create_access_token({"sub": "user@example.com"}),
+        "get_current_user": lambda: loop.run_until_complete(get_current_user(token)),
+        "get_password_hash": lambda: get_password_hash("correct horse battery staple"),
+        "verify_password": lambda: verify_password("correct horse battery staple", password_hash),
+        "email render + send (stub SMTP)": lambda: loop.run_until_complete(
+            email_service.send_lesson_confirmation("student@example.com", lesson_details)
+        ),
+        "material list (pydantic json)": material_page,
+        "material list (fast_json)": lambda: dumps(
+            material_service.get_materials(db, "bench-user", limit=50)
+        ),
+        "stripe webhook (stub Stripe)": lambda: loop.run_until_complete(
+            processor.handle_webhook_event(payload, signature)
+        ),
+        "drive upload + list (stub Drive)": lambda: (
+            drive.upload_file(__file__, folder_id), drive.list_files(folder_id)
+        ),
+    }
+
+
+# bcrypt は1回が数百ミリ秒かかるため計測回数を減らす
+SLOW_CASES = {"get_password_hash", "verify_password"}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the core hot paths")
+    parser.add_argument("--json", help="結果をJSONで書き出すパス")
+    parser.add_argument("--compare", help="比較対象の以前のJSON結果")
+    parser.add_argument("--threshold", type=float, default=0.10, help="劣化とみなす割合（既定10%%）")
+    parser.add_argument("--filter", default="", help="ケース名に含まれる文字列で絞り込む")
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    db = create_sqlite_session()
+    seed(db)
+    loop = asyncio.new_event_loop()
+
+    with tempfile.TemporaryDirectory() as template_dir:
+        for name, source in TEMPLATES.items():
+            with open(os.path.join(template_dir, f"{name}.html"), "w") as f:
+                f.write(source)
+
+        results = {}
+        for name, case in build_cases(db, loop, template_dir).items():
+            if args.filter not in name:
+                continue
+            repeat = max(3, args.repeat // 10) if name in SLOW_CASES else args.repeat
+            results[name] = measure(case, repeat=repeat, warmup=1)
+
+    report("core hot paths", results)
+    if args.json:
+        write_json(args.json, "hot_paths", results)
+
+    if args.compare:
+        regressions = compare(args.compare, results, threshold=args.threshold)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+計測ミドルウェア・サブシステムタイマーのオーバーヘッドのベンチマーク
+
+教材一覧と同等の処理（SQLite への一覧クエリとJSONエンコード）を行うASGIアプリを、
+HTTPクライアントを介さずに直接呼び出し、以下の3通りで比較する。
+
+- baseline: ミドルウェアなし・計測無効
+- no-op:    ミドルウェアあり・計測無効（INSTRUMENTATION=off）
+- metrics:  ミドルウェアあり・ヒストグラム集計とDB・サブシステムタイマー有効
+
+metrics のオーバーヘッドが baseline の2%未満であることを検証する。
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app.core.fast_json import dumps
+from app.core.instrumentation import Instrumentation, InstrumentationMiddleware, instrumentation
+from app.models.material import Material
+from app.services import material_service
+
+from .common import create_sqlite_session, measure, report
+
+MATERIALS = 1000
+REQUESTS_PER_SAMPLE = 200
+OVERHEAD_LIMIT = 0.02
+ROUNDS = 3
+
+
+class _Route:
+    path = "/materials/list"
+
+
+def seed(db) -> None:
+    db.execute(insert(Material.__table__), [
+        {"id": i, "title": f"Material {i}", "description": "x" * 300, "is_public": True,
+         "download_count": 0, "created_at": datetime(2024, 1, 1) + timedelta(minutes=i)}
+        for i in range(1, MATERIALS + 1)
+    ])
+    db.commit()
+
+
+def build_app(db, registry: Instrumentation):
+    async def endpoint(scope, receive, send):
+        scope["route"] = _Route()
+        with registry.timer("service", "get_materials"):
+            page = material_service.get_materials(db, "bench-user", limit=50)
+        body = dumps(page)
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+    return endpoint
+
+
+def run_requests(loop, app) -> None:
+    scope = {"type": "http", "method": "GET", "path": "/materials/list", "headers": []}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    async def batch():
+        for _ in range(REQUESTS_PER_SAMPLE):
+            await app(dict(scope), receive, send)
+
+    loop.run_until_complete(batch())
+
+
+def main() -> None:
+    db = create_sqlite_session()
+    seed(db)
+    loop = asyncio.new_event_loop()
+    # 共有インスタンス（サービス内のタイマー）は無効にし、比較対象のインスタンスのみで計測する
+    instrumentation.configure("off")
+
+    disabled = Instrumentation(mode="off")
+    enabled = Instrumentation(mode="metrics")
+    configurations = {
+        "baseline": (disabled, build_app(db, disabled)),
+        "no-op (INSTRUMENTATION=off)": (
+            disabled, InstrumentationMiddleware(build_app(db, disabled), registry=disabled)
+        ),
+        "metrics": (enabled, InstrumentationMiddleware(build_app(db, enabled), registry=enabled)),
+    }
+
+    # 計測順による偏りを避けるため、設定を入れ替えながら複数回計測し、最良の中央値を採用する
+    results = {}
+    for _ in range(ROUNDS):
+        for name, (registry, app) in configurations.items():
+            # DBリスナーはエンジン全体で共有されるため、計測対象の設定のみ有効にする
+            enabled.enabled = registry is enabled
+            stats = measure(lambda: run_requests(loop, app), repeat=15)
+            if name not in results or stats["median_ms"] < results[name]["median_ms"]:
+                results[name] = stats
+
+    baseline = results["baseline"]["median_ms"]
+    for stats in results.values():
+        stats["overhead_pct"] = (stats["median_ms"] - baseline) / baseline * 100
+    report(f"instrumentation overhead ({REQUESTS_PER_SAMPLE} requests per sample)", results)
+
+    assert enabled.request_duration.count(("GET", "/materials/list", "200")) > 0
+    overhead = results["metrics"]["overhead_pct"] / 100
+    assert overhead < OVERHEAD_LIMIT, f"instrumentation overhead {overhead:.1%} exceeds {OVERHEAD_LIMIT:.0%}"
+
+
+if __name__ == "__main__":
+    main()
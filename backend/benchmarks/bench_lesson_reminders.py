@@ -0,0 +1,188 @@
+"""
+レッスンのリマインダー送信のベンチマーク
+
+今後5日間のレッスン（受講者1〜2人）を一時ディレクトリのSQLite（WAL）に登録し、
+時刻を30分ずつ進めながら、2つのワーカー（LessonReminderDispatcher）に同時に検出・送信させる。
+途中で一方のワーカーを新しいインスタンスに置き換え（再起動）、以下を検証する。
+- 受講者ごとのリマインダー・予約変更期限の通知が、それぞれちょうど1回送信されること
+  （SMTPの送信数と送信済みの行数が、期待される件数と一致すること）
+- キャンセル済みのレッスンには送信しないこと
+- 送信期限の到来した送信待ちの行が残らないこと
+SMTPは benchmarks.stubs.FakeSMTP に置き換え、接続数からバッチ送信の効果も確認する。
+
+    python -m benchmarks.bench_lesson_reminders --lessons 20000
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, func, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.core.email_service import get_email_service
+from app.core.lesson_reminders import LESSON_CHANGE_DEADLINE_DAYS, LessonReminderDispatcher
+from app.models.base import Base
+from app.models.lesson import Lesson, LessonStatus, LessonType
+from app.models.lesson_notification import (
+    LessonNotification,
+    NotificationKind,
+    NotificationStatus,
+)
+from app.models.payment import Payment, PaymentMethod, PaymentStatus
+from app.models.user import User
+
+from . import stubs
+from .common import report, seeded_random
+
+TICK = timedelta(minutes=30)
+DAYS = 5
+STUDENTS = 2_000
+CANCELLED_RATIO = 0.05
+
+
+def seed(engine, lessons: int, start: datetime):
+    """レッスン・受講者・決済を登録し、期待される通知の件数を返す"""
+    rng = seeded_random()
+    users = [
+        {"id": str(index), "email": f"student{index}@example.com", "hashed_password": "x",
+         "first_name": f"Student{index}", "is_active": True}
+        for index in range(1, STUDENTS + 1)
+    ]
+    lesson_rows, payment_rows = [], []
+    expected = {NotificationKind.LESSON_REMINDER: 0, NotificationKind.CHANGE_DEADLINE: 0}
+    for lesson_id in range(1, lessons + 1):
+        lesson_start = start + timedelta(minutes=30 * rng.randrange(1, DAYS * 48))
+        cancelled = rng.random() < CANCELLED_RATIO
+        lesson_rows.append({
+            "id": lesson_id, "title": f"Lesson {lesson_id}", "start_time": lesson_start,
+            "end_time": lesson_start + timedelta(minutes=50), "duration": 50,
+            "lesson_type": LessonType.INDIVIDUAL.name,
+            "status": (LessonStatus.CANCELLED if cancelled else LessonStatus.SCHEDULED).name,
+            "price": 50.0, "teacher_id": 1, "is_active": True, "updated_at": start,
+        })
+        for student in rng.sample(range(1, STUDENTS + 1), rng.choice((1, 1, 2))):
+            payment_rows.append({
+                "user_id": student, "lesson_id": lesson_id, "amount": 50.0,
+                "payment_method": PaymentMethod.CREDIT_CARD.name,
+                "status": PaymentStatus.COMPLETED.name, "completed_at": start - timedelta(days=1),
+            })
+            if cancelled:
+                continue
+            expected[NotificationKind.LESSON_REMINDER] += 1
+            if lesson_start > start + timedelta(days=LESSON_CHANGE_DEADLINE_DAYS):
+                expected[NotificationKind.CHANGE_DEADLINE] += 1
+
+    with engine.begin() as connection:
+        connection.execute(insert(User.__table__), users)
+        connection.execute(insert(Lesson.__table__), lesson_rows)
+        connection.execute(insert(Payment.__table__), payment_rows)
+    return expected
+
+
+def run_worker(dispatcher, now, errors):
+    for _ in range(20):
+        try:
+            dispatcher.run_once(now)
+            return
+        except Exception as e:
+            # SQLite の "database is locked" などは再試行する
+            last_error = e
+            time.sleep(0.01)
+    errors.append(last_error)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the lesson reminder dispatcher")
+    parser.add_argument("--lessons", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+
+    email_service = get_email_service()
+    email_service._create_smtp_connection = lambda: stubs.FakeSMTP()
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        engine = create_engine(f"sqlite:///{os.path.join(tempdir, 'reminders.db')}",
+                               connect_args={"check_same_thread": False, "timeout": 30})
+
+        @event.listens_for(engine, "connect")
+        def _set_sqlite_pragmas(connection, _):
+            connection.execute("PRAGMA journal_mode=WAL")
+
+        Base.metadata.create_all(engine)
+        session_factory = sessionmaker(bind=engine)
+        start = datetime.utcnow().replace(second=0, microsecond=0)
+        expected = seed(engine, args.lessons, start)
+
+        def worker():
+            dispatcher = LessonReminderDispatcher(batch_size=args.batch_size, poll_interval=TICK.seconds)
+            dispatcher._session_factory = session_factory
+            return dispatcher
+
+        workers = [worker(), worker()]
+        retired = []
+        errors = []
+        ticks = 0
+        started = time.perf_counter()
+        now = start
+        while now <= start + timedelta(days=DAYS):
+            if now == start + timedelta(days=DAYS // 2):
+                # 一方のワーカーを再起動する（検出済みの範囲などのメモリ上の状態は失われる）
+                retired.append(workers[0])
+                workers[0] = worker()
+            threads = [threading.Thread(target=run_worker, args=(w, now, errors)) for w in workers]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            ticks += 1
+            now += TICK
+        elapsed = time.perf_counter() - started
+        assert not errors, errors
+
+        db = session_factory()
+        try:
+            sent = dict(
+                db.query(LessonNotification.kind, func.count())
+                .filter(LessonNotification.status == NotificationStatus.SENT)
+                .group_by(LessonNotification.kind)
+            )
+            duplicates = db.query(
+                LessonNotification.lesson_id, LessonNotification.user_id, LessonNotification.kind
+            ).group_by(
+                LessonNotification.lesson_id, LessonNotification.user_id, LessonNotification.kind
+            ).having(func.count() > 1).count()
+            overdue = db.query(LessonNotification).filter(
+                LessonNotification.status == NotificationStatus.PENDING,
+                LessonNotification.due_at <= now
+            ).count()
+            cancelled = db.query(LessonNotification).join(
+                Lesson, Lesson.id == LessonNotification.lesson_id
+            ).filter(Lesson.status == LessonStatus.CANCELLED).count()
+        finally:
+            db.close()
+        engine.dispose()
+
+    total = sum(expected.values())
+    for kind, count in expected.items():
+        assert sent.get(kind, 0) == count, (kind, sent.get(kind, 0), count)
+    assert stubs.FakeSMTP.sent == total, (stubs.FakeSMTP.sent, total)
+    assert duplicates == 0 and overdue == 0 and cancelled == 0, (duplicates, overdue, cancelled)
+
+    dispatchers = workers + retired
+    report(f"lesson reminders ({args.lessons:,} lessons over {DAYS} days, 2 workers, {ticks} ticks)", {
+        "dispatch": {
+            "notifications": total,
+            "elapsed_s": elapsed,
+            "notifications_per_hour": total / elapsed * 3600,
+            "smtp_connections": stubs.FakeSMTP.connections,
+            "sent_by_worker_min": min(d.sent for d in dispatchers),
+            "sent_by_worker_max": max(d.sent for d in dispatchers),
+        },
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+教材アクセス権限ベンチマーク
+
+教材20万件（うち公開10%）に対し、教材単位で10,000件、カテゴリー単位で
+数件の権限を持つユーザーについて、閲覧可能教材の一覧取得・閲覧可否の判定・
+閲覧可能集合の計算にかかる時間を計測する。
+あわせて、他ワーカーでの教材の変更が照合で反映され、ロールバックした変更は
+索引に反映されないこと、他ワーカーで剥奪した権限ではダウンロードできないことを検証する。
+"""
+import random
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import delete, insert, update
+
+from app.core.access_index import MaterialAccessIndex
+from app.models.material import Material, MaterialCategory
+from app.models.material_access import MaterialAccess
+from app.services import material_service
+
+from .common import create_sqlite_session, measure, report
+
+MATERIALS = 200_000
+CATEGORIES = 50
+MATERIAL_GRANTS = 10_000
+CATEGORY_GRANTS = 3
+PUBLIC_RATIO = 0.1
+USER_ID = "bench-user"
+SEED = 20241117
+
+
+def seed(db) -> None:
+    rng = random.Random(SEED)
+    db.execute(insert(MaterialCategory.__table__), [
+        {"id": i, "name": f"Category {i}"} for i in range(1, CATEGORIES + 1)
+    ])
+    db.execute(insert(Material.__table__), [
+        {
+            "id": i,
+            "title": f"Material {i}",
+            "category_id": rng.randint(1, CATEGORIES),
+            "is_public": rng.random() < PUBLIC_RATIO,
+            "download_count": 0,
+            "created_at": datetime(2024, 1, 1) + timedelta(minutes=i),
+        }
+        for i in range(1, MATERIALS + 1)
+    ])
+    granted = rng.sample(range(1, MATERIALS + 1), MATERIAL_GRANTS)
+    # executemany は全行で同じ列が必要なため、教材単位とカテゴリー単位で分けて登録する
+    db.execute(insert(MaterialAccess.__table__), [
+        {"user_id": USER_ID, "material_id": material_id} for material_id in granted
+    ])
+    db.execute(insert(MaterialAccess.__table__), [
+        {"user_id": USER_ID, "category_id": category_id}
+        for category_id in rng.sample(range(1, CATEGORIES + 1), CATEGORY_GRANTS)
+    ])
+    db.commit()
+
+
+def verify(db) -> None:
+    """他ワーカーでの変更が照合で反映され、ロールバックした変更は反映されないことを確認する"""
+    index = MaterialAccessIndex(material_ttl=3600)
+    index.register_listeners()
+    index.rebuild(db)
+    private_id = db.query(Material.id).filter(
+        Material.is_public.is_(False), Material.category_id.notin_(
+            db.query(MaterialAccess.category_id).filter(MaterialAccess.category_id.isnot(None))
+        ), Material.id.notin_(
+            db.query(MaterialAccess.material_id).filter(MaterialAccess.material_id.isnot(None))
+        )
+    ).limit(1).scalar()
+    assert not index.can_access(db, USER_ID, private_id)
+
+    # ロールバックした変更は反映しない
+    db.query(Material).filter(Material.id == private_id).one().is_public = True
+    db.flush()
+    db.rollback()
+    assert not index.can_access(db, USER_ID, private_id)
+
+    # ORMイベントを経由しない変更（他ワーカーでの変更に相当）は照合の間隔が過ぎてから反映する
+    db.execute(update(Material.__table__).where(Material.id == private_id).values(is_public=True))
+    db.commit()
+    assert not index.can_access(db, USER_ID, private_id)
+    index.material_ttl = 0
+    assert index.can_access(db, USER_ID, private_id)
+    db.execute(delete(Material.__table__).where(Material.id == private_id))
+    db.commit()
+    assert not index.can_access(db, USER_ID, private_id)
+    assert private_id not in index.visible_material_ids(db, USER_ID)
+
+    # コミットした権限の付与はすぐに反映する
+    index.material_ttl = 3600
+    material_id = db.query(Material.id).filter(Material.is_public.is_(False)).filter(
+        Material.id.notin_(db.query(MaterialAccess.material_id).filter(MaterialAccess.material_id.isnot(None)))
+    ).limit(1).scalar()
+    db.add(MaterialAccess(user_id=USER_ID, material_id=material_id))
+    db.commit()
+    assert index.can_access(db, USER_ID, material_id)
+    assert material_service.download_material(db, material_id, USER_ID)["id"] == material_id
+
+    # 他ワーカーで剥奪した権限は、索引のキャッシュに残っていてもダウンロードを拒否する
+    db.execute(delete(MaterialAccess.__table__).where(
+        MaterialAccess.user_id == USER_ID, MaterialAccess.material_id == material_id
+    ))
+    db.commit()
+    assert index.can_access(db, USER_ID, material_id)
+    try:
+        material_service.download_material(db, material_id, USER_ID)
+    except HTTPException as e:
+        assert e.status_code == 403
+    else:
+        raise AssertionError("a revoked grant still allowed the download")
+
+
+def main() -> None:
+    db = create_sqlite_session()
+    seed(db)
+    verify(db)
+
+    index = MaterialAccessIndex()
+    rng = random.Random(SEED)
+    probes = [rng.randint(1, MATERIALS) for _ in range(10_000)]
+
+    results = {
+        "index rebuild": measure(lambda: index.rebuild(db), repeat=3, warmup=0),
+        "list page 1 (SQL join)": measure(
+            lambda: material_service.get_materials(db, USER_ID, limit=100)
+        ),
+        "visible set (in-memory)": measure(lambda: index.visible_material_ids(db, USER_ID)),
+        "10k can_access checks": measure(
+            lambda: [index.can_access(db, USER_ID, material_id) for material_id in probes]
+        ),
+        "grant + revoke (index only)": measure(
+            lambda: (index.apply_grant(USER_ID, 1, None), index.apply_revoke(USER_ID, 1, None))
+        ),
+    }
+    report(f"material access ({MATERIAL_GRANTS:,} grants, {MATERIALS:,} materials)", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+教材一覧のページネーション比較ベンチマーク
+
+100万件の教材に対して、従来のOFFSETページネーションと
+(created_at, id) のキーセットページネーションで
+1ページ目と10,000ページ目の取得レイテンシを比較する。
+あわせて、作成日時が未設定の行を含む一覧を、カーソルで重複・欠落なく辿れることを検証する。
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app.core.pagination import encode_cursor
+from app.models.material import Material
+from app.services import material_service
+
+from .common import create_sqlite_session, measure, report
+
+TOTAL_MATERIALS = 1_000_000
+PAGE_SIZE = 100
+DEEP_PAGE = 10_000
+BATCH_SIZE = 50_000
+
+
+def seed_materials(db, total: int = TOTAL_MATERIALS) -> None:
+    """説明文の長い教材データを一括投入する"""
+    base_time = datetime(2024, 1, 1)
+    description = "教材の説明 " * 100
+    for offset in range(0, total, BATCH_SIZE):
+        db.execute(
+            insert(Material.__table__),
+            [
+                {
+                    "title": f"Material {i}",
+                    "description": description,
+                    "file_type": "pdf",
+                    "content_url": f"https://drive.example.com/{i}",
+                    "download_count": 0,
+                    "is_public": True,
+                    # 同一時刻の行を含めて id によるタイブレークも検証する
+                    "created_at": base_time + timedelta(seconds=i // 3),
+                }
+                for i in range(offset, min(offset + BATCH_SIZE, total))
+            ]
+        )
+    db.commit()
+
+
+def offset_page(db, page: int):
+    """従来方式: 全カラムを取得しOFFSETで読み飛ばす"""
+    materials = db.query(Material).order_by(
+        Material.created_at.desc(), Material.id.desc()
+    ).offset((page - 1) * PAGE_SIZE).limit(PAGE_SIZE).all()
+    return [material.to_dict() for material in materials]
+
+
+def cursor_for_page(db, page: int) -> str:
+    """指定ページの直前の行からカーソルを作成する（計測対象外）"""
+    row = db.query(Material.created_at, Material.id).order_by(
+        Material.created_at.desc(), Material.id.desc()
+    ).offset((page - 1) * PAGE_SIZE - 1).limit(1).one()
+    return encode_cursor(row.created_at, row.id)
+
+
+def verify() -> None:
+    """作成日時のない行は末尾に並び、どのページサイズでも全行を1回ずつ返すこと"""
+    db = create_sqlite_session()
+    base_time = datetime(2024, 1, 1)
+    db.execute(insert(Material.__table__), [
+        {
+            "title": f"Material {i}",
+            "file_type": "pdf",
+            "download_count": 0,
+            "is_public": True,
+            "created_at": None if i % 4 == 0 else base_time + timedelta(seconds=i // 3),
+        }
+        for i in range(50)
+    ])
+    db.commit()
+    rows = db.query(Material.id, Material.created_at).all()
+    expected = [row.id for row in sorted(
+        rows, key=lambda row: (row.created_at is not None, row.created_at or base_time, row.id), reverse=True
+    )]
+
+    for page_size in (1, 7, 12, 37, 38, 50):
+        listed, cursor = [], None
+        while True:
+            page = material_service.get_materials(db, user_id="bench-user", cursor=cursor, limit=page_size)
+            listed += [material["id"] for material in page["materials"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert listed == expected, (page_size, listed, expected)
+    db.close()
+
+
+def main() -> None:
+    verify()
+
+    db = create_sqlite_session()
+    seed_materials(db)
+    deep_cursor = cursor_for_page(db, DEEP_PAGE)
+
+    results = {
+        "offset page 1": measure(lambda: offset_page(db, 1)),
+        f"offset page {DEEP_PAGE}": measure(lambda: offset_page(db, DEEP_PAGE), repeat=5),
+        "keyset page 1": measure(
+            lambda: material_service.get_materials(db, user_id="bench-user", limit=PAGE_SIZE)
+        ),
+        f"keyset page {DEEP_PAGE}": measure(
+            lambda: material_service.get_materials(
+                db, user_id="bench-user", cursor=deep_cursor, limit=PAGE_SIZE
+            )
+        ),
+    }
+    report(f"material listing ({TOTAL_MATERIALS:,} rows, {PAGE_SIZE}/page)", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+パッケージ予約の自動スケジュール（package_scheduler）のベンチマーク
+
+受講可能時間のルールがある講師2人・営業時間の講師1人に1年分のレッスンを登録し、
+受講者の既存の予約（別の講師）がある状態で、3か月の期間から枠を選ぶ所要時間を
+講師数・枠の数ごとに計測する（目標は中央値 50ms 未満）。
+あわせて以下を検証する。
+- 指定した数の枠が返され、互いの開始時刻が最小間隔以上離れていること
+- 講師の予約済みのレッスン・受講者の既存の予約と重ならないこと
+- 希望の曜日・時間帯に収まる枠が十分にある場合は、開始が遅くてもその範囲から選ばれること
+  （枠の間隔 SLOT_INTERVAL を変えても成り立つこと）
+- 最小間隔のために枠が足りない場合は 409 を返すこと
+"""
+import asyncio
+from datetime import date, datetime, time, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import insert
+
+from app.models.availability import SATURDAY, WEEKDAYS, AvailabilityRule
+from app.models.lesson import Lesson, LessonStatus, LessonType
+from app.models.payment import Payment, PaymentMethod, PaymentStatus
+from app.models.user import User
+from app.schemas.lesson import PreferredTimeWindow
+from app.services.package_scheduler import WEEKDAY_PENALTY, find_package_slots
+
+from .common import create_sqlite_session, measure, report, seeded_random
+
+START = datetime(2024, 6, 3, 0, 0)
+HORIZON = timedelta(days=91)
+LESSONS_PER_TEACHER = 1_500
+TEACHERS = (1, 2, 3)  # 3 は受講可能時間のルールがない（営業時間の）講師
+OTHER_TEACHER = 4
+STUDENT_ID = "1"
+STUDENT_LESSONS = 40
+BUDGET_MS = 50.0
+
+WEEKDAY_PREFERENCE = [0, 2, 4]  # 月・水・金
+EVENING = [PreferredTimeWindow(start=time(18), end=time(21))]
+
+
+def seed(db) -> None:
+    rng = seeded_random()
+    rules = []
+    for teacher_id in (1, 2):
+        rules += [
+            {"teacher_id": teacher_id, "weekdays": WEEKDAYS, "start_time": time(9),
+             "end_time": time(12), "interval_weeks": 1, "valid_from": date(2024, 1, 1), "timezone": "UTC"},
+            {"teacher_id": teacher_id, "weekdays": WEEKDAYS, "start_time": time(17),
+             "end_time": time(22), "interval_weeks": 1, "valid_from": date(2024, 1, 1), "timezone": "UTC"},
+            {"teacher_id": teacher_id, "weekdays": SATURDAY, "start_time": time(10),
+             "end_time": time(16), "interval_weeks": 1, "valid_from": date(2024, 1, 1), "timezone": "UTC"},
+        ]
+    db.execute(insert(AvailabilityRule.__table__), rules)
+
+    lessons = []
+    for teacher_id in TEACHERS:
+        for _ in range(LESSONS_PER_TEACHER):
+            start = START + timedelta(days=rng.randrange(365), hours=rng.randrange(8, 22),
+                                      minutes=rng.choice((0, 30)))
+            lessons.append({
+                "id": len(lessons) + 1, "title": "Lesson", "start_time": start,
+                "end_time": start + timedelta(minutes=50), "duration": 50,
+                "lesson_type": LessonType.INDIVIDUAL.name, "status": LessonStatus.SCHEDULED.name,
+                "price": 50.0, "teacher_id": teacher_id, "is_active": True,
+            })
+
+    # 受講者が別の講師で予約済みのレッスン（希望の時間帯に重なるものを含む）
+    payments = []
+    for _ in range(STUDENT_LESSONS):
+        start = START + timedelta(days=rng.randrange(91), hours=rng.randrange(17, 21),
+                                  minutes=rng.choice((0, 30)))
+        lessons.append({
+            "id": len(lessons) + 1, "title": "Lesson", "start_time": start,
+            "end_time": start + timedelta(minutes=50), "duration": 50,
+            "lesson_type": LessonType.INDIVIDUAL.name, "status": LessonStatus.SCHEDULED.name,
+            "price": 50.0, "teacher_id": OTHER_TEACHER, "is_active": True,
+        })
+        payments.append({
+            "user_id": STUDENT_ID, "lesson_id": len(lessons), "amount": 50.0,
+            "payment_method": PaymentMethod.CREDIT_CARD.name,
+            "status": PaymentStatus.COMPLETED.name, "completed_at": START - timedelta(days=1),
+        })
+
+    db.execute(insert(User.__table__), [
+        {"id": STUDENT_ID, "email": "student@example.com", "hashed_password": "x",
+         "first_name": "Student", "is_active": True},
+    ])
+    db.execute(insert(Lesson.__table__), lessons)
+    db.execute(insert(Payment.__table__), payments)
+    db.commit()
+
+
+def schedule(db, teacher_ids, count, weekdays=None, preferred_times=(), spacing_hours=24):
+    return asyncio.run(find_package_slots(
+        db, STUDENT_ID, teacher_ids, count,
+        weekdays=weekdays, preferred_times=preferred_times,
+        min_spacing=timedelta(hours=spacing_hours),
+        start_date=START, end_date=START + HORIZON, timezone="UTC",
+    ))
+
+
+def overlaps(db, slot, **filters) -> bool:
+    query = db.query(Lesson.id).filter(
+        Lesson.start_time < slot["end_time"],
+        Lesson.end_time > slot["start_time"],
+        Lesson.status != LessonStatus.CANCELLED,
+    )
+    for column, value in filters.items():
+        query = query.filter(getattr(Lesson, column) == value)
+    return query.first() is not None
+
+
+def verify(db) -> None:
+    for teacher_ids in ((1,), TEACHERS):
+        for count in (5, 10, 20):
+            slots = schedule(db, teacher_ids, count, WEEKDAY_PREFERENCE, EVENING)
+            assert len(slots) == count, (teacher_ids, count, len(slots))
+            starts = [slot["start_time"] for slot in slots]
+            assert starts == sorted(starts)
+            for earlier, later in zip(slots, slots[1:]):
+                assert later["start_time"] - earlier["start_time"] >= timedelta(hours=24)
+            for slot in slots:
+                assert slot["teacher_id"] in teacher_ids
+                assert START <= slot["start_time"] and slot["end_time"] <= START + HORIZON
+                assert not overlaps(db, slot, teacher_id=slot["teacher_id"]), slot
+                assert not overlaps(db, slot, teacher_id=OTHER_TEACHER), slot
+                # 希望の曜日・時間帯（18:00〜21:00 に収まるレッスン）に十分な枠がある
+                assert slot["start_time"].weekday() in WEEKDAY_PREFERENCE, slot
+                assert slot["start_time"].time() >= EVENING[0].start, slot
+                assert slot["end_time"] <= datetime.combine(slot["start_time"].date(), EVENING[0].end), slot
+                assert slot["score"] == 0, slot
+
+    # 希望に合う枠が足りない場合は、希望外の枠で補う（希望の曜日がない講師）
+    slots = schedule(db, (1,), 20, [6], EVENING)
+    assert len(slots) == 20
+    assert all(0 < slot["score"] for slot in slots)
+    assert all(slot["score"] < WEEKDAY_PENALTY + 1 for slot in slots), slots
+
+    # 2週間間隔では3か月に7件までしか選べない
+    try:
+        schedule(db, (1,), 8, spacing_hours=24 * 14)
+    except HTTPException as e:
+        assert e.status_code == 409
+    else:
+        raise AssertionError("expected 409")
+
+
+def main() -> None:
+    db = create_sqlite_session()
+    seed(db)
+    verify(db)
+
+    results = {}
+    for name, teacher_ids in (("1 teacher", (1,)), ("3 teachers", TEACHERS)):
+        for count in (5, 20):
+            results[f"{name}, {count} slots"] = measure(
+                lambda: schedule(db, teacher_ids, count, WEEKDAY_PREFERENCE, EVENING), repeat=20
+            )
+    for case, stats in results.items():
+        assert stats["median_ms"] < BUDGET_MS, (case, stats)
+    report(f"package scheduler ({HORIZON.days} day horizon)", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+グループレッスンの同時予約のストレステスト
+
+定員 CAPACITY のレッスン1件に対して BOOKERS 人が同時に予約し、以下の2つの方式を比較する。
+- Python で加算する方式（Lesson を読み込み、add_participant を呼んでコミット）
+- 条件付きUPDATE文（/lessons/book と同じ lesson_service.create_booking）
+条件付きUPDATE文では、成功した予約数・参加者数・予約（決済記録）の件数がいずれも
+定員と一致すること（定員超過も数え漏れもないこと）を検証する。
+
+既定では一時ディレクトリのSQLite（WAL）を使う。SQLiteは書き込みを直列化するため、
+行ロックの挙動を確かめるには --database-url にPostgreSQLなどを指定する。
+
+    python -m benchmarks.bench_participant_capacity --bookers 500 --capacity 50
+    python -m benchmarks.bench_participant_capacity --database-url postgresql://localhost/speakpro_bench
+"""
+import argparse
+import itertools
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event, func, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.models.base import Base
+from app.models.lesson import Lesson, LessonStatus, LessonType
+from app.models.payment import Payment
+from app.schemas.lesson import LessonBookingCreate
+from app.services import lesson_service
+
+from .common import report
+
+# 読み込みからコミットまでの間に行われる処理（予約レコードの作成など）の代わり
+WORK_SECONDS = 0.002
+
+LESSON_START = datetime(2024, 6, 3, 10, 0)
+LESSON_END = datetime(2024, 6, 3, 11, 0)
+
+_user_ids = itertools.count(1)
+
+
+def python_increment(session_factory, lesson_id: int) -> bool:
+    db = session_factory()
+    try:
+        lesson = db.get(Lesson, lesson_id)
+        if not lesson.add_participant():
+            return False
+        time.sleep(WORK_SECONDS)
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+
+def conditional_update(session_factory, lesson_id: int) -> bool:
+    db = session_factory()
+    try:
+        lesson_service.create_booking(
+            db, f"booker-{next(_user_ids)}", LessonBookingCreate(lesson_id=lesson_id)
+        )
+        time.sleep(WORK_SECONDS)
+        return True
+    except HTTPException as e:
+        if e.status_code != 409:
+            raise
+        return False
+    finally:
+        db.close()
+
+
+def run(session_factory, book, lesson_id: int, bookers: int, workers: int):
+    barrier = threading.Barrier(min(workers, bookers))
+
+    def booker(index: int) -> bool:
+        if index < workers:
+            # 最初の一斉予約を同時に開始する
+            barrier.wait()
+        for _ in range(50):
+            try:
+                return book(session_factory, lesson_id)
+            except Exception:
+                # SQLite の "database is locked" などは再試行する
+                time.sleep(0.001)
+        raise RuntimeError("booking kept failing")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        successes = sum(executor.map(booker, range(bookers)))
+    elapsed = time.perf_counter() - started
+
+    db = session_factory()
+    try:
+        participants = db.get(Lesson, lesson_id).current_participants
+        bookings = db.query(func.count(Payment.id)).filter(Payment.lesson_id == lesson_id).scalar()
+    finally:
+        db.close()
+    return successes, participants, bookings, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stress-test concurrent group-lesson bookings")
+    parser.add_argument("--bookers", type=int, default=500)
+    parser.add_argument("--capacity", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=100, help="同時に予約するスレッド数")
+    parser.add_argument("--database-url", help="対象のDB（省略時は一時ディレクトリのSQLite）")
+    args = parser.parse_args()
+
+    tempdir = None
+    url = args.database_url
+    if url is None:
+        tempdir = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{os.path.join(tempdir.name, 'capacity.db')}"
+    sqlite = url.startswith("sqlite")
+    if sqlite:
+        engine = create_engine(url, connect_args={"check_same_thread": False, "timeout": 30})
+
+        @event.listens_for(engine, "connect")
+        def _set_sqlite_pragmas(connection, _):
+            connection.execute("PRAGMA journal_mode=WAL")
+    else:
+        engine = create_engine(url, pool_size=args.workers, max_overflow=0)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+
+    results = {}
+    try:
+        for lesson_id, (name, book) in enumerate(
+            (("python increment", python_increment), ("conditional UPDATE", conditional_update)), 1
+        ):
+            with engine.begin() as connection:
+                connection.execute(insert(Lesson.__table__), [{
+                    "id": lesson_id, "title": "Workshop", "start_time": LESSON_START,
+                    "end_time": LESSON_END, "duration": 60, "lesson_type": LessonType.WORKSHOP.name,
+                    "status": LessonStatus.SCHEDULED.name, "price": 30.0, "teacher_id": 1,
+                    "is_active": True, "max_participants": args.capacity, "current_participants": 0,
+                }])
+            successes, participants, bookings, elapsed = run(
+                session_factory, book, lesson_id, args.bookers, args.workers
+            )
+            results[name] = {
+                "successes": successes,
+                "participants": participants,
+                "overbooked": max(0, successes - args.capacity),
+                "lost_updates": successes - participants,
+                "bookings": bookings,
+                "elapsed_ms": elapsed * 1000,
+                "bookings_per_s": args.bookers / elapsed,
+            }
+
+        atomic = results["conditional UPDATE"]
+        assert atomic["successes"] == atomic["participants"] == atomic["bookings"] == args.capacity, atomic
+    finally:
+        engine.dispose()
+        if tempdir is not None:
+            tempdir.cleanup()
+
+    report(f"group lesson capacity ({args.bookers} bookers, capacity {args.capacity}, "
+           f"{args.workers} threads)", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+一覧系エンドポイントのクエリ数検証
+
+スケジュール一覧と教材一覧のサービス処理が、行数に関わらず一定回数の
+クエリで完了すること（N+1が発生しないこと）を検証し、
+遅延読み込みの場合のクエリ数と比較する。
+同じデータによるクエリ数の回帰テストは tests/test_query_counts.py にある。
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app.core.query_counter import count_queries
+from app.models.lesson import Lesson, LessonStatus, LessonType
+from app.models.material import Material
+from app.models.payment import Payment, PaymentMethod, PaymentStatus
+from app.models.user import User
+from app.services import lesson_service, material_service
+
+from .common import create_sqlite_session, measure, report
+
+TEACHERS = 20
+LESSONS = 200
+STUDENT_ID = "student-1"
+
+
+def seed(db) -> None:
+    db.execute(insert(User.__table__), [
+        {"id": str(i), "email": f"teacher{i}@example.com", "hashed_password": "x",
+         "first_name": "Teacher", "last_name": str(i)}
+        for i in range(1, TEACHERS + 1)
+    ] + [{"id": STUDENT_ID, "email": "student@example.com", "hashed_password": "x",
+          "first_name": "Student", "last_name": None}])
+    db.execute(insert(Material.__table__), [
+        {"id": i, "title": f"Material {i}", "is_public": True, "download_count": 0,
+         "created_at": datetime(2024, 1, 1) + timedelta(hours=i)}
+        for i in range(1, LESSONS + 1)
+    ])
+    start = datetime(2024, 6, 1, 9)
+    db.execute(insert(Lesson.__table__), [
+        {"id": i, "title": f"Lesson {i}", "start_time": start + timedelta(hours=i),
+         "end_time": start + timedelta(hours=i, minutes=50), "duration": 50,
+         "lesson_type": LessonType.INDIVIDUAL.name, "status": LessonStatus.SCHEDULED.name,
+         "price": 50.0, "teacher_id": i % TEACHERS + 1, "material_id": i, "is_active": True}
+        for i in range(1, LESSONS + 1)
+    ])
+    db.execute(insert(Payment.__table__), [
+        {"user_id": STUDENT_ID, "lesson_id": i, "amount": 50.0,
+         "payment_method": PaymentMethod.CREDIT_CARD.name, "status": PaymentStatus.COMPLETED.name}
+        for i in range(1, LESSONS + 1)
+    ])
+    db.commit()
+
+
+def lazy_schedule(db):
+    """リレーションを遅延読み込みする場合（比較用）"""
+    lessons = db.query(Lesson).order_by(Lesson.start_time).all()
+    return [(lesson.teacher.full_name, lesson.material.title) for lesson in lessons]
+
+
+def main() -> None:
+    db = create_sqlite_session()
+    seed(db)
+
+    def schedule():
+        db.expunge_all()
+        return lesson_service.get_user_schedule(db, STUDENT_ID)
+
+    def lazy():
+        db.expunge_all()
+        return lazy_schedule(db)
+
+    with count_queries() as counter:
+        rows = schedule()
+    assert len(rows) == LESSONS
+    assert counter.count == 1, f"schedule executed {counter.count} queries"
+    schedule_queries = counter.count
+
+    with count_queries() as counter:
+        page = material_service.get_materials(db, STUDENT_ID, limit=100)
+    assert len(page["materials"]) == 100
+    assert counter.count == 1, f"material list executed {counter.count} queries"
+    list_queries = counter.count
+
+    with count_queries() as counter:
+        lazy()
+    lazy_queries = counter.count
+
+    report(f"list endpoints ({LESSONS} rows)", {
+        "schedule (eager)": {"queries": float(schedule_queries), **measure(schedule)},
+        "schedule (lazy)": {"queries": float(lazy_queries), **measure(lazy)},
+        "material list": {"queries": float(list_queries), **measure(
+            lambda: material_service.get_materials(db, STUDENT_ID, limit=100))},
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+レート制限のオーバーヘッドのベンチマーク
+
+1回の判定にかかる時間を、アルゴリズム（トークンバケット・スライディングウィンドウ）、
+キー数、バックエンド（プロセス内・RESP互換の代替サーバー）ごとに計測する。
+あわせて、連続したリクエストのうち上限ちょうどの件数だけが許可されることを検証する。
+"""
+import asyncio
+import time
+
+from starlette.requests import Request
+
+from app.core.rate_limit import (
+    SLIDING_WINDOW,
+    InProcessBackend,
+    RateLimit,
+    RateLimiter,
+    RedisBackend,
+    client_ip,
+    redis,
+    token_subject,
+)
+from app.core.redis_standin import RedisStandin
+from app.core.security import create_access_token
+
+from .common import measure, report, seeded_random
+
+CHECKS_PER_SAMPLE = 10_000
+KEYS = 100_000
+
+TOKEN_BUCKET_LIMIT = RateLimit("bench:tb", limit=20, period=60, key_func=client_ip)
+SLIDING_WINDOW_LIMIT = RateLimit("bench:sw", limit=20, period=60, key_func=client_ip, algorithm=SLIDING_WINDOW)
+
+
+def make_request(ip: str, token: str = "") -> Request:
+    headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    return Request({"type": "http", "method": "POST", "path": "/auth/login",
+                    "headers": headers, "client": (ip, 50000)})
+
+
+def verify_burst(backend) -> None:
+    """上限を超える連続リクエストのうち、上限ちょうどの件数だけが許可されること"""
+    now = time.time()
+    for limit in (TOKEN_BUCKET_LIMIT, SLIDING_WINDOW_LIMIT):
+        allowed = sum(backend.hit(f"{limit.name}:burst", limit, now)[0] for _ in range(limit.limit + 10))
+        assert allowed == limit.limit, f"{limit.algorithm}: allowed {allowed} of limit {limit.limit}"
+
+
+def hits(backend, limit: RateLimit, keys):
+    # RateLimiter.check と同じく制限の名前を接頭辞にし、アルゴリズムごとに状態を分ける
+    keys = [f"{limit.name}:{key}" for key in keys]
+
+    def run():
+        now = time.time()
+        for key in keys:
+            backend.hit(key, limit, now)
+    return run
+
+
+def main() -> None:
+    rng = seeded_random()
+    hot_keys = ["bench:hot"] * CHECKS_PER_SAMPLE
+    spread_keys = [f"bench:{rng.randrange(KEYS)}" for _ in range(CHECKS_PER_SAMPLE)]
+
+    backend = InProcessBackend()
+    verify_burst(backend)
+    results = {
+        "token bucket (1 key)": measure(hits(backend, TOKEN_BUCKET_LIMIT, hot_keys), repeat=10),
+        f"token bucket ({KEYS:,} keys)": measure(hits(backend, TOKEN_BUCKET_LIMIT, spread_keys), repeat=10),
+        "sliding window (1 key)": measure(hits(backend, SLIDING_WINDOW_LIMIT, hot_keys), repeat=10),
+        f"sliding window ({KEYS:,} keys)": measure(hits(backend, SLIDING_WINDOW_LIMIT, spread_keys), repeat=10),
+    }
+
+    # 依存関係として呼び出した場合（キーの取り出し・トークンの検証を含む）
+    loop = asyncio.new_event_loop()
+    limiter = RateLimiter(backend=InProcessBackend(), enabled=True)
+    token = create_access_token({"sub": "user@example.com"})
+    account_limit = RateLimit("bench:account", limit=10**9, period=60, key_func=token_subject)
+    ip_limit = RateLimit("bench:ip", limit=10**9, period=60, key_func=client_ip)
+    requests = [make_request(f"10.0.{i % 256}.{i // 256 % 256}", token) for i in range(CHECKS_PER_SAMPLE)]
+
+    def dependency(limits):
+        async def run():
+            for request in requests:
+                await limiter.check(request, limits)
+        return lambda: loop.run_until_complete(run())
+
+    results["dependency (per-IP)"] = measure(dependency([ip_limit]), repeat=10)
+    results["dependency (per-IP + per-account)"] = measure(dependency([ip_limit, account_limit]), repeat=10)
+
+    if redis is not None:
+        standin = RedisStandin().start()
+        # 代替サーバーは RESP2 のみに対応する（redis-py 6 以降の既定は RESP3）
+        shared = RedisBackend(redis.Redis.from_url(standin.url, protocol=2))
+        verify_burst(shared)
+        results["shared backend (RESP stand-in)"] = measure(
+            hits(shared, TOKEN_BUCKET_LIMIT, spread_keys[:1000]), repeat=5
+        )
+        results["shared backend (RESP stand-in)"]["checks"] = 1000
+        standin.stop()
+    else:
+        print("redis package not installed; skipping the shared backend")
+
+    for name, stats in results.items():
+        checks = stats.pop("checks", CHECKS_PER_SAMPLE)
+        stats["us_per_check"] = stats["median_ms"] * 1000 / checks
+    report(f"rate limiter ({CHECKS_PER_SAMPLE:,} checks per sample)", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+参照専用行のメモリ使用量ベンチマーク
+
+50万件の決済について、ORMインスタンスとして取得した場合と
+__slots__ ベースの参照専用行として取得した場合のピークメモリと時間を比較する。
+"""
+import gc
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app.core.readonly_rows import PaymentRow, fetch_rows, stream_rows
+from app.models.payment import Payment, PaymentMethod, PaymentStatus
+
+from .common import create_sqlite_session, report
+
+ROWS = 500_000
+BATCH_SIZE = 50_000
+
+
+def seed(db) -> None:
+    base = datetime(2024, 1, 1)
+    for offset in range(0, ROWS, BATCH_SIZE):
+        db.execute(insert(Payment.__table__), [
+            {
+                "user_id": i % 5000,
+                "lesson_id": i,
+                "amount": 50.0,
+                "currency": "USD",
+                "payment_method": PaymentMethod.CREDIT_CARD.name,
+                "status": PaymentStatus.COMPLETED.name,
+                "stripe_payment_intent_id": f"pi_{i}",
+                "created_at": base + timedelta(seconds=i),
+            }
+            for i in range(offset, min(offset + BATCH_SIZE, ROWS))
+        ])
+    db.commit()
+
+
+def profile(func) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {"peak_mb": peak / 1024 / 1024, "elapsed_s": elapsed}
+
+
+def main() -> None:
+    db = create_sqlite_session()
+    seed(db)
+
+    def orm_instances():
+        payments = db.query(Payment).all()
+        db.expunge_all()
+        return payments
+
+    results = {
+        "ORM instances (.all())": profile(orm_instances),
+        "slotted rows (fetch_rows)": profile(
+            lambda: fetch_rows(db, PaymentRow, PaymentRow.select())
+        ),
+        "slotted rows (stream_rows)": profile(
+            lambda: sum(1 for _ in stream_rows(db, PaymentRow, PaymentRow.select()))
+        ),
+    }
+    report(f"read-only payment rows ({ROWS:,} rows)", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+トークン失効判定のベンチマーク
+
+失効済みトークンを REVOKED 件登録した状態で、アクセストークンの検証にかかる時間を
+リクエストごとにDBへ問い合わせる方式と、ワーカー内のブルームフィルタを使う方式で比較する。
+有効なトークンの検証でSQLが発行されないこと、失効済みのトークンが必ず拒否されることを検証する。
+"""
+import uuid
+from datetime import datetime, timedelta
+
+import jwt
+from fastapi import HTTPException
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from app.core.query_counter import count_queries
+from app.core.security import ALGORITHM, SECRET_KEY, create_access_token, decode_access_token
+from app.core.token_revocation import revocation_list
+from app.models.auth_token import RevokedToken
+
+from .common import create_sqlite_session, measure, report
+
+REVOKED = 50_000
+TOKENS = 2_000
+NEW_REVOCATIONS = 500
+
+
+def main() -> None:
+    db = create_sqlite_session()
+    session_factory = sessionmaker(bind=db.get_bind())
+    expires_at = datetime.utcnow() + timedelta(days=7)
+    revoked_jtis = [str(uuid.uuid4()) for _ in range(REVOKED)]
+    db.execute(insert(RevokedToken.__table__), [
+        {"jti": jti, "expires_at": expires_at, "revoked_at": datetime.utcnow() - timedelta(days=1),
+         "reason": "logout"}
+        for jti in revoked_jtis
+    ])
+    db.commit()
+
+    revocation_list.start(session_factory)
+    try:
+        valid_tokens = [
+            create_access_token({"sub": f"user-{i}@example.com", "fam": str(uuid.uuid4())})
+            for i in range(TOKENS)
+        ]
+        revoked_tokens = [
+            create_access_token({"sub": "revoked@example.com", "jti": jti}) for jti in revoked_jtis[:100]
+        ]
+
+        # 有効なトークンの検証ではSQLを発行しない（偽陽性の分を除く）
+        revocation_list.filter_hits = revocation_list.confirmed = 0
+        with count_queries() as counter:
+            for token in valid_tokens:
+                decode_access_token(token)
+        assert counter.count == revocation_list.false_positives, (
+            f"{counter.count} queries for {TOKENS} valid tokens"
+        )
+        for token in revoked_tokens:
+            try:
+                decode_access_token(token)
+            except HTTPException:
+                continue
+            raise AssertionError("revoked token was accepted")
+
+        def per_request_lookup():
+            for token in valid_tokens:
+                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+                db.query(RevokedToken.id).filter(
+                    RevokedToken.jti.in_([payload["jti"], payload["fam"]])
+                ).first()
+
+        def filter_lookup():
+            for token in valid_tokens:
+                decode_access_token(token)
+
+        def incremental_sync():
+            db.execute(insert(RevokedToken.__table__), [
+                {"jti": str(uuid.uuid4()), "expires_at": expires_at,
+                 "revoked_at": datetime.utcnow(), "reason": "logout"}
+                for _ in range(NEW_REVOCATIONS)
+            ])
+            db.commit()
+            revocation_list.sync(db)
+
+        results = {
+            "DB lookup per request": measure(per_request_lookup, repeat=5),
+            "in-worker filter": measure(filter_lookup, repeat=5),
+        }
+        for stats in results.values():
+            stats["us_per_token"] = stats["median_ms"] * 1000 / TOKENS
+        results[f"incremental sync (+{NEW_REVOCATIONS} rows)"] = measure(incremental_sync, repeat=5, warmup=0)
+        results["full rebuild"] = measure(lambda: revocation_list.load(db), repeat=3, warmup=0)
+    finally:
+        revocation_list.stop()
+
+    report(f"token revocation ({REVOKED:,} revoked, {TOKENS:,} tokens per sample)", results)
+    bloom = revocation_list.bloom_filter
+    print(f"  filter: {bloom.nbytes / 1024:.0f} KiB, {bloom.hash_count} hashes, "
+          f"{bloom.count:,} entries; false positives: {revocation_list.false_positives} / {TOKENS}")
+
+
+if __name__ == "__main__":
+    main()
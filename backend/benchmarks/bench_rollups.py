@@ -0,0 +1,131 @@
+"""
+管理ダッシュボード集計のベンチマーク
+
+30日分の日別予約数・売上を、元テーブル（lessons / payments）を毎回 GROUP BY で
+集計する場合と、集計テーブルを参照する場合とで比較する。
+あわせて、バックフィル結果と元テーブルからの集計が一致することと、以下を検証する。
+- パッケージ予約（1つの PaymentIntent に複数の行）の決済を1件と数えること
+- 返金を返金日時の日に計上し、以降の更新（updated_at）で日がずれないこと
+- アクティブユーザー数を活動記録から数え、users.last_login を使わないこと
+"""
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, insert
+
+from app.core import rollups
+from app.models.lesson import Lesson, LessonStatus, LessonType
+from app.models.payment import Payment, PaymentMethod, PaymentStatus
+from app.models.rollup import UserDailyActivity
+from app.models.user import User
+
+from .common import create_sqlite_session, measure, report
+
+LESSONS = 200_000
+TEACHERS = 200
+DAYS = 365
+START = datetime(2024, 1, 1, 9)
+
+
+def seed(db) -> None:
+    for offset in range(0, LESSONS, 50_000):
+        ids = range(offset + 1, min(offset + 50_000, LESSONS) + 1)
+        db.execute(insert(Lesson.__table__), [
+            {"id": i, "title": f"Lesson {i}",
+             "start_time": START + timedelta(days=i % DAYS, minutes=i % 600),
+             "end_time": START + timedelta(days=i % DAYS, minutes=i % 600 + 50),
+             "duration": 50, "lesson_type": LessonType.INDIVIDUAL.name,
+             "status": (LessonStatus.CANCELLED if i % 10 == 0 else LessonStatus.SCHEDULED).name,
+             "price": 50.0, "teacher_id": i % TEACHERS + 1, "is_active": True}
+            for i in ids
+        ])
+        db.execute(insert(Payment.__table__), [
+            {"user_id": str(i % 5000), "lesson_id": i, "amount": 50.0, "currency": "USD",
+             "payment_method": PaymentMethod.CREDIT_CARD.name,
+             "status": PaymentStatus.COMPLETED.name,
+             "completed_at": START + timedelta(days=i % DAYS, minutes=i % 600)}
+            for i in ids
+        ])
+    db.commit()
+
+
+def scan_dashboard(db, start_day: date, end_day: date):
+    """元テーブルを GROUP BY で集計する場合（比較用）"""
+    start = datetime.combine(start_day, datetime.min.time())
+    end = datetime.combine(end_day, datetime.min.time())
+    lesson_day = func.date(Lesson.start_time)
+    bookings = db.query(lesson_day, func.count(Lesson.id)).filter(
+        Lesson.start_time >= start, Lesson.start_time < end
+    ).group_by(lesson_day).all()
+    paid_day = func.date(Payment.completed_at)
+    revenue = db.query(paid_day, Payment.currency, func.sum(Payment.amount)).filter(
+        Payment.status == PaymentStatus.COMPLETED,
+        Payment.completed_at >= start, Payment.completed_at < end
+    ).group_by(paid_day, Payment.currency).all()
+    return bookings, revenue
+
+
+def verify() -> None:
+    db = create_sqlite_session()
+    day = date(2024, 3, 1)
+    paid_at = datetime.combine(day, datetime.min.time()) + timedelta(hours=10)
+    refunded_at = paid_at + timedelta(days=2)
+    db.execute(insert(Payment.__table__), [
+        {"user_id": "1", "amount": 20.0, "currency": "USD", "payment_method": PaymentMethod.CREDIT_CARD.name,
+         "status": PaymentStatus.COMPLETED.name, "stripe_payment_intent_id": "pi_package",
+         "completed_at": paid_at}
+        for _ in range(5)
+    ])
+    # executemany は全行で同じ列が必要なため、返金済みの決済は分けて登録する
+    db.execute(insert(Payment.__table__), [
+        {"user_id": "2", "amount": 50.0, "currency": "USD", "payment_method": PaymentMethod.CREDIT_CARD.name,
+         "status": PaymentStatus.REFUNDED.name, "stripe_payment_intent_id": "pi_refunded",
+         "completed_at": paid_at, "refunded_at": refunded_at,
+         # 返金後の更新（メタデータの修正など）で updated_at は返金日より後になる
+         "updated_at": refunded_at + timedelta(days=5)}
+    ])
+    db.execute(insert(User.__table__), [
+        {"id": "user-1", "email": "user-1@example.com", "hashed_password": "x",
+         "first_name": "User", "last_name": "1", "last_login": paid_at}
+    ])
+    db.execute(insert(UserDailyActivity.__table__), [
+        {"day": day + timedelta(days=offset), "user_id": "user-2"} for offset in range(3)
+    ])
+    db.commit()
+
+    rollups.backfill(db, day, day + timedelta(days=10))
+    dashboard = rollups.get_dashboard(db, day, day + timedelta(days=10))
+    revenue = {row["day"]: row for row in dashboard["revenue"]}
+    assert revenue[day]["payments"] == 2, "a package intent was counted once per lesson"
+    assert revenue[day]["amount"] == 150.0
+    refund_day = refunded_at.date()
+    assert revenue[refund_day]["refunds"] == 1 and revenue[refund_day]["refunded_amount"] == 50.0
+    assert set(revenue) == {day, refund_day}, "a refund was counted on its last update day"
+    assert [(row["day"], row["active_users"]) for row in dashboard["active_users"]] == [
+        (day + timedelta(days=offset), 1) for offset in range(3)
+    ], "active users were rebuilt from users.last_login"
+
+
+def main() -> None:
+    verify()
+    db = create_sqlite_session()
+    seed(db)
+
+    first_day = START.date()
+    last_day = first_day + timedelta(days=DAYS)
+    rollups.backfill(db, first_day, last_day)
+
+    start_day = last_day - timedelta(days=30)
+    dashboard = rollups.get_dashboard(db, start_day, last_day)
+    bookings, revenue = scan_dashboard(db, start_day, last_day)
+    assert [row["bookings"] for row in dashboard["bookings"]] == [count for _, count in bookings]
+    assert [row["amount"] for row in dashboard["revenue"]] == [amount for _, _, amount in revenue]
+
+    results = {
+        "GROUP BY scan (lessons/payments)": measure(lambda: scan_dashboard(db, start_day, last_day)),
+        "rollup tables": measure(lambda: rollups.get_dashboard(db, start_day, last_day)),
+    }
+    report(f"admin dashboard, last 30 days ({LESSONS:,} lessons)", results)
+
+
+if __name__ == "__main__":
+    main()
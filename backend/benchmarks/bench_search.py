@@ -0,0 +1,231 @@
+"""
+全文検索ベンチマーク
+
+教材50万件・レッスン50万件（計100万件）のコーパスに対して、
+SQLite FTS5、プロセス内転置インデックス、LIKE による全件走査の
+検索レイテンシを比較する。
+あわせて、小さなコーパスで以下を検証する。
+- 日本語（部分一致を含む）の検索結果が FTS5 と転置インデックスで一致すること
+- 転置インデックスの候補が FALLBACK_BATCH_SIZE 件を超えても、条件に合うレッスンを取りこぼさないこと
+- 転置インデックスはコミットした変更のみを反映し、他ワーカーでの変更（Core の更新文）を照合で反映すること
+- 索引に削除済みの教材が多数残っていても、教材の検索結果が limit 件に満たなくならないこと
+"""
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert
+
+from app.core.access_index import material_access_index
+from app.core.search_index import InvertedIndex, install_fts5, search_index
+from app.models.lesson import Lesson, LessonStatus, LessonType
+from app.models.material import Material, MaterialCategory
+from app.schemas.lesson import LessonSearch, LessonType as LessonTypeSchema
+from app.services import search_service
+
+from .common import create_sqlite_session, measure, report
+
+MATERIALS = 500_000
+LESSONS = 500_000
+BATCH_SIZE = 50_000
+SEED = 20241117
+BENCH_USER = "bench-user"
+
+VOCABULARY = [
+    "grammar", "listening", "pronunciation", "presentation", "business", "speech",
+    "vocabulary", "interview", "debate", "storytelling", "voice", "breathing",
+    "negotiation", "meeting", "conversation", "reading", "writing", "feedback",
+] + [f"term{i}" for i in range(2000)]
+CATEGORIES = ["Grammar", "Listening", "Speaking", "Business", "Presentation"]
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words))
+
+
+def seed_corpus(db) -> None:
+    rng = random.Random(SEED)
+    db.execute(insert(MaterialCategory.__table__), [
+        {"id": i + 1, "name": name} for i, name in enumerate(CATEGORIES)
+    ])
+    for offset in range(0, MATERIALS, BATCH_SIZE):
+        db.execute(insert(Material.__table__), [
+            {
+                "title": _sentence(rng, 4),
+                "description": _sentence(rng, 40),
+                "category_id": rng.randint(1, len(CATEGORIES)),
+                "download_count": 0,
+                "is_public": True,
+                "created_at": datetime(2024, 1, 1) + timedelta(minutes=i),
+            }
+            for i in range(offset, min(offset + BATCH_SIZE, MATERIALS))
+        ])
+    start = datetime(2024, 1, 1, 9)
+    for offset in range(0, LESSONS, BATCH_SIZE):
+        db.execute(insert(Lesson.__table__), [
+            {
+                "title": _sentence(rng, 4),
+                "description": _sentence(rng, 30),
+                "start_time": start + timedelta(hours=i),
+                "end_time": start + timedelta(hours=i, minutes=50),
+                "duration": 50,
+                "lesson_type": rng.choice(list(LessonType)).name,
+                "status": LessonStatus.SCHEDULED.name,
+                "level": rng.choice(["beginner", "intermediate", "advanced"]),
+                "price": float(rng.randint(20, 120)),
+                "currency": "USD",
+                "teacher_id": rng.randint(1, 200),
+                "is_active": True,
+            }
+            for i in range(offset, min(offset + BATCH_SIZE, LESSONS))
+        ])
+    db.commit()
+
+
+def _search_both(db, search):
+    """FTS5 と転置インデックスのそれぞれで検索した結果のIDを返す"""
+    ids = {}
+    for use_fts5 in (True, False):
+        search_index.use_fts5 = use_fts5
+        ids[use_fts5] = [row["id"] for row in search(db)]
+    return ids[True], ids[False]
+
+
+def verify() -> None:
+    db = create_sqlite_session()
+    titles = ["英語の発音練習", "ビジネス英語入門", "英会話フレーズ集", "日本語で学ぶ英文法",
+              "TOEIC リスニング対策", "ビジネスメールの書き方"]
+    db.execute(insert(MaterialCategory.__table__), [{"id": 1, "name": "英語"}])
+    db.execute(insert(Material.__table__), [
+        {"id": i + 1, "title": title, "description": None, "category_id": None, "download_count": 0,
+         "is_public": True, "created_at": datetime(2024, 1, 1) + timedelta(minutes=i)}
+        for i, title in enumerate(titles)
+    ])
+    # 全件がキーワードに一致し、検索条件（料金）に合うのはIDの小さい数件のみ
+    lessons = search_service.FALLBACK_BATCH_SIZE + 1000
+    db.execute(insert(Lesson.__table__), [
+        {"id": i, "title": "英会話レッスン", "start_time": datetime(2024, 1, 1) + timedelta(hours=i),
+         "end_time": datetime(2024, 1, 1) + timedelta(hours=i, minutes=50), "duration": 50,
+         "lesson_type": LessonType.GROUP.name, "status": LessonStatus.SCHEDULED.name,
+         "price": 10.0 if i <= 3 else 100.0, "teacher_id": 1, "is_active": True}
+        for i in range(1, lessons + 1)
+    ])
+    db.commit()
+    install_fts5(db.connection(), rebuild=True)
+    db.commit()
+    fallback = InvertedIndex()
+    fallback.rebuild(db)
+    search_index.inverted_index = fallback
+
+    for query in ("英語", "語の発", "ビジネス英語", "英会話", "toeic", "ビジネス メール"):
+        fts5_ids, fallback_ids = _search_both(
+            db, lambda db: search_service.search_materials(db, BENCH_USER, query))
+        assert fts5_ids, query
+        assert sorted(fts5_ids) == sorted(fallback_ids), (query, fts5_ids, fallback_ids)
+
+    cheap = LessonSearch(query="会話", price_max=20)
+    fts5_ids, fallback_ids = _search_both(db, lambda db: search_service.search_lessons(db, cheap))
+    assert fts5_ids == fallback_ids == [1, 2, 3], (fts5_ids, fallback_ids)
+    db.close()
+
+
+def verify_fallback_sync() -> None:
+    db = create_sqlite_session()
+    materials = search_service.FALLBACK_BATCH_SIZE + 1000
+    db.execute(insert(Material.__table__), [
+        {"id": i, "title": f"Speaking drill {i}", "download_count": 0, "is_public": True}
+        for i in range(1, materials + 1)
+    ])
+    db.commit()
+    fallback = InvertedIndex(sync_ttl=3600)
+    fallback.rebuild(db)
+    fallback.register_listeners()
+    search_index.use_fts5 = False
+    search_index.inverted_index = fallback
+
+    def search(query, limit=10):
+        return [row["id"] for row in search_service.search_materials(db, BENCH_USER, query, limit=limit)]
+
+    # ロールバックした変更は反映せず、コミットした変更はすぐに反映する
+    db.add(Material(title="Negotiation basics"))
+    db.flush()
+    db.rollback()
+    assert search("negotiation") == []
+    basics = Material(title="Negotiation basics")
+    db.add(basics)
+    db.commit()
+    assert search("negotiation") == [basics.id]
+
+    # Core の INSERT / DELETE（他ワーカーでの変更に相当）は照合の間隔が過ぎてから反映する
+    db.execute(insert(Material.__table__).values(
+        id=basics.id + 1, title="Negotiation roleplay", download_count=0, is_public=True
+    ))
+    db.commit()
+    assert search("negotiation") == [basics.id]
+    fallback.sync_ttl = material_access_index.material_ttl = 0
+    assert search("negotiation") == [basics.id + 1, basics.id]
+
+    # 照合前の索引に削除済みの教材が候補1回分以上残っていても、残りの候補から limit 件を返す
+    fallback.sync_ttl = material_access_index.material_ttl = 3600
+    deleted = search_service.FALLBACK_BATCH_SIZE + 500
+    db.execute(delete(Material.__table__).where(Material.id > materials - deleted, Material.id <= materials))
+    db.commit()
+    expected = list(range(materials - deleted, materials - deleted - 10, -1))
+    assert search("speaking drill") == expected, search("speaking drill")
+    db.close()
+
+
+def like_search(db, query: str):
+    """索引を使わない LIKE 検索（比較用）"""
+    pattern = f"%{query}%"
+    return db.query(*Material.list_columns()).filter(
+        Material.title.like(pattern) | Material.description.like(pattern)
+    ).limit(10).all()
+
+
+def main() -> None:
+    verify()
+    verify_fallback_sync()
+
+    db = create_sqlite_session()
+    seed_corpus(db)
+
+    lesson_filters = LessonSearch(
+        query="presentation voice",
+        lesson_type=LessonTypeSchema.GROUP,
+        price_min=30,
+        price_max=80,
+    )
+
+    results = {}
+
+    # SQLite FTS5
+    install_fts5(db.connection(), rebuild=True)
+    db.commit()
+    search_index.use_fts5 = True
+    results["fts5 material (1 term)"] = measure(
+        lambda: search_service.search_materials(db, BENCH_USER, "negotiation"))
+    results["fts5 material (2 terms)"] = measure(
+        lambda: search_service.search_materials(db, BENCH_USER, "business speech"))
+    results["fts5 lesson + filters"] = measure(
+        lambda: search_service.search_lessons(db, lesson_filters))
+
+    # プロセス内転置インデックス
+    fallback = InvertedIndex()
+    fallback.rebuild(db)
+    search_index.use_fts5 = False
+    search_index.inverted_index = fallback
+    results["inverted material (1 term)"] = measure(
+        lambda: search_service.search_materials(db, BENCH_USER, "negotiation"))
+    results["inverted material (2 terms)"] = measure(
+        lambda: search_service.search_materials(db, BENCH_USER, "business speech"))
+    results["inverted lesson + filters"] = measure(
+        lambda: search_service.search_lessons(db, lesson_filters))
+
+    # 全件走査
+    results["LIKE scan (1 term)"] = measure(lambda: like_search(db, "term1999"), repeat=3)
+
+    report(f"search ({MATERIALS + LESSONS:,} documents)", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+一覧レスポンスのシリアライズ性能ベンチマーク
+
+教材一覧とスケジュール一覧の100件ページについて、FastAPI 既定の
+response_model 検証 + jsonable_encoder + json.dumps の経路と、
+FastJSONResponse（orjson / 再検証なし）の経路のスループットを比較する。
+"""
+import json
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import parse_obj_as
+
+from app.core.fast_json import dumps, orjson
+from app.schemas.lesson import LessonSchedule
+from app.schemas.material import MaterialList
+
+from .common import measure, report
+
+ROWS = 100
+
+
+def material_page() -> dict:
+    base = datetime(2024, 1, 1)
+    return {
+        "materials": [
+            {
+                "id": i,
+                "title": f"Material {i}",
+                "description": "教材の説明 " * 30,
+                "file_type": "pdf",
+                "content_url": f"https://drive.example.com/{i}",
+                "created_at": base + timedelta(minutes=i),
+            }
+            for i in range(ROWS)
+        ],
+        "next_cursor": "MjAyNC0wMS0wMVQwMDowMDowMHwxMjM",
+    }
+
+
+def schedule_rows() -> list:
+    base = datetime(2024, 6, 1, 9)
+    return [
+        {
+            "id": i,
+            "title": f"Lesson {i}",
+            "start_time": base + timedelta(hours=i),
+            "end_time": base + timedelta(hours=i, minutes=50),
+            "status": "scheduled",
+            "lesson_type": "individual",
+            "teacher_id": i % 20,
+            "teacher_name": "Teacher Name",
+            "material_id": i,
+            "material_title": f"Material {i}",
+            "meeting_url": "https://meet.example.com/abc",
+        }
+        for i in range(ROWS)
+    ]
+
+
+def default_path(model, content) -> bytes:
+    """FastAPI の既定経路（検証 → エンコード → json.dumps）"""
+    validated = parse_obj_as(model, content)
+    return json.dumps(jsonable_encoder(validated), ensure_ascii=False).encode("utf-8")
+
+
+def main() -> None:
+    materials = material_page()
+    schedule = schedule_rows()
+
+    results = {}
+    for name, model, content in [
+        ("material list", MaterialList, materials),
+        ("schedule", List[LessonSchedule], schedule),
+    ]:
+        default = measure(lambda: default_path(model, content), repeat=200)
+        fast = measure(lambda: dumps(content), repeat=200)
+        results[f"{name} (response_model)"] = {
+            **default, "pages_per_s": 1000 / default["median_ms"]
+        }
+        results[f"{name} (fast)"] = {**fast, "pages_per_s": 1000 / fast["median_ms"]}
+
+    backend = "orjson" if orjson is not None else "json (orjson not installed)"
+    report(f"serialization of {ROWS}-row pages, fast path via {backend}", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+時間枠の仮押さえのベンチマーク
+
+一時ディレクトリのSQLite（WAL）に対して、以下を計測する。
+- 仮押さえ（slot_holds.place）・解放（release）の処理件数/秒
+- 数千件の仮押さえが同時に失効したときに、期限管理スレッドが行を削除し終えるまでの遅延
+あわせて以下を検証する。
+- 有効な仮押さえと重なる枠が iter_available_slots から除かれること
+- 同じ枠を別のユーザーが仮押さえすると409になること
+- 失効した仮押さえの枠が、行の削除を待たずに再び空き枠として返ること
+- 決済金額が仮押さえの料金と一致しない場合は予約せず、返金対象として記録すること
+- 失効後に決済が完了した仮押さえは、空いている枠のみ予約し、他は返金対象とすること
+
+    python -m benchmarks.bench_slot_holds --holds 5000
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, time as day_time, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.core.currency import split_minor_units
+from app.core.schedule_manager import ScheduleManager
+from app.core.slot_holds import SLOT_HOLD_TTL_SECONDS, SlotHoldManager
+from app.models.availability import EVERY_DAY, AvailabilityRule
+from app.models.base import Base
+from app.models.lesson import Lesson
+from app.models.payment import Payment, PaymentStatus
+from app.models.slot_hold import SlotHold
+
+from .common import report
+
+SLOT = timedelta(minutes=50)
+
+
+def slot_start(index: int, start: datetime) -> datetime:
+    # 1講師あたり1日10枠（1時間ごと）に割り振る
+    day, hour = divmod(index, 10)
+    return start + timedelta(days=day, hours=hour)
+
+
+def place_holds(manager, session_factory, count, start, ttl):
+    db = session_factory()
+    try:
+        started = time.perf_counter()
+        # 短いTTLでは先に作成した仮押さえが失効・削除されるため、IDは作成直後に取得する
+        hold_ids = [
+            manager.place(db, teacher_id=1 + index % 20, start_time=slot_start(index // 20, start),
+                          end_time=slot_start(index // 20, start) + SLOT,
+                          user_id=f"student-{index}", ttl=ttl).id
+            for index in range(count)
+        ]
+        elapsed = time.perf_counter() - started
+        return hold_ids, elapsed
+    finally:
+        db.close()
+
+
+def verify(manager, session_factory, start: datetime) -> None:
+    db = session_factory()
+    try:
+        db.execute(insert(AvailabilityRule.__table__), [{
+            "teacher_id": 99, "weekdays": EVERY_DAY, "start_time": day_time(9),
+            "end_time": day_time(12), "interval_weeks": 1,
+            "valid_from": start.date(), "timezone": "UTC",
+        }])
+        db.commit()
+        window_start = start.replace(hour=0)
+        window_end = window_start + timedelta(days=1)
+        schedule = ScheduleManager(db)
+
+        def free():
+            return set(slot for slot, _ in schedule.iter_available_slots(99, window_start, window_end))
+
+        before = free()
+        held = start.replace(hour=10, minute=0)
+        manager.place(db, 99, held, held + SLOT, user_id="student-a", ttl=timedelta(seconds=1))
+        during = free()
+        assert held in before and held not in during, "held slot is still offered"
+        assert all(not (slot < held + SLOT and slot + SLOT > held) for slot in during)
+
+        try:
+            manager.place(db, 99, held, held + SLOT, user_id="student-b")
+        except HTTPException as e:
+            assert e.status_code == 409
+        else:
+            raise AssertionError("a second user could hold the same slot")
+
+        time.sleep(1.1)
+        assert free() == before, "expired hold still blocks the slot"
+    finally:
+        db.close()
+
+
+def verify_payment(manager, session_factory, start: datetime) -> None:
+    db = session_factory()
+    try:
+        day = start + timedelta(days=400)
+
+        def place(user_id, hours, teacher_id=98):
+            return [manager.place(db, teacher_id, day + timedelta(hours=hour),
+                                  day + timedelta(hours=hour) + SLOT, user_id=user_id).id
+                    for hour in hours]
+
+        # 仮押さえ3件に対して1セントの決済 → 予約せず返金対象
+        hold_ids = place("student-a", [0, 1, 2])
+        amount, currency = manager.quote(db, hold_ids, "student-a")
+        assert manager.attach_payment(db, hold_ids, "pi_underpaid", "student-a") == 3
+        db.commit()
+        assert manager.confirm(db, "pi_underpaid", 1, currency, hold_ids=hold_ids) == []
+        db.commit()
+        flagged = db.query(Payment).filter_by(stripe_payment_intent_id="pi_underpaid").all()
+        assert [payment.status for payment in flagged] == [PaymentStatus.REFUND_REQUIRED]
+        assert db.query(Lesson).filter(Lesson.teacher_id == 98).count() == 0
+
+        # 失効後に決済が完了: 空いている枠は予約し、他のユーザーが仮押さえした枠は返金対象
+        hold_ids = place("student-a", [3, 4, 5])
+        amount, currency = manager.quote(db, hold_ids, "student-a")
+        manager.attach_payment(db, hold_ids, "pi_late", "student-a")
+        db.query(SlotHold).filter(SlotHold.id.in_(hold_ids)).update(
+            {SlotHold.expires_at: datetime.utcnow() - timedelta(seconds=1)}, synchronize_session=False
+        )
+        db.commit()
+        other = place("student-b", [4])
+        lessons = manager.confirm(db, "pi_late", amount, currency, hold_ids=hold_ids)
+        db.commit()
+        assert sorted(lesson.start_time for lesson in lessons) == [day + timedelta(hours=3),
+                                                                   day + timedelta(hours=5)]
+        payments = db.query(Payment).filter_by(stripe_payment_intent_id="pi_late").all()
+        assert sorted(payment.status.name for payment in payments) == ["COMPLETED", "COMPLETED",
+                                                                      "REFUND_REQUIRED"]
+        assert round(sum(payment.amount for payment in payments) * 100) == amount
+        manager.release(db, other[0])
+
+        # 端数は最後の行に含め、合計は決済金額に一致する
+        assert split_minor_units(10000, [1, 1, 1]) == [3333, 3333, 3334]
+        assert split_minor_units(10000, [2500, 2500, 5000]) == [2500, 2500, 5000]
+    finally:
+        db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark TTL slot holds")
+    parser.add_argument("--holds", type=int, default=5000)
+    parser.add_argument("--ttl", type=float, default=3.0, help="失効の計測に使う仮押さえの有効期間（秒）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        engine = create_engine(f"sqlite:///{os.path.join(tempdir, 'holds.db')}",
+                               connect_args={"check_same_thread": False})
+
+        @event.listens_for(engine, "connect")
+        def _set_sqlite_pragmas(connection, _):
+            connection.execute("PRAGMA journal_mode=WAL")
+
+        Base.metadata.create_all(engine)
+        session_factory = sessionmaker(bind=engine)
+        start = (datetime.utcnow() + timedelta(days=30)).replace(hour=9, minute=0, second=0,
+                                                                 microsecond=0)
+        results = {}
+
+        manager = SlotHoldManager()
+        manager.start(session_factory)
+        try:
+            verify(manager, session_factory, start)
+            verify_payment(manager, session_factory, start)
+
+            hold_ids, elapsed = place_holds(manager, session_factory, args.holds, start, None)
+            results["place"] = {"holds": len(hold_ids), "holds_per_s": len(hold_ids) / elapsed}
+
+            db = session_factory()
+            try:
+                started = time.perf_counter()
+                for hold_id in hold_ids:
+                    manager.release(db, hold_id)
+                elapsed = time.perf_counter() - started
+            finally:
+                db.close()
+            results["release"] = {"holds": len(hold_ids), "holds_per_s": len(hold_ids) / elapsed}
+
+            # 同時に失効する仮押さえを作成し、期限の到来から全件削除されるまでの時間を計る
+            ttl = timedelta(seconds=args.ttl)
+            hold_ids, elapsed = place_holds(manager, session_factory, args.holds, start, ttl)
+            db = session_factory()
+            try:
+                last_expiry = max(expires for (expires,) in db.query(SlotHold.expires_at))
+            finally:
+                db.close()
+            while manager.pending():
+                time.sleep(0.01)
+            lag = (datetime.utcnow() - last_expiry).total_seconds()
+            db = session_factory()
+            try:
+                remaining = db.query(SlotHold).count()
+            finally:
+                db.close()
+            assert remaining == 0, f"{remaining} expired holds were not deleted"
+            results["expiry sweep"] = {
+                "holds": len(hold_ids),
+                "lag_after_last_expiry_ms": lag * 1000,
+                "expired": manager.expired,
+            }
+        finally:
+            manager.stop()
+            engine.dispose()
+
+    report(f"slot holds (ttl {SLOT_HOLD_TTL_SECONDS}s default)", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+起動時間（コールドスタート）のベンチマーク
+
+新しいPythonプロセスで `python -X importtime` を使ってアプリケーションを生成し、
+インポートにかかった時間を集計する。起動時間が予算（STARTUP_BUDGET_MS）を
+超えないこと、および重いSDK（Stripe・Google API・jinja2）が起動時に
+インポートされないことを検証する。
+遅延インポートの回帰テストは tests/test_startup.py にある。
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from .common import report
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+STARTUP_CODE = "from app.main import create_app; create_app()"
+# 起動時のインポート時間の予算（ミリ秒）
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "1500"))
+# 起動時にインポートされてはならないモジュール（最初の利用時に遅延インポートする）
+DEFERRED_MODULES = ("stripe", "googleapiclient", "google_auth_oauthlib", "jinja2")
+RUNS = 5
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """
+    -X importtime の出力を (モジュール名, self[us], cumulative[us]) のリストに変換する
+    モジュール名の先頭の空白はインポートの入れ子の深さを表す
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        entries.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def cold_start() -> Dict[str, object]:
+    """新しいプロセスでアプリケーションを生成し、インポート時間を計測する"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_CODE],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+
+    entries = parse_importtime(result.stderr)
+    # 入れ子になっていない（トップレベルの）インポートの累積時間の合計
+    total_us = sum(cumulative for name, _, cumulative in entries if not name.startswith("  "))
+    modules = {name.strip() for name, _, _ in entries}
+    return {"total_ms": total_us / 1000, "entries": entries, "modules": modules}
+
+
+def main() -> None:
+    runs = [cold_start() for _ in range(RUNS)]
+    totals = sorted(run["total_ms"] for run in runs)
+
+    loaded = sorted(
+        module for module in runs[-1]["modules"]
+        if module.split(".")[0] in DEFERRED_MODULES
+    )
+    assert not loaded, f"heavy modules imported at startup: {loaded}"
+
+    slowest = sorted(runs[-1]["entries"], key=lambda entry: entry[2], reverse=True)
+    top_level = [entry for entry in slowest if not entry[0].startswith("  ")][:10]
+    report("cold start (create_app)", {
+        "import time": {"min_ms": totals[0], "median_ms": totals[len(totals) // 2], "max_ms": totals[-1]},
+    })
+    report("slowest top-level imports", {
+        name.strip(): {"cumulative_ms": cumulative / 1000} for name, _, cumulative in top_level
+    })
+
+    assert totals[len(totals) // 2] < STARTUP_BUDGET_MS, (
+        f"cold start {totals[len(totals) // 2]:.0f} ms exceeds budget {STARTUP_BUDGET_MS:.0f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+講師の予定のビットマスク（teacher_calendar）のベンチマーク
+
+1年分のレッスンを登録した講師について、以下をビットマスクの有無で比較する。
+- 枠の空き確認（レッスンの範囲検索 / is_free）
+- 1週間の空き枠（受講可能時間のルールあり / 営業時間）
+- 予約・キャンセルのコミット（ビットマスクの更新を含む）
+あわせて、ビットマスクから求めた空き枠が、レッスンから求めた空き枠と一致すること
+（予約・Lesson.cancel 後も一致すること）を検証する。
+レッスンは枠の境界（0分・30分）に開始するため、枠単位への丸めによる差は生じない。
+"""
+import asyncio
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import insert
+
+from app.core import schedule_manager as schedule_manager_module
+from app.core.config import settings
+from app.core.schedule_manager import ScheduleManager
+from app.core.teacher_calendar import teacher_calendar
+from app.models.availability import SATURDAY, WEEKDAYS, AvailabilityRule
+from app.models.lesson import Lesson, LessonStatus, LessonType
+
+from .common import create_sqlite_session, measure, report, seeded_random
+
+START = datetime(2024, 6, 3, 0, 0)
+LESSONS = 1_500
+RULE_TEACHER, HOURS_TEACHER = 1, 2
+
+
+def seed(db) -> None:
+    rng = seeded_random()
+    db.execute(insert(AvailabilityRule.__table__), [
+        {"teacher_id": RULE_TEACHER, "weekdays": WEEKDAYS, "start_time": time(9),
+         "end_time": time(21), "interval_weeks": 1, "valid_from": date(2024, 1, 1), "timezone": "UTC"},
+        {"teacher_id": RULE_TEACHER, "weekdays": SATURDAY, "start_time": time(10),
+         "end_time": time(16), "interval_weeks": 1, "valid_from": date(2024, 1, 1), "timezone": "UTC"},
+    ])
+    lessons = []
+    for teacher_id in (RULE_TEACHER, HOURS_TEACHER):
+        for _ in range(LESSONS):
+            start = START + timedelta(days=rng.randrange(365), hours=rng.randrange(8, 21),
+                                      minutes=rng.choice((0, 30)))
+            lessons.append({
+                "id": len(lessons) + 1, "title": "Lesson", "start_time": start,
+                "end_time": start + timedelta(minutes=50), "duration": 50,
+                "lesson_type": LessonType.INDIVIDUAL.name, "status": LessonStatus.SCHEDULED.name,
+                "price": 50.0, "teacher_id": teacher_id, "is_active": True,
+            })
+    db.execute(insert(Lesson.__table__), lessons)
+    db.commit()
+
+
+def use_calendar(enabled: bool) -> None:
+    schedule_manager_module.TEACHER_CALENDAR_ENABLED = enabled
+
+
+def free_slots(manager: ScheduleManager, teacher_id: int, start: datetime, end: datetime):
+    if teacher_id == RULE_TEACHER:
+        return list(manager.iter_available_slots(teacher_id, start, end))
+    return asyncio.run(manager.get_available_slots(teacher_id, start, end))
+
+
+def verify(db, manager: ScheduleManager) -> None:
+    end = START + timedelta(days=365)
+    for teacher_id in (RULE_TEACHER, HOURS_TEACHER):
+        use_calendar(False)
+        expected = free_slots(manager, teacher_id, START, end)
+        use_calendar(True)
+        assert free_slots(manager, teacher_id, START, end) == expected, f"teacher {teacher_id} differs"
+
+    # フラッシュ時の更新が反映されること（予約 → キャンセル）
+    week_end = START + timedelta(days=7)
+    slot = next(iter(manager.iter_available_slots(RULE_TEACHER, START, week_end)))
+    lesson = Lesson(
+        title="Lesson", start_time=slot[0], end_time=slot[1], lesson_type=LessonType.INDIVIDUAL,
+        status=LessonStatus.SCHEDULED, price=50.0, teacher_id=RULE_TEACHER, is_active=True,
+    )
+    db.add(lesson)
+    db.commit()
+    assert not teacher_calendar.is_free(db, RULE_TEACHER, *slot)
+    assert slot not in list(manager.iter_available_slots(RULE_TEACHER, START, week_end))
+    assert lesson.cancel()
+    db.commit()
+    assert teacher_calendar.is_free(db, RULE_TEACHER, *slot)
+    use_calendar(False)
+    expected = free_slots(manager, RULE_TEACHER, START, week_end)
+    use_calendar(True)
+    assert free_slots(manager, RULE_TEACHER, START, week_end) == expected
+
+
+def main() -> None:
+    db = create_sqlite_session()
+    seed(db)
+    manager = ScheduleManager(db)
+    verify(db, manager)
+
+    rng = seeded_random()
+    duration = timedelta(minutes=settings.LESSON_DURATION)
+    probes = [
+        START + timedelta(days=rng.randrange(365), hours=rng.randrange(8, 21), minutes=rng.choice((0, 30)))
+        for _ in range(1_000)
+    ]
+
+    def query_checks():
+        for probe in probes:
+            db.query(Lesson.id).filter(
+                Lesson.teacher_id == RULE_TEACHER,
+                Lesson.start_time < probe + duration,
+                Lesson.end_time > probe,
+                Lesson.status != LessonStatus.CANCELLED
+            ).first()
+
+    def bitmap_checks():
+        for probe in probes:
+            teacher_calendar.is_free(db, RULE_TEACHER, probe, probe + duration)
+
+    results = {
+        "is_free x1000 (lesson query)": measure(query_checks, repeat=5),
+        "is_free x1000 (bitmap)": measure(bitmap_checks, repeat=5),
+    }
+
+    week_end = START + timedelta(days=7)
+    for name, teacher_id in (("rules", RULE_TEACHER), ("business hours", HOURS_TEACHER)):
+        for enabled, path in ((False, "lessons"), (True, "bitmap")):
+            use_calendar(enabled)
+            results[f"1 week free slots ({name}, {path})"] = measure(
+                lambda: free_slots(manager, teacher_id, START, week_end), repeat=20
+            )
+        use_calendar(True)
+        results[f"1 week free starts ({name}, bitmap only)"] = measure(
+            lambda: list(teacher_calendar.iter_free_starts(db, teacher_id, START, week_end, duration)),
+            repeat=20,
+        )
+
+    # 予約とキャンセル（フラッシュ時のビットマスクの更新を含む）
+    slots = list(manager.iter_available_slots(RULE_TEACHER, START, START + timedelta(days=30)))[:200]
+
+    def book_and_cancel():
+        lessons = []
+        for slot_start, slot_end in slots:
+            lesson = Lesson(
+                title="Lesson", start_time=slot_start, end_time=slot_end,
+                lesson_type=LessonType.INDIVIDUAL, status=LessonStatus.SCHEDULED,
+                price=50.0, teacher_id=RULE_TEACHER, is_active=True,
+            )
+            db.add(lesson)
+            db.commit()
+            lessons.append(lesson)
+        for lesson in lessons:
+            lesson.cancel()
+            db.commit()
+
+    results["book + cancel x200"] = measure(book_and_cancel, repeat=3, warmup=1)
+    results["cache"] = {"hits": teacher_calendar.hits, "misses": teacher_calendar.misses}
+    report("teacher calendar bitmaps", results)
+
+
+if __name__ == "__main__":
+    main()
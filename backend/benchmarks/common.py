@@ -0,0 +1,115 @@
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.models.base import Base
+
+
+def create_sqlite_session(url: str = "sqlite://") -> Session:
+    """
+    ベンチマーク用のSQLiteセッションを作成し、全テーブルを作成する
+    """
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def measure(func: Callable[[], object], repeat: int = 20, warmup: int = 2) -> Dict[str, float]:
+    """
+    関数の実行時間を計測し、統計値（ミリ秒）を返す
+
+    Args:
+        func: 計測対象の関数
+        repeat: 計測回数
+        warmup: 計測前の空実行回数
+
+    Returns:
+        Dict[str, float]: min / median / p95 / max
+    """
+    for _ in range(warmup):
+        func()
+
+    samples: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+
+    samples.sort()
+    return {
+        "min_ms": samples[0],
+        "median_ms": statistics.median(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "max_ms": samples[-1],
+    }
+
+
+def report(name: str, results: Dict[str, Dict[str, float]]) -> None:
+    """計測結果を表形式で出力する"""
+    print(f"== {name}")
+    for case, stats in results.items():
+        columns = "  ".join(f"{key}={value:.3f}" for key, value in stats.items())
+        print(f"  {case:<32} {columns}")
+
+
+# 合成データの乱数シード（実行ごとに同じデータで計測するため固定する）
+SEED = 20240601
+
+
+def seeded_random(seed: int = SEED) -> random.Random:
+    """固定シードの乱数生成器を返す"""
+    return random.Random(seed)
+
+
+def environment() -> Dict[str, str]:
+    """計測環境の情報（結果の比較時に参照する）"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "unknown"
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+    }
+
+
+def write_json(path: str, suite: str, results: Dict[str, Dict[str, float]]) -> None:
+    """計測結果を機械可読なJSONとして書き出す"""
+    with open(path, "w") as f:
+        json.dump({"suite": suite, "environment": environment(), "results": results}, f, indent=2)
+
+
+def compare(previous_path: str, results: Dict[str, Dict[str, float]],
+            metric: str = "median_ms", threshold: float = 0.10) -> List[str]:
+    """
+    以前のJSON結果と比較し、threshold（割合）以上遅くなったケースを返す
+
+    Returns:
+        List[str]: 劣化したケースの説明
+    """
+    with open(previous_path) as f:
+        previous = json.load(f)["results"]
+
+    regressions = []
+    for case, stats in results.items():
+        before = previous.get(case, {}).get(metric)
+        after = stats.get(metric)
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        print(f"  {case:<32} {metric}: {before:.3f} -> {after:.3f} ({change:+.1%})")
+        if change > threshold:
+            regressions.append(f"{case}: {metric} {before:.3f} -> {after:.3f} ({change:+.1%})")
+    return regressions
@@ -0,0 +1,4 @@
+"""
+End-to-end load-test scenarios with local stand-ins for Stripe, SMTP and Google Drive.
+Run from the backend directory: ``python -m benchmarks.loadtest --users 50 --duration 60``.
+"""
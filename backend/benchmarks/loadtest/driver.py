@@ -0,0 +1,253 @@
+"""
+asyncio ベースの負荷試験ドライバー
+
+既定ではアプリケーション（create_app）を同じプロセス内で ASGI として直接呼び出し、
+一時ディレクトリの SQLite を使用する（1ワーカー相当の容量を計測する）。
+--base-url を指定すると起動済みのサーバーに対して実行する。その場合、サーバー側の
+stripe.api_base・SMTP_SERVER・教材の content_url を、表示される代替サーバーに向けておくこと。
+
+    python -m benchmarks.loadtest --users 50 --duration 60 --json loadtest.json
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.models.base import Base
+from app.models.lesson import Lesson, LessonStatus, LessonType
+from app.models.material import Material
+from app.models.user import User
+
+from ..common import SEED, report, write_json
+from .fakes import FakeDriveServer, FakeSMTPServer, FakeStripeServer, configure_stripe_sdk
+from .scenarios import FlowStats, UserJourney, default_calendar_start
+
+TEACHERS = 20
+LESSONS_PER_TEACHER = 200
+# 1日のグループレッスンの枠（9時から2時間おき）。間の時間を個人レッスンの仮押さえに使う
+GROUP_SLOTS_PER_DAY = 6
+MATERIALS = 500
+PASSWORD = "load-test-password"
+
+
+class LoadTestEnvironment:
+    """負荷試験の対象アプリケーション・代替サーバー・シードデータをまとめて管理する"""
+
+    def __init__(self, users: int, base_url: Optional[str], database_url: Optional[str],
+                 webhook_secret: Optional[str], latency: float, rate_limit: bool = False):
+        self.users = users
+        self.rate_limit = rate_limit
+        self.base_url = base_url
+        self.database_url = database_url
+        self.password = PASSWORD
+        self.calendar_start = default_calendar_start()
+        # グループレッスンと重ならない空き枠 (講師ID, 開始日時)
+        self.private_slots: List[Tuple[int, datetime]] = [
+            (teacher, self.calendar_start + timedelta(days=day, hours=10 + slot * 2))
+            for teacher in range(1, TEACHERS + 1)
+            for day in range(LESSONS_PER_TEACHER // GROUP_SLOTS_PER_DAY)
+            for slot in range(GROUP_SLOTS_PER_DAY - 1)
+        ]
+        self._tempdir = None
+
+        if webhook_secret is None:
+            from app.core.config import settings
+            webhook_secret = settings.STRIPE_WEBHOOK_SECRET
+        self.stripe = FakeStripeServer(webhook_secret, latency=latency)
+        self.drive = FakeDriveServer(latency=latency)
+        self.smtp = FakeSMTPServer(latency=latency / 2)
+
+    def user_email(self, index: int) -> str:
+        return f"load-user-{index % self.users}@example.com"
+
+    def start(self) -> None:
+        for server in (self.stripe, self.drive, self.smtp):
+            server.start()
+        # EmailService は最初に使われた時点で環境変数から接続先を読み込む
+        os.environ.update({
+            "SMTP_SERVER": "127.0.0.1",
+            "SMTP_PORT": str(self.smtp.port),
+            "SMTP_USE_TLS": "false",
+            "DEFAULT_SENDER_EMAIL": "noreply@example.com",
+        })
+        configure_stripe_sdk(self.stripe)
+
+        if self.base_url is None and self.database_url is None:
+            self._tempdir = tempfile.TemporaryDirectory()
+            self.database_url = f"sqlite:///{self._tempdir.name}/loadtest.db"
+        if self.database_url is not None:
+            self.engine = create_engine(self.database_url, connect_args=(
+                {"check_same_thread": False} if self.database_url.startswith("sqlite") else {}
+            ))
+            Base.metadata.create_all(self.engine)
+            self.session_factory = sessionmaker(bind=self.engine)
+            self.seed()
+
+    def stop(self) -> None:
+        for server in (self.stripe, self.drive, self.smtp):
+            server.stop()
+        if self._tempdir is not None:
+            self._tempdir.cleanup()
+
+    def seed(self) -> None:
+        from app.core.security import get_password_hash
+
+        # bcrypt は遅いため、全ユーザーで同じハッシュを使う
+        hashed_password = get_password_hash(self.password)
+        with self.session_factory() as db:
+            db.execute(insert(User.__table__), [
+                {"id": f"teacher-{i}", "email": f"teacher-{i}@example.com",
+                 "hashed_password": hashed_password, "first_name": "Teacher", "last_name": str(i),
+                 "is_active": True, "is_verified": True}
+                for i in range(1, TEACHERS + 1)
+            ] + [
+                {"id": f"load-user-{i}", "email": self.user_email(i),
+                 "hashed_password": hashed_password, "first_name": "Load", "last_name": str(i),
+                 "is_active": True, "is_verified": True}
+                for i in range(self.users)
+            ])
+            lessons = []
+            for teacher in range(1, TEACHERS + 1):
+                for slot in range(LESSONS_PER_TEACHER):
+                    start = self.calendar_start + timedelta(
+                        days=slot // GROUP_SLOTS_PER_DAY, hours=9 + (slot % GROUP_SLOTS_PER_DAY) * 2
+                    )
+                    lessons.append({
+                        "id": len(lessons) + 1, "title": f"English Conversation {teacher}-{slot}",
+                        "start_time": start, "end_time": start + timedelta(minutes=50),
+                        "duration": 50, "lesson_type": LessonType.GROUP.name,
+                        "status": LessonStatus.SCHEDULED.name, "price": 50.0,
+                        "max_participants": 1000, "current_participants": 0,
+                        "teacher_id": teacher, "is_active": True,
+                    })
+            db.execute(insert(Lesson.__table__), lessons)
+            db.execute(insert(Material.__table__), [
+                {"id": i, "title": f"English Material {i}", "description": "Practice sheet",
+                 "file_type": "PDF", "is_public": True, "download_count": 0,
+                 "content_url": self.drive.file_url(i)}
+                for i in range(1, MATERIALS + 1)
+            ])
+            db.commit()
+
+    def client(self) -> httpx.AsyncClient:
+        """アプリケーションへのクライアント（--base-url がなければプロセス内のASGI呼び出し）"""
+        timeout = httpx.Timeout(30.0)
+        if self.base_url is not None:
+            limits = httpx.Limits(max_connections=self.users, max_keepalive_connections=self.users)
+            return httpx.AsyncClient(base_url=self.base_url, timeout=timeout, limits=limits)
+
+        from app.core.database import get_db
+        from app.core.rate_limit import rate_limiter
+        from app.main import create_app
+
+        # プロセス内では全ユーザーの接続元IPが同じになるため、既定ではレート制限を無効にする
+        rate_limiter.enabled = self.rate_limit
+
+        app = create_app()
+
+        def override_get_db():
+            db = self.session_factory()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_get_db
+        return httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=timeout
+        )
+
+
+async def run_load(environment: LoadTestEnvironment, users: int, duration: float,
+                   ramp_up: float, purchase_ratio: float) -> Dict:
+    """仮想ユーザーを並行に動かし、フローごとの統計を返す"""
+    stats = FlowStats()
+    loop = asyncio.get_running_loop()
+
+    async with environment.client() as client, httpx.AsyncClient(timeout=30.0) as external:
+        started = loop.time()
+        deadline = started + ramp_up + duration
+
+        async def virtual_user(index: int) -> None:
+            await asyncio.sleep(ramp_up * index / users)
+            journey = UserJourney(client, external, environment, index, random.Random(SEED + index))
+            while loop.time() < deadline:
+                await journey.run(stats, purchase_ratio)
+
+        await asyncio.gather(*(virtual_user(index) for index in range(users)))
+        elapsed = loop.time() - started
+
+    return summarize(stats, elapsed)
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """最近傍順位法によるパーセンタイル"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))]
+
+
+def summarize(stats: FlowStats, elapsed: float) -> Dict:
+    results = {}
+    for name, latencies in stats.latencies.items():
+        errors = stats.errors.get(name, 0)
+        results[name] = {
+            "count": len(latencies),
+            "errors": errors,
+            "error_rate": errors / len(latencies),
+            "throughput_per_s": len(latencies) / elapsed,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "max_ms": max(latencies) * 1000,
+        }
+    return {"elapsed_s": elapsed, "flows": results, "error_samples": stats.error_samples}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the end-to-end load-test scenarios")
+    parser.add_argument("--users", type=int, default=20, help="同時に動かす仮想ユーザー数")
+    parser.add_argument("--duration", type=float, default=30.0, help="計測時間（秒、ランプアップを除く）")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="全ユーザーが動き出すまでの時間（秒）")
+    parser.add_argument("--purchase-ratio", type=float, default=0.3,
+                        help="1回のフローでパッケージ購入まで行う割合")
+    parser.add_argument("--latency", type=float, default=0.02, help="代替サーバーの応答遅延（秒）")
+    parser.add_argument("--base-url", help="起動済みサーバーのURL（省略時はプロセス内で実行）")
+    parser.add_argument("--database-url", help="シードデータを投入するDB（--base-url 使用時に指定）")
+    parser.add_argument("--webhook-secret", help="Webhook署名のシークレット（既定は設定値）")
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="プロセス内で実行する場合もレート制限を有効にする")
+    parser.add_argument("--json", help="結果をJSONで書き出すパス")
+    args = parser.parse_args()
+
+    environment = LoadTestEnvironment(
+        args.users, args.base_url, args.database_url, args.webhook_secret, args.latency,
+        args.rate_limit,
+    )
+    environment.start()
+    print(f"fake Stripe: {environment.stripe.url}  fake Drive: {environment.drive.url}  "
+          f"fake SMTP: 127.0.0.1:{environment.smtp.port}")
+    try:
+        started = time.perf_counter()
+        summary = asyncio.run(run_load(
+            environment, args.users, args.duration, args.ramp_up, args.purchase_ratio
+        ))
+        print(f"ran {args.users} users for {time.perf_counter() - started:.1f}s "
+              f"(Drive downloads: {environment.drive.downloads}, emails: {environment.smtp.messages})")
+    finally:
+        environment.stop()
+
+    report(f"load test ({args.users} users)", summary["flows"])
+    for name, samples in summary["error_samples"].items():
+        print(f"  {name} errors, e.g.: {samples[0]}")
+    if args.json:
+        write_json(args.json, "loadtest", summary["flows"])
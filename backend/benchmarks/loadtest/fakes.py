@@ -0,0 +1,248 @@
+"""
+負荷試験用の外部サービスの代替サーバー（Stripe API・SMTP・Google Drive）
+
+いずれも 127.0.0.1 の空きポートで別スレッドとして起動し、設定した遅延を
+挟んで応答する。実際のネットワーク越しの呼び出しと同じく、アプリケーションの
+ワーカーをブロックする時間も負荷試験の結果に含まれる。
+"""
+import itertools
+import json
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from ..stubs import payment_succeeded_event, sign_payload
+
+
+class _ServerThread:
+    """サーバーをデーモンスレッドで起動・停止する共通処理"""
+
+    server: socketserver.BaseServer
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body, content_type: str = "application/json") -> None:
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _form(self) -> Dict[str, str]:
+        length = int(self.headers.get("Content-Length") or 0)
+        fields = parse_qs(self.rfile.read(length).decode()) if length else {}
+        return {key: values[-1] for key, values in fields.items()}
+
+
+def _form_dict(form: Dict[str, str], name: str) -> Dict[str, str]:
+    """stripe SDK がフォームに展開した辞書（metadata[user_id]=... など）を戻す"""
+    prefix = f"{name}["
+    return {key[len(prefix):-1]: value for key, value in form.items()
+            if key.startswith(prefix) and key.endswith("]")}
+
+
+class FakeStripeServer(_ServerThread):
+    """
+    Stripe API（/v1/payment_intents・/v1/refunds）の代替サーバー
+
+    stripe SDK の api_base をこのサーバーのURLに向けて使用する。
+    作成した PaymentIntent は metadata（仮押さえのIDなど）を含めて保持し、
+    succeed_payment() でその決済を完了させ、署名済みの payment_intent.succeeded
+    Webhook のペイロードと Stripe-Signature ヘッダーを生成する。
+    """
+
+    def __init__(self, webhook_secret: str, latency: float = 0.02):
+        self.webhook_secret = webhook_secret
+        self.latency = latency
+        self.intents: Dict[str, Dict] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+
+    def create_intent(self, amount: int, currency: str = "usd", metadata: Optional[Dict] = None) -> Dict:
+        with self._lock:
+            intent_id = f"pi_load_{next(self._ids)}"
+        intent = {
+            "id": intent_id, "object": "payment_intent", "amount": amount, "currency": currency,
+            "status": "requires_payment_method", "client_secret": f"{intent_id}_secret",
+            "created": int(time.time()), "metadata": metadata or {},
+        }
+        self.intents[intent_id] = intent
+        return intent
+
+    def succeed_payment(self, payment_intent_id: str) -> Tuple[str, str]:
+        """作成済みの決済を完了させ、Webhook のペイロードと署名ヘッダーを返す"""
+        intent = self.intents[payment_intent_id]
+        intent["status"] = "succeeded"
+        payload = payment_succeeded_event(
+            intent["id"], intent["amount"], intent["currency"], intent["metadata"]
+        )
+        return payload, sign_payload(payload, self.webhook_secret)
+
+    def _handler(self):
+        stripe_server = self
+
+        class Handler(_JSONHandler):
+            def do_GET(self):
+                time.sleep(stripe_server.latency)
+                path = urlparse(self.path).path
+                if path == "/v1/payment_intents":
+                    data = list(stripe_server.intents.values())[-10:]
+                    self._send(200, {"object": "list", "data": data, "has_more": False})
+                elif path.startswith("/v1/payment_intents/"):
+                    intent = stripe_server.intents.get(path.rsplit("/", 1)[-1])
+                    if intent is None:
+                        self._send(404, {"error": {"type": "invalid_request_error",
+                                                   "message": "No such payment_intent"}})
+                    else:
+                        self._send(200, intent)
+                else:
+                    self._send(404, {"error": {"type": "invalid_request_error", "message": "Not found"}})
+
+            def do_POST(self):
+                time.sleep(stripe_server.latency)
+                path = urlparse(self.path).path
+                form = self._form()
+                if path == "/v1/payment_intents":
+                    intent = stripe_server.create_intent(
+                        int(form.get("amount", 0)), form.get("currency", "usd"), _form_dict(form, "metadata")
+                    )
+                    self._send(200, intent)
+                elif path.startswith("/v1/payment_intents/") and path.endswith("/confirm"):
+                    intent = stripe_server.intents.get(path.split("/")[3])
+                    if intent is None:
+                        self._send(404, {"error": {"type": "invalid_request_error",
+                                                   "message": "No such payment_intent"}})
+                    else:
+                        intent["status"] = "succeeded"
+                        self._send(200, intent)
+                elif path == "/v1/refunds":
+                    intent = stripe_server.intents.get(form.get("payment_intent", ""), {})
+                    self._send(200, {
+                        "id": f"re_load_{next(stripe_server._ids)}", "object": "refund",
+                        "status": "succeeded", "amount": int(form.get("amount") or intent.get("amount", 0)),
+                        "currency": intent.get("currency", "usd"),
+                    })
+                else:
+                    self._send(404, {"error": {"type": "invalid_request_error", "message": "Not found"}})
+
+        return Handler
+
+
+class FakeDriveServer(_ServerThread):
+    """
+    Google Drive のファイルダウンロード（/files/{id}?alt=media）の代替サーバー
+    教材の content_url をこのサーバーに向けて使用する
+    """
+
+    def __init__(self, file_size: int = 256 * 1024, latency: float = 0.03):
+        self.latency = latency
+        self.content = b"%PDF-1.4\n" + b"0" * max(0, file_size - 9)
+        self.downloads = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+
+    def file_url(self, file_id) -> str:
+        return f"{self.url}/files/{file_id}?alt=media"
+
+    def _handler(self):
+        drive_server = self
+
+        class Handler(_JSONHandler):
+            def do_GET(self):
+                time.sleep(drive_server.latency)
+                if urlparse(self.path).path.startswith("/files/"):
+                    drive_server.downloads += 1
+                    self._send(200, drive_server.content, content_type="application/pdf")
+                else:
+                    self._send(404, {"error": {"code": 404, "message": "File not found"}})
+
+        return Handler
+
+
+class FakeSMTPServer(_ServerThread):
+    """
+    最小限のSMTPサーバー（STARTTLS・認証なし）
+    EmailService は SMTP_SERVER / SMTP_PORT / SMTP_USE_TLS=false で接続する
+    """
+
+    def __init__(self, latency: float = 0.01):
+        self.latency = latency
+        self.messages = 0
+        smtp_server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def _reply(self, line: str) -> None:
+                self.wfile.write(f"{line}\r\n".encode())
+
+            def handle(self):
+                self._reply("220 fake-smtp ready")
+                in_data = False
+                for raw in self.rfile:
+                    line = raw.decode("utf-8", "replace").rstrip("\r\n")
+                    if in_data:
+                        if line == ".":
+                            in_data = False
+                            time.sleep(smtp_server.latency)
+                            smtp_server.messages += 1
+                            self._reply("250 OK: queued")
+                        continue
+                    command = line[:4].upper()
+                    if command in ("EHLO", "HELO"):
+                        self._reply("250 fake-smtp")
+                    elif command == "DATA":
+                        in_data = True
+                        self._reply("354 End data with <CR><LF>.<CR><LF>")
+                    elif command == "QUIT":
+                        self._reply("221 Bye")
+                        return
+                    else:
+                        self._reply("250 OK")
+
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+
+
+def configure_stripe_sdk(stripe_server: FakeStripeServer) -> Optional[object]:
+    """stripe SDK（インストールされている場合）の接続先を代替サーバーに向ける"""
+    try:
+        import stripe
+    except ImportError:
+        return None
+    stripe.api_base = stripe_server.url
+    stripe.api_key = stripe.api_key or "sk_test_load"
+    return stripe
@@ -0,0 +1,180 @@
+"""
+負荷試験のユーザーフロー
+
+1人の仮想ユーザーは以下を繰り返す:
+    login → browse_calendar → (一定割合で) book_package → pay → webhook → download_materials
+
+パッケージ購入はチェックアウトと同じ経路で行う。book_package で個人レッスンの枠を
+仮押さえし（/lessons/holds）、pay で仮押さえを指定して決済を作成し（/payment/intents、
+金額はサーバーが仮押さえから算出する）、webhook でその決済の payment_intent.succeeded を送る。
+
+各フローは FlowStats に所要時間と成否を記録する。途中のリクエストが失敗した
+フローはエラーとして数え、そのフローの残りのリクエストは送らない。
+"""
+import random
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import httpx
+
+PACKAGE_LESSONS = 5
+PACKAGE_LESSON_MINUTES = 50
+# 他の仮想ユーザーが仮押さえ済みの枠に当たった場合に、別の枠で試す回数
+HOLD_ATTEMPTS = 3
+MATERIAL_DOWNLOADS = 2
+
+
+class FlowFailed(Exception):
+    """フロー内のリクエストが失敗した場合の例外"""
+
+
+class FlowStats:
+    """フローごとの所要時間（秒）とエラー数"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.error_samples: Dict[str, List[str]] = {}
+
+    @asynccontextmanager
+    async def flow(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        except (FlowFailed, httpx.HTTPError) as e:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            samples = self.error_samples.setdefault(name, [])
+            if len(samples) < 5:
+                samples.append(str(e)[:200])
+            raise FlowFailed(str(e)) from e
+        finally:
+            self.latencies.setdefault(name, []).append(time.perf_counter() - started)
+
+
+def _check(response: httpx.Response, step: str) -> httpx.Response:
+    if response.status_code >= 400:
+        raise FlowFailed(f"{step}: HTTP {response.status_code} {response.text[:120]}")
+    return response
+
+
+class UserJourney:
+    """1人の仮想ユーザーの操作"""
+
+    def __init__(self, client: httpx.AsyncClient, external: httpx.AsyncClient,
+                 environment, user_index: int, rng: random.Random):
+        self.client = client
+        self.external = external
+        self.environment = environment
+        self.email = environment.user_email(user_index)
+        self.rng = rng
+        self.headers: Dict[str, str] = {}
+        self.hold_ids: List[str] = []
+        self.payment_intent_id: Optional[str] = None
+
+    async def login(self) -> None:
+        response = _check(await self.client.post(
+            "/auth/login", data={"username": self.email, "password": self.environment.password}
+        ), "login")
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def browse_calendar(self) -> None:
+        start = self.environment.calendar_start + timedelta(days=self.rng.randrange(30))
+        params = {"start_date": start.isoformat(), "end_date": (start + timedelta(days=7)).isoformat()}
+        _check(await self.client.get("/lessons/schedule", params=params, headers=self.headers), "schedule")
+        _check(await self.client.get(
+            "/lessons/search", params={**params, "query": "English"}, headers=self.headers
+        ), "search")
+
+    async def _hold(self, teacher_id: int, start: datetime) -> Optional[str]:
+        """枠を仮押さえし、他のユーザーが仮押さえ・予約済みの場合は None を返す"""
+        response = await self.client.post("/lessons/holds", json={
+            "teacher_id": teacher_id,
+            "start_time": start.isoformat(),
+            "end_time": (start + timedelta(minutes=PACKAGE_LESSON_MINUTES)).isoformat(),
+        }, headers=self.headers)
+        if response.status_code == 409:
+            return None
+        return _check(response, "hold").json()["id"]
+
+    async def _release_holds(self) -> None:
+        for hold_id in self.hold_ids:
+            await self.client.delete(f"/lessons/holds/{hold_id}", headers=self.headers)
+        self.hold_ids = []
+
+    async def book_package(self) -> None:
+        """パッケージの枠を仮押さえする（確保できなかった場合は仮押さえを解放して失敗とする）"""
+        self.hold_ids, self.payment_intent_id = [], None
+        slots = self.rng.sample(self.environment.private_slots, PACKAGE_LESSONS * HOLD_ATTEMPTS)
+        try:
+            for teacher_id, start in slots:
+                hold_id = await self._hold(teacher_id, start)
+                if hold_id is not None:
+                    self.hold_ids.append(hold_id)
+                    if len(self.hold_ids) == PACKAGE_LESSONS:
+                        return
+            raise FlowFailed(f"hold: only {len(self.hold_ids)}/{PACKAGE_LESSONS} slots were available")
+        except (FlowFailed, httpx.HTTPError):
+            await self._release_holds()
+            raise
+
+    async def pay(self) -> None:
+        """仮押さえを指定して決済を作成する（金額はサーバーが算出する）"""
+        try:
+            intent = _check(await self.client.post("/payment/intents", json={
+                "slot_hold_ids": self.hold_ids,
+            }, headers=self.headers), "payment intent").json()
+        except (FlowFailed, httpx.HTTPError):
+            await self._release_holds()
+            raise
+        self.payment_intent_id = intent["payment_intent_id"]
+
+    async def webhook(self) -> None:
+        """作成した決済を完了させ、その決済を参照する Webhook を送る"""
+        payload, signature = self.environment.stripe.succeed_payment(self.payment_intent_id)
+        _check(await self.client.post(
+            "/payment/webhook",
+            content=payload,
+            headers={"Content-Type": "application/json", "Stripe-Signature": signature},
+        ), "webhook")
+
+    async def download_materials(self) -> None:
+        page = _check(await self.client.get(
+            "/materials/list", params={"limit": 20}, headers=self.headers
+        ), "material list").json()
+        materials = page.get("materials") or []
+        for material in self.rng.sample(materials, min(MATERIAL_DOWNLOADS, len(materials))):
+            info = _check(await self.client.get(
+                f"/materials/download/{material['id']}", headers=self.headers
+            ), "download").json()
+            if info.get("content_url"):
+                # ファイル本体は教材のURL（Google Drive の代替サーバー）から取得する
+                _check(await self.external.get(info["content_url"]), "drive download")
+
+    async def _attempt(self, stats: FlowStats, name: str, step) -> bool:
+        try:
+            async with stats.flow(name):
+                await step()
+            return True
+        except FlowFailed:
+            return False
+
+    async def run(self, stats: FlowStats, purchase_ratio: float) -> None:
+        """
+        ユーザーフローを1回実行する
+        ログインに失敗した場合は以降を行わず、予約に失敗した場合は決済・Webhookを行わない
+        """
+        if not await self._attempt(stats, "login", self.login):
+            return
+        await self._attempt(stats, "browse_calendar", self.browse_calendar)
+        if self.rng.random() < purchase_ratio:
+            if await self._attempt(stats, "book_package", self.book_package):
+                if await self._attempt(stats, "pay", self.pay):
+                    await self._attempt(stats, "webhook", self.webhook)
+        await self._attempt(stats, "download_materials", self.download_materials)
+
+
+def default_calendar_start() -> datetime:
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today + timedelta(days=1)
@@ -0,0 +1,180 @@
+"""
+ベンチマーク用の外部サービスの代替実装（Stripe・SMTP・Google Drive）
+
+ネットワークに接続せず、呼び出し側から見て本物のSDKと同じ形の値を返す。
+Webhookの署名検証はStripeと同じHMAC-SHA256で行うため、検証のコストも計測に含まれる。
+"""
+import hashlib
+import hmac
+import itertools
+import json
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+WEBHOOK_SECRET = "whsec_benchmark"
+
+
+def _namespace(value):
+    """辞書を属性アクセスできるオブジェクトに変換する（StripeObject相当）"""
+    if isinstance(value, dict):
+        return SimpleNamespace(**{key: _namespace(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return [_namespace(item) for item in value]
+    return value
+
+
+class _StripeError(Exception):
+    pass
+
+
+class _SignatureVerificationError(_StripeError):
+    pass
+
+
+class FakeStripe:
+    """
+    stripe モジュールの代替
+
+    PaymentProcessor の _stripe に設定して使用する:
+        processor._stripe = FakeStripe()
+    """
+
+    error = SimpleNamespace(StripeError=_StripeError, SignatureVerificationError=_SignatureVerificationError)
+
+    def __init__(self):
+        self.api_key = None
+        self._ids = itertools.count(1)
+        self.intents: Dict[str, SimpleNamespace] = {}
+        self.PaymentIntent = SimpleNamespace(
+            create=self._create_intent, retrieve=self._retrieve_intent, list=self._list_intents
+        )
+        self.Refund = SimpleNamespace(create=self._create_refund)
+        self.Webhook = SimpleNamespace(construct_event=self._construct_event)
+
+    def _create_intent(self, amount: int, currency: str, metadata: Optional[Dict] = None, **kwargs):
+        intent_id = f"pi_{next(self._ids)}"
+        intent = SimpleNamespace(
+            id=intent_id, client_secret=f"{intent_id}_secret", amount=amount,
+            currency=currency, status="requires_payment_method", metadata=metadata or {},
+            created=int(time.time()),
+        )
+        self.intents[intent_id] = intent
+        return intent
+
+    def _retrieve_intent(self, payment_intent_id: str):
+        try:
+            return self.intents[payment_intent_id]
+        except KeyError:
+            raise _StripeError(f"No such payment_intent: {payment_intent_id}")
+
+    def _list_intents(self, customer: str, limit: int = 10):
+        return SimpleNamespace(data=list(self.intents.values())[:limit])
+
+    def _create_refund(self, payment_intent: str, amount: Optional[int] = None):
+        intent = self._retrieve_intent(payment_intent)
+        return SimpleNamespace(
+            id=f"re_{next(self._ids)}", status="succeeded",
+            amount=amount or intent.amount, currency=intent.currency,
+        )
+
+    def _construct_event(self, payload, sig_header: str, secret: str):
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload)
+        if isinstance(payload, bytes):
+            payload = payload.decode("utf-8")
+        parts = dict(item.split("=", 1) for item in sig_header.split(","))
+        expected = hmac.new(
+            secret.encode(), f"{parts.get('t')}.{payload}".encode(), hashlib.sha256
+        ).hexdigest()
+        if not hmac.compare_digest(expected, parts.get("v1", "")):
+            raise _SignatureVerificationError("No signatures found matching the expected signature")
+        return _namespace(json.loads(payload))
+
+
+def sign_payload(payload: str, secret: str = WEBHOOK_SECRET, timestamp: Optional[int] = None) -> str:
+    """Stripe-Signature ヘッダーの値を生成する"""
+    timestamp = timestamp or int(time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def payment_succeeded_event(
+    payment_intent_id: str, amount: int = 5000, currency: str = "usd", metadata: Optional[Dict] = None
+) -> str:
+    """payment_intent.succeeded イベントのペイロード（JSON文字列）を生成する"""
+    return json.dumps({
+        "id": f"evt_{payment_intent_id}",
+        "type": "payment_intent.succeeded",
+        "data": {"object": {"id": payment_intent_id, "amount": amount, "currency": currency,
+                            "metadata": metadata or {}}},
+    })
+
+
+class FakeSMTP:
+    """smtplib.SMTP の代替（接続数と送信したメッセージ数のみ数える）"""
+
+    sent = 0
+    connections = 0
+
+    def __init__(self, host: str = "localhost", port: int = 25):
+        self.host = host
+        self.port = port
+        FakeSMTP.connections += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def starttls(self):
+        pass
+
+    def login(self, username, password):
+        pass
+
+    def send_message(self, msg, to_addrs: Optional[List[str]] = None):
+        msg.as_bytes()
+        FakeSMTP.sent += 1
+
+
+class _Request:
+    def __init__(self, result):
+        self._result = result
+
+    def execute(self):
+        return self._result
+
+
+class FakeDriveFiles:
+    """Google Drive API v3 の files() リソースの代替"""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self.files: Dict[str, Dict] = {}
+
+    def create(self, body: Dict, media_body=None, fields: str = "id"):
+        file_id = f"drive_{next(self._ids)}"
+        self.files[file_id] = {"id": file_id, "mimeType": "application/pdf", **body}
+        return _Request({"id": file_id})
+
+    def list(self, q: Optional[str] = None, pageSize: int = 100, fields: str = ""):
+        files = [
+            item for item in self.files.values()
+            if q is None or f"'{(item.get('parents') or [None])[0]}' in parents" == q
+        ]
+        return _Request({"files": files[:pageSize]})
+
+    def get_media(self, fileId: str):
+        return _Request(b"%PDF-1.4 benchmark")
+
+
+class FakeDriveService:
+    """googleapiclient.discovery.build('drive', 'v3') の戻り値の代替"""
+
+    def __init__(self):
+        self._files = FakeDriveFiles()
+
+    def files(self) -> FakeDriveFiles:
+        return self._files
@@ -0,0 +1,38 @@
+"""
+一覧系のサービス処理のクエリ数の回帰テスト
+
+行数に関わらず1回のクエリで完了すること（リレーションの遅延読み込みによる
+N+1が発生しないこと）を検証する。データは bench_query_counts と同じものを使う。
+"""
+import pytest
+
+from app.core.query_counter import count_queries
+from app.schemas.lesson import LessonSearch
+from app.services import admin_service, lesson_service, material_service, search_service
+from benchmarks.bench_query_counts import STUDENT_ID, seed
+from benchmarks.common import create_sqlite_session
+
+
+@pytest.fixture(scope="module")
+def db():
+    session = create_sqlite_session()
+    seed(session)
+    yield session
+    session.close()
+
+
+@pytest.mark.parametrize("name, list_rows", [
+    ("schedule", lambda db: lesson_service.get_user_schedule(db, STUDENT_ID)),
+    ("material list", lambda db: material_service.get_materials(db, STUDENT_ID, limit=100)["materials"]),
+    ("lesson search", lambda db: search_service.search_lessons(db, LessonSearch(), limit=100)),
+    ("admin bookings", lambda db: admin_service.list_bookings(db, limit=100)),
+    ("admin payments", lambda db: admin_service.list_payments(db, limit=100)),
+])
+def test_list_runs_one_query(db, name, list_rows):
+    """一覧の取得が1回のクエリで完了すること"""
+    # 読み込み済みのオブジェクトを使わないよう、セッションを空にしてから数える
+    db.expunge_all()
+    with count_queries() as counter:
+        rows = list_rows(db)
+    assert rows
+    assert counter.count == 1, f"{name} executed {counter.count} queries"
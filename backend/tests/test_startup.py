@@ -0,0 +1,29 @@
+"""
+コールドスタートの回帰テスト
+
+新しいプロセスで app.main をインポートし、重いSDK（Stripe・Google API・jinja2）が
+起動時にインポートされないこと（最初の利用時まで遅延されること）を検証する。
+"""
+import json
+import subprocess
+import sys
+
+from benchmarks.bench_startup import BACKEND_DIR, DEFERRED_MODULES
+
+IMPORT_CODE = (
+    "import json, sys; import app.main; "
+    f"print(json.dumps(sorted(m for m in {DEFERRED_MODULES!r} if m in sys.modules)))"
+)
+
+
+def test_import_defers_sdks():
+    """app.main のインポート後に遅延対象のSDKが sys.modules にないこと"""
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_CODE],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    assert loaded == [], f"imported at startup: {loaded}"